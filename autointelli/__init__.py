@@ -11,7 +11,10 @@ from flask_migrate import Migrate
 from flask_mail import Mail
 from itsdangerous import URLSafeTimedSerializer
 from dotenv import load_dotenv
-from notion_client import Client
+from sqlalchemy import inspect
+from .notion.transport import build_notion_client, warm_up_notion_client # Cliente de Notion con transporte HTTP configurable
+from .torni_catalog import load_torni_catalog, torni_catalog_build_command # Catálogo Torni compilado (mmap)
+from .assets import init_static_assets, assets_build_command # Estáticos con huella y precomprimidos
 
 # Inicializar otras extensiones (db ya está importada, no la crees aquí)
 login_manager = LoginManager()
@@ -60,12 +63,131 @@ def create_app():
     app.config['DATABASE_ID_MATERIALES_DB1'] = os.environ.get("DATABASE_ID")
     app.config['DATABASE_ID_MATERIALES_DB2'] = os.environ.get("DATABASE_ID_2")
 
+    # Espejo local de Notion (ver notion/mirror.py)
+    # 'off' = siempre Notion en vivo, 'mirror_first' = espejo primero, 'notion_first' = Notion primero con respaldo en el espejo
+    app.config['NOTION_MIRROR_MODE'] = os.environ.get('NOTION_MIRROR_MODE', 'off').strip().lower()
+    app.config['NOTION_MIRROR_TTL_SECONDS'] = int(os.environ.get('NOTION_MIRROR_TTL_SECONDS', 300))
+    app.config['NOTION_MIRROR_MAX_DATABASES'] = int(os.environ.get('NOTION_MIRROR_MAX_DATABASES', 8))
+    app.config['NOTION_MIRROR_MAX_PAGES'] = int(os.environ.get('NOTION_MIRROR_MAX_PAGES', 50000))
+
+    # Caché de esquemas de bases de datos (ver notion/schema_cache.py)
+    app.config['NOTION_SCHEMA_TTL_SECONDS'] = int(os.environ.get('NOTION_SCHEMA_TTL_SECONDS', 600))
+    app.config['NOTION_SCHEMA_VERSION_CHECK_SECONDS'] = int(os.environ.get('NOTION_SCHEMA_VERSION_CHECK_SECONDS', 30))
+
+    # Límite de tasa y reintentos de la API de Notion (ver notion/rate_limit.py y notion/bulk.py)
+    app.config['NOTION_RATE_LIMIT_PER_SECOND'] = float(os.environ.get('NOTION_RATE_LIMIT_PER_SECOND', 3))
+    app.config['NOTION_RATE_LIMIT_BURST'] = int(os.environ.get('NOTION_RATE_LIMIT_BURST', 3))
+    app.config['NOTION_MAX_RETRIES'] = int(os.environ.get('NOTION_MAX_RETRIES', 4)) # Lecturas y pages.update
+    app.config['NOTION_MAX_RETRIES_CREATE'] = int(os.environ.get('NOTION_MAX_RETRIES_CREATE', 3)) # pages.create
+    app.config['NOTION_RETRY_BASE_SECONDS'] = float(os.environ.get('NOTION_RETRY_BASE_SECONDS', 0.5))
+    app.config['NOTION_RETRY_MAX_DELAY_SECONDS'] = float(os.environ.get('NOTION_RETRY_MAX_DELAY_SECONDS', 20))
+    app.config['NOTION_RETRY_SLEEP_BUDGET_SECONDS'] = float(os.environ.get('NOTION_RETRY_SLEEP_BUDGET_SECONDS', 60)) # Espera acumulada máxima por llamada
+    # Propiedad de texto de las bases de Materiales con la clave de deduplicación de cada página creada (opcional)
+    app.config['NOTION_DEDUPE_PROPERTY'] = os.environ.get('NOTION_DEDUPE_PROPERTY', 'Clave de envío')
+
+    # Circuit breaker de Notion (ver notion/circuit_breaker.py) y copias de los dashboards para cuando está abierto
+    app.config['NOTION_CIRCUIT_ENABLED'] = os.environ.get('NOTION_CIRCUIT_ENABLED', 'True').lower() == 'true'
+    app.config['NOTION_CIRCUIT_WINDOW'] = int(os.environ.get('NOTION_CIRCUIT_WINDOW', 20)) # Últimas llamadas consideradas
+    app.config['NOTION_CIRCUIT_MIN_CALLS'] = int(os.environ.get('NOTION_CIRCUIT_MIN_CALLS', 5))
+    app.config['NOTION_CIRCUIT_FAILURE_RATIO'] = float(os.environ.get('NOTION_CIRCUIT_FAILURE_RATIO', 0.5))
+    app.config['NOTION_CIRCUIT_SLOW_CALL_SECONDS'] = float(os.environ.get('NOTION_CIRCUIT_SLOW_CALL_SECONDS', 10)) # Más lenta = falla
+    app.config['NOTION_CIRCUIT_OPEN_SECONDS'] = float(os.environ.get('NOTION_CIRCUIT_OPEN_SECONDS', 30))
+    app.config['NOTION_DASHBOARD_SNAPSHOTS'] = int(os.environ.get('NOTION_DASHBOARD_SNAPSHOTS', 32))
+    app.config['NOTION_BULK_MAX_WORKERS'] = int(os.environ.get('NOTION_BULK_MAX_WORKERS', 4))
+    app.config['NOTION_SUBMIT_MAX_WORKERS'] = int(os.environ.get('NOTION_SUBMIT_MAX_WORKERS', 4)) # Creaciones simultáneas por solicitud de material
+    app.config['NOTION_RELATION_CACHE_TTL_SECONDS'] = int(os.environ.get('NOTION_RELATION_CACHE_TTL_SECONDS', 600))
+
+    # Índice en memoria de partidas (ver notion/partida_index.py)
+    app.config['NOTION_PARTIDA_INDEX_PREWARM'] = os.environ.get('NOTION_PARTIDA_INDEX_PREWARM', 'True').lower() == 'true'
+    app.config['NOTION_PARTIDA_INDEX_REFRESH_SECONDS'] = int(os.environ.get('NOTION_PARTIDA_INDEX_REFRESH_SECONDS', 60))
+    app.config['NOTION_PARTIDA_INDEX_FULL_SECONDS'] = int(os.environ.get('NOTION_PARTIDA_INDEX_FULL_SECONDS', 3600))
+    app.config['NOTION_PARTIDA_NEGATIVE_TTL_SECONDS'] = int(os.environ.get('NOTION_PARTIDA_NEGATIVE_TTL_SECONDS', 60))
+
+    # Catálogo de proyectos en caché para el selector de Compras (ver notion/catalog.py)
+    app.config['NOTION_PROJECT_CATALOG_TTL_SECONDS'] = int(os.environ.get('NOTION_PROJECT_CATALOG_TTL_SECONDS', 300))
+
+    # Consultas idénticas concurrentes comparten una sola llamada a Notion (singleflight, ver notion/utils.py)
+    app.config['NOTION_QUERY_COALESCING'] = os.environ.get('NOTION_QUERY_COALESCING', 'True').lower() == 'true'
+
+    # Máximo de solicitudes que los dashboards leen por consulta (iter_pages, notion/utils.py). 0 = sin límite.
+    app.config['NOTION_DASHBOARD_MAX_PAGES'] = int(os.environ.get('NOTION_DASHBOARD_MAX_PAGES', 0))
+    # Solicitudes por página en los dashboards (paginación por cursor en el servidor). 0 = sin paginación (lista completa).
+    app.config['NOTION_DASHBOARD_PAGE_SIZE'] = int(os.environ.get('NOTION_DASHBOARD_PAGE_SIZE', 50))
+    # Caché stale-while-revalidate de los dashboards (ver dashboard_snapshot.py). Cada blueprint puede sobrescribir
+    # estos valores con NOTION_DASHBOARD_<COMPRAS|ALMACEN>_<nombre>, p. ej. NOTION_DASHBOARD_ALMACEN_TTL_SECONDS.
+    app.config['NOTION_DASHBOARD_TTL_SECONDS'] = float(os.environ.get('NOTION_DASHBOARD_TTL_SECONDS', 60)) # Copia fresca. 0 = sin caché
+    app.config['NOTION_DASHBOARD_MAX_STALE_SECONDS'] = float(os.environ.get('NOTION_DASHBOARD_MAX_STALE_SECONDS', 600)) # Edad máxima servida mientras se recarga
+    app.config['NOTION_DASHBOARD_EARLY_REFRESH_BETA'] = float(os.environ.get('NOTION_DASHBOARD_EARLY_REFRESH_BETA', 1.0)) # Recarga anticipada. 0 = desactivada
+    # Cada cuánto un worker relee las versiones publicadas por invalidate_dashboard en otros procesos
+    app.config['NOTION_DASHBOARD_VERSION_CHECK_SECONDS'] = float(os.environ.get('NOTION_DASHBOARD_VERSION_CHECK_SECONDS', 2))
+    for view in ('COMPRAS', 'ALMACEN'):
+        for name in ('TTL_SECONDS', 'MAX_STALE_SECONDS', 'EARLY_REFRESH_BETA'):
+            if os.environ.get(f'NOTION_DASHBOARD_{view}_{name}'):
+                app.config[f'NOTION_DASHBOARD_{view}_{name}'] = float(os.environ[f'NOTION_DASHBOARD_{view}_{name}'])
+    # Exportación CSV/XLSX de los dashboards (ver dashboard_export.py)
+    app.config['DASHBOARD_EXPORT_MAX_ROWS'] = int(os.environ.get('DASHBOARD_EXPORT_MAX_ROWS', 50000)) # 0 = sin límite
+    app.config['DASHBOARD_EXPORT_XLSX_PROCESSES'] = int(os.environ.get('DASHBOARD_EXPORT_XLSX_PROCESSES', 2)) # Exportaciones XLSX simultáneas (un proceso cada una)
+
+    # Hilos en segundo plano (ver start_background_workers); False en procesos web que no deben aplicar escrituras ni sincronizar
+    app.config['NOTION_BACKGROUND_WORKERS'] = os.environ.get('NOTION_BACKGROUND_WORKERS', 'True').lower() == 'true'
+
+    # Sincronización incremental del espejo (ver notion/sync.py). 0 = sin hilo en segundo plano (usar 'flask notion-sync').
+    app.config['NOTION_SYNC_INTERVAL_SECONDS'] = int(os.environ.get('NOTION_SYNC_INTERVAL_SECONDS', 0))
+    app.config['NOTION_SYNC_FULL_EVERY'] = int(os.environ.get('NOTION_SYNC_FULL_EVERY', 24))
+
+    # Bandeja de salida de escrituras a Notion (ver notion/outbox.py). Desactivada = escritura síncrona en la solicitud.
+    # Solo encola si hay quien la aplique: el hilo de start_background_workers (gunicorn.conf.py, run.py) o 'flask notion-outbox'
+    # en otro proceso (POLL_SECONDS = 0 o NOTION_BACKGROUND_WORKERS=False); con 'flask run' se escribe en la solicitud.
+    app.config['NOTION_OUTBOX_ENABLED'] = os.environ.get('NOTION_OUTBOX_ENABLED', 'True').lower() == 'true'
+    app.config['NOTION_OUTBOX_POLL_SECONDS'] = float(os.environ.get('NOTION_OUTBOX_POLL_SECONDS', 2)) # 0 = sin hilo (usar 'flask notion-outbox')
+    app.config['NOTION_OUTBOX_BATCH_SIZE'] = int(os.environ.get('NOTION_OUTBOX_BATCH_SIZE', 20))
+    app.config['NOTION_OUTBOX_MAX_ATTEMPTS'] = int(os.environ.get('NOTION_OUTBOX_MAX_ATTEMPTS', 8))
+    app.config['NOTION_OUTBOX_LEASE_SECONDS'] = int(os.environ.get('NOTION_OUTBOX_LEASE_SECONDS', 300))
+    app.config['NOTION_OUTBOX_RETRY_BASE_SECONDS'] = float(os.environ.get('NOTION_OUTBOX_RETRY_BASE_SECONDS', 5))
+
+    # Transporte HTTP del cliente de Notion (ver notion/transport.py)
+    app.config['NOTION_HTTP_POOL_SIZE'] = int(os.environ.get('NOTION_HTTP_POOL_SIZE', 10))
+    app.config['NOTION_HTTP_KEEPALIVE_SECONDS'] = float(os.environ.get('NOTION_HTTP_KEEPALIVE_SECONDS', 120))
+    app.config['NOTION_HTTP_CONNECT_TIMEOUT_SECONDS'] = float(os.environ.get('NOTION_HTTP_CONNECT_TIMEOUT_SECONDS', 5))
+    app.config['NOTION_HTTP_READ_TIMEOUT_SECONDS'] = float(os.environ.get('NOTION_HTTP_READ_TIMEOUT_SECONDS', 30))
+    app.config['NOTION_HTTP2'] = os.environ.get('NOTION_HTTP2', 'False').lower() == 'true'
+    app.config['NOTION_CLIENT_STRATEGY'] = os.environ.get('NOTION_CLIENT_STRATEGY', 'shared').strip().lower() # 'shared' o 'per_thread'
+    app.config['NOTION_HTTP_WARMUP'] = os.environ.get('NOTION_HTTP_WARMUP', 'True').lower() == 'true'
+    app.config['NOTION_HTTP_WARMUP_CONNECTIONS'] = int(os.environ.get('NOTION_HTTP_WARMUP_CONNECTIONS', 2))
+
+    # Estáticos con huella en el nombre, precomprimidos y con caché immutable (ver assets.py y 'flask assets-build')
+    app.config['STATIC_ASSETS_ENABLED'] = os.environ.get('STATIC_ASSETS_ENABLED', 'True').lower() == 'true'
+    app.config['STATIC_ASSETS_MAX_AGE'] = int(os.environ.get('STATIC_ASSETS_MAX_AGE', 31536000)) # Un año
+    app.config['STATIC_ASSETS_BROTLI_QUALITY'] = int(os.environ.get('STATIC_ASSETS_BROTLI_QUALITY', 11))
+
+    # Catálogo Torni compilado y abierto con mmap para /accesorios/catalog/search (ver torni_catalog.py)
+    data_dir = os.path.join(static_dir, 'data')
+    app.config['TORNI_CATALOG_PATH'] = os.environ.get('TORNI_CATALOG_PATH', os.path.join(data_dir, 'torni_catalog.bin'))
+    # Fuentes que compila 'flask torni-catalog-build', en orden de prioridad
+    app.config['TORNI_CATALOG_SOURCES'] = [os.path.join(data_dir, name) for name in ('torni_items_masterlist.json', 'accesorios.json', 'accesorios.csv')]
+    app.config['TORNI_SEARCH_DEFAULT_LIMIT'] = int(os.environ.get('TORNI_SEARCH_DEFAULT_LIMIT', 10))
+    app.config['TORNI_SEARCH_MAX_LIMIT'] = int(os.environ.get('TORNI_SEARCH_MAX_LIMIT', 50))
+    app.torni_catalog = load_torni_catalog(app.config['TORNI_CATALOG_PATH'], app.config['TORNI_CATALOG_SOURCES'])
+
+    # Importación masiva de solicitudes desde CSV/XLSX (ver material_import.py)
+    app.config['MATERIAL_IMPORT_MAX_BYTES'] = int(os.environ.get('MATERIAL_IMPORT_MAX_BYTES', 5 * 1024 * 1024))
+    app.config['MATERIAL_IMPORT_MAX_ROWS'] = int(os.environ.get('MATERIAL_IMPORT_MAX_ROWS', 500))
+    app.config['MATERIAL_IMPORT_BATCH_SIZE'] = int(os.environ.get('MATERIAL_IMPORT_BATCH_SIZE', 25)) # Items Torni por solicitud
+    app.config['MATERIAL_IMPORT_MAX_WORKERS'] = int(os.environ.get('MATERIAL_IMPORT_MAX_WORKERS', 2)) # Solicitudes simultáneas por importación
+    app.config['MATERIAL_IMPORT_JOBS'] = int(os.environ.get('MATERIAL_IMPORT_JOBS', 20)) # Importaciones terminadas que se conservan en la base de datos
+    # Un trabajo en segundo plano sin cambios durante este tiempo se reporta como interrumpido (ver background_jobs.py)
+    app.config['BACKGROUND_JOB_STALE_SECONDS'] = int(os.environ.get('BACKGROUND_JOB_STALE_SECONDS', 900))
+
+    # Creación de partidas de proyectos nuevos en segundo plano (ver project_setup.py)
+    app.config['PROJECT_PARTIDAS_MAX_WORKERS'] = int(os.environ.get('PROJECT_PARTIDAS_MAX_WORKERS', 4)) # Partidas que se crean a la vez (el limitador de tasa sigue aplicando)
+    app.config['PROJECT_PARTIDAS_JOBS'] = int(os.environ.get('PROJECT_PARTIDAS_JOBS', 20)) # Trabajos terminados que se conservan en la base de datos
+
     # Inicializar Cliente Notion y guardarlo en la instancia de app
     app.notion_client = None
     if app.config.get('NOTION_API_KEY'):
          print("DEBUG: NOTION_API_KEY encontrada en config, intentando inicializar Notion Client...") 
          try:
-              app.notion_client = Client(auth=app.config['NOTION_API_KEY'])
+              app.notion_client = build_notion_client(app.config['NOTION_API_KEY'], app.config)
               print("DEBUG: Cliente de Notion inicializado.")
          except Exception as e:
               print(f"DEBUG: ERROR al inicializar Notion Client: {e}") 
@@ -128,7 +250,52 @@ def create_app():
     app.register_blueprint(proyectos_bp, url_prefix='/proyectos')
     app.register_blueprint(accesorios_bp, url_prefix='/accesorios')
     app.register_blueprint(almacen_bp, url_prefix='/almacen')
-    app.register_blueprint(compras_bp, url_prefix='/compras') 
+    app.register_blueprint(compras_bp, url_prefix='/compras')
+    init_static_assets(app)
+
+    # --- Sincronización del espejo de Notion ---
+    from .notion.sync import notion_sync_command
+    from .notion.outbox import notion_outbox_command
+    app.cli.add_command(notion_sync_command)
+    app.cli.add_command(notion_outbox_command)
+    app.cli.add_command(torni_catalog_build_command)
+    app.cli.add_command(assets_build_command)
+    # Los hilos en segundo plano no se inician aquí: create_app también corre en cada comando 'flask' (incluido
+    # 'flask db upgrade') y, con 'gunicorn --preload', en el proceso maestro. Ver start_background_workers.
 
     # Retornar la instancia de la aplicación configurada
-    return app
\ No newline at end of file
+    return app
+
+
+# Tablas que usan los hilos en segundo plano; si faltan, las migraciones aún no se han aplicado
+BACKGROUND_WORKER_TABLES = ('notion_outbox_item', 'notion_mirror_page', 'dashboard_version')
+
+
+def start_background_workers(app) -> bool:
+    """
+    Inicia los hilos en segundo plano del proceso que atiende solicitudes: calentamiento de conexiones, sincronización
+    del espejo, bandeja de salida y precarga del índice de partidas. Se llama desde el hook post_worker_init de
+    gunicorn (gunicorn.conf.py) y desde run.py, nunca desde create_app. Retorna False si no se iniciaron.
+    """
+    from .notion.sync import start_sync_worker, prewarm_partida_index
+    from .notion.outbox import start_outbox_worker
+    if not app.config.get('NOTION_BACKGROUND_WORKERS') or app.notion_client is None:
+        return False
+
+    with app.app_context():
+        try:
+            missing = [table for table in BACKGROUND_WORKER_TABLES if not inspect(db.engine).has_table(table)]
+        except Exception as e:
+            app.logger.error(f"No se pudo revisar la base de datos antes de iniciar los hilos en segundo plano: {e}")
+            return False
+    if missing:
+        app.logger.warning(f"Hilos en segundo plano no iniciados: faltan las tablas {', '.join(missing)} (ejecuta 'flask db upgrade').")
+        return False
+
+    if app.config.get('NOTION_HTTP_WARMUP'):
+        warm_up_notion_client(app)
+    start_sync_worker(app)
+    start_outbox_worker(app)
+    if app.config.get('NOTION_PARTIDA_INDEX_PREWARM'):
+        prewarm_partida_index(app)
+    return True
\ No newline at end of file
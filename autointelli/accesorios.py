@@ -1,10 +1,13 @@
 # autointelli/accesorios.py
 
-from flask import Blueprint, request, jsonify, render_template, current_app
+from flask import Blueprint, request, jsonify, render_template, current_app, url_for
 from flask_login import login_required, current_user
 from .notion.solicitudes import submit_request_for_material_logic # Reutiliza la lógica principal
+from .notion.outbox import outbox_enabled, enqueue_material_request # Envío asíncrono vía bandeja de salida
 from .models import db, AuditLog # Importar para auditoría
 from .decorators import role_required # Importar el decorador
+from .torni_catalog import get_torni_catalog # Búsqueda en el catálogo Torni indexado en el servidor
+from .dashboard_snapshot import invalidate_dashboard # Las copias de los dashboards quedan viejas tras un envío
 
 import logging
 
@@ -24,6 +27,24 @@ def torni_accessories_request_page(): # Nombre de función descriptivo
     return render_template('accesorios/torni_request_form.html')
 
 
+@accesorios_bp.route('/catalog/search', methods=['GET']) # Búsqueda en el catálogo Torni (autocompletado del formulario)
+@login_required
+@role_required(['diseno', 'admin'])
+def torni_catalog_search():
+    # Solo los primeros resultados: el formulario ya no descarga la lista maestra completa (ver torni_catalog.py)
+    catalog = get_torni_catalog()
+    if catalog is None:
+        return jsonify({"error": "El catálogo Torni no está disponible."}), 503
+
+    query = request.args.get('q', '').strip()
+    limit = request.args.get('limit', current_app.config.get('TORNI_SEARCH_DEFAULT_LIMIT', 10), type=int)
+    limit = max(1, min(limit, current_app.config.get('TORNI_SEARCH_MAX_LIMIT', 50)))
+    results = catalog.search(query, limit=limit)
+    response = jsonify({"query": query, "results": results})
+    response.headers['Cache-Control'] = 'private, max-age=300' # El catálogo solo cambia al reiniciar la aplicación
+    return response
+
+
 @accesorios_bp.route('/submit_torni', methods=['POST']) # Ruta para submit Torni
 @login_required
 @role_required(['diseno', 'admin']) # Solo roles 'diseno' y 'admin' pueden enviar
@@ -91,13 +112,23 @@ def submit_torni_accessories_request(): # Nombre de función descriptivo
     # Llamar a la lógica principal de procesamiento
     # La lógica principal detectará que es modo Torni porque data tiene 'proveedor' = 'Torni'
     # y la clave 'torni_items' con una lista (ya validamos que existe y no está vacía)
+    if outbox_enabled():
+        response_data, status_code = enqueue_material_request(database_id_db1, database_id_db2, data, user_id=current_user.id)
+        if status_code == 202:
+            response_data['status_url'] = url_for('solicitudes.request_status', request_key=response_data['request_key'])
+        return jsonify(response_data), status_code
+
     response_data, status_code = submit_request_for_material_logic(
         notion_client,
         database_id_db1,
         database_id_db2,
-        data, # Pasa el diccionario data con los campos comunes y 'torni_items'
+        current_app.config.get('DATABASE_ID_PARTIDAS'),
+        current_app.config.get('DATABASE_ID_PROYECTOS'),
+        data=data, # Pasa el diccionario data con los campos comunes y 'torni_items'
         user_id=current_user.id
     )
+    if 200 <= status_code < 300:
+        invalidate_dashboard(reason="solicitud Torni creada")
 
     # Nota: El logging y el registro de auditoría se hacen dentro de submit_request_for_material_logic
 
@@ -1,6 +1,6 @@
 # autointelli/ajustes.py
 
-from flask import Blueprint, request, jsonify, render_template, current_app # Importar current_app
+from flask import Blueprint, request, jsonify, render_template, current_app, flash # Importar current_app
 from flask_login import login_required, current_user
 from .notion.ajustes import adjust_dates_api
 from .notion.utils import list_available_properties
@@ -8,6 +8,7 @@ from .models import db, AuditLog # Importarlos para registro de auditoría
 
 
 import logging
+import re
 # from flask_cors import cross_origin # Si necesitas CORS
 
 logger = logging.getLogger(__name__) # Logger para este Blueprint
@@ -103,10 +104,13 @@ def run_adjust_script():
              if prop_name and prop_value:
                   property_filters[prop_name.strip()] = prop_value.strip()
 
-        logger.info(f"[{current_user.username}] Datos de formulario recibidos: Horas={hours}, Fecha={start_date_str}, Filtros={property_filters}")
+        # Reintento de un ajuste parcial: solo los IDs que la ejecución anterior no pudo aplicar
+        page_ids = [page_id for page_id in re.split(r'[\s,]+', request.form.get("page_ids", "")) if page_id]
+
+        logger.info(f"[{current_user.username}] Datos de formulario recibidos: Horas={hours}, Fecha={start_date_str}, Filtros={property_filters}, IDs={len(page_ids) or 'todos'}")
 
         # Llama a la lógica principal del módulo auxiliar, pasando el cliente Notion y el ID
-        result_dict = adjust_dates_api(notion_client, database_id_planes, hours, start_date_str, property_filters=property_filters)
+        result_dict = adjust_dates_api(notion_client, database_id_planes, hours, start_date_str, property_filters=property_filters, page_ids=page_ids or None)
 
 
         # Registro de auditoría
@@ -127,7 +131,7 @@ def run_adjust_script():
 
         # Construir respuesta para el frontend
         if result_dict.get("success"):
-            return jsonify({"message": result_dict.get("message")})
+            return jsonify({"message": result_dict.get("message"), "pending_page_ids": result_dict.get("pending_page_ids", [])})
         else:
             return jsonify({"error": result_dict.get("error", "Error desconocido al ajustar fechas.")}), result_dict.get("status_code", 500)
 
@@ -1,11 +1,17 @@
 # autointelli/almacen.py
 
-from flask import Blueprint, render_template, current_app, request, jsonify
+from flask import Blueprint, render_template, current_app, request, jsonify, flash
 from flask_login import login_required, current_user
 from .models import db, AuditLog # Importar para auditoría si es necesario en el Blueprint
 from .decorators import role_required # Importar el decorador
 # Importar funciones para consultar/actualizar Notion
-from .notion.utils import get_pages_with_filter_util, update_notion_page_properties, build_filter_from_properties_util
+from .notion.utils import build_filter_from_properties_util, iter_pages, get_pages_slice_util, notion_query_failed
+from .pagination import decode_page_token, current_cursor, build_pagination # Paginación por cursor del dashboard
+from .notion.records import get_solicitud_extractor # Registros compactos de solicitudes para el template
+from .notion.constants import PROJECTION_SOLICITUDES_DASHBOARD # Solo las propiedades que muestra el dashboard
+from .notion.circuit_breaker import notion_circuit_open
+from .dashboard_snapshot import DashboardLoad, dashboard_snapshot_key, load_dashboard # Caché stale-while-revalidate del dashboard
+from .dashboard_export import export_response, iter_export_rows # Exportación CSV/XLSX en streaming
 
 import logging
 
@@ -15,6 +21,57 @@ logger = logging.getLogger(__name__) # Logger para este Blueprint
 almacen_bp = Blueprint('almacen', __name__, url_prefix='/almacen')
 
 
+def _almacen_filters(notion_client, database_id_solicitudes_almacen) -> list:
+    """Filtros de Notion del dashboard de Almacén; los usa también /almacen/export."""
+    return build_filter_from_properties_util(
+        notion_client, # Pasa el cliente Notion
+        database_id_solicitudes_almacen, # Pasa el ID de la DB
+        {
+            "Estatus": "Pendiente" # Ejemplo: filtrar por estatus "Pendiente"
+            # Puedes añadir más filtros si Almacén solo ve ciertos tipos, proveedores, etc.
+            # "Proveedor": "Torni" # Ejemplo: si Almacén solo ve solicitudes Torni (no es tu caso aquí, pero como ejemplo)
+        }
+    )
+
+
+def _load_almacen_dashboard(notion_client, database_id_solicitudes_almacen, page_token, log_prefix) -> DashboardLoad:
+    """
+    Consulta Notion y arma el contexto del dashboard de Almacén para el token de página dado.
+    No usa la solicitud HTTP (ni flash ni current_user), así que también corre como recarga en segundo plano (ver dashboard_snapshot.py).
+    """
+    solicitudes = [] # Lista para almacenar las solicitudes obtenidas de Notion
+    notices = [] # Avisos para flash(), se guardan con la copia de la vista
+    pagination = None # Navegación anterior/siguiente cuando NOTION_DASHBOARD_PAGE_SIZE > 0
+
+    # Define los filtros relevantes para Almacén (ej: estatus 'Pendiente', 'En Proceso')
+    # Esto requiere conocimiento de las propiedades de estatus en tu DB de materiales en Notion.
+    # Asume que tienes una propiedad "Estatus" de tipo "Select" en tu base de datos de materiales.
+    # Este es un ejemplo. Ajusta el nombre de la propiedad y los valores según tu base de datos.
+    filters_for_almacen = _almacen_filters(notion_client, database_id_solicitudes_almacen)
+    logger.info(f"{log_prefix} Almacen: Filters built: {filters_for_almacen}")
+
+    # Obtener las páginas (solicitudes) de Notion aplicando los filtros
+    # Cada página se convierte a un registro compacto (ver notion/records.py); la página completa no se conserva
+    extract_solicitud = get_solicitud_extractor(notion_client, database_id_solicitudes_almacen)
+    page_size = current_app.config.get('NOTION_DASHBOARD_PAGE_SIZE') or 0
+    if page_size:
+        # Paginación en el servidor: solo se consulta la ventana actual (cursor en el parámetro 'page', ver pagination.py)
+        trail = decode_page_token(page_token)
+        pages, next_cursor = get_pages_slice_util(notion_client, database_id_solicitudes_almacen, filters_for_almacen, page_size, current_cursor(trail), properties=PROJECTION_SOLICITUDES_DASHBOARD)
+        solicitudes = [extract_solicitud(page) for page in pages]
+        pagination = build_pagination(trail, next_cursor, page_size, len(solicitudes))
+    else:
+        # iter_pages las entrega por cursor y deja de pedir cursores al llegar a NOTION_DASHBOARD_MAX_PAGES
+        max_pages = current_app.config.get('NOTION_DASHBOARD_MAX_PAGES') or None
+        solicitudes = [extract_solicitud(page) for page in iter_pages(notion_client, database_id_solicitudes_almacen, filters_for_almacen, max_pages=max_pages, properties=PROJECTION_SOLICITUDES_DASHBOARD)]
+        if max_pages and len(solicitudes) >= max_pages:
+            notices.append((f"Se muestran solo las primeras {max_pages} solicitudes. Ajusta los filtros para acotar la búsqueda.", "warning"))
+    logger.info(f"{log_prefix} Almacen: Obtenidas {len(solicitudes)} solicitudes para Almacén con filtros.")
+
+    # Solo se guarda como copia si la consulta no falló y el breaker no se abrió a mitad de la carga
+    return DashboardLoad(dict(solicitudes=solicitudes, pagination=pagination), ok=not notion_query_failed() and not notion_circuit_open(), notices=notices)
+
+
 @almacen_bp.route('/') # Ruta para la página principal del dashboard de Almacén
 @login_required
 @role_required(['almacen', 'admin']) # Solo roles 'almacen' y 'admin' pueden acceder
@@ -29,31 +86,22 @@ def almacen_dashboard():
     # Por ahora, usaremos DATABASE_ID_MATERIALES_DB1 como ejemplo.
     database_id_solicitudes_almacen = current_app.config.get('DATABASE_ID_MATERIALES_DB1') # O la DB relevante para Almacén
 
-    solicitudes = [] # Lista para almacenar las solicitudes obtenidas de Notion
     error_msg = None # Para almacenar un mensaje de error si falla la carga de Notion
 
     # Verificar si la integración con Notion está configurada correctamente para esta DB
     if notion_client and database_id_solicitudes_almacen:
+         page_token = request.args.get('page')
+         log_prefix = f"[{current_user.username}]"
          try:
-              # Define los filtros relevantes para Almacén (ej: estatus 'Pendiente', 'En Proceso')
-              # Esto requiere conocimiento de las propiedades de estatus en tu DB de materiales en Notion.
-              # Asume que tienes una propiedad "Estatus" de tipo "Select" en tu base de datos de materiales.
-              # Este es un ejemplo. Ajusta el nombre de la propiedad y los valores según tu base de datos.
-              filters_for_almacen = build_filter_from_properties_util(
-                  notion_client, # Pasa el cliente Notion
-                  database_id_solicitudes_almacen, # Pasa el ID de la DB
-                  {
-                      "Estatus": "Pendiente" # Ejemplo: filtrar por estatus "Pendiente"
-                      # Puedes añadir más filtros si Almacén solo ve ciertos tipos, proveedores, etc.
-                      # "Proveedor": "Torni" # Ejemplo: si Almacén solo ve solicitudes Torni (no es tu caso aquí, pero como ejemplo)
-                  }
+              # Datos servidos según la política stale-while-revalidate de Almacén (ver dashboard_snapshot.py)
+              context, notices, datos_en_cache = load_dashboard(
+                  'almacen',
+                  dashboard_snapshot_key('almacen', request.args),
+                  lambda: _load_almacen_dashboard(notion_client, database_id_solicitudes_almacen, page_token, log_prefix),
               )
-              logger.info(f"[{current_user.username}] Almacen: Filters built: {filters_for_almacen}")
-
-              # Obtener las páginas (solicitudes) de Notion aplicando los filtros
-              # get_pages_with_filter_util ya usa el cliente y el ID
-              solicitudes = get_pages_with_filter_util(notion_client, database_id_solicitudes_almacen, filters_for_almacen)
-              logger.info(f"[{current_user.username}] Almacen: Obtenidas {len(solicitudes)} solicitudes para Almacén con filtros.")
+              for message, category in notices:
+                  flash(message, category)
+              return render_template('almacen/dashboard.html', **context, datos_en_cache=datos_en_cache)
 
          except Exception as e:
               error_msg = f"Error al cargar solicitudes de Notion para Almacén: {e}"
@@ -67,9 +115,31 @@ def almacen_dashboard():
          flash(error_msg, "warning")
 
 
-    # Renderiza la plantilla para la vista de Almacén, pasando la lista de solicitudes obtenidas
+    # Renderiza la plantilla para la vista de Almacén sin solicitudes
     # Asegúrate de que la plantilla existe en templates/almacen/dashboard.html
-    return render_template('almacen/dashboard.html', solicitudes=solicitudes)
+    return render_template('almacen/dashboard.html', solicitudes=[], pagination=None)
+
+# --- RUTA GET para exportar la vista de Almacén a CSV o XLSX (ver dashboard_export.py) ---
+@almacen_bp.route('/export')
+@login_required
+@role_required(['almacen', 'admin'])
+def export_almacen():
+    notion_client = current_app.notion_client
+    database_id_solicitudes_almacen = current_app.config.get('DATABASE_ID_MATERIALES_DB1')
+    if not notion_client or not database_id_solicitudes_almacen:
+        return jsonify({"error": "La integración con Notion para Almacén no está configurada correctamente (Cliente Notion o DATABASE_ID_MATERIALES_DB1)."}), 503
+
+    # Partida y Proyecto se exportan como códigos (en el dashboard de Almacén no se muestran resueltos)
+    database_id_partidas = current_app.config.get('DATABASE_ID_PARTIDAS')
+    database_id_proyectos = current_app.config.get('DATABASE_ID_PROYECTOS')
+    log_prefix = f"[{current_user.username}]"
+    filters_for_almacen = _almacen_filters(notion_client, database_id_solicitudes_almacen)
+    return export_response(
+        'almacen',
+        request.args.get('format', 'csv'),
+        lambda: iter_export_rows(notion_client, database_id_solicitudes_almacen, filters_for_almacen, database_id_partidas, database_id_proyectos, log_prefix),
+        log_prefix,
+    )
 
 # --- Puedes añadir rutas para acciones de Almacén aquí (ej: actualizar estatus por AJAX) ---
 # Esto requeriría funciones adicionales en notion_utils.py o lógica aquí.
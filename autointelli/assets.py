@@ -0,0 +1,191 @@
+# autointelli/assets.py
+# Archivos estáticos con nombre por contenido, precomprimidos y con caché de larga duración.
+# Los templates piden static/js, static/css y static/data por su nombre simple, así que el navegador los vuelve
+# a validar en cada página y, sin un proxy delante, viajan sin comprimir.
+#
+# 'flask assets-build' copia cada archivo de static/ a static/dist/ con la huella de su contenido en el nombre
+# (js/standard_request.js -> js/standard_request.<hash>.js), escribe las variantes .gz y .br (si el paquete
+# 'brotli' está instalado) de los tipos de texto y guarda el manifiesto static/dist/manifest.json.
+# Al iniciar, init_static_assets carga el manifiesto y:
+# - url_for('static', filename='js/x.js') resuelve al nombre con huella (no hay que cambiar los templates);
+# - /static/dist/<archivo> sirve la variante .br o .gz según Accept-Encoding, con Cache-Control immutable.
+# Las entradas cuyo archivo fuente cambió después del build se descartan (se sirve el original sin caché
+# larga) hasta volver a ejecutar el build. Sin manifiesto, los estáticos se sirven como siempre.
+
+import gzip
+import hashlib
+import importlib.util
+import json
+import logging
+import mimetypes
+import os
+import shutil
+from typing import Dict, Any
+
+import click
+from flask import current_app, request, send_file
+from flask.cli import with_appcontext
+from werkzeug.security import safe_join
+
+logger = logging.getLogger(__name__)
+
+DIST_DIRNAME = 'dist'
+MANIFEST_NAME = 'manifest.json'
+HASH_LENGTH = 12
+# Tipos que vale la pena comprimir (las imágenes ya vienen comprimidas)
+COMPRESSIBLE_SUFFIXES = {'.js', '.css', '.json', '.csv', '.svg', '.txt', '.html', '.map', '.ico'}
+# Archivos de static/ que no se publican con huella
+SKIPPED_NAMES = {'desktop.ini'}
+SKIPPED_SUFFIXES = {'.bin'}
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def _hashed_name(logical_path: str, content_hash: str) -> str:
+    root, suffix = os.path.splitext(logical_path)
+    return f"{root}.{content_hash}{suffix}"
+
+
+def _brotli_available() -> bool:
+    return importlib.util.find_spec('brotli') is not None
+
+
+def _iter_static_files(static_dir: str):
+    for current_dir, dirnames, filenames in os.walk(static_dir):
+        if current_dir == static_dir:
+            dirnames[:] = [name for name in dirnames if name != DIST_DIRNAME]
+        for filename in sorted(filenames):
+            if filename in SKIPPED_NAMES or os.path.splitext(filename)[1].lower() in SKIPPED_SUFFIXES:
+                continue
+            full_path = os.path.join(current_dir, filename)
+            yield os.path.relpath(full_path, static_dir).replace(os.sep, '/'), full_path
+
+
+def build_static_assets(static_dir: str, brotli_quality: int = 11) -> Dict[str, Any]:
+    """Escribe static/dist (archivos con huella, .gz y .br) y su manifiesto. Retorna el manifiesto."""
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    brotli = None
+    if _brotli_available():
+        import brotli
+    else:
+        logger.warning("El paquete 'brotli' no está instalado (pip install brotli); solo se generan variantes .gz.")
+
+    assets = {}
+    for logical_path, source_path in _iter_static_files(static_dir):
+        with open(source_path, 'rb') as source:
+            data = source.read()
+        content_hash = _content_hash(data)
+        hashed_path = _hashed_name(logical_path, content_hash)
+        target_path = os.path.join(dist_dir, *hashed_path.split('/'))
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        with open(target_path, 'wb') as target:
+            target.write(data)
+
+        encodings = []
+        if os.path.splitext(logical_path)[1].lower() in COMPRESSIBLE_SUFFIXES:
+            variants = [('br', '.br', lambda raw: brotli.compress(raw, quality=brotli_quality))] if brotli else []
+            variants.append(('gzip', '.gz', lambda raw: gzip.compress(raw, compresslevel=9, mtime=0)))
+            for encoding, suffix, compress in variants:
+                compressed = compress(data)
+                if len(compressed) < len(data): # Solo si ahorra bytes
+                    with open(target_path + suffix, 'wb') as target:
+                        target.write(compressed)
+                    encodings.append(encoding)
+        assets[logical_path] = {"path": hashed_path, "hash": content_hash, "size": len(data), "encodings": encodings}
+
+    manifest = {"version": 1, "assets": assets}
+    manifest_path = os.path.join(dist_dir, MANIFEST_NAME)
+    with open(manifest_path + '.tmp', 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(manifest_path + '.tmp', manifest_path)
+    return manifest
+
+
+def load_static_manifest(static_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Entradas del manifiesto cuyo archivo fuente sigue igual; vacío si no hay build."""
+    manifest_path = os.path.join(static_dir, DIST_DIRNAME, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, encoding='utf-8') as manifest_file:
+            assets = json.load(manifest_file).get('assets', {})
+    except (OSError, ValueError) as e:
+        logger.error(f"No se pudo leer el manifiesto de estáticos {manifest_path}: {e}")
+        return {}
+
+    current = {}
+    stale = []
+    for logical_path, entry in assets.items():
+        source_path = os.path.join(static_dir, *logical_path.split('/'))
+        try:
+            if os.path.getsize(source_path) == entry.get('size'):
+                with open(source_path, 'rb') as source:
+                    if _content_hash(source.read()) == entry.get('hash'):
+                        current[logical_path] = entry
+                        continue
+        except OSError:
+            pass
+        stale.append(logical_path)
+    if stale:
+        logger.warning(f"{len(stale)} estáticos cambiaron desde el último 'flask assets-build' y se sirven sin huella: {', '.join(stale[:5])}")
+    logger.info(f"Manifiesto de estáticos cargado: {len(current)} archivos con huella.")
+    return current
+
+
+def serve_dist_asset(filename: str):
+    """Sirve un archivo de static/dist con la variante comprimida que acepte el navegador y caché immutable."""
+    static_dir = current_app.static_folder
+    path = safe_join(os.path.join(static_dir, DIST_DIRNAME), filename)
+    if path is None or not os.path.isfile(path):
+        # Referencias relativas desde un CSS con huella (p. ej. url("../img/x.png")) apuntan al original
+        return current_app.send_static_file(filename)
+
+    max_age = current_app.config.get('STATIC_ASSETS_MAX_AGE', 31536000)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = None
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[encoding] and os.path.isfile(path + suffix):
+            response = send_file(path + suffix, mimetype=mimetype, max_age=max_age, conditional=True)
+            response.headers['Content-Encoding'] = encoding
+            break
+    if response is None:
+        response = send_file(path, mimetype=mimetype, max_age=max_age, conditional=True)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable' # El nombre cambia si cambia el contenido
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_static_assets(app) -> None:
+    """Carga el manifiesto y hace que url_for('static', ...) resuelva a los archivos con huella."""
+    app.static_assets = load_static_manifest(app.static_folder) if app.config.get('STATIC_ASSETS_ENABLED', True) else {}
+    app.add_url_rule(f'{app.static_url_path}/{DIST_DIRNAME}/<path:filename>', endpoint='static_dist', view_func=serve_dist_asset)
+
+    @app.url_defaults
+    def hashed_static_filename(endpoint: str, values: Dict[str, Any]) -> None:
+        if endpoint == 'static' and app.static_assets:
+            entry = app.static_assets.get(values.get('filename'))
+            if entry is not None:
+                values['filename'] = f"{DIST_DIRNAME}/{entry['path']}"
+
+
+@click.command('assets-build')
+@click.option('--clean', is_flag=True, help='Borra static/dist antes de escribir (quita versiones anteriores).')
+@with_appcontext
+def assets_build_command(clean):
+    """Genera static/dist: estáticos con huella en el nombre, variantes .gz/.br y manifest.json."""
+    static_dir = current_app.static_folder
+    dist_dir = os.path.join(static_dir, DIST_DIRNAME)
+    if clean and os.path.isdir(dist_dir):
+        shutil.rmtree(dist_dir)
+    manifest = build_static_assets(static_dir, current_app.config.get('STATIC_ASSETS_BROTLI_QUALITY', 11))
+    assets = manifest['assets']
+    original = sum(entry['size'] for entry in assets.values())
+    click.echo(f"{len(assets)} estáticos con huella en {dist_dir} ({original / 1024:.1f} KB).")
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        compressed = [(logical_path, entry) for logical_path, entry in assets.items() if encoding in entry['encodings']]
+        if compressed:
+            before = sum(entry['size'] for _, entry in compressed)
+            after = sum(os.path.getsize(os.path.join(dist_dir, *entry['path'].split('/')) + suffix) for _, entry in compressed)
+            click.echo(f"  {suffix}: {len(compressed)} archivos, {before / 1024:.1f} KB -> {after / 1024:.1f} KB")
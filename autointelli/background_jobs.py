@@ -0,0 +1,144 @@
+# autointelli/background_jobs.py
+# Estado persistido de los trabajos en segundo plano con progreso consultable (importación de solicitudes,
+# creación de partidas), en las tablas background_job y background_job_row.
+#
+# - El trabajo corre en hilos del proceso que recibió la solicitud, pero la consulta de estado puede llegar a otro
+#   worker de gunicorn: por eso cada cambio (estado del trabajo, estado de una fila) se guarda aquí y las consultas
+#   se responden desde la base de datos, no desde memoria.
+# - La versión del trabajo avanza con cada cambio y cada fila guarda la versión en que cambió por última vez, así
+#   que ?since=<versión> solo devuelve las filas que cambiaron desde la consulta anterior.
+# - Si el proceso muere a medio trabajo, el trabajo deja de actualizarse: pasados BACKGROUND_JOB_STALE_SECONDS sin
+#   cambios se reporta como fallido y deja de bloquear un trabajo nuevo con la misma clave.
+
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Tuple, Sequence, Any
+
+from flask import current_app, has_app_context
+from sqlalchemy import update, func
+
+from .models import db, BackgroundJob, BackgroundJobRow
+
+logger = logging.getLogger(__name__)
+
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+FINISHED_STATES = (JOB_DONE, JOB_FAILED)
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def _stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=_config('BACKGROUND_JOB_STALE_SECONDS', 900))
+
+
+def create_job(kind: str, job_id: str, state: str, rows: Sequence[Tuple[int, str, str, Dict[str, Any]]],
+               summary: Dict[str, Any], user_id: Optional[int] = None, key: Optional[str] = None) -> None:
+    """Guarda un trabajo nuevo con sus filas: (posición, estado, mensaje, datos fijos de la fila)."""
+    db.session.add(BackgroundJob(id=job_id, kind=kind, key=key, user_id=user_id, state=state, summary=json.dumps(summary)))
+    db.session.flush()
+    db.session.add_all(BackgroundJobRow(job_id=job_id, position=position, status=status, message=message, data=json.dumps(data))
+                       for position, status, message, data in rows)
+    db.session.commit()
+
+
+def save_job_rows(job_id: str, version: int, positions: Sequence[int], status: str, message: str = '',
+                  result: Optional[str] = None) -> None:
+    """Guarda el nuevo estado de las filas (en la versión dada). Un error se registra y no interrumpe el trabajo."""
+    if not positions:
+        return
+    values = {"status": status, "message": message, "version": version}
+    if result is not None:
+        values["result"] = result
+    try:
+        db.session.execute(update(BackgroundJobRow)
+                           .where(BackgroundJobRow.job_id == job_id, BackgroundJobRow.position.in_(list(positions)))
+                           .values(**values))
+        db.session.execute(update(BackgroundJob).where(BackgroundJob.id == job_id)
+                           .values(version=version, updated_at=datetime.utcnow()))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Trabajo {job_id}: no se pudo guardar el estado de {len(positions)} filas: {e}", exc_info=True)
+
+
+def save_job_state(job_id: str, version: int, state: str, error: Optional[str] = None,
+                   summary: Optional[Dict[str, Any]] = None) -> None:
+    """Guarda el estado del trabajo (y, si se da, su resumen). Un error se registra y no interrumpe el trabajo."""
+    values = {"state": state, "error": error, "version": version, "updated_at": datetime.utcnow()}
+    if summary is not None:
+        values["summary"] = json.dumps(summary)
+    try:
+        db.session.execute(update(BackgroundJob).where(BackgroundJob.id == job_id).values(**values))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Trabajo {job_id}: no se pudo guardar el estado '{state}': {e}", exc_info=True)
+
+
+def find_active_job(kind: str, key: str) -> Optional[str]:
+    """job_id del trabajo sin terminar (y que sigue actualizándose) con esa clave, o None."""
+    job = (BackgroundJob.query
+           .filter(BackgroundJob.kind == kind, BackgroundJob.key == key, BackgroundJob.state.notin_(FINISHED_STATES),
+                   BackgroundJob.updated_at >= _stale_before())
+           .order_by(BackgroundJob.created_at.desc())
+           .first())
+    return job.id if job is not None else None
+
+
+def prune_jobs(kind: str, keep: int) -> None:
+    """Borra los trabajos terminados más antiguos de ese tipo, dejando los `keep` más recientes."""
+    try:
+        old_ids = [job_id for (job_id,) in db.session.query(BackgroundJob.id)
+                   .filter(BackgroundJob.kind == kind, BackgroundJob.state.in_(FINISHED_STATES))
+                   .order_by(BackgroundJob.created_at.desc())
+                   .offset(max(0, keep))]
+        if not old_ids:
+            return
+        BackgroundJobRow.query.filter(BackgroundJobRow.job_id.in_(old_ids)).delete(synchronize_session=False)
+        BackgroundJob.query.filter(BackgroundJob.id.in_(old_ids)).delete(synchronize_session=False)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"No se pudieron borrar los trabajos '{kind}' antiguos: {e}")
+
+
+def get_job_status(kind: str, job_id: str, row_statuses: Sequence[str], result_field: str, since: int = 0,
+                   user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Estado de un trabajo: resumen, conteo por estado de fila y las filas que cambiaron después de `since`
+    (todas si es 0). None si no existe o, con user_id, si es de otro usuario.
+    """
+    job = db.session.get(BackgroundJob, job_id)
+    if job is None or job.kind != kind or (user_id is not None and job.user_id != user_id):
+        return None
+
+    state, error = job.state, job.error
+    if state not in FINISHED_STATES and job.updated_at < _stale_before():
+        state, error = JOB_FAILED, "El trabajo se interrumpió (el proceso que lo ejecutaba ya no responde)."
+
+    counts = {status: 0 for status in row_statuses}
+    rows_query = BackgroundJobRow.query.filter(BackgroundJobRow.job_id == job_id)
+    if since:
+        rows_query = rows_query.filter(BackgroundJobRow.version > since)
+        for status, count in (db.session.query(BackgroundJobRow.status, func.count())
+                              .filter(BackgroundJobRow.job_id == job_id).group_by(BackgroundJobRow.status)):
+            counts[status] = count
+    rows: List[Dict[str, Any]] = []
+    for row in rows_query.order_by(BackgroundJobRow.position):
+        rows.append({**json.loads(row.data), "status": row.status, "message": row.message or '', result_field: row.result})
+        if not since:
+            counts[row.status] = counts.get(row.status, 0) + 1
+
+    return {
+        "job_id": job.id,
+        **json.loads(job.summary),
+        "state": state,
+        "error": error,
+        "version": job.version,
+        "counts": counts,
+        "rows": rows,
+    }
@@ -1,12 +1,21 @@
 # autointelli/compras.py
 
-from flask import Blueprint, render_template, current_app, request, jsonify, flash
+from flask import Blueprint, render_template, current_app, request, jsonify, flash, url_for
 from flask_login import login_required, current_user
 from .models import db, AuditLog
 from .decorators import role_required
 # Importar funciones para consultar/actualizar Notion
 # Importar la nueva función find_page_id_by_property_value
-from .notion.utils import get_pages_with_filter_util, update_notion_page_properties, build_filter_from_properties_util, get_page_details_by_id_util, find_page_id_by_property_value
+from .notion.utils import update_notion_page_properties, get_database_properties_util, find_page_id_by_property_value, iter_pages, get_pages_slice_util, notion_query_failed
+from .pagination import decode_page_token, current_cursor, build_pagination # Paginación por cursor del dashboard
+from .notion.relations import resolve_relation_titles # Resolución en lote de Partidas/Proyectos relacionados
+from .notion.records import get_solicitud_extractor # Registros compactos de solicitudes para el template
+from .notion.constants import PROJECTION_SOLICITUDES_DASHBOARD # Solo las propiedades que muestra el dashboard
+from .notion.catalog import get_project_catalog, get_project_catalog_etag, find_project_in_catalog # Catálogo de proyectos en caché
+from .notion.outbox import outbox_enabled, enqueue_page_update # Actualizaciones asíncronas vía bandeja de salida
+from .notion.circuit_breaker import notion_circuit_open
+from .dashboard_snapshot import DashboardLoad, dashboard_snapshot_key, load_dashboard, invalidate_dashboard # Caché stale-while-revalidate del dashboard
+from .dashboard_export import export_response, iter_export_rows # Exportación CSV/XLSX en streaming
 
 
 import logging
@@ -16,30 +25,9 @@ logger = logging.getLogger(__name__)
 
 compras_bp = Blueprint('compras', __name__, url_prefix='/compras')
 
-@compras_bp.route('/')
-@login_required
-@role_required(['compras', 'admin'])
-def compras_dashboard():
-    logger.info(f"[{current_user.username}] Solicitud GET recibida en /compras/ (Compras Dashboard)")
-
-    notion_client = current_app.notion_client
-    database_id_solicitudes_compras = current_app.config.get('DATABASE_ID_MATERIALES_DB1') # O la DB relevante para Compras
-    database_id_partidas = current_app.config.get('DATABASE_ID_PARTIDAS') # Obtener el ID de la base de datos de Partidas
-    database_id_proyectos = current_app.config.get('DATABASE_ID_PROYECTOS') # Obtener el ID de la base de datos de Proyectos
-
-
-    solicitudes = []
-    error_msg = None
-    # Usar defaultdict para agrupar solicitudes por proyecto más fácilmente
-    grouped_solicitudes = defaultdict(list)
-
-    # --- Lógica para obtener y aplicar filtros ---
+def _compras_filters(notion_client, database_id_proyectos, filter_estatus, filter_proyecto_code, log_prefix) -> list:
+    """Filtros de Notion del dashboard de Compras para 'estatus' y 'proyecto' (código); los usa también /compras/export."""
     filters_for_compras = []
-    filter_estatus = request.args.get('estatus')
-    filter_proyecto_code = request.args.get('proyecto')
-
-    logger.info(f"[{current_user.username}] Compras: Filtros recibidos - Estatus: {filter_estatus}, Proyecto: {filter_proyecto_code}")
-
 
     if filter_estatus:
         # Construir filtro para la propiedad 'Estatus' (select)
@@ -49,21 +37,25 @@ def compras_dashboard():
                 "equals": filter_estatus
             }
         })
-        logger.debug(f"[{current_user.username}] Compras: Añadido filtro por Estatus: {filter_estatus}")
+        logger.debug(f"{log_prefix} Compras: Añadido filtro por Estatus: {filter_estatus}")
 
 
     if filter_proyecto_code and database_id_proyectos:
         # Si se proporciona un código de proyecto, buscar el ID de la página del proyecto
-        logger.debug(f"[{current_user.username}] Compras: Buscando ID de proyecto para código '{filter_proyecto_code}' en DB {database_id_proyectos}")
+        logger.debug(f"{log_prefix} Compras: Buscando ID de proyecto para código '{filter_proyecto_code}' en DB {database_id_proyectos}")
         try:
-             # Usar la nueva función auxiliar para encontrar el ID de la página del proyecto por su código
-             project_page_id = find_page_id_by_property_value(
-                 notion_client,
-                 database_id_proyectos,
-                 "ID del proyecto", # Nombre de la propiedad en la base de datos de Proyectos
-                 filter_proyecto_code,
-                 ['rich_text', 'title'] # Tipos de propiedad a buscar
-             )
+             # Primero en el catálogo de proyectos en caché (sin llamada a Notion); si no está, búsqueda en vivo
+             catalog_project = find_project_in_catalog(filter_proyecto_code)
+             if catalog_project:
+                 project_page_id = catalog_project['id']
+             else:
+                 project_page_id = find_page_id_by_property_value(
+                     notion_client,
+                     database_id_proyectos,
+                     "ID del proyecto", # Nombre de la propiedad en la base de datos de Proyectos
+                     filter_proyecto_code,
+                     ['rich_text', 'title'] # Tipos de propiedad a buscar
+                 )
 
              if project_page_id:
                  # Si se encuentra el ID de la página del proyecto, construir filtro para la propiedad 'Proyecto' (relation)
@@ -73,171 +65,211 @@ def compras_dashboard():
                          "contains": project_page_id
                      }
                  })
-                 logger.debug(f"[{current_user.username}] Compras: Añadido filtro por Proyecto con ID: {project_page_id}")
+                 logger.debug(f"{log_prefix} Compras: Añadido filtro por Proyecto con ID: {project_page_id}")
              else:
-                 logger.warning(f"[{current_user.username}] Compras: No se encontró ID de proyecto para el código '{filter_proyecto_code}'. No se aplicará el filtro de proyecto.")
+                 logger.warning(f"{log_prefix} Compras: No se encontró ID de proyecto para el código '{filter_proyecto_code}'. No se aplicará el filtro de proyecto.")
 
         except Exception as e:
-             logger.error(f"[{current_user.username}] Compras: Error al buscar ID de proyecto para código '{filter_proyecto_code}': {e}", exc_info=True)
-             # Opcional: Podrías añadir un error_msg aquí si quieres notificar al usuario que el filtro de proyecto falló.
+             logger.error(f"{log_prefix} Compras: Error al buscar ID de proyecto para código '{filter_proyecto_code}': {e}", exc_info=True)
              pass # Continuar sin el filtro de proyecto si la búsqueda falla
 
+    return filters_for_compras
+
+
+def _load_compras_dashboard(notion_client, database_id_solicitudes_compras, database_id_partidas, database_id_proyectos, filter_estatus, filter_proyecto_code, page_token, log_prefix) -> DashboardLoad:
+    """
+    Consulta Notion y arma el contexto del dashboard de Compras para los filtros y el token de página dados.
+    No usa la solicitud HTTP (ni flash ni current_user), así que también corre como recarga en segundo plano (ver dashboard_snapshot.py).
+    """
+    solicitudes = []
+    notices = [] # Avisos para flash(), se guardan con la copia de la vista
+    pagination = None # Navegación anterior/siguiente cuando NOTION_DASHBOARD_PAGE_SIZE > 0
+    # Usar defaultdict para agrupar solicitudes por proyecto más fácilmente
+    grouped_solicitudes = defaultdict(list)
+
+    # --- Lógica para obtener y aplicar filtros (compartida con la exportación) ---
+    filters_for_compras = _compras_filters(notion_client, database_id_proyectos, filter_estatus, filter_proyecto_code, log_prefix)
 
-    logger.info(f"[{current_user.username}] Compras: Filters being applied to Notion query: {filters_for_compras if filters_for_compras else 'Ninguno'}")
+    logger.info(f"{log_prefix} Compras: Filters being applied to Notion query: {filters_for_compras if filters_for_compras else 'Ninguno'}")
     # --- Fin de la lógica para obtener y aplicar filtros ---
 
+    # Cada página de Notion se convierte a un registro compacto (ver notion/records.py); las páginas completas no se conservan.
+    extract_solicitud = get_solicitud_extractor(notion_client, database_id_solicitudes_compras)
+    page_size = current_app.config.get('NOTION_DASHBOARD_PAGE_SIZE') or 0
+    if page_size:
+        # Paginación en el servidor: solo se consulta la ventana actual (cursor en el parámetro 'page', ver pagination.py)
+        trail = decode_page_token(page_token)
+        pages, next_cursor = get_pages_slice_util(notion_client, database_id_solicitudes_compras, filters_for_compras, page_size, current_cursor(trail), properties=PROJECTION_SOLICITUDES_DASHBOARD)
+        solicitudes = [extract_solicitud(page) for page in pages]
+        pagination = build_pagination(trail, next_cursor, page_size, len(solicitudes))
+    else:
+        # Sin paginación: leer todas las solicitudes por cursor (iter_pages), acotadas por NOTION_DASHBOARD_MAX_PAGES
+        max_pages = current_app.config.get('NOTION_DASHBOARD_MAX_PAGES') or None
+        solicitudes = [extract_solicitud(page) for page in iter_pages(notion_client, database_id_solicitudes_compras, filters_for_compras, max_pages=max_pages, properties=PROJECTION_SOLICITUDES_DASHBOARD)]
+        if max_pages and len(solicitudes) >= max_pages:
+            notices.append((f"Se muestran solo las primeras {max_pages} solicitudes. Ajusta los filtros para acotar la búsqueda.", "warning"))
+    logger.info(f"{log_prefix} Compras: Obtenidas {len(solicitudes)} solicitudes de Notion con filtros.")
+    if not solicitudes:
+        logger.warning(f"{log_prefix} Compras: No se obtuvieron solicitudes de Notion con los filtros aplicados.")
+
+    # --- Lógica para obtener opciones de filtro (Estatus) ---
+    # Las opciones de Proyecto no van en la página: el selector las pide a /compras/proyectos.json (ETag, 304 si no cambiaron)
+    estatus_options = []
+
+    try:
+        # Obtener las opciones de 'Estatus' del esquema en caché (ver notion/schema_cache.py)
+        estatus_prop = get_database_properties_util(notion_client, database_id_solicitudes_compras).get('Estatus')
+        if estatus_prop and estatus_prop.get('type') == 'select' and estatus_prop.get('select') and estatus_prop.get('select').get('options'):
+            estatus_options = [option['name'] for option in estatus_prop['select']['options']]
+            logger.debug(f"{log_prefix} Compras: Obtenidas opciones de estatus: {estatus_options}")
+        else:
+             logger.warning(f"{log_prefix} Compras: No se pudieron obtener las opciones de estatus de la base de datos {database_id_solicitudes_compras}.")
+
+    except Exception as e:
+         logger.error(f"{log_prefix} Error al obtener opciones de estatus de la base de datos {database_id_solicitudes_compras}: {e}", exc_info=True)
+
+    # --- Fin de la lógica para obtener opciones de filtro ---
+
+    # --- Lógica para obtener detalles de las Partidas y Proyectos relacionados y agrupar ---
+    # Esta lógica se aplica AHORA a la lista de solicitudes FILTRADA.
+    # Primero se juntan todos los IDs relacionados (sin duplicados) y se resuelven en lote (ver notion/relations.py),
+    # así el número de llamadas a Notion depende de las partidas/proyectos distintos, no del número de solicitudes.
+    partida_ids = [related_id for solicitud in solicitudes for related_id in solicitud.partida_ids]
+    proyecto_ids = [solicitud.proyecto_ids[0] for solicitud in solicitudes if solicitud.proyecto_ids] # Solo el proyecto principal
+    partida_codes = resolve_relation_titles(notion_client, partida_ids, 'ID de partida', database_id_partidas)
+    proyecto_codes = resolve_relation_titles(notion_client, proyecto_ids, 'ID del proyecto', database_id_proyectos)
+    logger.debug(f"{log_prefix} Compras: Resueltas {len(partida_codes)} partidas y {len(proyecto_codes)} proyectos distintos.")
+
+    for solicitud in solicitudes:
+        # Lógica para Partidas
+        partida_labels = []
+        for related_page_id in solicitud.partida_ids:
+            if related_page_id not in partida_codes:
+                partida_labels.append('Error al cargar detalles')
+            elif partida_codes[related_page_id] is None:
+                logger.warning(f"{log_prefix} Partida relacionada con ID {related_page_id} no tiene una propiedad 'ID de partida' válida o es de un tipo inesperado.")
+                partida_labels.append('Título no disponible')
+            else:
+                partida_labels.append(partida_codes[related_page_id])
+        solicitud.partida_codes = tuple(partida_labels)
+
+
+        # --- Lógica para obtener detalles del Proyecto relacionado ---
+        if solicitud.proyecto_ids:
+             # Asumimos que solo hay UNA relación de proyecto principal para la agrupación
+             related_project_id = solicitud.proyecto_ids[0]
+             if proyecto_codes.get(related_project_id):
+                 solicitud.project_code = proyecto_codes[related_project_id] # Usar el código del proyecto como nombre de grupo
+             else:
+                 logger.warning(f"{log_prefix} Proyecto relacionado con ID {related_project_id} no tiene una propiedad 'ID del proyecto' válida o no se pudo obtener.")
+
+        # Añadir la solicitud al grupo de su proyecto ("Sin Proyecto" si no hay proyecto relacionado)
+        grouped_solicitudes[solicitud.project_code or "Sin Proyecto"].append(solicitud)
+
+
+    # --- Fin de la lógica para obtener detalles de Proyectos y agrupar ---
+
+    logger.info(f"{log_prefix} Compras: Proceso de agrupación completado. Grupos creados: {list(grouped_solicitudes.keys())}")
+    for project_name, solicitudes_list in grouped_solicitudes.items():
+        logger.info(f"{log_prefix} Compras: Grupo '{project_name}' tiene {len(solicitudes_list)} solicitudes.")
+
+    context = dict(grouped_solicitudes=grouped_solicitudes, error_msg=None, filter_estatus=filter_estatus, filter_proyecto_code=filter_proyecto_code, estatus_options=estatus_options, pagination=pagination)
+    # Solo se guarda como copia si ninguna consulta falló y el breaker no se abrió a mitad de la carga
+    return DashboardLoad(context, ok=not notion_query_failed() and not notion_circuit_open(), notices=notices)
+
+
+@compras_bp.route('/')
+@login_required
+@role_required(['compras', 'admin'])
+def compras_dashboard():
+    logger.info(f"[{current_user.username}] Solicitud GET recibida en /compras/ (Compras Dashboard)")
+
+    notion_client = current_app.notion_client
+    database_id_solicitudes_compras = current_app.config.get('DATABASE_ID_MATERIALES_DB1') # O la DB relevante para Compras
+    database_id_partidas = current_app.config.get('DATABASE_ID_PARTIDAS') # Obtener el ID de la base de datos de Partidas
+    database_id_proyectos = current_app.config.get('DATABASE_ID_PROYECTOS') # Obtener el ID de la base de datos de Proyectos
+
+    error_msg = None
+    filter_estatus = request.args.get('estatus')
+    filter_proyecto_code = request.args.get('proyecto')
+    page_token = request.args.get('page')
+
+    logger.info(f"[{current_user.username}] Compras: Filtros recibidos - Estatus: {filter_estatus}, Proyecto: {filter_proyecto_code}")
 
     if not notion_client:
         error_msg = "Cliente Notion no inicializado."
-        logger.error(f"[{current_user.username}] {error_msg}")
-        flash(error_msg, "danger")
     elif not database_id_solicitudes_compras:
          error_msg = "DATABASE_ID_MATERIALES_DB1 no está configurado."
-         logger.error(f"[{current_user.username}] {error_msg}")
-         flash(error_msg, "danger")
     elif not database_id_partidas:
          error_msg = "DATABASE_ID_PARTIDAS no está configurado."
-         logger.error(f"[{current_user.username}] {error_msg}")
-         flash(error_msg, "danger")
     elif not database_id_proyectos: # Verificar también el ID de la base de datos de Proyectos
          error_msg = "DATABASE_ID_PROYECTOS no está configurado."
-         logger.error(f"[{current_user.username}] {error_msg}")
-         flash(error_msg, "danger")
     else:
+         log_prefix = f"[{current_user.username}]"
          try:
-              # Usar get_pages_with_filter_util con los filtros construidos
-              solicitudes = get_pages_with_filter_util(notion_client, database_id_solicitudes_compras, filters_for_compras)
-              logger.info(f"[{current_user.username}] Compras: Obtenidas {len(solicitudes)} solicitudes de Notion con filtros.")
-              if not solicitudes:
-                  logger.warning(f"[{current_user.username}] Compras: No se obtuvieron solicitudes de Notion con los filtros aplicados.")
-
-              # --- Lógica para obtener opciones de filtro (Estatus y Proyectos) ---
-              estatus_options = []
-              proyectos_list = [] # Lista para almacenar proyectos con ID y código
-
-              if notion_client and database_id_solicitudes_compras:
-                   try:
-                       # Obtener metadatos de la base de datos para obtener las opciones de 'Estatus'
-                       db_metadata = notion_client.databases.retrieve(database_id=database_id_solicitudes_compras)
-                       estatus_prop = db_metadata.get('properties', {}).get('Estatus')
-                       if estatus_prop and estatus_prop.get('type') == 'select' and estatus_prop.get('select') and estatus_prop.get('select').get('options'):
-                           estatus_options = [option['name'] for option in estatus_prop['select']['options']]
-                           logger.debug(f"[{current_user.username}] Compras: Obtenidas opciones de estatus: {estatus_options}")
-                       else:
-                            logger.warning(f"[{current_user.username}] Compras: No se pudieron obtener las opciones de estatus de la base de datos {database_id_solicitudes_compras}.")
-
-                   except Exception as e:
-                        logger.error(f"[{current_user.username}] Error al obtener opciones de estatus de la base de datos {database_id_solicitudes_compras}: {e}", exc_info=True)
-
-              if notion_client and database_id_proyectos:
-                   try:
-                       # Obtener todas las páginas (proyectos) de la base de datos de Proyectos
-                       projects_pages = get_pages_with_filter_util(notion_client, database_id_proyectos) # Sin filtro para obtener todos
-                       logger.debug(f"[{current_user.username}] Compras: Obtenidas {len(projects_pages)} páginas de la base de datos de Proyectos {database_id_proyectos}.")
-
-                       # Extraer ID y código de cada proyecto
-                       for project_page in projects_pages:
-                           project_id = project_page.get('id')
-                           project_id_prop = project_page.get('properties', {}).get('ID del proyecto')
-                           if project_id and project_id_prop and (project_id_prop.get('type') == 'rich_text' or project_id_prop.get('type') == 'title'):
-                               project_code = "".join([text_part.get('text', {}).get('content', '') for text_part in project_id_prop.get(project_id_prop.get('type'), [])])
-                               if project_code: # Asegurarse de que el código no esté vacío
-                                   proyectos_list.append({'id': project_id, 'code': project_code})
-                                   logger.debug(f"[{current_user.username}] Compras: Proyecto con ID '{project_id}' y código '{project_code}' añadido a la lista.")
-                           else:
-                                logger.warning(f"[{current_user.username}] Página de proyecto con ID {project_id} no tiene una propiedad 'ID del proyecto' válida o está vacía.")
-
-                       # Opcional: Ordenar la lista de proyectos por código
-                       proyectos_list.sort(key=lambda x: x['code'])
-
-                       logger.info(f"[{current_user.username}] Compras: Lista de proyectos enviada al template: {proyectos_list}")
-
-                   except Exception as e:
-                        logger.error(f"[{current_user.username}] Error al obtener la lista de proyectos de la base de datos {database_id_proyectos}: {e}", exc_info=True)
-
-              # --- Fin de la lógica para obtener opciones de filtro ---
-
-              # --- Lógica para obtener detalles de las Partidas y Proyectos relacionados y agrupar ---
-              # Esta lógica se aplica AHORA a la lista de solicitudes FILTRADA
-              for solicitud in solicitudes:
-                  logger.debug(f"[{current_user.username}] Procesando solicitud ID: {solicitud.get('id')} para agrupación y detalles.")
-                  # Lógica para Partidas (existente)
-                  partida_details_list = []
-                  partida_prop = solicitud.get('properties', {}).get('Partida')
-                  if partida_prop and partida_prop.get('type') == 'relation' and partida_prop.get('relation'):
-                      relation_ids = [rel.get('id') for rel in partida_prop.get('relation')]
-                      logger.debug(f"[{current_user.username}] Solicitud {solicitud.get('id')}: Encontradas {len(relation_ids)} relaciones de Partida: {relation_ids}")
-                      for related_page_id in relation_ids:
-                          try:
-                              related_page = notion_client.pages.retrieve(related_page_id)
-                              partida_id_prop = related_page.get('properties', {}).get('ID de partida')
-                              if partida_id_prop and (partida_id_prop.get('type') == 'rich_text' or partida_id_prop.get('type') == 'title'):
-                                  partida_code = "".join([text_part.get('text', {}).get('content', '') for text_part in partida_id_prop.get(partida_id_prop.get('type'), [])])
-                                  partida_details_list.append({'id': related_page_id, 'title': partida_code})
-                                  logger.debug(f"[{current_user.username}] Solicitud {solicitud.get('id')}: Partida '{partida_code}' obtenida.")
-                              else:
-                                  logger.warning(f"[{current_user.username}] Partida relacionada con ID {related_page_id} no tiene una propiedad 'ID de partida' válida o es de un tipo inesperado.")
-                                  partida_details_list.append({'id': related_page_id, 'title': 'Título no disponible'})
-                          except Exception as e:
-                              logger.error(f"[{current_user.username}] Error al obtener detalles de Partida relacionada con ID {related_page_id}: {e}", exc_info=True)
-                              partida_details_list.append({'id': related_page_id, 'title': 'Error al cargar detalles'})
-                  solicitud['partida_details'] = partida_details_list
-
-
-                  # --- Lógica para obtener detalles del Proyecto relacionado ---
-                  project_name = "Sin Proyecto" # Valor por defecto si no hay proyecto relacionado
-                  project_prop = solicitud.get('properties', {}).get('Proyecto') # Acceder a la propiedad "Proyecto"
-
-                  logger.debug(f"[{current_user.username}] Solicitud {solicitud.get('id')}: Propiedad 'Proyecto': {project_prop}")
-
-                  if project_prop and project_prop.get('type') == 'relation' and project_prop.get('relation'):
-                       # Asumimos que solo hay UNA relación de proyecto principal para la agrupación
-                       related_project_id = project_prop.get('relation')[0].get('id') # Tomar el primer ID relacionado
-                       logger.debug(f"[{current_user.username}] Solicitud {solicitud.get('id')}: Encontrada relación de Proyecto con ID: {related_project_id}")
-
-                       try:
-                           # Obtener los detalles de la página de Proyecto relacionada
-                           related_project_page = notion_client.pages.retrieve(related_project_id)
-                           logger.debug(f"[{current_user.username}] Solicitud {solicitud.get('id')}: Detalles de página de Proyecto {related_project_id} obtenidos.")
-                           # Extraer la propiedad 'ID del proyecto' de la página relacionada
-                           project_id_prop = related_project_page.get('properties', {}).get('ID del proyecto') # ¡Corregido el nombre!
-
-                           logger.debug(f"[{current_user.username}] Solicitud {solicitud.get('id')}: Propiedad 'ID del proyecto' en Proyecto: {project_id_prop}")
-
-                           if project_id_prop and (project_id_prop.get('type') == 'rich_text' or project_id_prop.get('type') == 'title'):
-                               # Concatenar el texto de las partes de rich_text/title para obtener el código/nombre
-                               project_code = "".join([text_part.get('text', {}).get('content', '') for text_part in project_id_prop.get(project_id_prop.get('type'), [])])
-                               project_name = project_code # Usar el código del proyecto como nombre de grupo
-                               logger.debug(f"[{current_user.username}] Solicitud {solicitud.get('id')}: Código de Proyecto '{project_name}' extraído.")
-                           else:
-                               logger.warning(f"[{current_user.username}] Proyecto relacionado con ID {related_project_id} no tiene una propiedad 'ID del proyecto' válida o es de un tipo inesperado.")
-                               pass # Mantiene "Sin Proyecto" por defecto
-
-                       except Exception as e:
-                           logger.error(f"[{current_user.username}] Error al obtener detalles de Proyecto relacionado con ID {related_project_id}: {e}", exc_info=True)
-                           pass # Mantiene "Sin Proyecto" por defecto
-
-                  # Adjuntar el nombre del proyecto (obtenido o por defecto) a la solicitud
-                  solicitud['project_name'] = project_name
-                  # Añadir la solicitud al grupo correspondiente
-                  grouped_solicitudes[project_name].append(solicitud)
-                  logger.debug(f"[{current_user.username}] Solicitud {solicitud.get('id')} añadida al grupo '{project_name}'.")
-
-
-              # --- Fin de la lógica para obtener detalles de Proyectos y agrupar ---
-
-              logger.info(f"[{current_user.username}] Compras: Proceso de agrupación completado. Grupos creados: {list(grouped_solicitudes.keys())}")
-              for project_name, solicitudes_list in grouped_solicitudes.items():
-                  logger.info(f"[{current_user.username}] Compras: Grupo '{project_name}' tiene {len(solicitudes_list)} solicitudes.")
-
-
+              # Datos servidos según la política stale-while-revalidate de Compras (ver dashboard_snapshot.py)
+              context, notices, datos_en_cache = load_dashboard(
+                  'compras',
+                  dashboard_snapshot_key('compras', request.args),
+                  lambda: _load_compras_dashboard(notion_client, database_id_solicitudes_compras, database_id_partidas, database_id_proyectos, filter_estatus, filter_proyecto_code, page_token, log_prefix),
+              )
+              for message, category in notices:
+                  flash(message, category)
+              return render_template('compras/dashboard_compras.html', **context, datos_en_cache=datos_en_cache)
          except Exception as e:
               error_msg = f"Error al cargar solicitudes de Notion para Compras: {e}"
               logger.error(f"[{current_user.username}] {error_msg}", exc_info=True)
               flash(error_msg, "danger")
+              return render_template('compras/dashboard_compras.html', grouped_solicitudes={}, error_msg=error_msg, filter_estatus=filter_estatus, filter_proyecto_code=filter_proyecto_code, estatus_options=[], pagination=None)
 
-    # Pasar los datos agrupados al template
-    return render_template('compras/dashboard_compras.html', grouped_solicitudes=grouped_solicitudes, error_msg=error_msg, filter_estatus=filter_estatus, filter_proyecto_code=filter_proyecto_code, estatus_options=estatus_options, proyectos_list=proyectos_list) # Pasar también los filtros actuales, opciones de estatus y lista de proyectos al template
+    logger.error(f"[{current_user.username}] {error_msg}")
+    flash(error_msg, "danger")
+    return render_template('compras/dashboard_compras.html', grouped_solicitudes={}, error_msg=error_msg, filter_estatus=filter_estatus, filter_proyecto_code=filter_proyecto_code, estatus_options=[], pagination=None)
+
+
+# --- RUTA GET para exportar la vista filtrada a CSV o XLSX (ver dashboard_export.py) ---
+@compras_bp.route('/export')
+@login_required
+@role_required(['compras', 'admin'])
+def export_compras():
+    notion_client = current_app.notion_client
+    database_id_solicitudes_compras = current_app.config.get('DATABASE_ID_MATERIALES_DB1')
+    database_id_partidas = current_app.config.get('DATABASE_ID_PARTIDAS')
+    database_id_proyectos = current_app.config.get('DATABASE_ID_PROYECTOS')
+    if not notion_client or not database_id_solicitudes_compras or not database_id_partidas or not database_id_proyectos:
+        return jsonify({"error": "La integración con Notion para Compras no está configurada correctamente (Cliente Notion o IDs de bases de datos)."}), 503
+
+    log_prefix = f"[{current_user.username}]"
+    filter_estatus = request.args.get('estatus')
+    filter_proyecto_code = request.args.get('proyecto')
+    filters_for_compras = _compras_filters(notion_client, database_id_proyectos, filter_estatus, filter_proyecto_code, log_prefix)
+    logger.info(f"{log_prefix} Compras: Exportación con filtros - Estatus: {filter_estatus}, Proyecto: {filter_proyecto_code}")
+    return export_response(
+        'compras',
+        request.args.get('format', 'csv'),
+        lambda: iter_export_rows(notion_client, database_id_solicitudes_compras, filters_for_compras, database_id_partidas, database_id_proyectos, log_prefix),
+        log_prefix,
+    )
+
+
+# --- RUTA GET con el catálogo de proyectos para el selector (JSON con ETag) ---
+@compras_bp.route('/proyectos.json')
+@login_required
+@role_required(['compras', 'admin'])
+def proyectos_catalog_json():
+    notion_client = current_app.notion_client
+    database_id_proyectos = current_app.config.get('DATABASE_ID_PROYECTOS')
+    if notion_client is None or not database_id_proyectos:
+        return jsonify({"error": "Cliente Notion o DATABASE_ID_PROYECTOS no configurado."}), 503
+
+    proyectos_list = get_project_catalog(notion_client, database_id_proyectos)
+    response = jsonify(proyectos_list)
+    etag = get_project_catalog_etag()
+    if etag:
+        response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True # El navegador revalida con If-None-Match y recibe 304 si no cambió
+    return response.make_conditional(request)
 
 
 # --- RUTA POST para actualizar el estatus de una solicitud ---
@@ -269,12 +301,26 @@ def update_solicitud_status(page_id):
         return jsonify({"error": error_msg}), 503 # Service Unavailable
 
 
+    if outbox_enabled():
+        # La actualización se encola (se aplica en orden por página) y la auditoría registra la solicitud del usuario
+        response_data, status_code = enqueue_page_update(page_id, properties_to_update, user_id=current_user.id)
+        try:
+            details_log = f'Solicitud ID Notion: {page_id}, Propiedades (en cola {response_data["request_key"]}): {properties_to_update}'
+            db.session.add(AuditLog(user_id=current_user.id, action='Actualizar solicitud', details=details_log[:500]))
+            db.session.commit()
+        except Exception as audit_e:
+            db.session.rollback()
+            logger.error(f"[{current_user.username}] ERROR al crear registro de auditoría para actualización de solicitud: {audit_e}", exc_info=True)
+        response_data['status_url'] = url_for('solicitudes.request_status', request_key=response_data['request_key'])
+        return jsonify(response_data), status_code
+
     try:
         # Llamar a la nueva función para actualizar propiedades generales
         # Le pasamos el diccionario properties_to_update directamente
         status_code, response_data = update_notion_page_properties(notion_client, page_id, properties_to_update)
 
         if 200 <= status_code < 300:
+            invalidate_dashboard(reason=f"solicitud {page_id} actualizada")
             # Registrar auditoría si la actualización fue exitosa
             from .models import db, AuditLog
             try:
@@ -0,0 +1,219 @@
+# autointelli/dashboard_export.py
+# Exportación en streaming de los dashboards de Compras y Almacén (/compras/export y /almacen/export, ?format=csv|xlsx)
+# con los mismos filtros que la vista. Las filas salen conforme llega cada cursor de Notion (iter_pages; o del espejo
+# local según NOTION_MIRROR_MODE) y solo se retiene un bloque de EXPORT_CHUNK_ROWS registros para resolver en lote los
+# códigos de Partida/Proyecto, así que la memoria no crece con el número de filas.
+# - CSV: se escribe en el hilo de la solicitud (UTF-8 con BOM para que Excel respete los acentos).
+# - XLSX: lo escribe un proceso aparte (xlsx_stream.run_xlsx_worker, contexto 'spawn'): un hilo le envía las filas por
+#   una conexión y la respuesta devuelve los bytes que el proceso va generando. Hay DASHBOARD_EXPORT_XLSX_PROCESSES
+#   procesos a la vez como máximo; si están ocupados se responde 503.
+# Si Notion falla a mitad de la consulta, el archivo termina con una fila que indica que la exportación está incompleta.
+
+import csv
+import io
+import logging
+import multiprocessing
+import threading
+from datetime import datetime
+from typing import Optional, Dict, List, Callable, Iterator, Any
+
+from flask import current_app, has_app_context, jsonify, Response, stream_with_context
+
+from .notion.utils import iter_pages, notion_query_failed
+from .notion.records import get_solicitud_extractor, SolicitudRecord
+from .notion.relations import resolve_relation_titles
+from .notion.constants import PROJECTION_SOLICITUDES_DASHBOARD
+from .xlsx_stream import run_xlsx_worker
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+# Registros que se acumulan para resolver sus relaciones en lote (una página de resultados de Notion)
+EXPORT_CHUNK_ROWS = 100
+# Filas por mensaje hacia el proceso XLSX
+_XLSX_BATCH_ROWS = 200
+_CSV_CHUNK_SIZE = 64 * 1024
+
+# (encabezado, valor de la celda a partir del registro)
+EXPORT_COLUMNS = (
+    ("Folio", lambda record: record.folio),
+    ("Fecha de solicitud", lambda record: record.fecha_solicitud_dia),
+    ("Solicitante", lambda record: record.solicitante),
+    ("Departamento", lambda record: record.departamento),
+    ("Proveedor", lambda record: record.proveedor),
+    ("Material", lambda record: record.material),
+    ("Descripción", lambda record: record.descripcion),
+    ("Cantidad", lambda record: record.cantidad),
+    ("Unidad", lambda record: record.unidad),
+    ("Partida", lambda record: ", ".join(record.partida_codes)),
+    ("Proyecto", lambda record: record.project_code),
+    ("Urgente", lambda record: "Sí" if record.urgente else "No"),
+    ("Estatus", lambda record: record.estatus),
+    ("Notion", lambda record: record.url),
+)
+EXPORT_HEADER = [title for title, _ in EXPORT_COLUMNS]
+
+_xlsx_slots: Optional[threading.BoundedSemaphore] = None
+_xlsx_slots_lock = threading.Lock()
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def _notice_row(message: str) -> List[Any]:
+    return [message] + [None] * (len(EXPORT_HEADER) - 1)
+
+
+def _export_rows(notion_client, database_id_partidas: str, database_id_proyectos: str, records: List[SolicitudRecord]) -> Iterator[List[Any]]:
+    """Resuelve en lote los códigos de Partida/Proyecto de un bloque de registros y entrega sus filas."""
+    partida_codes = resolve_relation_titles(notion_client, [related_id for record in records for related_id in record.partida_ids], 'ID de partida', database_id_partidas)
+    proyecto_codes = resolve_relation_titles(notion_client, [record.proyecto_ids[0] for record in records if record.proyecto_ids], 'ID del proyecto', database_id_proyectos)
+    for record in records:
+        record.partida_codes = tuple(partida_codes.get(related_id) or '' for related_id in record.partida_ids)
+        if record.proyecto_ids and proyecto_codes.get(record.proyecto_ids[0]):
+            record.project_code = proyecto_codes[record.proyecto_ids[0]]
+        yield [value(record) for _, value in EXPORT_COLUMNS]
+
+
+def iter_export_rows(notion_client, database_id: str, filters: List[Dict], database_id_partidas: str, database_id_proyectos: str, log_prefix: str = "") -> Iterator[List[Any]]:
+    """Filas de la exportación (sin encabezado), en bloques de EXPORT_CHUNK_ROWS conforme llegan de Notion."""
+    max_rows = _config('DASHBOARD_EXPORT_MAX_ROWS', 50000) or None
+    extract = get_solicitud_extractor(notion_client, database_id)
+    chunk: List[SolicitudRecord] = []
+    exported = 0
+    try:
+        # Se pide una página más del límite para saber si la exportación quedó truncada
+        for page in iter_pages(notion_client, database_id, filters, max_pages=max_rows + 1 if max_rows else None, properties=PROJECTION_SOLICITUDES_DASHBOARD):
+            if max_rows and exported + len(chunk) >= max_rows:
+                yield from _export_rows(notion_client, database_id_partidas, database_id_proyectos, chunk)
+                yield _notice_row(f"Exportación limitada a {max_rows} filas. Ajusta los filtros para exportar el resto.")
+                logger.warning(f"{log_prefix} Exportación de {database_id} truncada en {max_rows} filas.")
+                return
+            chunk.append(extract(page))
+            if len(chunk) >= EXPORT_CHUNK_ROWS:
+                yield from _export_rows(notion_client, database_id_partidas, database_id_proyectos, chunk)
+                exported += len(chunk)
+                chunk = []
+        yield from _export_rows(notion_client, database_id_partidas, database_id_proyectos, chunk)
+        exported += len(chunk)
+    except Exception as e:
+        # iter_pages propaga los errores a mitad de la consulta: se cierra el archivo con lo ya exportado
+        logger.error(f"{log_prefix} Exportación de {database_id} interrumpida tras {exported} filas: {e}", exc_info=True)
+        yield _notice_row(f"Exportación incompleta: error al consultar Notion después de {exported} filas.")
+        return
+    if notion_query_failed() and not exported:
+        yield _notice_row("Exportación incompleta: no se pudo consultar Notion.")
+    logger.info(f"{log_prefix} Exportación de {database_id} completada: {exported} filas.")
+
+
+def _csv_chunks(make_rows: Callable[[], Iterator[List[Any]]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff') # BOM
+    writer.writerow(EXPORT_HEADER)
+    for row in make_rows():
+        writer.writerow(['' if value is None else value for value in row])
+        if buffer.tell() >= _CSV_CHUNK_SIZE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+def _get_xlsx_slots() -> threading.BoundedSemaphore:
+    global _xlsx_slots
+    with _xlsx_slots_lock:
+        if _xlsx_slots is None:
+            _xlsx_slots = threading.BoundedSemaphore(max(1, _config('DASHBOARD_EXPORT_XLSX_PROCESSES', 2)))
+        return _xlsx_slots
+
+
+def _feed_xlsx_worker(app, make_rows: Callable[[], Iterator[List[Any]]], rows_connection, log_prefix: str) -> None:
+    """Hilo que consulta Notion y envía las filas al proceso XLSX en lotes de _XLSX_BATCH_ROWS."""
+    try:
+        with app.app_context():
+            batch = []
+            for row in make_rows():
+                batch.append(row)
+                if len(batch) >= _XLSX_BATCH_ROWS:
+                    rows_connection.send(batch)
+                    batch = []
+            rows_connection.send(batch)
+            rows_connection.send(None)
+    except (BrokenPipeError, ConnectionResetError, OSError):
+        logger.info(f"{log_prefix} Exportación XLSX cancelada antes de terminar.")
+    finally:
+        rows_connection.close()
+
+
+def _xlsx_response(make_rows: Callable[[], Iterator[List[Any]]], sheet_name: str, log_prefix: str) -> Optional[Response]:
+    slots = _get_xlsx_slots()
+    if not slots.acquire(blocking=False):
+        return None
+
+    context = multiprocessing.get_context('spawn') # Sin fork: el proceso de la app tiene hilos y conexiones abiertas
+    rows_reader, rows_writer = context.Pipe(duplex=False)
+    output_reader, output_writer = context.Pipe(duplex=False)
+    process = context.Process(target=run_xlsx_worker, args=(rows_reader, output_writer, EXPORT_HEADER, sheet_name), name="xlsx-export", daemon=True)
+    try:
+        process.start()
+    except Exception:
+        slots.release()
+        raise
+    rows_reader.close()
+    output_writer.close()
+    app = current_app._get_current_object()
+    threading.Thread(target=_feed_xlsx_worker, args=(app, make_rows, rows_writer, log_prefix), name="xlsx-export-feeder", daemon=True).start()
+
+    def _chunks() -> Iterator[bytes]:
+        while True:
+            try:
+                data = output_reader.recv_bytes()
+            except EOFError:
+                logger.error(f"{log_prefix} El proceso de exportación XLSX terminó sin completar el archivo (código {process.exitcode}).")
+                return
+            if not data:
+                return
+            yield data
+
+    released = []
+
+    def _cleanup() -> None:
+        # Se llama al cerrar la respuesta, se haya enviado completa o no (cliente desconectado)
+        if released:
+            return
+        released.append(True)
+        output_reader.close() # El proceso y el hilo que le envía filas reciben BrokenPipeError si siguen escribiendo
+        process.join(timeout=5)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+        slots.release()
+
+    response = Response(_chunks(), mimetype=XLSX_MIMETYPE)
+    response.call_on_close(_cleanup)
+    return response
+
+
+def export_response(view: str, export_format: str, make_rows: Callable[[], Iterator[List[Any]]], log_prefix: str = ""):
+    """Respuesta en streaming con el archivo de la vista. make_rows se llama al empezar a enviar (ver iter_export_rows)."""
+    export_format = (export_format or 'csv').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"Formato '{export_format}' no soportado. Usa csv o xlsx."}), 400
+
+    filename = f"{view}_{datetime.now().strftime('%Y%m%d_%H%M')}.{export_format}"
+    if export_format == 'csv':
+        response = Response(stream_with_context(_csv_chunks(make_rows)), mimetype='text/csv; charset=utf-8')
+    else:
+        response = _xlsx_response(make_rows, view.capitalize(), log_prefix)
+        if response is None:
+            logger.warning(f"{log_prefix} Exportación XLSX de {view} rechazada: todos los procesos de exportación están ocupados.")
+            return jsonify({"error": "Hay demasiadas exportaciones XLSX en curso. Intenta de nuevo en unos minutos o exporta a CSV."}), 503
+
+    logger.info(f"{log_prefix} Exportando {view} a {export_format.upper()} ({filename}).")
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no' # Que un proxy nginx no acumule la respuesta completa
+    return response
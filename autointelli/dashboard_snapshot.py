@@ -0,0 +1,257 @@
+# autointelli/dashboard_snapshot.py
+# Caché stale-while-revalidate de los datos de los dashboards (compras, almacén), en memoria del proceso.
+# Cada vista (nombre + parámetros de la URL: filtros y token de página) guarda el contexto del template de su
+# última carga correcta, con registros compactos (SolicitudRecord), hasta NOTION_DASHBOARD_SNAPSHOTS vistas (LRU).
+#
+# Configuración por blueprint (NOTION_DASHBOARD_<VISTA>_*, p. ej. NOTION_DASHBOARD_COMPRAS_TTL_SECONDS,
+# con NOTION_DASHBOARD_* como valor por defecto):
+# - TTL_SECONDS: mientras la copia tiene menos de esta edad se sirve sin consultar Notion. 0 = sin caché.
+# - MAX_STALE_SECONDS: una copia vencida pero más joven que esto se sirve de inmediato y se recarga en segundo
+#   plano (una sola recarga por vista a la vez). Más vieja, la solicitud espera la carga completa.
+# - EARLY_REFRESH_BETA: recarga anticipada probabilística (XFetch): antes de vencer, cada solicitud tiene una
+#   probabilidad creciente de lanzar la recarga en segundo plano, proporcional a lo que tardó la última carga.
+#   Así las copias no vencen todas a la vez ni varias solicitudes recargan la misma vista. 0 = desactivada.
+# Si Notion no responde (circuit breaker abierto, ver notion/circuit_breaker.py, o consulta fallida), se sirve
+# la última copia sin importar su edad, con el aviso "datos en caché".
+#
+# Tras una escritura (cambio de estatus, envío aplicado por la bandeja de salida) invalidate_dashboard descarta las
+# copias de la vista en este proceso y publica una nueva versión en la tabla dashboard_version; cada worker la relee
+# como mucho cada NOTION_DASHBOARD_VERSION_CHECK_SECONDS y deja de servir (ni como copia vencida) las copias más viejas.
+# Una recarga que empezó antes de la invalidación se guarda con la versión anterior, así que tampoco se sirve.
+
+import logging
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Dict, List, Tuple, Callable, Any
+
+from flask import current_app, has_app_context
+from sqlalchemy import select
+
+from .models import db, DashboardVersion
+from .notion.circuit_breaker import notion_circuit_open
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_VIEWS = ('compras', 'almacen')
+
+
+class DashboardLoad:
+    """Resultado de la función de carga de una vista: contexto del template, si es una carga correcta y avisos (mensaje, categoría)."""
+
+    __slots__ = ('context', 'ok', 'notices')
+
+    def __init__(self, context: Dict[str, Any], ok: bool = True, notices: Optional[List[Tuple[str, str]]] = None):
+        self.context = context
+        self.ok = ok # False si alguna consulta falló: el resultado no se guarda
+        self.notices = notices or []
+
+
+class DashboardSnapshot:
+    """Contexto del template de una vista que se cargó bien, cuándo se cargó y cuánto tardó la carga."""
+
+    __slots__ = ('context', 'notices', 'saved_at', 'saved_monotonic', 'load_seconds', 'version')
+
+    def __init__(self, load: DashboardLoad, load_seconds: float, version: int = 0):
+        self.context = load.context
+        self.notices = load.notices
+        self.saved_at = datetime.now()
+        self.saved_monotonic = time.monotonic()
+        self.load_seconds = load_seconds
+        self.version = version # Versión de la vista cuando empezó la carga
+
+    @property
+    def age_seconds(self) -> float:
+        return time.monotonic() - self.saved_monotonic
+
+    @property
+    def saved_at_label(self) -> str:
+        return self.saved_at.strftime('%d/%m/%Y %H:%M')
+
+
+_snapshots: "OrderedDict[tuple, DashboardSnapshot]" = OrderedDict()
+_refreshing = set() # Vistas con una recarga en segundo plano en curso
+_known_versions: Dict[str, int] = {} # Últimas versiones conocidas de la tabla dashboard_version
+_versions_checked_at: Optional[float] = None
+_lock = threading.Lock()
+
+
+def _view_config(view: str, name: str, default: Any) -> Any:
+    if not has_app_context():
+        return default
+    config = current_app.config
+    value = config.get(f'NOTION_DASHBOARD_{view.upper()}_{name}')
+    return value if value is not None else config.get(f'NOTION_DASHBOARD_{name}', default)
+
+
+def dashboard_snapshot_key(view: str, args) -> tuple:
+    """Clave de la vista: nombre y parámetros de la URL (request.args)."""
+    return (view, tuple(sorted(args.items(multi=True))))
+
+
+def _refresh_known_versions() -> None:
+    """Relee las versiones publicadas por otros workers, como mucho una vez por intervalo."""
+    global _versions_checked_at
+    if not has_app_context():
+        return
+    now = time.monotonic()
+    if _versions_checked_at is not None and now - _versions_checked_at < current_app.config.get('NOTION_DASHBOARD_VERSION_CHECK_SECONDS', 2):
+        return
+    _versions_checked_at = now
+    try:
+        rows = db.session.execute(select(DashboardVersion.view, DashboardVersion.version)).all()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"No se pudieron leer las versiones de los dashboards: {e}")
+        return
+    with _lock:
+        for view, version in rows:
+            _known_versions[view] = max(version, _known_versions.get(view, 0))
+
+
+def current_dashboard_version(view: str) -> int:
+    _refresh_known_versions()
+    with _lock:
+        return _known_versions.get(view, 0)
+
+
+def invalidate_dashboard(view: Optional[str] = None, reason: str = "") -> None:
+    """
+    Descarta las copias de la vista (o de todas si view es None) en este proceso y publica una nueva versión para
+    que los demás workers también dejen de servirlas. Se llama después de escribir en Notion.
+    """
+    views = DASHBOARD_VIEWS if view is None else (view,)
+    with _lock:
+        for key in [key for key in _snapshots if key[0] in views]:
+            del _snapshots[key]
+    logger.info(f"Copias del dashboard invalidadas para {view or 'todas las vistas'}{f' ({reason})' if reason else ''}.")
+
+    if not has_app_context():
+        return
+    try:
+        for name in views:
+            row = db.session.get(DashboardVersion, name)
+            if row is None:
+                row = DashboardVersion(view=name, version=0)
+                db.session.add(row)
+            row.version = (row.version or 0) + 1
+            row.updated_at = datetime.utcnow()
+            with _lock:
+                _known_versions[name] = max(row.version, _known_versions.get(name, 0))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al publicar la nueva versión del dashboard {view or 'todas las vistas'}: {e}", exc_info=True)
+
+
+def save_dashboard_snapshot(key: tuple, load: DashboardLoad, load_seconds: float = 0.0, version: int = 0) -> None:
+    max_snapshots = current_app.config.get('NOTION_DASHBOARD_SNAPSHOTS', 32) if has_app_context() else 32
+    if max_snapshots <= 0:
+        return
+    with _lock:
+        _snapshots[key] = DashboardSnapshot(load, load_seconds, version)
+        _snapshots.move_to_end(key)
+        while len(_snapshots) > max_snapshots:
+            _snapshots.popitem(last=False)
+
+
+def get_dashboard_snapshot(key: tuple) -> Optional[DashboardSnapshot]:
+    with _lock:
+        snapshot = _snapshots.get(key)
+        if snapshot is not None:
+            _snapshots.move_to_end(key)
+    return snapshot
+
+
+def _run_load(loader: Callable[[], DashboardLoad]) -> Tuple[DashboardLoad, float]:
+    started = time.monotonic()
+    load = loader()
+    return load, time.monotonic() - started
+
+
+def _refresh_in_background(key: tuple, loader: Callable[[], DashboardLoad], reason: str) -> None:
+    """Recarga la vista en un hilo con su propio contexto de aplicación; si ya hay una recarga en curso no hace nada."""
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    app = current_app._get_current_object()
+
+    def _refresh():
+        try:
+            with app.app_context():
+                version = current_dashboard_version(key[0])
+                load, load_seconds = _run_load(loader)
+                if load.ok:
+                    save_dashboard_snapshot(key, load, load_seconds, version)
+                    logger.info(f"Vista {key[0]} recargada en segundo plano ({reason}) en {load_seconds:.2f}s.")
+                else:
+                    logger.warning(f"Recarga en segundo plano de la vista {key[0]} incompleta; se conserva la copia anterior.")
+        except Exception as e:
+            logger.error(f"Error al recargar en segundo plano la vista {key[0]}: {e}", exc_info=True)
+        finally:
+            with _lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=_refresh, name=f"dashboard-refresh-{key[0]}", daemon=True).start()
+
+
+def _should_refresh_early(snapshot: DashboardSnapshot, ttl_seconds: float, beta: float) -> bool:
+    # XFetch: recargar si age - load_seconds * beta * ln(U) >= ttl, con U uniforme en (0, 1]
+    if beta <= 0:
+        return False
+    return snapshot.age_seconds - snapshot.load_seconds * beta * math.log(1.0 - random.random()) >= ttl_seconds
+
+
+def load_dashboard(view: str, key: tuple, loader: Callable[[], DashboardLoad]) -> Tuple[Dict[str, Any], List[Tuple[str, str]], Optional[str]]:
+    """
+    Contexto del template de la vista según la política stale-while-revalidate de su blueprint.
+    'loader' no debe depender de la solicitud HTTP (puede correr en segundo plano). Retorna (contexto, avisos,
+    datos_en_cache): datos_en_cache es la fecha de la copia si se sirve por falta de Notion, o None.
+    Propaga la excepción de la carga si no hay una copia que servir en su lugar.
+    """
+    ttl_seconds = _view_config(view, 'TTL_SECONDS', 60)
+    max_stale_seconds = max(ttl_seconds, _view_config(view, 'MAX_STALE_SECONDS', 600))
+    snapshot = get_dashboard_snapshot(key)
+    version = current_dashboard_version(view)
+    if snapshot is not None and snapshot.version < version:
+        # Hubo una escritura después de esta copia (quizá en otro worker): solo sirve como respaldo si Notion falla
+        fallback, snapshot = snapshot, None
+    else:
+        fallback = snapshot
+
+    if snapshot is not None:
+        if notion_circuit_open():
+            logger.warning(f"Vista {view} servida desde la copia del {snapshot.saved_at_label} (circuit breaker de Notion abierto).")
+            return snapshot.context, snapshot.notices, snapshot.saved_at_label
+        age = snapshot.age_seconds
+        if age < ttl_seconds:
+            if _should_refresh_early(snapshot, ttl_seconds, _view_config(view, 'EARLY_REFRESH_BETA', 1.0)):
+                _refresh_in_background(key, loader, f"anticipada, {age:.0f}s de {ttl_seconds}s")
+            return snapshot.context, snapshot.notices, None
+        if age < max_stale_seconds:
+            _refresh_in_background(key, loader, f"copia vencida hace {age - ttl_seconds:.0f}s")
+            return snapshot.context, snapshot.notices, None
+
+    if fallback is not None and notion_circuit_open():
+        logger.warning(f"Vista {view} servida desde la copia del {fallback.saved_at_label} (circuit breaker de Notion abierto).")
+        return fallback.context, fallback.notices, fallback.saved_at_label
+
+    try:
+        load, load_seconds = _run_load(loader)
+    except Exception:
+        if fallback is None:
+            raise
+        logger.error(f"Error al cargar la vista {view}; se sirve la copia del {fallback.saved_at_label}.", exc_info=True)
+        return fallback.context, fallback.notices, fallback.saved_at_label
+
+    if load.ok:
+        save_dashboard_snapshot(key, load, load_seconds, version)
+    elif fallback is not None:
+        # La consulta falló (resultado vacío o desde el espejo): preferir la última copia correcta
+        logger.warning(f"Vista {view} servida desde la copia del {fallback.saved_at_label} (consulta a Notion fallida).")
+        return fallback.context, fallback.notices, fallback.saved_at_label
+    return load.context, load.notices, None
@@ -0,0 +1,448 @@
+# autointelli/material_import.py
+# Importación masiva de solicitudes de material desde una hoja de cálculo (CSV o XLSX), para no volver a capturar
+# fila por fila listas de 100-300 materiales en el formulario estándar o en la tabla Torni.
+#
+# - El archivo se lee como flujo, fila por fila: el CSV con csv.reader sobre el stream de la subida y el XLSX con
+#   iterparse sobre la hoja dentro del zip (cada fila se descarta al procesarla; solo la tabla de textos compartidos
+#   queda en memoria). No se necesita openpyxl.
+# - Cada fila se valida al leerla (cantidad, ID contra el catálogo Torni compilado, campos del material estándar) y,
+#   ya en segundo plano, la partida contra el índice de partidas (find_partida_by_id, una búsqueda por código).
+# - Las filas válidas se agrupan en solicitudes: las filas Torni de la misma partida (y mismas marcas urgente/recuperado)
+#   forman una solicitud de hasta MATERIAL_IMPORT_BATCH_SIZE items; cada fila estándar es una solicitud, como en el
+#   formulario. Las solicitudes se envían con submit_request_for_material_logic desde MATERIAL_IMPORT_MAX_WORKERS
+#   hilos; las escrituras pasan por el limitador de tasa compartido, así que la importación no rebasa la tasa a Notion.
+# - El estado de cada fila (invalid, pending, sending, done, failed) se guarda en la base de datos (background_jobs.py),
+#   así que el navegador lo consulta desde cualquier worker por /solicitudes/importar/<job_id>?since=<versión> (solo
+#   las filas que cambiaron desde esa versión).
+
+import csv
+import io
+import itertools
+import logging
+import os
+import re
+import threading
+import uuid
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Tuple, Iterator, Any
+from xml.etree import ElementTree
+
+from flask import current_app, has_app_context
+
+from .background_jobs import create_job, save_job_rows, save_job_state, prune_jobs, get_job_status
+from .dashboard_snapshot import invalidate_dashboard # Compras y Almacén leen las bases donde se registra la importación
+from .notion.solicitudes import submit_request_for_material_logic
+from .notion.utils import find_partida_by_id
+from .torni_catalog import TorniCatalog, get_torni_catalog, normalize_text
+
+logger = logging.getLogger(__name__)
+
+ROW_INVALID = 'invalid'
+ROW_PENDING = 'pending'
+ROW_SENDING = 'sending'
+ROW_DONE = 'done'
+ROW_FAILED = 'failed'
+
+JOB_VALIDATING = 'validating'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+JOB_KIND = 'material_import'
+ROW_STATUSES = (ROW_INVALID, ROW_PENDING, ROW_SENDING, ROW_DONE, ROW_FAILED)
+
+# Campo de la fila -> encabezados aceptados (normalizados: minúsculas, sin acentos)
+COLUMN_ALIASES = {
+    'partida': ('partida', 'id de partida', 'id partida'),
+    'cantidad': ('cantidad', 'cantidad solicitada', 'cant', 'cant.'),
+    'torni_id': ('id torni', 'torni id', 'id', 'clave torni', 'clave'),
+    'descripcion': ('descripcion', 'descripcion torni'),
+    'tipo_material': ('tipo de material', 'tipo material', 'tipo'),
+    'nombre_material': ('material', 'nombre material', 'nombre de material', 'nombre del material'),
+    'unidad_medida': ('unidad', 'unidad de medida', 'unidad medida'),
+    'largo': ('largo',),
+    'ancho': ('ancho',),
+    'alto': ('alto',),
+    'diametro': ('diametro',),
+    'urgente': ('urgente',),
+    'recuperado': ('recuperado',),
+    'especificaciones': ('especificaciones', 'especificaciones adicionales', 'notas', 'observaciones'),
+}
+_TRUE_VALUES = {'si', 'sí', 'x', 'true', 'verdadero', 'yes', '1', 'on'}
+
+_XLSX_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_XLSX_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_XLSX_PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+_CELL_REF_RE = re.compile(r'([A-Z]+)')
+
+
+class SpreadsheetError(ValueError):
+    """El archivo no se puede importar (formato, encabezados o tamaño); el mensaje es para el usuario."""
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+# --- Lectura en flujo ---
+
+def _iter_csv_rows(stream) -> Iterator[List[str]]:
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        header_line = text.readline()
+        # Excel en español guarda los CSV con ';' como separador
+        delimiter = max(',;\t', key=header_line.count)
+        yield from csv.reader(itertools.chain([header_line], text), delimiter=delimiter)
+    except UnicodeDecodeError:
+        raise SpreadsheetError("El CSV no está en UTF-8. En Excel, guárdalo como 'CSV UTF-8 (delimitado por comas)'.")
+    finally:
+        text.detach() # No cerrar el stream de la subida junto con el wrapper
+
+
+def _xlsx_first_sheet(archive: zipfile.ZipFile) -> str:
+    """Ruta dentro del zip de la primera hoja del libro."""
+    try:
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        first_sheet = workbook.find(f'{_XLSX_MAIN_NS}sheets/{_XLSX_MAIN_NS}sheet')
+        relations = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        for relation in relations.iter(f'{_XLSX_PKG_REL_NS}Relationship'):
+            if first_sheet is not None and relation.get('Id') == first_sheet.get(f'{_XLSX_REL_NS}id'):
+                target = relation.get('Target', '').lstrip('/')
+                return target if target.startswith('xl/') else f'xl/{target}'
+    except KeyError:
+        pass
+    return 'xl/worksheets/sheet1.xml'
+
+
+def _xlsx_shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as shared_file:
+        for _, element in ElementTree.iterparse(shared_file):
+            if element.tag == f'{_XLSX_MAIN_NS}si':
+                strings.append(''.join(text.text or '' for text in element.iter(f'{_XLSX_MAIN_NS}t')))
+                element.clear()
+    return strings
+
+
+def _xlsx_column_index(cell_ref: str) -> int:
+    letters = _CELL_REF_RE.match(cell_ref).group(1)
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index - 1
+
+
+def _xlsx_cell_value(cell, shared_strings: List[str]) -> str:
+    cell_type = cell.get('t')
+    if cell_type == 'inlineStr':
+        return ''.join(text.text or '' for text in cell.iter(f'{_XLSX_MAIN_NS}t'))
+    value = cell.findtext(f'{_XLSX_MAIN_NS}v') or ''
+    if cell_type == 's' and value:
+        return shared_strings[int(value)]
+    if cell_type == 'b':
+        return 'si' if value == '1' else ''
+    return value
+
+
+def _iter_xlsx_rows(stream) -> Iterator[List[str]]:
+    try:
+        archive = zipfile.ZipFile(stream)
+    except zipfile.BadZipFile:
+        raise SpreadsheetError("El archivo no es un XLSX válido.")
+    with archive:
+        shared_strings = _xlsx_shared_strings(archive)
+        sheet_path = _xlsx_first_sheet(archive)
+        if sheet_path not in archive.namelist():
+            raise SpreadsheetError("No se encontró la primera hoja del libro.")
+        sheet_data = None
+        with archive.open(sheet_path) as sheet_file:
+            for event, element in ElementTree.iterparse(sheet_file, events=('start', 'end')):
+                if event == 'start':
+                    if element.tag == f'{_XLSX_MAIN_NS}sheetData':
+                        sheet_data = element
+                    continue
+                if element.tag != f'{_XLSX_MAIN_NS}row':
+                    continue
+                values = []
+                for cell in element.iter(f'{_XLSX_MAIN_NS}c'):
+                    cell_ref = cell.get('r')
+                    if cell_ref:
+                        values.extend([''] * (_xlsx_column_index(cell_ref) - len(values)))
+                    values.append(_xlsx_cell_value(cell, shared_strings))
+                yield values
+                if sheet_data is not None:
+                    sheet_data.remove(element) # Liberar la fila ya procesada
+
+
+def iter_spreadsheet_rows(stream, filename: str) -> Iterator[List[str]]:
+    """Filas (lista de textos) del archivo subido, leídas en flujo según su extensión (.csv o .xlsx)."""
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.csv', '.txt'):
+        return _iter_csv_rows(stream)
+    if extension == '.xlsx':
+        return _iter_xlsx_rows(stream)
+    raise SpreadsheetError("Formato no soportado: sube un archivo .csv o .xlsx (los .xls antiguos hay que guardarlos como .xlsx).")
+
+
+# --- Validación de filas ---
+
+class ImportRow:
+    """Una fila de la hoja: datos del item ya validados, a qué solicitud pertenece y su estado."""
+
+    __slots__ = ('number', 'is_torni', 'partida', 'label', 'item', 'flags', 'status', 'message', 'folio')
+
+    def __init__(self, number: int, is_torni: bool, partida: str, label: str):
+        self.number = number # Número de fila en la hoja (el encabezado cuenta)
+        self.is_torni = is_torni
+        self.partida = partida
+        self.label = label
+        self.item: Dict[str, Any] = {} # Item Torni ({id, description, quantity}) o campos del material estándar
+        self.flags: Tuple[bool, bool, str] = (False, False, '') # urgente, recuperado, especificaciones
+        self.status = ROW_PENDING
+        self.message = ''
+        self.folio: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Datos fijos de la fila que muestra la interfaz (el estado, el mensaje y el folio se guardan aparte)."""
+        return {"row": self.number, "label": self.label, "partida": self.partida}
+
+
+def _map_columns(header: List[str]) -> Dict[str, int]:
+    aliases = {alias: field for field, names in COLUMN_ALIASES.items() for alias in names}
+    columns = {}
+    for position, title in enumerate(header):
+        field = aliases.get(normalize_text(title))
+        if field and field not in columns:
+            columns[field] = position
+    missing = [name for name in ('partida', 'cantidad') if name not in columns]
+    if 'torni_id' not in columns and 'nombre_material' not in columns:
+        missing.append("ID Torni o Material")
+    if missing:
+        raise SpreadsheetError(f"Faltan columnas en el encabezado: {', '.join(missing)}. Encabezado leído: {', '.join(cell for cell in header if cell)}")
+    return columns
+
+
+def _parse_quantity(value: str) -> Optional[float]:
+    try:
+        quantity = float(value.replace(',', '.')) if value else None
+    except ValueError:
+        return None
+    return quantity if quantity is not None and quantity > 0 else None
+
+
+def _validate_row(number: int, cell, catalog: Optional[TorniCatalog]) -> ImportRow:
+    torni_id = cell('torni_id')
+    row = ImportRow(number, bool(torni_id), cell('partida'), torni_id or cell('nombre_material') or '(sin material)')
+    row.flags = (cell('urgente').lower() in _TRUE_VALUES, cell('recuperado').lower() in _TRUE_VALUES, cell('especificaciones'))
+    errors = []
+    if not row.partida:
+        errors.append("falta la partida")
+    quantity = _parse_quantity(cell('cantidad'))
+    if quantity is None:
+        errors.append(f"cantidad '{cell('cantidad')}' inválida (debe ser un número mayor que 0)")
+
+    if row.is_torni:
+        entry = catalog.get(torni_id) if catalog is not None else None
+        if catalog is None:
+            errors.append("el catálogo Torni no está disponible en el servidor")
+        elif entry is None:
+            errors.append(f"el ID Torni '{torni_id}' no existe en el catálogo")
+        else:
+            row.label = f"{entry['id']} {entry['description']}"
+            row.item = {"id": entry['id'], "description": cell('descripcion') or entry['description'], "quantity": quantity}
+    else:
+        for field, label in (('nombre_material', 'material'), ('unidad_medida', 'unidad de medida')):
+            if not cell(field):
+                errors.append(f"falta {label}")
+        row.item = {"cantidad_solicitada": quantity, **{field: cell(field) for field in
+                    ('tipo_material', 'nombre_material', 'unidad_medida', 'largo', 'ancho', 'alto', 'diametro')}}
+
+    if errors:
+        row.status = ROW_INVALID
+        message = "; ".join(errors)
+        row.message = message[0].upper() + message[1:]
+    return row
+
+
+def parse_material_rows(rows: Iterator[List[str]], catalog: Optional[TorniCatalog], max_rows: int) -> List[ImportRow]:
+    """Valida las filas conforme se leen. Lanza SpreadsheetError si falta el encabezado o hay más de max_rows filas."""
+    columns = None
+    parsed = []
+    for number, values in enumerate(rows, start=1):
+        values = [str(value).strip() for value in values]
+        if not any(values):
+            continue
+        if columns is None:
+            columns = _map_columns(values)
+            continue
+        if len(parsed) >= max_rows:
+            raise SpreadsheetError(f"El archivo tiene más de {max_rows} filas de material; divídelo en varios archivos.")
+        cell = lambda field: values[columns[field]] if field in columns and columns[field] < len(values) else ''
+        parsed.append(_validate_row(number, cell, catalog))
+    if columns is None:
+        raise SpreadsheetError("El archivo está vacío.")
+    if not parsed:
+        raise SpreadsheetError("El archivo no tiene filas de material debajo del encabezado.")
+    return parsed
+
+
+# --- Trabajos de importación ---
+
+class ImportJob:
+    """
+    Importación en curso en este proceso: filas con su estado y una versión que avanza con cada cambio. Cada cambio se
+    guarda en la base de datos (background_jobs.py), de donde se leen las consultas de estado. Requiere contexto de aplicación.
+    """
+
+    def __init__(self, user_id: Optional[int], filename: str, rows: List[ImportRow], common_data: Dict[str, Any]):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.user_id = user_id
+        self.filename = filename
+        self.rows = rows
+        self.common_data = common_data # Campos de la solicitud que vienen del formulario (solicitante, departamento, fecha)
+        self.state = JOB_VALIDATING
+        self.request_count = 0
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def summary(self) -> Dict[str, Any]:
+        return {"filename": self.filename, "total_rows": len(self.rows), "requests": self.request_count}
+
+    def save(self) -> None:
+        create_job(JOB_KIND, self.job_id, self.state, [(row.number, row.status, row.message, row.to_dict()) for row in self.rows],
+                   self.summary(), user_id=self.user_id)
+
+    def update_rows(self, rows: List[ImportRow], status: str, message: str = '', folio: Optional[str] = None) -> None:
+        if not rows:
+            return
+        with self._lock:
+            self.version += 1
+            for row in rows:
+                row.status = status
+                row.message = message
+                row.folio = folio or row.folio
+            save_job_rows(self.job_id, self.version, [row.number for row in rows], status, message, folio)
+
+    def set_state(self, state: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.version += 1
+            self.state = state
+            save_job_state(self.job_id, self.version, state, error, self.summary())
+
+    def counts(self) -> Dict[str, int]:
+        counts = {status: 0 for status in ROW_STATUSES}
+        for row in self.rows:
+            counts[row.status] += 1
+        return counts
+
+
+def get_import_status(job_id: str, since: int = 0, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Estado de una importación desde la base de datos; con since solo incluye las filas que cambiaron desde esa versión.
+    None si no existe o, con user_id, si es de otro usuario.
+    """
+    return get_job_status(JOB_KIND, job_id, ROW_STATUSES, 'folio', since=since, user_id=user_id)
+
+
+def _build_requests(job: ImportJob, rows: List[ImportRow], batch_size: int) -> List[Tuple[List[ImportRow], Dict[str, Any]]]:
+    """Agrupa las filas válidas en solicitudes: (filas, data para submit_request_for_material_logic)."""
+    groups: "OrderedDict[tuple, List[ImportRow]]" = OrderedDict()
+    for row in rows:
+        key = ('torni', row.partida, row.flags) if row.is_torni else ('estandar', row.number)
+        groups.setdefault(key, []).append(row)
+
+    requests = []
+    for key, group_rows in groups.items():
+        for start in range(0, len(group_rows), batch_size):
+            batch = group_rows[start:start + batch_size]
+            urgente, recuperado, especificaciones = batch[0].flags
+            data = {
+                **job.common_data,
+                "folio_solicitud": f"IMP-{job.job_id[:6].upper()}-{len(requests) + 1:03d}",
+                "partida": batch[0].partida,
+                "urgente": urgente,
+                "recuperado": recuperado,
+                "especificaciones_adicionales": especificaciones,
+            }
+            if key[0] == 'torni':
+                data.update({"proveedor": "Torni", "torni_items": [row.item for row in batch]})
+            else:
+                data.update({"proveedor": "Por definir", **batch[0].item})
+            requests.append((batch, data))
+    return requests
+
+
+def _validate_partidas(job: ImportJob, notion_client, database_id_partidas: str) -> None:
+    """Marca como inválidas las filas cuya partida no existe (índice de partidas, una búsqueda por código)."""
+    rows_by_code: Dict[str, List[ImportRow]] = OrderedDict()
+    for row in job.rows:
+        if row.status == ROW_PENDING:
+            rows_by_code.setdefault(row.partida, []).append(row)
+    for code, rows in rows_by_code.items():
+        if not find_partida_by_id(notion_client, database_id_partidas, code):
+            job.update_rows(rows, ROW_INVALID, f"La partida '{code}' no existe en Notion")
+
+
+def _submit_batch(app, job: ImportJob, batch: List[ImportRow], data: Dict[str, Any], database_ids: Tuple[str, str, str, str]) -> None:
+    folio = data["folio_solicitud"]
+    with app.app_context():
+        job.update_rows(batch, ROW_SENDING, folio=folio)
+        try:
+            response, status_code = submit_request_for_material_logic(app.notion_client, *database_ids, data=data, user_id=job.user_id)
+        except Exception as e:
+            logger.error(f"Importación {job.job_id}: error al enviar el folio {folio}: {e}", exc_info=True)
+            job.update_rows(batch, ROW_FAILED, f"Error inesperado: {e}")
+            return
+
+        if status_code not in (200, 207):
+            job.update_rows(batch, ROW_FAILED, response.get("error") or response.get("message") or f"Error {status_code}")
+            return
+        invalidate_dashboard(reason=f"importación {job.job_id}, folio {folio}")
+        failed_items = set(response.get("failed_items", []))
+        job.update_rows([row for index, row in enumerate(batch, start=1) if index not in failed_items], ROW_DONE, f"Registrado con el folio {folio}")
+        job.update_rows([row for index, row in enumerate(batch, start=1) if index in failed_items], ROW_FAILED, "Notion no registró este item; revisa los logs del servidor")
+
+
+def _run_import(app, job: ImportJob) -> None:
+    with app.app_context():
+        config = app.config
+        database_ids = (config.get('DATABASE_ID_MATERIALES_DB1'), config.get('DATABASE_ID_MATERIALES_DB2'),
+                        config.get('DATABASE_ID_PARTIDAS'), config.get('DATABASE_ID_PROYECTOS'))
+        try:
+            _validate_partidas(job, app.notion_client, database_ids[2])
+            pending = [row for row in job.rows if row.status == ROW_PENDING]
+            requests = _build_requests(job, pending, max(1, config.get('MATERIAL_IMPORT_BATCH_SIZE', 25)))
+            job.request_count = len(requests)
+            job.set_state(JOB_RUNNING)
+            logger.info(f"Importación {job.job_id} ({job.filename}): {len(pending)} filas válidas en {len(requests)} solicitudes.")
+            with ThreadPoolExecutor(max_workers=max(1, config.get('MATERIAL_IMPORT_MAX_WORKERS', 2)), thread_name_prefix="material-import") as executor:
+                for batch, data in requests:
+                    executor.submit(_submit_batch, app, job, batch, data, database_ids)
+            job.set_state(JOB_DONE)
+        except Exception as e:
+            logger.error(f"Importación {job.job_id} interrumpida: {e}", exc_info=True)
+            job.update_rows([row for row in job.rows if row.status in (ROW_PENDING, ROW_SENDING)], ROW_FAILED, "Importación interrumpida")
+            job.set_state(JOB_FAILED, str(e))
+        counts = job.counts()
+        logger.info(f"Importación {job.job_id} terminada: {counts[ROW_DONE]} registradas, {counts[ROW_FAILED]} fallidas, {counts[ROW_INVALID]} inválidas.")
+
+
+def start_material_import(stream, filename: str, common_data: Dict[str, Any], user_id: Optional[int] = None) -> ImportJob:
+    """
+    Lee y valida el archivo (en la solicitud HTTP, mientras el stream de la subida sigue abierto) y lanza el envío a
+    Notion en segundo plano. Lanza SpreadsheetError si el archivo no se puede importar.
+    """
+    rows = parse_material_rows(iter_spreadsheet_rows(stream, filename), get_torni_catalog(), _config('MATERIAL_IMPORT_MAX_ROWS', 500))
+    job = ImportJob(user_id, filename, rows, common_data)
+    job.save()
+    prune_jobs(JOB_KIND, _config('MATERIAL_IMPORT_JOBS', 20)) # Conserva solo las importaciones terminadas más recientes
+    invalid = sum(1 for row in rows if row.status == ROW_INVALID)
+    logger.info(f"[User ID: {user_id or 'N/A'}] Importación {job.job_id} de '{filename}': {len(rows)} filas leídas, {invalid} inválidas.")
+
+    app = current_app._get_current_object()
+    threading.Thread(target=_run_import, args=(app, job), name=f"material-import-{job.job_id}", daemon=True).start()
+    return job
@@ -52,4 +52,131 @@ class AuditLog(db.Model):
 
         action_repr = self.action[:50] + '...' if len(self.action) > 50 else self.action
 
-        return f'<AuditLog {self.id} User:{user_info} Action:"{action_repr}" @{self.timestamp.strftime("%Y-%m-%d %H:%M")}>'
\ No newline at end of file
+        return f'<AuditLog {self.id} User:{user_info} Action:"{action_repr}" @{self.timestamp.strftime("%Y-%m-%d %H:%M")}>'
+
+# --- Espejo local de bases de datos de Notion ---
+# Copia de lectura de las páginas de Notion para no re-paginar la API en cada vista.
+# get_pages_with_filter_util (notion/utils.py) lee a través de estas tablas según NOTION_MIRROR_MODE.
+
+class NotionMirrorDatabase(db.Model):
+    __tablename__ = 'notion_mirror_database'
+
+    database_id = db.Column(db.String(64), primary_key=True)
+    synced_at = db.Column(db.DateTime, nullable=True) # Última carga completa o sincronización exitosa
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False) # Usado para la expulsión LRU
+    page_count = db.Column(db.Integer, default=0, nullable=False)
+    sync_watermark = db.Column(db.String(40), nullable=True) # Mayor last_edited_time visto; base del filtro on_or_after de la sincronización incremental
+
+    pages = db.relationship('NotionMirrorPage', backref='database', lazy='dynamic', cascade='all, delete-orphan')
+
+    def __repr__(self):
+        return f'<NotionMirrorDatabase {self.database_id} ({self.page_count} páginas, sync: {self.synced_at})>'
+
+
+class NotionMirrorPage(db.Model):
+    __tablename__ = 'notion_mirror_page'
+
+    page_id = db.Column(db.String(64), primary_key=True)
+    database_id = db.Column(db.String(64), db.ForeignKey('notion_mirror_database.database_id'), nullable=False, index=True)
+    last_edited_time = db.Column(db.String(40), nullable=True) # ISO 8601 tal como lo devuelve Notion
+    payload = db.Column(db.Text, nullable=False) # Página completa de Notion serializada como JSON
+
+    def __repr__(self):
+        return f'<NotionMirrorPage {self.page_id} DB:{self.database_id}>'
+
+
+# --- Versión del esquema de Notion en caché (ver notion/schema_cache.py) ---
+# Cada invalidación incrementa la versión; los workers descartan su copia en memoria si es más vieja.
+
+class NotionSchemaVersion(db.Model):
+    __tablename__ = 'notion_schema_version'
+
+    database_id = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<NotionSchemaVersion {self.database_id} v{self.version}>'
+
+
+# --- Versión de las copias en caché de los dashboards (ver dashboard_snapshot.py) ---
+# invalidate_dashboard incrementa la versión de la vista tras una escritura; cada worker descarta sus copias más viejas.
+
+class DashboardVersion(db.Model):
+    __tablename__ = 'dashboard_version'
+
+    view = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<DashboardVersion {self.view} v{self.version}>'
+
+
+# --- Bandeja de salida (outbox) de escrituras a Notion (ver notion/outbox.py) ---
+# Los envíos guardan aquí las escrituras y responden de inmediato; un hilo en segundo plano las aplica en Notion
+# con reintentos y deja el estado de cada una para que la interfaz lo consulte.
+
+class NotionOutboxItem(db.Model):
+    __tablename__ = 'notion_outbox_item'
+    # Un mismo envío repetido (mismo folio) no vuelve a encolar sus escrituras
+    __table_args__ = (db.UniqueConstraint('request_key', 'item_index', 'target_id', name='uq_notion_outbox_item_request'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    request_key = db.Column(db.String(100), nullable=False, index=True) # Folio de la solicitud o clave de la actualización
+    operation = db.Column(db.String(20), nullable=False) # 'create' (pages.create en target_id) o 'update' (pages.update de target_id)
+    item_index = db.Column(db.Integer, default=0, nullable=False) # Posición del item dentro del envío
+    target_id = db.Column(db.String(64), nullable=False, index=True) # database_id para 'create', page_id para 'update'
+    label = db.Column(db.String(200), nullable=True) # Identificador legible del item (ID Torni, material)
+    payload = db.Column(db.Text, nullable=False) # JSON con las propiedades y los datos para resolver relaciones
+    status = db.Column(db.String(20), default='pending', nullable=False, index=True) # pending | processing | done | failed
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    locked_until = db.Column(db.DateTime, nullable=True) # Vencimiento del lease mientras status='processing'
+    last_error = db.Column(db.Text, nullable=True)
+    result_page_id = db.Column(db.String(64), nullable=True)
+    result_url = db.Column(db.String(300), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<NotionOutboxItem {self.id} {self.request_key}#{self.item_index} {self.operation} {self.status} (intentos: {self.attempts})>'
+
+
+# --- Trabajos en segundo plano con progreso consultable (ver background_jobs.py) ---
+# El proceso que ejecuta el trabajo guarda aquí cada cambio; la consulta de estado puede llegar a cualquier worker.
+
+class BackgroundJob(db.Model):
+    __tablename__ = 'background_job'
+
+    id = db.Column(db.String(32), primary_key=True) # job_id que ve el navegador
+    kind = db.Column(db.String(30), nullable=False, index=True) # 'material_import' o 'project_partidas'
+    key = db.Column(db.String(100), nullable=True, index=True) # Clave de negocio (p. ej. el proyecto de las partidas)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    state = db.Column(db.String(20), nullable=False, index=True)
+    error = db.Column(db.Text, nullable=True)
+    version = db.Column(db.Integer, default=0, nullable=False) # Avanza con cada cambio (consultas incrementales)
+    summary = db.Column(db.Text, nullable=False, default='{}') # JSON con los datos del trabajo que muestra la interfaz
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.kind} {self.state} v{self.version}>'
+
+
+class BackgroundJobRow(db.Model):
+    __tablename__ = 'background_job_row'
+    __table_args__ = (db.UniqueConstraint('job_id', 'position', name='uq_background_job_row_position'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), db.ForeignKey('background_job.id', ondelete='CASCADE'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False) # Orden de la fila dentro del trabajo
+    status = db.Column(db.String(20), nullable=False)
+    message = db.Column(db.Text, nullable=True)
+    result = db.Column(db.String(100), nullable=True) # Folio o ID de la página creada
+    version = db.Column(db.Integer, default=0, nullable=False)
+    data = db.Column(db.Text, nullable=False, default='{}') # JSON con los datos fijos de la fila (número, etiqueta...)
+
+    def __repr__(self):
+        return f'<BackgroundJobRow {self.job_id}#{self.position} {self.status}>'
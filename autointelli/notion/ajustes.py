@@ -2,26 +2,27 @@ import logging
 from datetime import datetime, timedelta
 from notion_client import Client
 from notion_client.errors import APIResponseError
-from typing import Optional, Dict, List, Tuple, Any, Union
+from typing import Optional, Dict, List, Tuple, Any, Union, Sequence
 import json
 import traceback # Para el error general
 
 # Importar funciones auxiliares y constantes
-from .utils import update_notion_page_properties, get_pages_with_filter_util, get_database_properties_util, create_filter_condition_util # build_filter_from_properties_util las usa
-from .constants import DATE_PROPERTY_NAME # Necesita la constante para el nombre de la propiedad de Fecha
-
 from .utils import (
-    update_notion_page_properties, # Si se usa aquí
-    get_pages_with_filter_util,   # Si se usa aquí
-    get_database_properties_util, # Si se usa aquí
-    create_filter_condition_util, # Si se usa aquí
-    build_filter_from_properties_util # <<< Importación CORRECTA para ajustes.py
+    update_notion_page_properties,
+    get_database_properties_util,
+    build_filter_from_properties_util, # <<< Importación CORRECTA para ajustes.py
+    iter_pages, # Consulta en streaming (las páginas llegan por cursor)
+    notion_query_failed,
 )
-
-from .constants import DATE_PROPERTY_NAME
+from .constants import DATE_PROPERTY_NAME # Necesita la constante para el nombre de la propiedad de Fecha
+from .mirror import normalize_notion_id
+from .bulk import bulk_update_pages # Actualización masiva concurrente con límite de tasa
 
 logger = logging.getLogger(__name__)
 
+# Orden estable para leer el plan del ajuste: no depende de la Fecha que se modifica
+PLAN_QUERY_SORTS = [{"timestamp": "created_time", "direction": "ascending"}]
+
 # --- Funciones Auxiliares para Ajuste de Horarios ---
 
 def update_page_util(notion_client: Client, page_id: str, new_start: datetime, new_end: Optional[datetime]) -> Tuple[int, Dict]:
@@ -38,27 +39,54 @@ def update_page_util(notion_client: Client, page_id: str, new_start: datetime, n
     return update_notion_page_properties(notion_client, page_id, properties_to_update)
 
 
+def build_date_cutoff_filters(notion_client: Client, database_id: str, start_date: datetime) -> List[Dict]:
+    """
+    Condiciones que se envían a databases.query para que solo lleguen páginas candidatas al ajuste:
+    fecha no vacía y fecha de inicio en o después del corte. Si la base no tiene DATE_PROPERTY_NAME de tipo date,
+    no se agregan (Notion rechazaría el filtro) y la revisión queda solo en Python.
+    """
+    date_prop = get_database_properties_util(notion_client, database_id).get(DATE_PROPERTY_NAME)
+    if not date_prop or date_prop.get('type') != 'date':
+        logger.warning(f"La base de datos {database_id} no tiene la propiedad de fecha '{DATE_PROPERTY_NAME}'; el corte por fecha no se envía a Notion.")
+        return []
+    # Un día antes del corte: Notion compara en UTC y la revisión final (en Python) usa la fecha local de la página,
+    # así una fecha con zona horaria cerca de la medianoche no se queda fuera de la consulta.
+    cutoff = (start_date - timedelta(days=1)).date().isoformat()
+    return [
+        {"property": DATE_PROPERTY_NAME, "date": {"is_not_empty": True}},
+        {"property": DATE_PROPERTY_NAME, "date": {"on_or_after": cutoff}},
+    ]
+
+
 def adjust_dates_with_filters_util(
     notion_client: Client,
     database_id: str, # Este es el ID de la base de datos donde se ajustan fechas (Ajustes/Proyectos)
     hours: int,
     start_date: datetime, # Fecha límite (solo se ajustan fechas iguales o posteriores)
-    filters: List[Dict[str, Any]] = None # Lista de objetos filtro API Notion
-) -> str:
-    
+    filters: List[Dict[str, Any]] = None, # Lista de objetos filtro API Notion
+    page_ids: Optional[Sequence[str]] = None # Solo estas páginas (reintento de las que no se aplicaron)
+) -> Tuple[str, List[str]]:
+    """
+    Ajusta la Fecha de las páginas que cumplen los filtros. Retorna (resumen, IDs de las páginas cuyo ajuste no se
+    aplicó); esos IDs se pueden pasar en 'page_ids' para repetir el ajuste solo en ellas sin desplazar otra vez las
+    demás. Si la consulta falla antes de completar el plan, no se escribe nada.
+    """
     if not notion_client or not database_id:
          # Este caso ya debería estar cubierto por el llamador (adjust_dates_api), pero es un buen fallback.
-         return "Error interno: Cliente de Notion no inicializado o Database ID faltante para ajuste."
+         return "Error interno: Cliente de Notion no inicializado o Database ID faltante para ajuste.", []
+
+    only_page_ids = {normalize_notion_id(page_id) for page_id in page_ids} if page_ids else None
 
     all_filters = []
     if filters:
          all_filters.extend(filters)
 
-    pages = get_pages_with_filter_util(notion_client, database_id, all_filters)
-    total_pages = len(pages)
+    total_pages = 0
     updated_pages = 0
     failed_updates = 0
     skipped_pages = 0 # Páginas encontradas por filtro, pero omitidas por lógica interna (ej. fecha anterior)
+    stream_error = None # Error de Notion a mitad de la consulta: el plan quedó incompleto y no se escribe nada
+    pending_page_ids = [] # Páginas del plan cuyo ajuste no se aplicó
 
     # Intenta construir una descripción legible de los filtros para el log y el resumen.
     filter_description = "ninguno"
@@ -87,97 +115,127 @@ def adjust_dates_with_filters_util(
              # Si falla el parsing, usar una descripción genérica
              filter_description = f"detalles no disponibles (error al parsear: {len(all_filters)} filtros)"
 
-    logger.info(f"Iniciando ajuste de fechas en {database_id}: {hours} horas a partir del {start_date.date().isoformat()}. Filtros: [{filter_description}]. Total de páginas encontradas para revisión: {total_pages}")
+    # Los filtros del formulario y el corte por fecha van juntos en la consulta (compuesto 'and'); la revisión por página
+    # de abajo se mantiene como verificación final.
+    query_filters = all_filters + build_date_cutoff_filters(notion_client, database_id, start_date)
 
+    logger.info(f"Iniciando ajuste de fechas en {database_id}: {hours} horas a partir del {start_date.date().isoformat()}. Filtros: [{filter_description}]. Condiciones enviadas a Notion: {len(query_filters)}.")
 
-    if total_pages == 0:
-        # Si no se encontraron páginas con los filtros iniciales
-        resumen = f"Operación completada: No se encontraron registros que coincidieran con los filtros. Filtros: [{filter_description}]."
-        logger.info(f"Ajuste de fechas completado con 0 páginas encontradas.")
-        return resumen
-
-    # Procesar cada página encontrada
-    for page in pages:
-        properties = page.get("properties", {})
-        page_id = page.get("id")
-
-        if not page_id:
-            logger.warning("Página sin ID encontrada en los resultados de la consulta, omitiendo.")
-            skipped_pages += 1
-            continue
-
-        # Extraer la propiedad de fecha por el nombre definido
-        date_property_data = properties.get(DATE_PROPERTY_NAME, {})
-        date_property_value = date_property_data.get("date") # Esto debería ser {"start": ..., "end": ...} o None
-
-        if date_property_value and "start" in date_property_value and date_property_value["start"] is not None:
-            try:
-                # Parsear la fecha de inicio desde el string ISO 8601 de Notion
-                start_date_notion_str = date_property_value["start"]
-                # Manejar correctamente el formato ISO, incluyendo posibles zonas horarias o 'Z'
-                start_date_notion = datetime.fromisoformat(
-                    start_date_notion_str.replace('Z', '+00:00') if start_date_notion_str and start_date_notion_str.endswith('Z') else start_date_notion_str
-                )
-                # Opcional: Convertir a UTC si todas las fechas de Notion están en UTC y quieres operar en un solo huso
-                # start_date_notion = start_date_notion.astimezone(timezone.utc) if start_date_notion.tzinfo else start_date_notion.replace(tzinfo=timezone.utc)
-                # Para simplificar y si las fechas en Notion no son sensibles a la zona horaria, puedes remover la info de zona:
-                start_date_notion_naive = start_date_notion.replace(tzinfo=None)
-
-
-                # Verificar si la fecha de inicio de la página es posterior o igual a la fecha de filtro 'start_date'
-                # Usamos la fecha pura para la comparación si start_date viene como AAAA-MM-DD
-                if start_date_notion_naive.date() >= start_date.date():
-                    # Calcular las nuevas fechas
-                    new_start_naive = start_date_notion_naive + timedelta(hours=hours)
-
-                    new_end_naive = None
-                    if date_property_value.get("end"):
-                         end_date_notion_str = date_property_value["end"]
-                         end_date_notion = datetime.fromisoformat(
-                             end_date_notion_str.replace('Z', '+00:00') if end_date_notion_str and end_date_notion_str.endswith('Z') else end_date_notion_str
-                         )
-                         end_date_notion_naive = end_date_notion.replace(tzinfo=None)
-                         new_end_naive = end_date_notion_naive + timedelta(hours=hours)
-
-                    # Preparar el payload para la actualización de fecha. Notion espera ISO 8601.
-                    # Es mejor enviar de vuelta strings ISO sin tzinfo si los originales no tenían o se limpiaron.
-                    # Opcional: Añadir '.isoformat()' con timezone si estás manejando zonas horarias explícitamente.
-                    properties_to_update = {
-                         DATE_PROPERTY_NAME: {
-                             "date": {
-                                 "start": new_start_naive.isoformat(),
-                                 "end": new_end_naive.isoformat() if new_end_naive else None
-                             }
-                          }
-                    }
-
-                    # Realizar la actualización de la página
-                    status_code, update_response = update_notion_page_properties(notion_client, page_id, properties_to_update)
-
-                    if 200 <= status_code < 300:
-                        updated_pages += 1
-                    else:
+    # Primero se lee la consulta completa y se calcula el plan; las escrituras empiezan después. Actualizar mientras se
+    # pagina cambiaría la misma Fecha que usan el filtro y el cursor (páginas omitidas o desplazadas dos veces), por eso
+    # además se pide un orden estable (created_time) que no depende de la propiedad que se modifica.
+    def _planned_updates():
+        nonlocal total_pages, skipped_pages, failed_updates, stream_error
+        try:
+            for page in iter_pages(notion_client, database_id, query_filters, sorts=PLAN_QUERY_SORTS):
+                page_id = page.get("id")
+                if only_page_ids is not None and normalize_notion_id(page_id) not in only_page_ids:
+                    continue
+                total_pages += 1
+                properties = page.get("properties", {})
+
+                if not page_id:
+                    logger.warning("Página sin ID encontrada en los resultados de la consulta, omitiendo.")
+                    skipped_pages += 1
+                    continue
+
+                # Extraer la propiedad de fecha por el nombre definido
+                date_property_data = properties.get(DATE_PROPERTY_NAME, {})
+                date_property_value = date_property_data.get("date") # Esto debería ser {"start": ..., "end": ...} o None
+
+                if date_property_value and "start" in date_property_value and date_property_value["start"] is not None:
+                    try:
+                        # Parsear la fecha de inicio desde el string ISO 8601 de Notion
+                        start_date_notion_str = date_property_value["start"]
+                        # Manejar correctamente el formato ISO, incluyendo posibles zonas horarias o 'Z'
+                        start_date_notion = datetime.fromisoformat(
+                            start_date_notion_str.replace('Z', '+00:00') if start_date_notion_str and start_date_notion_str.endswith('Z') else start_date_notion_str
+                        )
+                        # Opcional: Convertir a UTC si todas las fechas de Notion están en UTC y quieres operar en un solo huso
+                        # start_date_notion = start_date_notion.astimezone(timezone.utc) if start_date_notion.tzinfo else start_date_notion.replace(tzinfo=timezone.utc)
+                        # Para simplificar y si las fechas en Notion no son sensibles a la zona horaria, puedes remover la info de zona:
+                        start_date_notion_naive = start_date_notion.replace(tzinfo=None)
+
+
+                        # Verificar si la fecha de inicio de la página es posterior o igual a la fecha de filtro 'start_date'
+                        # Usamos la fecha pura para la comparación si start_date viene como AAAA-MM-DD
+                        if start_date_notion_naive.date() >= start_date.date():
+                            # Calcular las nuevas fechas
+                            new_start_naive = start_date_notion_naive + timedelta(hours=hours)
+
+                            new_end_naive = None
+                            if date_property_value.get("end"):
+                                 end_date_notion_str = date_property_value["end"]
+                                 end_date_notion = datetime.fromisoformat(
+                                     end_date_notion_str.replace('Z', '+00:00') if end_date_notion_str and end_date_notion_str.endswith('Z') else end_date_notion_str
+                                 )
+                                 end_date_notion_naive = end_date_notion.replace(tzinfo=None)
+                                 new_end_naive = end_date_notion_naive + timedelta(hours=hours)
+
+                            # Preparar el payload para la actualización de fecha. Notion espera ISO 8601.
+                            # Es mejor enviar de vuelta strings ISO sin tzinfo si los originales no tenían o se limpiaron.
+                            # Opcional: Añadir '.isoformat()' con timezone si estás manejando zonas horarias explícitamente.
+                            properties_to_update = {
+                                 DATE_PROPERTY_NAME: {
+                                     "date": {
+                                         "start": new_start_naive.isoformat(),
+                                         "end": new_end_naive.isoformat() if new_end_naive else None
+                                     }
+                                  }
+                            }
+
+                            # La actualización se aplica con bulk_update_pages (ver notion/bulk.py) cuando el plan está completo
+                            yield page_id, properties_to_update
+                        else:
+                            logger.info(f"Página {page_id} con fecha de inicio ({start_date_notion_naive.date().isoformat()}) anterior al filtro ({start_date.date().isoformat()}), omitiendo ajuste.")
+                            skipped_pages += 1
+
+                    except (ValueError, TypeError) as e:
+                        logger.error(f"Error al procesar o parsear fecha de página {page_id} ('{start_date_notion_str}'): {str(e)}", exc_info=True)
                         failed_updates += 1
-                        # Loguea detalles del error de Notion si están disponibles
-                        notion_error_msg = update_response.get('notion_error_details', {}).get('message', update_response.get('error', 'Desconocido'))
-                        logger.error(f"Fallo al actualizar fecha en página {page_id}: Estado={status_code}, Mensaje interno={update_response.get('error', 'N/A')}. Msg Notion: {notion_error_msg}")
+                    except Exception as e:
+                         logger.error(f"Error inesperado al procesar página {page_id} durante el ajuste: {str(e)}", exc_info=True)
+                         failed_updates += 1
                 else:
-                    logger.info(f"Página {page_id} con fecha de inicio ({start_date_notion_naive.date().isoformat()}) anterior al filtro ({start_date.date().isoformat()}), omitiendo ajuste.")
-                    skipped_pages += 1
-
-            except (ValueError, TypeError) as e:
-                logger.error(f"Error al procesar o parsear fecha de página {page_id} ('{start_date_notion_str}'): {str(e)}", exc_info=True)
-                failed_updates += 1
-            except Exception as e:
-                 logger.error(f"Error inesperado al procesar página {page_id} durante el ajuste: {str(e)}", exc_info=True)
-                 failed_updates += 1
+                     # La página no tiene la propiedad de fecha, no tiene un valor válido o 'start' es None.
+                     logger.info(f"Página {page_id} sin propiedad '{DATE_PROPERTY_NAME}' válida con fecha de inicio, omitiendo.")
+                     skipped_pages += 1
+        except Exception as e:
+            # iter_pages ya registró el error
+            stream_error = e
+
+    plan = list(_planned_updates())
+    if stream_error is None and total_pages == 0 and notion_query_failed():
+        # iter_pages registra un fallo antes de la primera página y termina sin lanzar: no es un resultado vacío
+        stream_error = "la consulta falló antes de devolver registros"
+    if stream_error is not None:
+        # Sin el plan completo no se escribe nada: el ajuste se puede repetir tal cual
+        logger.error(f"Ajuste de fechas cancelado: la consulta a Notion se interrumpió tras revisar {total_pages} registros ({stream_error}). No se modificó ningún registro.")
+        resumen = (
+            f"¡ADVERTENCIA! La consulta a Notion se interrumpió tras revisar {total_pages} registros ({stream_error}). "
+            f"No se modificó ningún registro; puedes repetir el ajuste con los mismos datos. Filtros: [{filter_description}]."
+        )
+        return resumen, list(page_ids or [])
+
+    # Realizar las actualizaciones en paralelo bajo el limitador de tasa compartido
+    for page_id, status_code, update_response in bulk_update_pages(notion_client, plan):
+        if 200 <= status_code < 300:
+            updated_pages += 1
         else:
-             # La página no tiene la propiedad de fecha, no tiene un valor válido o 'start' es None.
-             logger.info(f"Página {page_id} sin propiedad '{DATE_PROPERTY_NAME}' válida con fecha de inicio, omitiendo.")
-             skipped_pages += 1
+            failed_updates += 1
+            pending_page_ids.append(page_id)
+            # Loguea detalles del error de Notion si están disponibles
+            notion_error_msg = (update_response.get('notion_error_details') or {}).get('message', update_response.get('error', 'Desconocido'))
+            logger.error(f"Fallo al actualizar fecha en página {page_id}: Estado={status_code}, Mensaje interno={update_response.get('error', 'N/A')}. Msg Notion: {notion_error_msg}")
+
 
+    if total_pages == 0:
+        # Si no se encontraron páginas con los filtros iniciales
+        resumen = f"Operación completada: No se encontraron registros que coincidieran con los filtros. Filtros: [{filter_description}]."
+        logger.info("Ajuste de fechas completado con 0 páginas encontradas.")
+        return resumen, []
 
-    logger.info(f"Proceso de ajuste de fechas completado: {updated_pages} páginas actualizadas, {failed_updates} fallidas, {skipped_pages} omitidas")
+    logger.info(f"Proceso de ajuste de fechas completado: {total_pages} páginas revisadas, {updated_pages} páginas actualizadas, {failed_updates} fallidas, {skipped_pages} omitidas")
 
     # Construir el mensaje resumen para la respuesta al usuario/API
     resumen = (
@@ -188,13 +246,16 @@ def adjust_dates_with_filters_util(
         f"Registros con fecha anterior omitidos: {skipped_pages} (solo se ajustan fechas iguales o posteriores a {start_date.date().isoformat()})\n"
         f"Registros actualizados con éxito: {updated_pages}\n"
         f"Actualizaciones fallidas: {failed_updates}\n"
-        f"Ajuste aplicado: +{hours} horas" if hours >= 0 else f"Ajuste aplicado: {hours} horas"
+        + (f"Ajuste aplicado: +{hours} horas" if hours >= 0 else f"Ajuste aplicado: {hours} horas")
     )
 
     if failed_updates > 0:
          resumen += "\n\n¡ADVERTENCIA! Hubo actualizaciones fallidas. Consulta los logs del servidor para obtener más detalles específicos sobre los errores por página."
+    if pending_page_ids:
+         # Repetir el ajuste completo desplazaría otra vez los registros ya actualizados: solo se reintentan estos
+         resumen += f"\nRegistros sin ajustar ({len(pending_page_ids)}), reintenta solo estos IDs: {', '.join(pending_page_ids)}"
 
-    return resumen
+    return resumen, pending_page_ids
 
 # *** FUNCIÓN adjust_dates_api (llamada desde ajustes.py) ***
 def adjust_dates_api(
@@ -202,7 +263,8 @@ def adjust_dates_api(
     database_id: str, # Este es el ID de la base de datos de Ajustes/Proyectos (donde se ajustan fechas)
     hours: int,
     start_date_str: str, # Fecha límite en formato AAAA-MM-DD
-    property_filters: Dict[str, Any] = None # Diccionario de {nombre_propiedad: valor_filtro}
+    property_filters: Dict[str, Any] = None, # Diccionario de {nombre_propiedad: valor_filtro}
+    page_ids: Optional[Sequence[str]] = None # Reintento: solo estas páginas (pending_page_ids de una ejecución anterior)
 ) -> Tuple[Dict, int]: # Retorna (respuesta_dict, status_code HTTP)
     """
     Lógica principal para la ruta de ajuste de fechas.
@@ -233,7 +295,7 @@ def adjust_dates_api(
         # pero la función de ajuste principal tiene la verificación final por seguridad.
 
         # 3. Llamar a la función auxiliar que realiza la búsqueda y el ajuste de fechas
-        result_message = adjust_dates_with_filters_util(notion_client, database_id, hours, start_date_filter_dt, filters)
+        result_message, pending_page_ids = adjust_dates_with_filters_util(notion_client, database_id, hours, start_date_filter_dt, filters, page_ids=page_ids)
 
         # 4. Determinar el status code de la respuesta API basado en el mensaje resumen
         status_code_return = 200 # Default: Éxito total o parcial sin errores en la API de Notion
@@ -245,6 +307,7 @@ def adjust_dates_api(
         return {
             "success": True,
             "message": result_message,
+            "pending_page_ids": pending_page_ids,
             "status_code": status_code_return
         }, status_code_return
 
@@ -0,0 +1,54 @@
+# autointelli/notion/bulk.py
+# Actualización masiva de páginas de Notion con un pool acotado de hilos.
+# Todas las llamadas pasan por update_notion_page_properties, que a su vez usa el limitador de tasa
+# compartido y los reintentos de notion/rate_limit.py; el pool solo solapa la latencia de red.
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Iterable
+
+from flask import current_app, has_app_context
+from notion_client import Client
+
+from .utils import update_notion_page_properties
+
+logger = logging.getLogger(__name__)
+
+
+def bulk_update_pages(notion_client: Client, updates: Iterable[Tuple[str, Dict]], max_workers: int = None) -> List[Tuple[str, int, Dict]]:
+    """
+    Actualiza varias páginas en paralelo. 'updates' es un iterable de (page_id, properties_to_update);
+    si es un generador, cada actualización se envía al pool en cuanto se produce. No pasar un generador sobre una
+    consulta cuyas propiedades filtradas se están modificando (ver notion/ajustes.py): se lee el plan completo antes.
+    Retorna una lista de (page_id, status_code, response) en el mismo orden que 'updates',
+    con el mismo formato de respuesta que update_notion_page_properties.
+    """
+    if isinstance(updates, (list, tuple)) and not updates:
+        return []
+
+    app = current_app._get_current_object() if has_app_context() else None
+    if max_workers is None:
+        max_workers = app.config.get('NOTION_BULK_MAX_WORKERS', 4) if app else 4
+    if isinstance(updates, (list, tuple)):
+        max_workers = min(max_workers, len(updates))
+    max_workers = max(1, max_workers)
+
+    def _update_one(update: Tuple[str, Dict]) -> Tuple[str, int, Dict]:
+        page_id, properties_to_update = update
+        try:
+            if app is not None:
+                # Cada hilo necesita su propio contexto de aplicación (config, sesión de BD para el espejo)
+                with app.app_context():
+                    status_code, response = update_notion_page_properties(notion_client, page_id, properties_to_update)
+            else:
+                status_code, response = update_notion_page_properties(notion_client, page_id, properties_to_update)
+        except Exception as e:
+            logger.error(f"Error inesperado en la actualización masiva de la página {page_id}: {e}", exc_info=True)
+            status_code, response = 500, {"error": f"Error interno del servidor: {str(e)}"}
+        return page_id, status_code, response
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notion-bulk") as executor:
+        # executor.map consume 'updates' de inmediato y encola cada elemento conforme se produce
+        results = list(executor.map(_update_one, updates))
+    logger.info(f"Actualización masiva: {len(results)} páginas con {max_workers} hilos.")
+    return results
@@ -0,0 +1,142 @@
+# autointelli/notion/catalog.py
+# Proyección compacta en caché de la base de datos de Proyectos: [{'id', 'code', 'title'}].
+# Sustituye la descarga completa de Proyectos que compras_dashboard hacía en cada solicitud solo para
+# llenar el selector de proyectos. La consulta pide únicamente las propiedades necesarias (filter_properties).
+# Si la proyección venció (NOTION_PROJECT_CATALOG_TTL_SECONDS) se sirve la copia vigente y se refresca
+# en un hilo en segundo plano; solo la primera carga del proceso es síncrona.
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from typing import Optional, Dict, List, Any
+
+from flask import current_app, has_app_context
+from notion_client import Client
+
+from .constants import NOTION_PROP_PROYECTO_BUSQUEDA_ID
+from .relations import extract_text_property
+from .utils import _query_all_pages_live, get_database_properties_util
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_catalog: Dict[str, Any] = {
+    "projects": None,    # Lista de {'id', 'code', 'title'} ordenada por código
+    "etag": None,        # Hash del contenido, para la respuesta JSON condicional
+    "loaded_at": None,   # time.monotonic() de la última carga
+    "refreshing": False, # Evita lanzar varios refrescos simultáneos
+}
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def _project_from_page(page: Dict) -> Optional[Dict[str, str]]:
+    page_id = page.get('id')
+    code = extract_text_property(page, NOTION_PROP_PROYECTO_BUSQUEDA_ID)
+    if not page_id or not code:
+        return None
+    title = code
+    for prop_name, prop in page.get('properties', {}).items():
+        if prop.get('type') == 'title':
+            title = extract_text_property(page, prop_name) or code
+            break
+    return {'id': page_id, 'code': code, 'title': title}
+
+
+def _store(projects: List[Dict[str, str]], reloaded: bool = True) -> None:
+    projects = sorted(projects, key=lambda project: project['code'])
+    etag = hashlib.sha1(json.dumps(projects, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    with _lock:
+        _catalog["projects"] = projects
+        _catalog["etag"] = etag
+        if reloaded:
+            _catalog["loaded_at"] = time.monotonic()
+
+
+def refresh_project_catalog(notion_client: Client, database_id_proyectos: str) -> List[Dict[str, str]]:
+    """Recarga la proyección desde Notion. Propaga las excepciones de la API."""
+    # Pedir solo las propiedades de código y título (IDs de propiedad tomados del esquema en caché)
+    properties = get_database_properties_util(notion_client, database_id_proyectos)
+    property_ids = [info.get('id') for name, info in properties.items()
+                    if info.get('id') and (name == NOTION_PROP_PROYECTO_BUSQUEDA_ID or info.get('type') == 'title')]
+
+    pages = _query_all_pages_live(notion_client, database_id_proyectos, filter_properties=property_ids or None)
+    projects = [project for project in (_project_from_page(page) for page in pages) if project]
+    _store(projects)
+    logger.info(f"Catálogo de proyectos recargado: {len(projects)} proyectos.")
+    with _lock:
+        return _catalog["projects"]
+
+
+def _refresh_in_background(app, notion_client: Client, database_id_proyectos: str) -> None:
+    with _lock:
+        if _catalog["refreshing"]:
+            return
+        _catalog["refreshing"] = True
+
+    def _run():
+        try:
+            with app.app_context():
+                refresh_project_catalog(notion_client, database_id_proyectos)
+        except Exception as e:
+            logger.warning(f"No se pudo refrescar el catálogo de proyectos en segundo plano: {e}")
+        finally:
+            with _lock:
+                _catalog["refreshing"] = False
+
+    threading.Thread(target=_run, name="notion-project-catalog", daemon=True).start()
+
+
+def get_project_catalog(notion_client: Client, database_id_proyectos: str) -> List[Dict[str, str]]:
+    """
+    Devuelve la proyección de proyectos sin consultar Notion si ya hay una copia en el proceso.
+    Si venció, se refresca en segundo plano. Retorna lista vacía si la primera carga falla.
+    """
+    with _lock:
+        projects = _catalog["projects"]
+        loaded_at = _catalog["loaded_at"]
+
+    if projects is None:
+        try:
+            return refresh_project_catalog(notion_client, database_id_proyectos)
+        except Exception as e:
+            logger.error(f"Error al cargar el catálogo de proyectos: {e}", exc_info=True)
+            return []
+
+    if time.monotonic() - loaded_at >= _config('NOTION_PROJECT_CATALOG_TTL_SECONDS', 300) and has_app_context():
+        _refresh_in_background(current_app._get_current_object(), notion_client, database_id_proyectos)
+    return projects
+
+
+def get_project_catalog_etag() -> Optional[str]:
+    with _lock:
+        return _catalog["etag"]
+
+
+def find_project_in_catalog(value: str) -> Optional[Dict[str, str]]:
+    """Busca un proyecto del catálogo por código o por page_id (sin consultar Notion)."""
+    if not value:
+        return None
+    with _lock:
+        projects = _catalog["projects"] or []
+    value = value.strip()
+    for project in projects:
+        if project['code'] == value or project['id'] == value:
+            return project
+    return None
+
+
+def register_project_page(page: Optional[Dict]) -> None:
+    """Añade al catálogo un proyecto recién creado (respuesta de pages.create)."""
+    project = _project_from_page(page or {})
+    if project is None:
+        return
+    with _lock:
+        projects = _catalog["projects"]
+    if projects is None:
+        return # Aún no se cargó; la primera carga ya lo incluirá
+    _store([existing for existing in projects if existing['id'] != project['id']] + [project], reloaded=False)
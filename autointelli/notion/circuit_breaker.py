@@ -0,0 +1,150 @@
+# autointelli/notion/circuit_breaker.py
+# Circuit breaker de las llamadas a la API de Notion (lo consulta _call_with_policy en rate_limit.py).
+# Si Notion se degrada, cada hilo de gunicorn se queda esperando hasta el timeout del cliente y la aplicación
+# entera deja de responder. El breaker lleva una ventana de las últimas NOTION_CIRCUIT_WINDOW llamadas: cuenta
+# como falla un 5xx, un error de red o una respuesta más lenta que NOTION_CIRCUIT_SLOW_CALL_SECONDS.
+# - closed: todas las llamadas pasan. Si en la ventana hay al menos NOTION_CIRCUIT_MIN_CALLS llamadas y la
+#   proporción de fallas llega a NOTION_CIRCUIT_FAILURE_RATIO, se abre.
+# - open: las llamadas fallan de inmediato con NotionUnavailableError durante NOTION_CIRCUIT_OPEN_SECONDS.
+# - half_open: pasa una sola llamada de prueba; si responde bien se cierra, si falla se vuelve a abrir.
+# El estado es por proceso (cada worker de gunicorn decide con sus propias llamadas).
+# Mientras está abierto, los dashboards se sirven desde su última versión correcta (ver dashboard_snapshot.py).
+
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any
+
+from flask import current_app, has_app_context
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class NotionUnavailableError(Exception):
+    """Notion no se consulta porque el circuit breaker está abierto."""
+
+    def __init__(self, retry_in_seconds: float):
+        super().__init__(f"Notion no está disponible por ahora (circuit breaker abierto); se reintentará en {retry_in_seconds:.0f}s.")
+        self.retry_in_seconds = retry_in_seconds
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+class CircuitBreaker:
+    """Circuit breaker seguro entre hilos con ventana deslizante de resultados."""
+
+    def __init__(self, window: int, min_calls: int, failure_ratio: float, slow_call_seconds: float, open_seconds: float):
+        self.min_calls = max(1, int(min_calls))
+        self.failure_ratio = float(failure_ratio)
+        self.slow_call_seconds = float(slow_call_seconds)
+        self.open_seconds = float(open_seconds)
+        self._results = deque(maxlen=max(self.min_calls, int(window))) # True = falla
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == STATE_OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = STATE_HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def is_open(self) -> bool:
+        """True si ahora mismo se rechazaría una llamada (abierto, o semiabierto con la prueba en curso)."""
+        with self._lock:
+            state = self._current_state()
+            return state == STATE_OPEN or (state == STATE_HALF_OPEN and self._probe_in_flight)
+
+    def before_call(self) -> None:
+        """Autoriza una llamada o lanza NotionUnavailableError. En half_open solo autoriza la llamada de prueba."""
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return
+            if state == STATE_HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self.stats["probes"] += 1
+                logger.info("Circuit breaker de Notion semiabierto: se envía una llamada de prueba.")
+                return
+            self.stats["rejected"] += 1
+            retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+        raise NotionUnavailableError(retry_in)
+
+    def record(self, failed: bool, elapsed_seconds: float = 0.0) -> None:
+        """Registra el resultado de una llamada autorizada por before_call(). Las llamadas lentas cuentan como falla."""
+        slow = elapsed_seconds > self.slow_call_seconds
+        failed = failed or slow
+        with self._lock:
+            if self._state == STATE_HALF_OPEN:
+                self._probe_in_flight = False
+                if failed:
+                    self._open(f"la llamada de prueba tardó {elapsed_seconds:.1f}s" if slow else "la llamada de prueba falló")
+                else:
+                    self._state = STATE_CLOSED
+                    self._results.clear()
+                    logger.warning("Circuit breaker de Notion cerrado: Notion volvió a responder.")
+                return
+            if self._state == STATE_OPEN:
+                return # Llamada autorizada antes de abrirse; no cambia el estado
+            self._results.append(failed)
+            failures = sum(self._results)
+            if failed and len(self._results) >= self.min_calls and failures / len(self._results) >= self.failure_ratio:
+                self._open(f"{failures} de las últimas {len(self._results)} llamadas fallaron o tardaron más de {self.slow_call_seconds:.0f}s")
+
+    def _open(self, reason: str) -> None:
+        self._state = STATE_OPEN
+        self._opened_at = time.monotonic()
+        self._results.clear()
+        self.stats["opened"] += 1
+        logger.error(f"Circuit breaker de Notion abierto por {self.open_seconds:.0f}s: {reason}.")
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._current_state(),
+                "window_calls": len(self._results),
+                "window_failures": sum(self._results),
+                **self.stats,
+            }
+
+
+_breaker: Optional[CircuitBreaker] = None
+_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> Optional[CircuitBreaker]:
+    """Breaker del proceso, creado con la configuración NOTION_CIRCUIT_*; None si NOTION_CIRCUIT_ENABLED es False."""
+    global _breaker
+    if not _config('NOTION_CIRCUIT_ENABLED', True):
+        return None
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    window=_config('NOTION_CIRCUIT_WINDOW', 20),
+                    min_calls=_config('NOTION_CIRCUIT_MIN_CALLS', 5),
+                    failure_ratio=_config('NOTION_CIRCUIT_FAILURE_RATIO', 0.5),
+                    slow_call_seconds=_config('NOTION_CIRCUIT_SLOW_CALL_SECONDS', 10),
+                    open_seconds=_config('NOTION_CIRCUIT_OPEN_SECONDS', 30),
+                )
+    return _breaker
+
+
+def notion_circuit_open() -> bool:
+    """True si las llamadas a Notion se están rechazando (para servir datos en caché sin intentar la consulta)."""
+    breaker = get_circuit_breaker()
+    return breaker is not None and breaker.is_open()
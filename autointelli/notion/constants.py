@@ -15,6 +15,7 @@ NOTION_PROP_DEPARTAMENTO = "Departamento/Área" # Asumiendo Select
 NOTION_PROP_URGENTE = "Urgente" # <<< Nombre EXACTO de la propiedad Checkbox
 NOTION_PROP_RECUPERADO = "Recuperado"
 NOTION_PROP_MATERIALES_PROYECTO_RELATION = "Partida" # <<<< Nombre EXACTO de la propiedad RELATION en BD Materiales (vincula a Partidas) <<<<
+NOTION_PROP_MATERIALES_PROYECTO = "Proyecto" # Relation a Proyectos (o Rich Text con el código en bases antiguas)
 NOTION_PROP_ESPECIFICACIONES = "Especificaciones adicionales" # Asumiendo Rich Text
 
 NOTION_PROP_CANTIDAD = "Cantidad solicitada" # Asumiendo Number
@@ -39,4 +40,20 @@ NOTION_PROP_PROYECTO_BUSQUEDA_ID = "ID del proyecto" # <<<< Nombre EXACTO de la
 # El nombre de la propiedad en tu BD de PARTIDAS que usas para IDENTIFICAR UNA PARTIDA
 NOTION_PROP_PARTIDA_BUSQUEDA_ID = "ID de partida" # <<<< Nombre EXACTO de la propiedad para BUSCAR en BD Partidas <<<<
 # --- Fin Nombres de Propiedad ---
-# --- Fin Nombres de Propiedad ---
\ No newline at end of file
+# --- Fin Nombres de Propiedad ---
+
+# --- Proyecciones de propiedades por consulta (filter_properties) ---
+# Nombres de las propiedades que cada consulta pide a Notion; se traducen a IDs con el esquema en caché
+# (ver property_projection en notion/schema_cache.py). Las propiedades que no aparecen no se descargan.
+# Búsquedas que solo necesitan el ID de la página y el código
+PROJECTION_PARTIDA_LOOKUP = (NOTION_PROP_PARTIDA_BUSQUEDA_ID,)
+PROJECTION_PROYECTO_LOOKUP = (NOTION_PROP_PROYECTO_BUSQUEDA_ID,)
+# La propiedad title de cualquier base tiene siempre el ID 'title' (no requiere el esquema)
+NOTION_TITLE_PROPERTY_ID = "title"
+# Columnas de los dashboards de compras y almacén (campos de SolicitudRecord, ver notion/records.py)
+PROJECTION_SOLICITUDES_DASHBOARD = (
+    NOTION_PROP_FOLIO, NOTION_PROP_SOLICITANTE, NOTION_PROP_FECHA_SOLICITUD, NOTION_PROP_ESTATUS,
+    NOTION_PROP_PROVEEDOR, NOTION_PROP_DEPARTAMENTO, NOTION_PROP_CANTIDAD, NOTION_PROP_UNIDAD_MEDIDA,
+    NOTION_PROP_NOMBRE_MATERIAL, NOTION_PROP_TORNI_DESCRIPTION, NOTION_PROP_URGENTE,
+    NOTION_PROP_MATERIALES_PROYECTO_RELATION, NOTION_PROP_MATERIALES_PROYECTO,
+)
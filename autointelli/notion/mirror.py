@@ -0,0 +1,519 @@
+# autointelli/notion/mirror.py
+# Espejo local (SQL) de bases de datos de Notion.
+# get_pages_with_filter_util lee a través de este módulo según NOTION_MIRROR_MODE:
+#   - 'off':          nunca se usa el espejo (comportamiento original).
+#   - 'mirror_first': se responde desde el espejo si está vigente (TTL); si no, se recarga la base completa y se filtra localmente.
+#   - 'notion_first': se consulta Notion en vivo; el espejo solo se usa como respaldo si la API falla.
+# Los filtros que no se pueden evaluar localmente siempre se envían a la API en vivo.
+
+import logging
+import json
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Any, Callable, Iterable
+
+from flask import current_app, has_app_context
+from sqlalchemy import select, delete, insert
+
+from ..models import db, NotionMirrorDatabase, NotionMirrorPage
+
+logger = logging.getLogger(__name__)
+
+MIRROR_MODE_OFF = "off"
+MIRROR_MODE_MIRROR_FIRST = "mirror_first"
+MIRROR_MODE_NOTION_FIRST = "notion_first"
+MIRROR_MODES = (MIRROR_MODE_OFF, MIRROR_MODE_MIRROR_FIRST, MIRROR_MODE_NOTION_FIRST)
+
+# Solo se actualiza last_accessed_at si el último acceso registrado es más viejo que esto (evita un UPDATE por lectura).
+_ACCESS_TOUCH_INTERVAL = timedelta(seconds=30)
+
+# Operadores que el espejo sabe evaluar, por tipo de condición de filtro de la API de Notion.
+_TEXT_OPERATORS = {"equals", "does_not_equal", "contains", "does_not_contain", "starts_with", "ends_with", "is_empty", "is_not_empty"}
+_DATE_OPERATORS = {"equals", "before", "after", "on_or_before", "on_or_after", "is_empty", "is_not_empty"}
+_SUPPORTED_OPERATORS = {
+    "rich_text": _TEXT_OPERATORS,
+    "title": _TEXT_OPERATORS,
+    "url": _TEXT_OPERATORS,
+    "email": _TEXT_OPERATORS,
+    "phone_number": _TEXT_OPERATORS,
+    "select": {"equals", "does_not_equal", "is_empty", "is_not_empty"},
+    "status": {"equals", "does_not_equal", "is_empty", "is_not_empty"},
+    "multi_select": {"contains", "does_not_contain", "is_empty", "is_not_empty"},
+    "number": {"equals", "does_not_equal", "greater_than", "less_than", "greater_than_or_equal_to", "less_than_or_equal_to", "is_empty", "is_not_empty"},
+    "checkbox": {"equals", "does_not_equal"},
+    "relation": {"contains", "does_not_contain", "is_empty", "is_not_empty"},
+    "date": _DATE_OPERATORS,
+}
+_TEXT_PROPERTY_TYPES = ("rich_text", "title", "url", "email", "phone_number")
+_TIMESTAMP_FILTERS = ("created_time", "last_edited_time")
+
+
+class UnsupportedFilterError(Exception):
+    """El filtro (o la página) no se puede evaluar localmente; hay que consultar la API en vivo."""
+
+
+# --- Configuración ---
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def get_mirror_mode() -> str:
+    """Devuelve el modo del espejo configurado en NOTION_MIRROR_MODE ('off' fuera de un contexto de aplicación)."""
+    mode = _config('NOTION_MIRROR_MODE', MIRROR_MODE_OFF)
+    if mode not in MIRROR_MODES:
+        logger.warning(f"NOTION_MIRROR_MODE '{mode}' no reconocido. Se usará '{MIRROR_MODE_OFF}'.")
+        return MIRROR_MODE_OFF
+    return mode
+
+
+def normalize_notion_id(notion_id: str) -> str:
+    """Notion acepta IDs con o sin guiones; el espejo siempre los guarda sin guiones."""
+    return (notion_id or "").replace("-", "").strip()
+
+
+# --- Evaluación local de filtros ---
+
+def _single_condition(condition: Any) -> tuple:
+    if not isinstance(condition, dict) or len(condition) != 1:
+        raise UnsupportedFilterError(f"Condición de filtro no soportada: {condition}")
+    return next(iter(condition.items()))
+
+
+def is_filter_supported(filter_arg: Optional[Dict]) -> bool:
+    """Revisa la estructura del filtro sin evaluarlo. Un filtro None (sin filtro) siempre es soportado."""
+    if filter_arg is None:
+        return True
+    if not isinstance(filter_arg, dict):
+        return False
+    for compound in ("and", "or"):
+        if compound in filter_arg:
+            conditions = filter_arg[compound]
+            return len(filter_arg) == 1 and isinstance(conditions, list) and all(is_filter_supported(f) for f in conditions)
+    if "timestamp" in filter_arg:
+        timestamp = filter_arg.get("timestamp")
+        if timestamp not in _TIMESTAMP_FILTERS or not isinstance(filter_arg.get(timestamp), dict):
+            return False
+        condition = filter_arg[timestamp]
+        return len(condition) == 1 and next(iter(condition)) in _DATE_OPERATORS
+    condition_types = [key for key in filter_arg if key != "property"]
+    if not filter_arg.get("property") or len(condition_types) != 1:
+        return False
+    condition_type = condition_types[0]
+    condition = filter_arg[condition_type]
+    if condition_type not in _SUPPORTED_OPERATORS or not isinstance(condition, dict) or len(condition) != 1:
+        return False
+    return next(iter(condition)) in _SUPPORTED_OPERATORS[condition_type]
+
+
+def _plain_text(parts: Any) -> str:
+    if isinstance(parts, str):
+        return parts
+    return "".join((part.get("plain_text") or part.get("text", {}).get("content", "")) for part in (parts or []))
+
+
+def _match_text(text: str, condition: Dict) -> bool:
+    operator, expected = _single_condition(condition)
+    if operator == "is_empty":
+        return text == ""
+    if operator == "is_not_empty":
+        return text != ""
+    expected = str(expected)
+    if operator == "equals":
+        return text == expected
+    if operator == "does_not_equal":
+        return text != expected
+    # La API de Notion no distingue mayúsculas en 'contains'/'starts_with'/'ends_with'.
+    if operator == "contains":
+        return expected.lower() in text.lower()
+    if operator == "does_not_contain":
+        return expected.lower() not in text.lower()
+    if operator == "starts_with":
+        return text.lower().startswith(expected.lower())
+    if operator == "ends_with":
+        return text.lower().endswith(expected.lower())
+    raise UnsupportedFilterError(f"Operador de texto no soportado: {operator}")
+
+
+def _match_number(value: Optional[float], condition: Dict) -> bool:
+    operator, expected = _single_condition(condition)
+    if operator == "is_empty":
+        return value is None
+    if operator == "is_not_empty":
+        return value is not None
+    if value is None:
+        return operator == "does_not_equal"
+    if operator == "equals":
+        return value == expected
+    if operator == "does_not_equal":
+        return value != expected
+    if operator == "greater_than":
+        return value > expected
+    if operator == "less_than":
+        return value < expected
+    if operator == "greater_than_or_equal_to":
+        return value >= expected
+    if operator == "less_than_or_equal_to":
+        return value <= expected
+    raise UnsupportedFilterError(f"Operador numérico no soportado: {operator}")
+
+
+def _parse_iso(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace('Z', '+00:00') if value.endswith('Z') else value)
+
+
+def _match_date(value: Optional[str], condition: Dict) -> bool:
+    operator, expected = _single_condition(condition)
+    if operator == "is_empty":
+        return not value
+    if operator == "is_not_empty":
+        return bool(value)
+    if not value:
+        return False
+    expected = str(expected)
+    if len(expected) == 10:
+        # Fecha sin hora (AAAA-MM-DD): se compara solo la parte de fecha, las cadenas ISO ordenan igual que las fechas.
+        left, right = value[:10], expected
+    else:
+        try:
+            left, right = _parse_iso(value), _parse_iso(expected)
+        except ValueError:
+            raise UnsupportedFilterError(f"Fecha no interpretable en filtro: '{expected}' / '{value}'")
+        if (left.tzinfo is None) != (right.tzinfo is None):
+            raise UnsupportedFilterError("No se comparan fechas con y sin zona horaria localmente.")
+    if operator == "equals":
+        return left == right
+    if operator == "before":
+        return left < right
+    if operator == "after":
+        return left > right
+    if operator == "on_or_before":
+        return left <= right
+    if operator == "on_or_after":
+        return left >= right
+    raise UnsupportedFilterError(f"Operador de fecha no soportado: {operator}")
+
+
+def evaluate_filter(filter_arg: Optional[Dict], page: Dict) -> bool:
+    """
+    Evalúa un filtro de la API de Notion contra una página espejada.
+    Lanza UnsupportedFilterError si el filtro o la página no permiten una evaluación local fiel.
+    """
+    if filter_arg is None:
+        return True
+    if "and" in filter_arg:
+        return all(evaluate_filter(f, page) for f in filter_arg["and"])
+    if "or" in filter_arg:
+        return any(evaluate_filter(f, page) for f in filter_arg["or"])
+    if "timestamp" in filter_arg:
+        timestamp = filter_arg["timestamp"]
+        if timestamp not in _TIMESTAMP_FILTERS:
+            raise UnsupportedFilterError(f"Filtro de timestamp no soportado: {timestamp}")
+        return _match_date(page.get(timestamp), filter_arg.get(timestamp))
+
+    property_name = filter_arg.get("property")
+    condition_types = [key for key in filter_arg if key != "property"]
+    if not property_name or len(condition_types) != 1:
+        raise UnsupportedFilterError(f"Filtro no soportado: {filter_arg}")
+    condition_type = condition_types[0]
+    condition = filter_arg[condition_type]
+
+    properties = page.get("properties", {})
+    if property_name not in properties:
+        # Notion respondería con un error de validación; dejamos que lo haga la API.
+        raise UnsupportedFilterError(f"Propiedad '{property_name}' no presente en la página espejada.")
+    prop = properties[property_name] or {}
+    prop_type = prop.get("type")
+
+    if condition_type in _TEXT_PROPERTY_TYPES:
+        if prop_type not in _TEXT_PROPERTY_TYPES:
+            raise UnsupportedFilterError(f"Filtro de texto sobre propiedad '{property_name}' de tipo '{prop_type}'.")
+        return _match_text(_plain_text(prop.get(prop_type)) or "", condition)
+
+    if condition_type != prop_type:
+        raise UnsupportedFilterError(f"Filtro '{condition_type}' sobre propiedad '{property_name}' de tipo '{prop_type}'.")
+
+    if condition_type in ("select", "status"):
+        operator, expected = _single_condition(condition)
+        name = (prop.get(prop_type) or {}).get("name")
+        if operator == "is_empty":
+            return name is None
+        if operator == "is_not_empty":
+            return name is not None
+        return (name == expected) if operator == "equals" else (name != expected)
+
+    if condition_type == "multi_select":
+        operator, expected = _single_condition(condition)
+        names = [option.get("name") for option in (prop.get("multi_select") or [])]
+        if operator == "is_empty":
+            return not names
+        if operator == "is_not_empty":
+            return bool(names)
+        return (expected in names) if operator == "contains" else (expected not in names)
+
+    if condition_type == "number":
+        return _match_number(prop.get("number"), condition)
+
+    if condition_type == "checkbox":
+        operator, expected = _single_condition(condition)
+        value = bool(prop.get("checkbox"))
+        return (value == expected) if operator == "equals" else (value != expected)
+
+    if condition_type == "relation":
+        if prop.get("has_more"):
+            # Notion trunca las relaciones largas en el payload de la página; no se puede evaluar fielmente.
+            raise UnsupportedFilterError(f"Relación '{property_name}' truncada en la página espejada.")
+        operator, expected = _single_condition(condition)
+        related_ids = {normalize_notion_id(rel.get("id")) for rel in (prop.get("relation") or [])}
+        if operator == "is_empty":
+            return not related_ids
+        if operator == "is_not_empty":
+            return bool(related_ids)
+        contained = normalize_notion_id(str(expected)) in related_ids
+        return contained if operator == "contains" else not contained
+
+    if condition_type == "date":
+        return _match_date((prop.get("date") or {}).get("start"), condition)
+
+    raise UnsupportedFilterError(f"Tipo de filtro no soportado localmente: {condition_type}")
+
+
+def filter_pages(pages: Iterable[Dict], filter_arg: Optional[Dict]) -> List[Dict]:
+    """Aplica evaluate_filter a una colección de páginas. Propaga UnsupportedFilterError."""
+    if filter_arg is None:
+        return list(pages)
+    return [page for page in pages if evaluate_filter(filter_arg, page)]
+
+
+# --- Lectura y escritura del espejo ---
+
+def _is_stale(mirror_db: NotionMirrorDatabase) -> bool:
+    ttl_seconds = _config('NOTION_MIRROR_TTL_SECONDS', 300)
+    return mirror_db.synced_at is None or datetime.utcnow() - mirror_db.synced_at > timedelta(seconds=ttl_seconds)
+
+
+def _touch(mirror_db: NotionMirrorDatabase) -> None:
+    now = datetime.utcnow()
+    if mirror_db.last_accessed_at is None or now - mirror_db.last_accessed_at > _ACCESS_TOUCH_INTERVAL:
+        mirror_db.last_accessed_at = now
+        db.session.commit()
+
+
+def _load_pages(database_id: str) -> List[Dict]:
+    payloads = db.session.execute(
+        select(NotionMirrorPage.payload).where(NotionMirrorPage.database_id == database_id)
+    ).scalars()
+    pages = [json.loads(payload) for payload in payloads]
+    # La tabla no guarda el orden de la API; se usa created_time descendente para un orden estable.
+    pages.sort(key=lambda page: page.get("created_time") or "", reverse=True)
+    return pages
+
+
+def read_mirror(database_id: str, filter_arg: Optional[Dict] = None, allow_stale: bool = False) -> Optional[List[Dict]]:
+    """
+    Devuelve las páginas espejadas de la base de datos que cumplen el filtro,
+    o None si el espejo no existe, está vencido (salvo allow_stale) o no puede evaluar el filtro.
+    """
+    database_id = normalize_notion_id(database_id)
+    if not is_filter_supported(filter_arg):
+        return None
+    try:
+        mirror_db = db.session.get(NotionMirrorDatabase, database_id)
+        if mirror_db is None or mirror_db.synced_at is None:
+            return None
+        if not allow_stale and _is_stale(mirror_db):
+            logger.debug(f"Espejo de DB {database_id} vencido (sync: {mirror_db.synced_at}).")
+            return None
+        pages = filter_pages(_load_pages(database_id), filter_arg)
+        _touch(mirror_db)
+        return pages
+    except UnsupportedFilterError as e:
+        logger.debug(f"Filtro no evaluable localmente para DB {database_id}: {e}")
+        return None
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al leer el espejo local de la DB {database_id}: {e}", exc_info=True)
+        return None
+
+
+def store_database_snapshot(database_id: str, pages: List[Dict]) -> None:
+    """Reemplaza por completo el contenido espejado de una base de datos con las páginas dadas."""
+    database_id = normalize_notion_id(database_id)
+    now = datetime.utcnow()
+    try:
+        mirror_db = db.session.get(NotionMirrorDatabase, database_id)
+        if mirror_db is None:
+            mirror_db = NotionMirrorDatabase(database_id=database_id)
+            db.session.add(mirror_db)
+
+        db.session.execute(delete(NotionMirrorPage).where(NotionMirrorPage.database_id == database_id))
+        rows = {}
+        for page in pages:
+            page_id = normalize_notion_id(page.get("id"))
+            if page_id and not page.get("archived") and not page.get("in_trash"):
+                rows[page_id] = {
+                    "page_id": page_id,
+                    "database_id": database_id,
+                    "last_edited_time": page.get("last_edited_time"),
+                    "payload": json.dumps(page, ensure_ascii=False),
+                }
+        if rows:
+            db.session.execute(insert(NotionMirrorPage), list(rows.values()))
+
+        mirror_db.synced_at = now
+        mirror_db.last_accessed_at = now
+        mirror_db.page_count = len(rows)
+        mirror_db.sync_watermark = max((row["last_edited_time"] or "" for row in rows.values()), default=None) or None
+        db.session.commit()
+        logger.info(f"Espejo de DB {database_id} recargado con {len(rows)} páginas.")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al guardar el espejo de la DB {database_id}: {e}", exc_info=True)
+        return
+
+    _enforce_size_bound(keep_database_id=database_id)
+
+
+def upsert_pages(database_id: str, pages: List[Dict]) -> int:
+    """
+    Inserta o actualiza páginas en el espejo de una base de datos ya espejada.
+    Las páginas archivadas se eliminan. Retorna cuántas filas cambiaron.
+    """
+    database_id = normalize_notion_id(database_id)
+    if not pages:
+        return 0
+    changed = 0
+    try:
+        mirror_db = db.session.get(NotionMirrorDatabase, database_id)
+        if mirror_db is None:
+            return 0
+
+        incoming = {normalize_notion_id(page.get("id")): page for page in pages if page.get("id")}
+        existing = {
+            row.page_id: row
+            for row in NotionMirrorPage.query.filter(NotionMirrorPage.page_id.in_(list(incoming.keys()))).all()
+        }
+        for page_id, page in incoming.items():
+            row = existing.get(page_id)
+            if page.get("archived") or page.get("in_trash"):
+                if row is not None:
+                    db.session.delete(row)
+                    changed += 1
+                continue
+            payload = json.dumps(page, ensure_ascii=False)
+            if row is None:
+                db.session.add(NotionMirrorPage(page_id=page_id, database_id=database_id, last_edited_time=page.get("last_edited_time"), payload=payload))
+                changed += 1
+            elif row.last_edited_time != page.get("last_edited_time") or row.payload != payload:
+                row.database_id = database_id
+                row.last_edited_time = page.get("last_edited_time")
+                row.payload = payload
+                changed += 1
+
+        db.session.flush()
+        mirror_db.page_count = NotionMirrorPage.query.filter_by(database_id=database_id).count()
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al actualizar páginas en el espejo de la DB {database_id}: {e}", exc_info=True)
+        return 0
+    return changed
+
+
+def get_sync_watermark(database_id: str) -> Optional[str]:
+    """Devuelve el watermark de sincronización incremental de una base espejada (None si nunca se sincronizó)."""
+    mirror_db = db.session.get(NotionMirrorDatabase, normalize_notion_id(database_id))
+    if mirror_db is None or mirror_db.synced_at is None:
+        return None
+    return mirror_db.sync_watermark
+
+
+def mark_synced(database_id: str, watermark: Optional[str]) -> None:
+    """Marca el espejo como vigente tras una sincronización incremental y avanza el watermark."""
+    database_id = normalize_notion_id(database_id)
+    try:
+        mirror_db = db.session.get(NotionMirrorDatabase, database_id)
+        if mirror_db is None:
+            return
+        mirror_db.synced_at = datetime.utcnow()
+        if watermark and (mirror_db.sync_watermark is None or watermark > mirror_db.sync_watermark):
+            mirror_db.sync_watermark = watermark
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al marcar como sincronizado el espejo de la DB {database_id}: {e}", exc_info=True)
+
+
+def record_page_write(page: Optional[Dict]) -> None:
+    """
+    Refleja en el espejo una página devuelta por pages.create/pages.update,
+    para que la siguiente lectura desde el espejo no muestre datos anteriores a la escritura.
+    """
+    if not page or get_mirror_mode() == MIRROR_MODE_OFF:
+        return
+    parent = page.get("parent") or {}
+    if parent.get("type") != "database_id" or not parent.get("database_id"):
+        return
+    upsert_pages(parent["database_id"], [page])
+
+
+def evict_database(database_id: str) -> None:
+    """Elimina del espejo todas las páginas de una base de datos."""
+    database_id = normalize_notion_id(database_id)
+    try:
+        db.session.execute(delete(NotionMirrorPage).where(NotionMirrorPage.database_id == database_id))
+        db.session.execute(delete(NotionMirrorDatabase).where(NotionMirrorDatabase.database_id == database_id))
+        db.session.commit()
+        logger.info(f"Espejo de DB {database_id} expulsado.")
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al expulsar el espejo de la DB {database_id}: {e}", exc_info=True)
+
+
+def _enforce_size_bound(keep_database_id: Optional[str] = None) -> None:
+    """Expulsa bases de datos menos usadas recientemente (LRU) hasta respetar los límites configurados."""
+    max_databases = _config('NOTION_MIRROR_MAX_DATABASES', 8)
+    max_pages = _config('NOTION_MIRROR_MAX_PAGES', 50000)
+    try:
+        mirrors = NotionMirrorDatabase.query.order_by(NotionMirrorDatabase.last_accessed_at.asc()).all()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al revisar el tamaño del espejo local: {e}", exc_info=True)
+        return
+
+    total_databases = len(mirrors)
+    total_pages = sum(mirror.page_count or 0 for mirror in mirrors)
+    for mirror in mirrors:
+        if total_databases <= max_databases and total_pages <= max_pages:
+            break
+        if mirror.database_id == keep_database_id:
+            continue
+        total_databases -= 1
+        total_pages -= mirror.page_count or 0
+        evict_database(mirror.database_id)
+
+
+def read_through_mirror(database_id: str, filter_arg: Optional[Dict], load_all_pages: Callable[[], List[Dict]]) -> Optional[List[Dict]]:
+    """
+    Lectura a través del espejo (modo 'mirror_first').
+    Si el espejo está vigente se filtra localmente; si no, se recarga la base completa con load_all_pages()
+    y se filtra localmente. Retorna None cuando la consulta debe ir a la API en vivo.
+    """
+    if not is_filter_supported(filter_arg):
+        return None
+
+    pages = read_mirror(database_id, filter_arg)
+    if pages is not None:
+        return pages
+
+    try:
+        all_pages = load_all_pages()
+    except Exception as e:
+        logger.warning(f"No se pudo recargar el espejo de la DB {database_id} desde Notion: {e}. Se intentará usar el espejo vencido.")
+        return read_mirror(database_id, filter_arg, allow_stale=True)
+
+    store_database_snapshot(database_id, all_pages)
+    try:
+        return filter_pages(all_pages, filter_arg)
+    except UnsupportedFilterError as e:
+        logger.debug(f"Filtro no evaluable localmente para DB {database_id}: {e}")
+        return None
@@ -0,0 +1,490 @@
+# autointelli/notion/outbox.py
+# Bandeja de salida (outbox) de escrituras a Notion, persistida en la tabla notion_outbox_item.
+# Los envíos de solicitudes de material y las actualizaciones de estatus validan los datos, guardan las escrituras
+# y responden de inmediato (202) con el folio, así que la latencia de Notion ya no se suma al tiempo de respuesta.
+# Un hilo en segundo plano de los workers web (NOTION_OUTBOX_POLL_SECONDS, ver start_background_workers) o el
+# comando 'flask notion-outbox' las aplica. Solo se encola si alguien va a aplicar la cola (ver outbox_enabled): con
+# 'flask run' u otro servidor WSGI que no llama a start_background_workers, las escrituras se hacen en la solicitud.
+# - Cada fila se reclama con un UPDATE condicionado a status='pending' (seguro con varios workers de gunicorn) y queda
+#   en 'processing' con un lease (NOTION_OUTBOX_LEASE_SECONDS); si el proceso muere, el lease vence y la fila se reintenta.
+# - Los errores transitorios se reintentan con backoff hasta NOTION_OUTBOX_MAX_ATTEMPTS; los demás dejan la fila en 'failed'.
+#   En pages.create solo se reintentan los errores en que Notion no aplicó la escritura (429, 502, 503, conexión no
+#   establecida); un 500 o un timeout de lectura pudieron crear la página y se reportan para revisarlos. Si las bases
+#   tienen la propiedad NOTION_DEDUPE_PROPERTY, los reintentos buscan antes la página por su clave (ver create_page_util).
+# - Las actualizaciones de una misma página se aplican en el orden en que se encolaron.
+# Las relaciones de Partida/Proyecto de las solicitudes se resuelven al aplicar, no al encolar (ver resolve_request_relations).
+
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Tuple, Any
+
+import click
+import httpx
+from flask import current_app, has_app_context
+from flask.cli import with_appcontext
+from notion_client import Client
+from notion_client.errors import HTTPResponseError, APIResponseError, RequestTimeoutError
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from ..models import db, NotionOutboxItem
+from ..dashboard_snapshot import invalidate_dashboard
+from .mirror import record_page_write
+from .rate_limit import call_notion
+from .circuit_breaker import NotionUnavailableError, notion_circuit_open
+from .solicitudes import prepare_material_request, resolve_request_relations, material_dedupe_key
+from .utils import create_page_util
+
+logger = logging.getLogger(__name__)
+
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+_OPEN_STATUSES = (STATUS_PENDING, STATUS_PROCESSING)
+
+OPERATION_CREATE = 'create'
+OPERATION_UPDATE = 'update'
+
+# Respuestas con las que Notion no aplicó la escritura: se reintentan también para pages.create
+_CREATE_RETRYABLE_STATUSES = {429, 502, 503}
+# pages.update es idempotente: se reintenta cualquier error transitorio
+_UPDATE_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# Errores de red en los que la solicitud no llegó a enviarse
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+_wakeup = threading.Event()
+_worker_thread: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+_no_worker_warned = False
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def outbox_enabled() -> bool:
+    """
+    True si los envíos se encolan. Además de NOTION_OUTBOX_ENABLED hace falta quien aplique la cola: el hilo de este
+    proceso (start_outbox_worker, iniciado por start_background_workers desde gunicorn.conf.py o run.py) o un
+    'flask notion-outbox' aparte, que se declara con NOTION_OUTBOX_POLL_SECONDS=0 o NOTION_BACKGROUND_WORKERS=False.
+    Sin ninguno de los dos los envíos responderían 202 y nunca llegarían a Notion: se escriben en la solicitud.
+    """
+    global _no_worker_warned
+    if not _config('NOTION_OUTBOX_ENABLED', True):
+        return False
+    if _config('NOTION_OUTBOX_POLL_SECONDS', 2) <= 0 or not _config('NOTION_BACKGROUND_WORKERS', True):
+        return True # La cola la aplica otro proceso
+    if _worker_thread is not None and _worker_thread.is_alive():
+        return True
+    if not _no_worker_warned:
+        _no_worker_warned = True
+        logger.warning("Bandeja de salida activada pero sin hilo en este proceso (start_background_workers no se llamó): "
+                       "las escrituras a Notion se harán dentro de cada solicitud.")
+    return False
+
+
+def notify_outbox_worker() -> None:
+    """Despierta al hilo de este proceso para que aplique de inmediato lo recién encolado."""
+    _wakeup.set()
+
+
+# --- Encolado ---
+
+def enqueue_material_request(database_id_db1: str, database_id_db2: str, data: Dict, user_id: Optional[int] = None) -> Tuple[Dict, int]:
+    """
+    Valida la solicitud (prepare_material_request) y encola la creación de cada item en DB 1 y DB 2.
+    Retorna (respuesta, 202) con el folio como request_key, o la respuesta de error de la validación.
+    Un envío repetido del mismo folio no se vuelve a encolar: responde con el estado del envío original.
+    """
+    material_request, error_response, error_status = prepare_material_request(data, user_id)
+    if material_request is None:
+        return error_response, error_status
+    folio = material_request.folio
+
+    if not database_id_db1 or not database_id_db2:
+        error_msg = "La integración con Notion para Solicitudes no está configurada correctamente en el servidor (IDs de bases de datos faltantes)."
+        logger.error(f"{material_request.log_prefix} {error_msg}")
+        return {"error": error_msg, "folio_solicitud": folio}, 503
+
+    rows = []
+    for index, ((item_log_prefix, properties), item_data) in enumerate(zip(material_request.item_payloads, material_request.items)):
+        label = str(item_data.get('id', item_data.get('nombre_material', 'Desconocido Item')))[:200]
+        for db_label, database_id in (("DB 1", database_id_db1), ("DB 2", database_id_db2)):
+            payload = {"properties": properties, "partida": material_request.partida_valor, "db_label": db_label, "log_prefix": item_log_prefix,
+                       "dedupe_key": material_dedupe_key(folio, index, db_label)}
+            rows.append(NotionOutboxItem(
+                request_key=folio, operation=OPERATION_CREATE, item_index=index, target_id=database_id,
+                label=label, payload=json.dumps(payload, ensure_ascii=False), user_id=user_id,
+            ))
+
+    existing = NotionOutboxItem.query.filter_by(request_key=folio).all()
+    if existing:
+        return _repeated_request_response(folio, existing, rows, user_id, material_request.log_prefix)
+
+    try:
+        db.session.add_all(rows)
+        db.session.commit()
+    except IntegrityError:
+        # Otro envío del mismo folio se encoló al mismo tiempo
+        db.session.rollback()
+        existing = NotionOutboxItem.query.filter_by(request_key=folio).all()
+        return _repeated_request_response(folio, existing, rows, user_id, material_request.log_prefix)
+
+    notify_outbox_worker()
+    total_items = len(material_request.items)
+    logger.info(f"{material_request.log_prefix}: {total_items} item(s) ({len(rows)} escrituras) encolados para Notion.")
+    return {
+        "folio_solicitud": folio,
+        "request_key": folio,
+        "message": f"Solicitud Folio '{folio}' recibida: {total_items} item(s) en proceso de registro en Notion.",
+        "queued_items": total_items,
+    }, 202
+
+
+def _write_signature(rows: List[NotionOutboxItem]) -> List[tuple]:
+    return sorted((row.item_index, row.operation, row.target_id, json.dumps(json.loads(row.payload), sort_keys=True)) for row in rows)
+
+
+def _repeated_request_response(folio: str, existing: List[NotionOutboxItem], rows: List[NotionOutboxItem], user_id: Optional[int], log_prefix: str) -> Tuple[Dict, int]:
+    """
+    Respuesta a un folio que ya está en la bandeja de salida. Solo es un reenvío (202 con el estado del original) si es
+    del mismo usuario y con las mismas escrituras; si no, 409 sin revelar nada del otro envío.
+    """
+    if any(row.user_id != user_id for row in existing) or _write_signature(existing) != _write_signature(rows):
+        logger.warning(f"{log_prefix}: El folio ya está en la bandeja de salida con otro usuario o con otros datos; envío rechazado.")
+        return {
+            "error": f"El folio '{folio}' ya se usó en otra solicitud. Recarga el formulario para obtener un folio nuevo.",
+            "folio_solicitud": folio,
+        }, 409
+
+    logger.warning(f"{log_prefix}: El folio ya estaba en la bandeja de salida; envío repetido, no se vuelve a encolar.")
+    status = get_request_status(folio, user_id=user_id) or {}
+    return {
+        "folio_solicitud": folio,
+        "request_key": folio,
+        "message": f"La solicitud Folio '{folio}' ya había sido recibida. {status.get('message', '')}".strip(),
+        "queued_items": status.get("total_items", 0),
+    }, 202
+
+
+def enqueue_page_update(page_id: str, properties: Dict, user_id: Optional[int] = None) -> Tuple[Dict, int]:
+    """Encola la actualización de propiedades de una página. Retorna (respuesta, 202) con su request_key."""
+    request_key = f"upd-{uuid.uuid4().hex}"
+    db.session.add(NotionOutboxItem(
+        request_key=request_key, operation=OPERATION_UPDATE, item_index=0, target_id=page_id,
+        label=", ".join(properties.keys())[:200], payload=json.dumps({"properties": properties}, ensure_ascii=False), user_id=user_id,
+    ))
+    db.session.commit()
+    notify_outbox_worker()
+    logger.info(f"Actualización de la página {page_id} encolada para Notion ({request_key}).")
+    return {"message": "Actualización recibida; se aplicará en Notion en unos segundos.", "request_key": request_key}, 202
+
+
+# --- Estado ---
+
+def get_request_status(request_key: str, user_id: Optional[int] = None) -> Optional[Dict]:
+    """
+    Estado de un envío encolado, por item y por escritura. None si la clave no existe (o, con user_id, si el envío
+    es de otro usuario). 'state' es 'pending' mientras quede alguna escritura por aplicar; después 'done', 'partial' o 'failed'.
+    """
+    query = NotionOutboxItem.query.filter_by(request_key=request_key)
+    if user_id is not None:
+        query = query.filter_by(user_id=user_id)
+    rows = query.order_by(NotionOutboxItem.item_index, NotionOutboxItem.id).all()
+    if not rows:
+        return None
+
+    items: Dict[int, Dict] = {}
+    first_urls: Dict[str, str] = {}
+    for row in rows:
+        destination = json.loads(row.payload).get("db_label") or "Notion"
+        item = items.setdefault(row.item_index, {"item_index": row.item_index + 1, "item_identifier": row.label, "writes": []})
+        item["writes"].append({
+            "destination": destination,
+            "status": row.status,
+            "attempts": row.attempts,
+            "url": row.result_url,
+            "error": row.last_error,
+        })
+        if row.status == STATUS_DONE and row.result_url:
+            first_urls.setdefault(destination, row.result_url)
+
+    pending_count = processed_count = failed_count = 0
+    for item in items.values():
+        statuses = {write["status"] for write in item["writes"]}
+        if statuses & set(_OPEN_STATUSES):
+            item["status"] = STATUS_PENDING
+            pending_count += 1
+        elif statuses == {STATUS_DONE}:
+            item["status"] = STATUS_DONE
+            processed_count += 1
+        else:
+            item["status"] = STATUS_FAILED
+            failed_count += 1
+
+    total_items = len(items)
+    if pending_count:
+        state = 'pending'
+        message = f"{processed_count}/{total_items} item(s) registrados en Notion; {pending_count} en proceso."
+    elif failed_count == 0:
+        state = 'done'
+        message = f"{processed_count}/{total_items} item(s) registrados con éxito en Notion."
+    elif processed_count:
+        state = 'partial'
+        message = f"{processed_count}/{total_items} item(s) registrados; {failed_count} fallaron."
+    else:
+        state = 'failed'
+        message = f"Ningún item se registró en Notion ({failed_count} fallaron)."
+
+    status = {
+        "request_key": request_key,
+        "state": state,
+        "message": message,
+        "total_items": total_items,
+        "processed_count": processed_count,
+        "failed_count": failed_count,
+        "pending_count": pending_count,
+        "items": list(items.values()),
+    }
+    if "DB 1" in first_urls:
+        status["notion_url_db1"] = first_urls["DB 1"]
+    if "DB 2" in first_urls:
+        status["notion_url_db2"] = first_urls["DB 2"]
+    return status
+
+
+# --- Aplicación de las escrituras ---
+
+def _is_retryable(error: Exception, operation: str) -> bool:
+    if isinstance(error, NotionUnavailableError):
+        return True # El circuit breaker rechazó la llamada antes de enviarla
+    if isinstance(error, HTTPResponseError):
+        return error.status in (_CREATE_RETRYABLE_STATUSES if operation == OPERATION_CREATE else _UPDATE_RETRYABLE_STATUSES)
+    if isinstance(error, _NOT_SENT_ERRORS):
+        return True
+    if isinstance(error, (RequestTimeoutError, httpx.TransportError)):
+        return operation == OPERATION_UPDATE
+    return False
+
+
+def _describe_error(error: Exception) -> str:
+    if isinstance(error, APIResponseError):
+        return f"{error.code} (HTTP {error.status}): {error.message if hasattr(error, 'message') else str(error)}"
+    if isinstance(error, HTTPResponseError):
+        return f"HTTP {error.status}: {error}"
+    return f"{type(error).__name__}: {error}"
+
+
+def _reclaim_expired_leases(now: datetime) -> None:
+    result = db.session.execute(
+        update(NotionOutboxItem)
+        .where(NotionOutboxItem.status == STATUS_PROCESSING, NotionOutboxItem.locked_until < now)
+        .values(status=STATUS_PENDING, locked_until=None, next_attempt_at=now)
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.warning(f"Bandeja de salida: {result.rowcount} escrituras con lease vencido vuelven a la cola.")
+
+
+def _claim_batch(limit: int) -> List[Dict]:
+    """Reclama hasta 'limit' escrituras pendientes. Retorna copias planas (los hilos no comparten objetos de la sesión)."""
+    now = datetime.utcnow()
+    _reclaim_expired_leases(now)
+    lease = timedelta(seconds=_config('NOTION_OUTBOX_LEASE_SECONDS', 300))
+
+    candidates = (NotionOutboxItem.query
+                  .filter(NotionOutboxItem.status == STATUS_PENDING, NotionOutboxItem.next_attempt_at <= now)
+                  .order_by(NotionOutboxItem.id)
+                  .limit(limit * 2)
+                  .all())
+    claimed = []
+    update_targets = set()
+    for row in candidates:
+        if len(claimed) >= limit:
+            break
+        if row.operation == OPERATION_UPDATE:
+            # Solo la actualización más antigua abierta de cada página; las siguientes esperan su turno
+            if row.target_id in update_targets:
+                continue
+            update_targets.add(row.target_id)
+            earlier = (NotionOutboxItem.query
+                       .filter(NotionOutboxItem.operation == OPERATION_UPDATE, NotionOutboxItem.target_id == row.target_id,
+                               NotionOutboxItem.status.in_(_OPEN_STATUSES), NotionOutboxItem.id < row.id)
+                       .first())
+            if earlier is not None:
+                continue
+        attempts = row.attempts + 1 # Antes del UPDATE, que también se refleja en el objeto de la sesión
+        result = db.session.execute(
+            update(NotionOutboxItem)
+            .where(NotionOutboxItem.id == row.id, NotionOutboxItem.status == STATUS_PENDING)
+            .values(status=STATUS_PROCESSING, locked_until=now + lease, attempts=attempts)
+        )
+        if result.rowcount == 1: # Otro proceso pudo haberla reclamado primero
+            claimed.append({
+                "id": row.id,
+                "request_key": row.request_key,
+                "operation": row.operation,
+                "target_id": row.target_id,
+                "payload": json.loads(row.payload),
+                "attempts": attempts,
+            })
+    db.session.commit()
+    return claimed
+
+
+def _apply(notion_client: Client, item: Dict, relations_cache: Dict[str, Dict]) -> Dict:
+    """Aplica una escritura en Notion. Propaga las excepciones de la API."""
+    payload = item["payload"]
+    if item["operation"] == OPERATION_CREATE:
+        partida = payload.get("partida") or ""
+        if partida not in relations_cache:
+            relations_cache[partida] = resolve_request_relations(
+                notion_client, _config('DATABASE_ID_PARTIDAS', None), _config('DATABASE_ID_PROYECTOS', None),
+                partida, payload.get("log_prefix", f"[Outbox] Folio: {item['request_key']}"),
+            )
+        properties = {**payload["properties"], **relations_cache[partida]}
+        # En un reintento se busca primero la página por su clave: el intento anterior pudo haberla creado
+        return create_page_util(notion_client, item["target_id"], properties, dedupe_property=_config('NOTION_DEDUPE_PROPERTY', None),
+                                dedupe_value=payload.get("dedupe_key"), lookup_first=item["attempts"] > 1)
+    response = call_notion(notion_client.pages.update, page_id=item["target_id"], properties=payload["properties"])
+    record_page_write(response) # Mantener el espejo local al día con la escritura
+    return response
+
+
+def _finish(item: Dict, response: Optional[Dict] = None, error: Optional[Exception] = None) -> str:
+    """Guarda el resultado de una escritura. Retorna el nuevo estado ('done', 'pending' si se reintentará o 'failed')."""
+    now = datetime.utcnow()
+    if error is None:
+        values = {"status": STATUS_DONE, "locked_until": None, "last_error": None,
+                  "result_page_id": (response or {}).get("id"), "result_url": (response or {}).get("url")}
+    elif _is_retryable(error, item["operation"]) and item["attempts"] < _config('NOTION_OUTBOX_MAX_ATTEMPTS', 8):
+        # Backoff exponencial, con tope de 15 minutos
+        delay = min(_config('NOTION_OUTBOX_RETRY_BASE_SECONDS', 5) * (2 ** (item["attempts"] - 1)), 900)
+        values = {"status": STATUS_PENDING, "locked_until": None, "last_error": _describe_error(error),
+                  "next_attempt_at": now + timedelta(seconds=delay)}
+    else:
+        values = {"status": STATUS_FAILED, "locked_until": None, "last_error": _describe_error(error)}
+
+    db.session.execute(update(NotionOutboxItem).where(NotionOutboxItem.id == item["id"]).values(**values))
+    db.session.commit()
+    return values["status"]
+
+
+def drain_outbox(app, limit: Optional[int] = None) -> Dict[str, int]:
+    """
+    Reclama y aplica un lote de escrituras pendientes en paralelo (NOTION_SUBMIT_MAX_WORKERS), bajo el limitador
+    de tasa compartido. Requiere contexto de aplicación. Retorna los contadores del lote.
+    """
+    stats = {"claimed": 0, STATUS_DONE: 0, STATUS_PENDING: 0, STATUS_FAILED: 0}
+    notion_client = app.notion_client
+    if notion_client is None:
+        logger.warning("Bandeja de salida omitida: Cliente de Notion no inicializado.")
+        return stats
+
+    if notion_circuit_open():
+        # Notion está caído: no se reclaman filas (no consumen intentos) hasta que el breaker deje pasar llamadas
+        return stats
+
+    items = _claim_batch(limit or app.config.get('NOTION_OUTBOX_BATCH_SIZE', 20))
+    stats["claimed"] = len(items)
+    if not items:
+        return stats
+
+    relations_cache: Dict[str, Dict] = {} # Partida -> relaciones, resueltas una vez por lote
+
+    def _process(item: Dict) -> str:
+        with app.app_context():
+            try:
+                response = _apply(notion_client, item, relations_cache)
+            except Exception as e:
+                logger.error(f"Bandeja de salida: error al aplicar la escritura {item['id']} ({item['operation']} {item['target_id']}, "
+                             f"intento {item['attempts']}): {_describe_error(e)}", exc_info=not isinstance(e, HTTPResponseError))
+                return _finish(item, error=e)
+            return _finish(item, response=response)
+
+    max_workers = max(1, min(app.config.get('NOTION_SUBMIT_MAX_WORKERS', 4), len(items)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notion-outbox") as executor:
+        for status in executor.map(_process, items):
+            stats[status] += 1
+    if stats[STATUS_DONE]:
+        # Las copias de los dashboards ya no reflejan lo que hay en Notion
+        invalidate_dashboard(reason=f"{stats[STATUS_DONE]} escrituras aplicadas por la bandeja de salida")
+    logger.info(f"Bandeja de salida: {stats['claimed']} escrituras procesadas ({stats[STATUS_DONE]} aplicadas, "
+                f"{stats[STATUS_PENDING]} por reintentar, {stats[STATUS_FAILED]} fallidas).")
+    return stats
+
+
+def retry_failed_writes(request_key: Optional[str] = None) -> int:
+    """Vuelve a encolar las escrituras fallidas (de un envío o de todos). Retorna cuántas se reencolaron."""
+    query = update(NotionOutboxItem).where(NotionOutboxItem.status == STATUS_FAILED)
+    if request_key:
+        query = query.where(NotionOutboxItem.request_key == request_key)
+    result = db.session.execute(query.values(status=STATUS_PENDING, attempts=0, next_attempt_at=datetime.utcnow()))
+    db.session.commit()
+    notify_outbox_worker()
+    return result.rowcount
+
+
+# --- Hilo en segundo plano y comando CLI ---
+
+def _worker_loop(app, poll_seconds: float):
+    while True:
+        claimed = 0
+        try:
+            with app.app_context():
+                stats = drain_outbox(app)
+            claimed = stats["claimed"]
+        except Exception as e:
+            logger.error(f"Error inesperado en la bandeja de salida de Notion: {e}", exc_info=True)
+        if claimed >= app.config.get('NOTION_OUTBOX_BATCH_SIZE', 20):
+            continue # Lote completo: probablemente hay más pendientes
+        _wakeup.wait(poll_seconds)
+        _wakeup.clear()
+
+
+def start_outbox_worker(app) -> Optional[threading.Thread]:
+    """
+    Inicia el hilo que aplica la bandeja de salida si NOTION_OUTBOX_ENABLED y NOTION_OUTBOX_POLL_SECONDS > 0.
+    Con varios workers de gunicorn cada proceso tiene su hilo; el reclamo condicionado evita aplicar dos veces la misma fila.
+    """
+    global _worker_thread
+    poll_seconds = app.config.get('NOTION_OUTBOX_POLL_SECONDS', 2)
+    if not app.config.get('NOTION_OUTBOX_ENABLED', True) or not poll_seconds or poll_seconds <= 0:
+        return None
+
+    with _worker_lock:
+        if _worker_thread is not None and _worker_thread.is_alive():
+            return _worker_thread
+        _worker_thread = threading.Thread(target=_worker_loop, args=(app, poll_seconds), name="notion-outbox", daemon=True)
+        _worker_thread.start()
+        logger.info(f"Hilo de la bandeja de salida de Notion iniciado (sondeo cada {poll_seconds}s).")
+        return _worker_thread
+
+
+@click.command('notion-outbox')
+@click.option('--retry-failed', is_flag=True, help='Vuelve a encolar las escrituras fallidas antes de procesar.')
+@click.option('--request', 'request_key', default=None, help='Limita --retry-failed a un folio o clave de envío.')
+@click.option('--loop', 'loop_seconds', type=int, default=0, help='Repite el procesamiento cada N segundos (0 = hasta vaciar la cola una vez).')
+@with_appcontext
+def notion_outbox_command(retry_failed, request_key, loop_seconds):
+    """Aplica en Notion las escrituras pendientes de la bandeja de salida."""
+    app = current_app._get_current_object()
+    if retry_failed:
+        click.echo(f"{retry_failed_writes(request_key)} escrituras fallidas reencoladas.")
+    while True:
+        while True:
+            stats = drain_outbox(app)
+            if stats["claimed"]:
+                click.echo(f"{stats['claimed']} procesadas: {stats[STATUS_DONE]} aplicadas, "
+                           f"{stats[STATUS_PENDING]} por reintentar, {stats[STATUS_FAILED]} fallidas.")
+            if stats["claimed"] < app.config.get('NOTION_OUTBOX_BATCH_SIZE', 20):
+                break
+        if loop_seconds <= 0:
+            break
+        time.sleep(loop_seconds)
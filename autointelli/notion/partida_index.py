@@ -0,0 +1,170 @@
+# autointelli/notion/partida_index.py
+# Índice en memoria 'ID de partida' -> page_id de la base de datos de Partidas.
+# find_partida_by_id (notion/utils.py) lo consulta antes de ir a Notion; la carga y el refresco incremental
+# (filtro last_edited_time 'on_or_after') los hace utils, este módulo solo guarda el estado del índice.
+# Los códigos no encontrados se recuerdan durante NOTION_PARTIDA_NEGATIVE_TTL_SECONDS para que un error
+# de captura repetido no vuelva a consultar la API en cada envío.
+# Los refrescos corren en segundo plano y de uno en uno por base (claim_refresh/release_refresh): mientras la carga
+# completa horaria tarda, las búsquedas siguen usando el índice actual en lugar de esperarla o repetirla.
+
+import logging
+import threading
+import time
+from typing import Optional, Dict, List, Any
+
+from flask import current_app, has_app_context
+
+from .constants import NOTION_PROP_PARTIDA_BUSQUEDA_ID
+from .mirror import normalize_notion_id
+from .relations import extract_text_property
+
+logger = logging.getLogger(__name__)
+
+# Valor de lookup_partida cuando el código está en el caché negativo
+PARTIDA_NOT_FOUND = object()
+
+_lock = threading.Lock()
+# database_id normalizado -> estado del índice de esa base
+_indexes: Dict[str, "_PartidaIndex"] = {}
+
+
+class _PartidaIndex:
+    def __init__(self):
+        self.code_to_page_id: Dict[str, str] = {}
+        self.page_id_to_code: Dict[str, str] = {}
+        self.not_found_until: Dict[str, float] = {} # código -> instante (monotonic) en que vence el caché negativo
+        self.watermark: Optional[str] = None # Mayor last_edited_time indexado
+        self.loaded_at: Optional[float] = None # Última carga completa
+        self.refreshed_at: Optional[float] = None # Última carga completa o incremental
+        self.refreshing = False # Hay un refresco en curso (solo uno por base)
+        self.retry_at: Optional[float] = None # Tras un refresco fallido, no se reintenta antes de este instante
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def _normalize_code(code: str) -> str:
+    return (code or "").strip()
+
+
+def _get_index(database_id: str) -> _PartidaIndex:
+    key = normalize_notion_id(database_id)
+    index = _indexes.get(key)
+    if index is None:
+        index = _indexes[key] = _PartidaIndex()
+    return index
+
+
+def lookup_partida(database_id: str, code: str) -> Any:
+    """Devuelve el page_id indexado, PARTIDA_NOT_FOUND si está en el caché negativo, o None si el índice no lo conoce."""
+    code = _normalize_code(code)
+    with _lock:
+        index = _get_index(database_id)
+        page_id = index.code_to_page_id.get(code)
+        if page_id:
+            return page_id
+        expires_at = index.not_found_until.get(code)
+        if expires_at is not None:
+            if time.monotonic() < expires_at:
+                return PARTIDA_NOT_FOUND
+            index.not_found_until.pop(code, None)
+    return None
+
+
+def claim_refresh(database_id: str) -> Optional[str]:
+    """
+    Indica qué refresco necesita el índice ('full' o 'incremental') y lo marca en curso; None si está vigente, si ya hay
+    un refresco en curso o si el último falló hace poco. Quien recibe un refresco debe llamar a release_refresh.
+    """
+    now = time.monotonic()
+    with _lock:
+        index = _get_index(database_id)
+        if index.refreshing or (index.retry_at is not None and now < index.retry_at):
+            return None
+        if index.loaded_at is None or index.watermark is None or now - index.loaded_at >= _config('NOTION_PARTIDA_INDEX_FULL_SECONDS', 3600):
+            kind = 'full'
+        elif now - index.refreshed_at >= _config('NOTION_PARTIDA_INDEX_REFRESH_SECONDS', 60):
+            kind = 'incremental'
+        else:
+            return None
+        index.refreshing = True
+        return kind
+
+
+def release_refresh(database_id: str, ok: bool) -> None:
+    """Termina el refresco en curso; si falló, el siguiente se pospone NOTION_PARTIDA_INDEX_REFRESH_SECONDS."""
+    with _lock:
+        index = _get_index(database_id)
+        index.refreshing = False
+        index.retry_at = None if ok else time.monotonic() + _config('NOTION_PARTIDA_INDEX_REFRESH_SECONDS', 60)
+
+
+def get_partida_watermark(database_id: str) -> Optional[str]:
+    with _lock:
+        return _get_index(database_id).watermark
+
+
+def _index_page(index: _PartidaIndex, page: Dict) -> None:
+    page_id = page.get("id")
+    if not page_id:
+        return
+    previous_code = index.page_id_to_code.pop(page_id, None)
+    if previous_code is not None and index.code_to_page_id.get(previous_code) == page_id:
+        index.code_to_page_id.pop(previous_code, None)
+    if page.get("archived") or page.get("in_trash"):
+        return
+    code = _normalize_code(extract_text_property(page, NOTION_PROP_PARTIDA_BUSQUEDA_ID))
+    if not code:
+        return
+    index.code_to_page_id[code] = page_id
+    index.page_id_to_code[page_id] = code
+    index.not_found_until.pop(code, None)
+
+
+def load_partida_pages(database_id: str, pages: List[Dict], full: bool) -> None:
+    """Indexa páginas de Partidas. Con full=True reemplaza el índice completo (elimina partidas borradas)."""
+    now = time.monotonic()
+    with _lock:
+        index = _get_index(database_id)
+        if full:
+            index.code_to_page_id.clear()
+            index.page_id_to_code.clear()
+            index.watermark = None
+            index.loaded_at = now
+        for page in pages:
+            _index_page(index, page)
+            # El watermark solo avanza con cargas desde la consulta; una partida registrada suelta no debe saltarse otras ediciones.
+            last_edited_time = page.get("last_edited_time")
+            if last_edited_time and (index.watermark is None or last_edited_time > index.watermark):
+                index.watermark = last_edited_time
+        if index.watermark is None:
+            # Base vacía: usar un watermark mínimo para que el siguiente refresco sea incremental
+            index.watermark = "1970-01-01T00:00:00.000Z"
+        index.refreshed_at = now
+        size = len(index.code_to_page_id)
+    logger.info(f"Índice de partidas de {database_id} {'cargado' if full else 'actualizado'}: {len(pages)} páginas procesadas, {size} códigos indexados.")
+
+
+def remember_partida(database_id: str, code: str, page_id: Optional[str]) -> None:
+    """Guarda el resultado de una búsqueda en vivo: el page_id encontrado o una entrada del caché negativo."""
+    code = _normalize_code(code)
+    if not code:
+        return
+    with _lock:
+        index = _get_index(database_id)
+        if page_id:
+            index.code_to_page_id[code] = page_id
+            index.page_id_to_code[page_id] = code
+            index.not_found_until.pop(code, None)
+        else:
+            index.not_found_until[code] = time.monotonic() + _config('NOTION_PARTIDA_NEGATIVE_TTL_SECONDS', 60)
+
+
+def register_partida_page(page: Optional[Dict]) -> None:
+    """Indexa una partida recién creada (respuesta de pages.create) para que esté disponible de inmediato."""
+    parent = (page or {}).get("parent") or {}
+    if parent.get("type") != "database_id" or not parent.get("database_id"):
+        return
+    with _lock:
+        _index_page(_get_index(parent["database_id"]), page)
@@ -79,7 +79,8 @@ def find_project_page_by_property_value(
             notion_client,
             database_id_proyectos,
             filters=[filter_condition],
-            page_size=2 # Solo necesitamos 1 o 2 para ver si hay múltiples coincidencias
+            page_size=2, # Solo necesitamos 1 o 2 para ver si hay múltiples coincidencias
+            properties=[property_name] # Solo interesa el ID de la página: se pide únicamente la propiedad buscada
         )
 
         # 5. Procesar los resultados
@@ -0,0 +1,247 @@
+# autointelli/notion/rate_limit.py
+# Limitador de tasa (token bucket) y reintentos compartidos para las llamadas a la API de Notion.
+# Notion documenta un promedio de 3 solicitudes por segundo por integración; el bucket permite pequeñas ráfagas
+# (NOTION_RATE_LIMIT_BURST) sin superar ese promedio. El limitador es por proceso: con varios workers de gunicorn
+# la tasa total puede superar el límite, y en ese caso los 429 se reintentan respetando Retry-After.
+# Los reintentos siguen una política por tipo de operación (ver RetryPolicy) y se registran en retry_stats.
+# Antes de cada intento se consulta el circuit breaker (ver circuit_breaker.py), que corta las llamadas si Notion está caído.
+
+import logging
+import random
+import threading
+import time
+from typing import Optional, Callable, Dict, Set, Any
+
+import httpx
+from flask import current_app, has_app_context
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+from .circuit_breaker import get_circuit_breaker
+
+logger = logging.getLogger(__name__)
+
+# Estados HTTP que se consideran transitorios y se reintentan
+_RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket seguro entre hilos: acquire() bloquea hasta que haya un token disponible."""
+
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate_per_second = float(rate_per_second)
+        self.capacity = max(1, int(capacity))
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate_per_second)
+        self._updated_at = now
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate_per_second
+            time.sleep(wait_seconds)
+
+    def pause(self, seconds: float) -> None:
+        """Vacía el bucket durante 'seconds' (usado cuando Notion responde 429 con Retry-After)."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate_per_second
+
+
+_rate_limiter: Optional[TokenBucket] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def get_rate_limiter() -> TokenBucket:
+    """Devuelve el limitador del proceso, creado con NOTION_RATE_LIMIT_PER_SECOND / NOTION_RATE_LIMIT_BURST."""
+    global _rate_limiter
+    if _rate_limiter is None:
+        with _rate_limiter_lock:
+            if _rate_limiter is None:
+                _rate_limiter = TokenBucket(
+                    _config('NOTION_RATE_LIMIT_PER_SECOND', 3),
+                    _config('NOTION_RATE_LIMIT_BURST', 3),
+                )
+    return _rate_limiter
+
+
+# --- Política de reintentos ---
+# Cada llamada a Notion pasa por _call_with_policy con la política de su tipo de operación:
+# - Lecturas y actualizaciones (call_notion): son idempotentes, así que se reintentan 429, 5xx y errores de red.
+# - Creaciones (call_notion_write): 429 y los errores de conexión (la solicitud no llegó a enviarse) se reintentan
+#   siempre. Un 5xx o un timeout de lectura son ambiguos (la página pudo haberse creado): solo se reintentan si quien
+#   llama da una clave de deduplicación (dedupe_lookup), que se consulta antes de cada reintento.
+# Cada operación tiene su presupuesto de reintentos (NOTION_MAX_RETRIES / NOTION_MAX_RETRIES_CREATE) y todas
+# comparten un tope de espera acumulada por llamada (NOTION_RETRY_SLEEP_BUDGET_SECONDS). Retry-After se respeta en 429 y 503.
+
+# Errores de red en los que la solicitud no llegó a enviarse: reintentarlos nunca duplica una escritura
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+class RetryPolicy:
+    """Qué errores se reintentan para un tipo de operación y con qué presupuesto."""
+
+    __slots__ = ('name', 'retryable_statuses', 'ambiguous_statuses', 'retry_transport_errors', 'max_retries_key', 'max_retries_default')
+
+    def __init__(self, name: str, retryable_statuses: Set[int], ambiguous_statuses: Set[int], retry_transport_errors: bool, max_retries_key: str, max_retries_default: int):
+        self.name = name
+        self.retryable_statuses = frozenset(retryable_statuses)
+        self.ambiguous_statuses = frozenset(ambiguous_statuses) # Solo se reintentan con dedupe_lookup
+        self.retry_transport_errors = retry_transport_errors # False: timeouts de lectura y demás errores de red son ambiguos
+        self.max_retries_key = max_retries_key
+        self.max_retries_default = max_retries_default
+
+
+READ_POLICY = RetryPolicy('read', _RETRYABLE_STATUSES, set(), True, 'NOTION_MAX_RETRIES', 4)
+CREATE_POLICY = RetryPolicy('create', {429}, {500, 502, 503, 504}, False, 'NOTION_MAX_RETRIES_CREATE', 3)
+
+
+# --- Métricas por operación ('databases.query', 'pages.create', ...) ---
+
+retry_stats: Dict[str, Dict[str, float]] = {}
+_stats_lock = threading.Lock()
+_STAT_FIELDS = ('calls', 'attempts', 'retries', 'sleep_seconds', 'failures', 'deduplicated')
+
+
+def _record(operation: str, **counters: float) -> None:
+    with _stats_lock:
+        stats = retry_stats.get(operation)
+        if stats is None:
+            stats = retry_stats[operation] = dict.fromkeys(_STAT_FIELDS, 0)
+        for field, value in counters.items():
+            stats[field] += value
+
+
+def get_retry_stats() -> Dict[str, Dict[str, float]]:
+    """Copia de las métricas de reintentos del proceso, por operación y en total ('total')."""
+    with _stats_lock:
+        snapshot = {operation: dict(stats) for operation, stats in retry_stats.items()}
+    snapshot['total'] = {field: sum(stats[field] for stats in snapshot.values()) for field in _STAT_FIELDS}
+    for stats in snapshot.values():
+        stats['sleep_seconds'] = round(stats['sleep_seconds'], 3)
+    return snapshot
+
+
+def _operation_name(fn: Callable) -> str:
+    endpoint = getattr(fn, '__self__', None)
+    name = getattr(fn, '__name__', 'call')
+    if endpoint is None:
+        return name
+    return f"{type(endpoint).__name__.replace('Endpoint', '').lower()}.{name}" # PagesEndpoint.create -> 'pages.create'
+
+
+def _retry_after_seconds(error: HTTPResponseError) -> Optional[float]:
+    headers = getattr(error, 'headers', None)
+    value = headers.get('retry-after') if headers is not None else None
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _call_with_policy(fn: Callable, args: tuple, kwargs: dict, policy: RetryPolicy, dedupe_lookup: Optional[Callable[[], Optional[Dict]]] = None) -> Any:
+    limiter = get_rate_limiter()
+    max_retries = _config(policy.max_retries_key, policy.max_retries_default)
+    base_delay = _config('NOTION_RETRY_BASE_SECONDS', 0.5)
+    max_delay = _config('NOTION_RETRY_MAX_DELAY_SECONDS', 20)
+    sleep_budget = _config('NOTION_RETRY_SLEEP_BUDGET_SECONDS', 60)
+    breaker = get_circuit_breaker()
+    operation = _operation_name(fn)
+    _record(operation, calls=1)
+
+    attempt = 0
+    slept = 0.0
+    while True:
+        if breaker is not None:
+            breaker.before_call() # Con el breaker abierto falla de inmediato (NotionUnavailableError), también entre reintentos
+        limiter.acquire()
+        _record(operation, attempts=1)
+        retry_after = None
+        call_failed = False # Para el breaker: 5xx y errores de red (las respuestas lentas las detecta el propio breaker)
+        started = time.monotonic()
+        try:
+            return fn(*args, **kwargs)
+        except HTTPResponseError as e:
+            error = e
+            call_failed = e.status >= 500
+            ambiguous = e.status in policy.ambiguous_statuses
+            retryable = e.status in policy.retryable_statuses or (ambiguous and dedupe_lookup is not None)
+            if e.status in (429, 503):
+                retry_after = _retry_after_seconds(e)
+            reason = f"Notion respondió {e.status}"
+            rate_limited = e.status == 429 and retry_after is not None
+        except _NOT_SENT_ERRORS as e:
+            error = e
+            call_failed = True
+            ambiguous = False
+            retryable = True
+            reason = f"No se pudo conectar con Notion ({type(e).__name__})"
+            rate_limited = False
+        except (RequestTimeoutError, httpx.TransportError) as e:
+            error = e
+            call_failed = True
+            ambiguous = not policy.retry_transport_errors
+            retryable = not ambiguous or dedupe_lookup is not None
+            reason = f"Error de red con Notion ({type(e).__name__})"
+            rate_limited = False
+        finally:
+            if breaker is not None:
+                breaker.record(call_failed, time.monotonic() - started)
+
+        # Solo se llega aquí tras una excepción de la API o de red
+        delay = retry_after if retry_after is not None else min(max_delay, base_delay * (2 ** attempt)) * random.uniform(0.5, 1.5)
+        if not retryable or attempt >= max_retries or slept + delay > sleep_budget:
+            _record(operation, failures=1)
+            if retryable:
+                logger.warning(f"{reason} en {operation}; sin más reintentos ({attempt}/{max_retries}, {slept:.2f}s de espera acumulada).")
+            raise error
+
+        attempt += 1
+        slept += delay
+        _record(operation, retries=1, sleep_seconds=delay)
+        if rate_limited:
+            # Pausar el bucket frena a todos los hilos; el siguiente acquire() ya espera el Retry-After.
+            limiter.pause(retry_after)
+            logger.warning(f"{reason} en {operation}; reintento {attempt}/{max_retries} tras Retry-After de {retry_after:.2f}s.")
+        else:
+            logger.warning(f"{reason} en {operation}; reintento {attempt}/{max_retries} en {delay:.2f}s.")
+            time.sleep(delay)
+
+        if ambiguous:
+            # La escritura anterior pudo haberse aplicado: buscarla por su clave antes de repetirla
+            existing = dedupe_lookup()
+            if existing is not None:
+                _record(operation, deduplicated=1)
+                logger.warning(f"{operation}: la escritura anterior sí se aplicó en Notion ({existing.get('id')}); no se repite.")
+                return existing
+
+
+def call_notion(fn: Callable, *args, **kwargs) -> Any:
+    """
+    Ejecuta una lectura o una actualización idempotente (pages.update) bajo el limitador de tasa compartido.
+    Reintenta 429 y 503 (respetando Retry-After), 5xx y errores de red con backoff exponencial con jitter,
+    hasta NOTION_MAX_RETRIES veces. Si se agotan los reintentos, propaga la última excepción.
+    """
+    return _call_with_policy(fn, args, kwargs, READ_POLICY)
+
+
+def call_notion_write(fn: Callable, *args, dedupe_lookup: Optional[Callable[[], Optional[Dict]]] = None, **kwargs) -> Any:
+    """
+    Variante de call_notion para escrituras no idempotentes (pages.create). Reintenta 429 y los errores de conexión,
+    que Notion no llegó a procesar. Un 5xx o un timeout pudo haber creado la página: sin dedupe_lookup se propaga;
+    con dedupe_lookup (función que busca la página por su clave de deduplicación y la retorna, o None) se consulta
+    antes de cada reintento y, si la página ya existe, se retorna en lugar de crearla otra vez.
+    """
+    return _call_with_policy(fn, args, kwargs, CREATE_POLICY, dedupe_lookup=dedupe_lookup)
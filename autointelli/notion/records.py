@@ -0,0 +1,196 @@
+# autointelli/notion/records.py
+# Registro compacto de una solicitud de material (SolicitudRecord, con __slots__) para los dashboards.
+# En lugar de pasar a Jinja la página completa de Notion (propiedades anidadas, arreglos rich_text con anotaciones),
+# cada página se convierte en un registro plano con solo los campos que se muestran o agrupan.
+# El extractor se compila una vez por esquema de base de datos (ver notion/schema_cache.py): para cada
+# propiedad NOTION_PROP_* se elige de antemano el lector según su tipo, y se recompila si el esquema cambia.
+
+import logging
+import threading
+from typing import Optional, Dict, List, Tuple, Callable, Iterable, Any
+
+from notion_client import Client
+
+from .constants import (
+    NOTION_PROP_FOLIO, NOTION_PROP_SOLICITANTE, NOTION_PROP_FECHA_SOLICITUD, NOTION_PROP_ESTATUS,
+    NOTION_PROP_PROVEEDOR, NOTION_PROP_DEPARTAMENTO, NOTION_PROP_URGENTE, NOTION_PROP_CANTIDAD,
+    NOTION_PROP_UNIDAD_MEDIDA, NOTION_PROP_NOMBRE_MATERIAL, NOTION_PROP_TORNI_DESCRIPTION,
+    NOTION_PROP_MATERIALES_PROYECTO_RELATION, NOTION_PROP_MATERIALES_PROYECTO,
+)
+from .mirror import normalize_notion_id
+from .utils import get_database_properties_util
+
+logger = logging.getLogger(__name__)
+
+
+class SolicitudRecord:
+    """Solicitud de material lista para mostrar. Los campos sin valor en Notion quedan en None (relaciones: tupla vacía)."""
+
+    __slots__ = (
+        'id', 'url', 'created_time', 'last_edited_time',
+        'folio', 'solicitante', 'fecha_solicitud', 'estatus', 'proveedor', 'departamento',
+        'cantidad', 'unidad', 'material', 'descripcion', 'urgente',
+        'partida_ids', 'proyecto_ids',
+        'partida_codes', 'project_code', # Códigos resueltos (o leídos como texto), los llena quien consume el registro
+    )
+
+    def __init__(self, page_id: Optional[str], url: Optional[str] = None):
+        self.id = page_id
+        self.url = url
+        self.created_time = None
+        self.last_edited_time = None
+        self.folio = None
+        self.solicitante = None
+        self.fecha_solicitud = None
+        self.estatus = None
+        self.proveedor = None
+        self.departamento = None
+        self.cantidad = None
+        self.unidad = None
+        self.material = None
+        self.descripcion = None
+        self.urgente = None
+        self.partida_ids = ()
+        self.proyecto_ids = ()
+        self.partida_codes = ()
+        self.project_code = None
+
+    @property
+    def fecha_solicitud_dia(self) -> Optional[str]:
+        """Fecha de solicitud sin la parte de hora (AAAA-MM-DD)."""
+        return self.fecha_solicitud.split('T')[0] if self.fecha_solicitud else None
+
+    def __repr__(self):
+        return f"<SolicitudRecord {self.id} folio={self.folio!r} estatus={self.estatus!r}>"
+
+
+# (atributo del registro, nombre de la propiedad en Notion)
+_FIELDS: Tuple[Tuple[str, str], ...] = (
+    ('folio', NOTION_PROP_FOLIO),
+    ('solicitante', NOTION_PROP_SOLICITANTE),
+    ('fecha_solicitud', NOTION_PROP_FECHA_SOLICITUD),
+    ('estatus', NOTION_PROP_ESTATUS),
+    ('proveedor', NOTION_PROP_PROVEEDOR),
+    ('departamento', NOTION_PROP_DEPARTAMENTO),
+    ('cantidad', NOTION_PROP_CANTIDAD),
+    ('unidad', NOTION_PROP_UNIDAD_MEDIDA),
+    ('material', NOTION_PROP_NOMBRE_MATERIAL),
+    ('descripcion', NOTION_PROP_TORNI_DESCRIPTION),
+    ('urgente', NOTION_PROP_URGENTE),
+    ('partida_ids', NOTION_PROP_MATERIALES_PROYECTO_RELATION),
+    ('proyecto_ids', NOTION_PROP_MATERIALES_PROYECTO),
+)
+
+_TEXT_TYPES = ('rich_text', 'title')
+
+
+# --- Lectores por tipo de propiedad ---
+
+def _read_text(prop: Dict) -> Optional[str]:
+    parts = prop.get(prop.get('type')) or []
+    text = "".join([part.get('plain_text') or part.get('text', {}).get('content', '') for part in parts])
+    return text or None
+
+
+def _read_select(prop: Dict) -> Optional[str]:
+    return (prop.get(prop.get('type')) or {}).get('name') # select y status tienen la misma forma
+
+
+def _read_multi_select(prop: Dict) -> Optional[str]:
+    names = [option.get('name') for option in prop.get('multi_select') or [] if option.get('name')]
+    return ", ".join(names) or None
+
+
+def _read_number(prop: Dict) -> Any:
+    return prop.get('number')
+
+
+def _read_checkbox(prop: Dict) -> Optional[bool]:
+    return prop.get('checkbox')
+
+
+def _read_date(prop: Dict) -> Optional[str]:
+    return (prop.get('date') or {}).get('start')
+
+
+def _read_relation(prop: Dict) -> Tuple[str, ...]:
+    return tuple(rel.get('id') for rel in prop.get('relation') or [] if rel.get('id'))
+
+
+_READERS: Dict[str, Callable[[Dict], Any]] = {
+    'rich_text': _read_text,
+    'title': _read_text,
+    'select': _read_select,
+    'status': _read_select,
+    'multi_select': _read_multi_select,
+    'number': _read_number,
+    'checkbox': _read_checkbox,
+    'date': _read_date,
+    'relation': _read_relation,
+}
+
+
+def _read_any(prop: Dict) -> Any:
+    """Lector para propiedades que no están en el esquema: decide por el tipo de cada página."""
+    reader = _READERS.get(prop.get('type'))
+    return reader(prop) if reader else None
+
+
+# --- Extractor compilado por esquema ---
+
+# database_id normalizado -> (firma del esquema, extractor)
+_extractors: Dict[str, Tuple[tuple, Callable[[Dict], SolicitudRecord]]] = {}
+_lock = threading.Lock()
+
+
+def _compile_extractor(properties: Dict[str, Dict]) -> Callable[[Dict], SolicitudRecord]:
+    plan = []
+    for slot, prop_name in _FIELDS:
+        prop_type = properties.get(prop_name, {}).get('type')
+        if slot == 'proyecto_ids' and prop_type in _TEXT_TYPES:
+            slot = 'project_code' # Bases donde el proyecto se captura como texto en lugar de relación
+        plan.append((slot, prop_name, _READERS.get(prop_type, _read_any)))
+    plan = tuple(plan)
+
+    def extract(page: Dict) -> SolicitudRecord:
+        record = SolicitudRecord(page.get('id'), page.get('url'))
+        record.created_time = page.get('created_time')
+        record.last_edited_time = page.get('last_edited_time')
+        page_properties = page.get('properties') or {}
+        for slot, prop_name, reader in plan:
+            prop = page_properties.get(prop_name)
+            if prop:
+                value = reader(prop)
+                if value is not None:
+                    setattr(record, slot, value)
+        return record
+
+    return extract
+
+
+def get_solicitud_extractor(notion_client: Client, database_id: str) -> Callable[[Dict], SolicitudRecord]:
+    """
+    Devuelve el extractor página -> SolicitudRecord para la base de datos indicada.
+    Se compila con el esquema en caché y solo se recompila si cambian los tipos de las propiedades usadas.
+    Si no se puede obtener el esquema, cada propiedad se lee según el tipo que trae la página.
+    """
+    properties = get_database_properties_util(notion_client, database_id) if notion_client and database_id else {}
+    signature = tuple((prop_name, properties.get(prop_name, {}).get('type')) for _, prop_name in _FIELDS)
+    key = normalize_notion_id(database_id or "")
+
+    with _lock:
+        cached = _extractors.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+    extractor = _compile_extractor(properties)
+    with _lock:
+        _extractors[key] = (signature, extractor)
+    logger.debug(f"Extractor de solicitudes compilado para la base de datos {database_id}.")
+    return extractor
+
+
+def to_solicitud_records(notion_client: Client, database_id: str, pages: Iterable[Dict]) -> List[SolicitudRecord]:
+    """Convierte páginas (p. ej. de iter_pages) a registros; cada página se descarta en cuanto se convierte."""
+    extract = get_solicitud_extractor(notion_client, database_id)
+    return [extract(page) for page in pages]
@@ -0,0 +1,112 @@
+# autointelli/notion/relations.py
+# Resolución en lote de relaciones de Notion (ID de página relacionada -> código/título).
+# En lugar de un pages.retrieve por relación y por registro (N+1), se juntan todos los IDs, se eliminan
+# duplicados, se consultan solo los que no están en caché y en paralelo bajo el limitador de tasa compartido.
+# El caché id -> código es por proceso y dura NOTION_RELATION_CACHE_TTL_SECONDS.
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Iterable, Any
+
+from flask import current_app, has_app_context
+from notion_client import Client
+
+from .mirror import normalize_notion_id
+from .rate_limit import call_notion
+from .schema_cache import property_projection
+
+logger = logging.getLogger(__name__)
+
+# (property_name, page_id normalizado) -> (instante de obtención (monotonic), código o None si la página no lo tiene)
+_title_cache: Dict[tuple, tuple] = {}
+_lock = threading.Lock()
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def extract_text_property(page: Dict, property_name: str) -> Optional[str]:
+    """Concatena el texto de una propiedad rich_text/title de una página. None si no existe o es de otro tipo."""
+    prop = (page or {}).get('properties', {}).get(property_name)
+    if not prop or prop.get('type') not in ('rich_text', 'title'):
+        return None
+    return "".join([text_part.get('text', {}).get('content', '') for text_part in prop.get(prop.get('type'), [])])
+
+
+def relation_ids(page: Dict, property_name: str) -> List[str]:
+    """Devuelve los IDs de una propiedad relation de una página (lista vacía si no aplica)."""
+    prop = (page or {}).get('properties', {}).get(property_name)
+    if not prop or prop.get('type') != 'relation' or not prop.get('relation'):
+        return []
+    return [rel.get('id') for rel in prop.get('relation') if rel.get('id')]
+
+
+def fetch_pages_by_ids(notion_client: Client, page_ids: Iterable[str], max_workers: int = None, filter_properties: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+    """
+    Obtiene páginas por ID en paralelo (sin duplicados). Retorna {page_id: página o None si falló}.
+    Las llamadas pasan por call_notion (límite de tasa y reintentos compartidos).
+    filter_properties (IDs de propiedad) limita las propiedades devueltas en cada página.
+    """
+    unique_ids = list(dict.fromkeys(page_id for page_id in page_ids if page_id))
+    if not unique_ids:
+        return {}
+
+    app = current_app._get_current_object() if has_app_context() else None
+    if max_workers is None:
+        max_workers = _config('NOTION_BULK_MAX_WORKERS', 4)
+    max_workers = max(1, min(max_workers, len(unique_ids)))
+    retrieve_args = {"filter_properties": filter_properties} if filter_properties else {}
+
+    def _fetch_one(page_id: str) -> Optional[Dict]:
+        try:
+            if app is not None:
+                with app.app_context():
+                    return call_notion(notion_client.pages.retrieve, page_id=page_id, **retrieve_args)
+            return call_notion(notion_client.pages.retrieve, page_id=page_id, **retrieve_args)
+        except Exception as e:
+            logger.error(f"Error al obtener la página relacionada {page_id}: {e}", exc_info=True)
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notion-relations") as executor:
+        return dict(zip(unique_ids, executor.map(_fetch_one, unique_ids)))
+
+
+def resolve_relation_titles(notion_client: Client, page_ids: Iterable[str], property_name: str, database_id: Optional[str] = None) -> Dict[str, Optional[str]]:
+    """
+    Resuelve el código (propiedad rich_text/title 'property_name') de cada página relacionada.
+    Usa el caché del proceso y solo consulta a Notion los IDs faltantes o vencidos.
+    Con database_id (la base de las páginas relacionadas) cada pages.retrieve pide solo 'property_name'.
+    Retorna {page_id: código}; el código es None si la página no tiene la propiedad y no hay entrada si falló la consulta.
+    """
+    ttl_seconds = _config('NOTION_RELATION_CACHE_TTL_SECONDS', 600)
+    now = time.monotonic()
+    resolved: Dict[str, Optional[str]] = {}
+    missing: List[str] = []
+
+    with _lock:
+        for page_id in dict.fromkeys(page_ids):
+            if not page_id:
+                continue
+            entry = _title_cache.get((property_name, normalize_notion_id(page_id)))
+            if entry is not None and now - entry[0] < ttl_seconds:
+                resolved[page_id] = entry[1]
+            else:
+                missing.append(page_id)
+
+    if missing:
+        logger.info(f"Resolviendo {len(missing)} relaciones '{property_name}' desde Notion ({len(resolved)} desde caché).")
+        filter_properties = property_projection(notion_client, database_id, [property_name]) if database_id else None
+        fetched = fetch_pages_by_ids(notion_client, missing, filter_properties=filter_properties)
+        with _lock:
+            for page_id, page in fetched.items():
+                if page is None:
+                    continue # No se cachean los fallos; se reintentará en la siguiente solicitud
+                code = extract_text_property(page, property_name)
+                _title_cache[(property_name, normalize_notion_id(page_id))] = (time.monotonic(), code)
+                resolved[page_id] = code
+
+    return resolved
+
@@ -0,0 +1,137 @@
+# autointelli/notion/schema_cache.py
+# Caché compartido del esquema de bases de datos de Notion (respuesta de databases.retrieve).
+# Cada proceso guarda el esquema en memoria con un TTL (NOTION_SCHEMA_TTL_SECONDS).
+# La invalidación es versionada: invalidate_database_schema incrementa la versión de la base en la tabla
+# notion_schema_version, y cada worker compara esa versión (como mucho cada NOTION_SCHEMA_VERSION_CHECK_SECONDS)
+# para descartar su copia local aunque el TTL no haya vencido.
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Tuple, Iterable
+
+from flask import current_app, has_app_context
+from notion_client import Client
+from sqlalchemy import select
+
+from ..models import db, NotionSchemaVersion
+from .mirror import normalize_notion_id
+from .rate_limit import call_notion
+
+logger = logging.getLogger(__name__)
+
+# database_id normalizado -> (instante de obtención (monotonic), versión con la que se obtuvo, objeto database de Notion)
+_schema_cache: Dict[str, Tuple[float, int, Dict]] = {}
+# Últimas versiones conocidas de la tabla notion_schema_version
+_known_versions: Dict[str, int] = {}
+_versions_checked_at: Optional[float] = None
+_lock = threading.Lock()
+
+# Contadores para diagnóstico
+schema_cache_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+def _refresh_known_versions(force: bool = False) -> None:
+    """Relee las versiones de esquema publicadas por otros workers, como mucho una vez por intervalo."""
+    global _versions_checked_at
+    if not has_app_context():
+        return
+    now = time.monotonic()
+    check_interval = _config('NOTION_SCHEMA_VERSION_CHECK_SECONDS', 30)
+    if not force and _versions_checked_at is not None and now - _versions_checked_at < check_interval:
+        return
+    _versions_checked_at = now
+    try:
+        rows = db.session.execute(select(NotionSchemaVersion.database_id, NotionSchemaVersion.version)).all()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"No se pudieron leer las versiones de esquema de Notion: {e}")
+        return
+    with _lock:
+        for database_id, version in rows:
+            _known_versions[database_id] = version
+
+
+def get_database_schema(notion_client: Client, database_id: str, force_refresh: bool = False) -> Dict:
+    """
+    Devuelve el objeto database de Notion (incluye 'properties') desde el caché si está vigente.
+    Si no, llama a databases.retrieve y lo guarda. Propaga las excepciones de la API.
+    """
+    key = normalize_notion_id(database_id)
+    _refresh_known_versions()
+    ttl_seconds = _config('NOTION_SCHEMA_TTL_SECONDS', 600)
+
+    with _lock:
+        current_version = _known_versions.get(key, 0)
+        entry = _schema_cache.get(key)
+        if entry is not None and not force_refresh:
+            fetched_at, version, database_info = entry
+            if version >= current_version and time.monotonic() - fetched_at < ttl_seconds:
+                schema_cache_stats["hits"] += 1
+                return database_info
+
+    schema_cache_stats["misses"] += 1
+    database_info = call_notion(notion_client.databases.retrieve, database_id)
+    with _lock:
+        _schema_cache[key] = (time.monotonic(), current_version, database_info)
+    logger.debug(f"Esquema de la base de datos {database_id} cargado desde Notion (versión {current_version}).")
+    return database_info
+
+
+def property_projection(notion_client: Client, database_id: str, property_names: Iterable[str]) -> Optional[List[str]]:
+    """
+    Traduce nombres de propiedad a los IDs que espera filter_properties (databases.query / pages.retrieve),
+    con el esquema en caché. Retorna None (sin proyección: páginas completas) si el esquema no está disponible
+    o ninguna propiedad existe; los nombres que no están en el esquema se omiten.
+    """
+    try:
+        properties = get_database_schema(notion_client, database_id).get('properties', {})
+    except Exception as e:
+        logger.warning(f"No se pudo obtener el esquema de {database_id} para proyectar propiedades; se piden páginas completas: {e}")
+        return None
+    property_ids = []
+    for name in dict.fromkeys(property_names):
+        property_id = properties.get(name, {}).get('id')
+        if property_id:
+            property_ids.append(property_id)
+        else:
+            logger.debug(f"Propiedad '{name}' no encontrada en el esquema de {database_id}; se omite de la proyección.")
+    return property_ids or None
+
+
+def invalidate_database_schema(database_id: Optional[str] = None, reason: str = "") -> None:
+    """
+    Invalida el esquema en caché de una base de datos (o de todas si database_id es None) en este proceso,
+    y publica una nueva versión para que los demás workers también lo descarten.
+    """
+    with _lock:
+        if database_id is None:
+            keys = set(_schema_cache.keys()) | set(_known_versions.keys())
+            _schema_cache.clear()
+        else:
+            keys = {normalize_notion_id(database_id)}
+            _schema_cache.pop(normalize_notion_id(database_id), None)
+    schema_cache_stats["invalidations"] += 1
+    logger.info(f"Esquema de Notion invalidado para {database_id or 'todas las bases de datos'}{f' ({reason})' if reason else ''}.")
+
+    if not has_app_context() or not keys:
+        return
+    try:
+        for key in keys:
+            row = db.session.get(NotionSchemaVersion, key)
+            if row is None:
+                row = NotionSchemaVersion(database_id=key, version=0)
+                db.session.add(row)
+            row.version = (row.version or 0) + 1
+            row.updated_at = datetime.utcnow()
+            with _lock:
+                _known_versions[key] = row.version
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error al publicar la nueva versión de esquema para {database_id or 'todas las bases de datos'}: {e}", exc_info=True)
@@ -0,0 +1,184 @@
+# autointelli/notion/sync.py
+# Sincronización incremental de bases de datos de Notion hacia el espejo local (notion/mirror.py).
+# En lugar de re-paginar la base completa, se consulta con un filtro last_edited_time 'on_or_after'
+# a partir del watermark guardado por base de datos y solo se hace upsert de las páginas que cambiaron.
+#
+# Se puede ejecutar como comando CLI (flask notion-sync) o como hilo en segundo plano dentro
+# del proceso web (NOTION_SYNC_INTERVAL_SECONDS > 0, ver start_background_workers).
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Optional, Dict, List
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .utils import _query_all_pages_live, refresh_partida_index_in_background
+from .mirror import store_database_snapshot, upsert_pages, get_sync_watermark, mark_synced
+
+logger = logging.getLogger(__name__)
+
+# Claves de configuración de las bases de datos que se sincronizan.
+SYNC_DATABASE_CONFIG_KEYS = (
+    'DATABASE_ID_MATERIALES_DB1',
+    'DATABASE_ID_MATERIALES_DB2',
+    'DATABASE_ID_PARTIDAS',
+    'DATABASE_ID_PROYECTOS',
+    'DATABASE_ID_PLANES',
+)
+
+# Contadores del último ciclo por base de datos (para diagnóstico desde el shell o los logs).
+last_cycle_stats: Dict[str, "SyncStats"] = {}
+
+_worker_thread: Optional[threading.Thread] = None
+_worker_lock = threading.Lock()
+
+
+class SyncStats:
+    """Contadores de un ciclo de sincronización para una base de datos."""
+
+    def __init__(self, config_key: str, database_id: str, full: bool):
+        self.config_key = config_key
+        self.database_id = database_id
+        self.full = full
+        self.rows_fetched = 0
+        self.rows_changed = 0
+        self.duration_seconds = 0.0
+        self.error: Optional[str] = None
+
+    def __repr__(self):
+        mode = "completa" if self.full else "incremental"
+        status = f"error: {self.error}" if self.error else "ok"
+        return f"<SyncStats {self.config_key} ({mode}) obtenidas={self.rows_fetched} cambiadas={self.rows_changed} {self.duration_seconds:.2f}s {status}>"
+
+
+def sync_database(notion_client, config_key: str, database_id: str, full: bool = False) -> SyncStats:
+    """
+    Sincroniza una base de datos hacia el espejo local.
+    Si no hay watermark (primera vez) o full=True, se hace una carga completa; si no, solo el delta.
+    """
+    watermark = None if full else get_sync_watermark(database_id)
+    stats = SyncStats(config_key, database_id, full=watermark is None)
+    started = time.monotonic()
+
+    try:
+        if watermark is None:
+            pages = _query_all_pages_live(notion_client, database_id)
+            stats.rows_fetched = len(pages)
+            stats.rows_changed = len(pages)
+            store_database_snapshot(database_id, pages)
+        else:
+            # last_edited_time de Notion tiene resolución de minutos: 'on_or_after' vuelve a traer el último minuto,
+            # y upsert_pages descarta las páginas que no cambiaron.
+            delta_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": watermark}}
+            pages = _query_all_pages_live(notion_client, database_id, delta_filter)
+            stats.rows_fetched = len(pages)
+            stats.rows_changed = upsert_pages(database_id, pages)
+            new_watermark = max((page.get("last_edited_time") or "" for page in pages), default="") or watermark
+            mark_synced(database_id, new_watermark)
+    except Exception as e:
+        stats.error = str(e)
+        logger.error(f"Error al sincronizar {config_key} ({database_id}): {e}", exc_info=True)
+
+    stats.duration_seconds = time.monotonic() - started
+    last_cycle_stats[config_key] = stats
+    return stats
+
+
+def sync_configured_databases(app, full: bool = False, only_key: Optional[str] = None) -> List[SyncStats]:
+    """Ejecuta un ciclo de sincronización sobre todas las bases configuradas. Requiere contexto de aplicación."""
+    notion_client = app.notion_client
+    if notion_client is None:
+        logger.warning("Sincronización omitida: Cliente de Notion no inicializado.")
+        return []
+
+    results = []
+    for config_key in SYNC_DATABASE_CONFIG_KEYS:
+        if only_key and config_key != only_key:
+            continue
+        database_id = app.config.get(config_key)
+        if not database_id:
+            continue
+        stats = sync_database(notion_client, config_key, database_id, full=full)
+        logger.info(f"Sincronización: {stats}")
+        results.append(stats)
+    return results
+
+
+def _worker_loop(app, interval_seconds: int, full_every: int):
+    cycle = 0
+    while True:
+        # Cada NOTION_SYNC_FULL_EVERY ciclos se fuerza una carga completa para reflejar páginas eliminadas
+        # o archivadas, que la consulta incremental no puede ver.
+        full = full_every > 0 and cycle > 0 and cycle % full_every == 0
+        try:
+            with app.app_context():
+                results = sync_configured_databases(app, full=full)
+            fetched = sum(stats.rows_fetched for stats in results)
+            changed = sum(stats.rows_changed for stats in results)
+            logger.info(f"Ciclo de sincronización {cycle} completado: {fetched} filas obtenidas, {changed} filas cambiadas.")
+        except Exception as e:
+            logger.error(f"Error inesperado en el ciclo de sincronización {cycle}: {e}", exc_info=True)
+        cycle += 1
+        time.sleep(interval_seconds)
+
+
+def start_sync_worker(app) -> Optional[threading.Thread]:
+    """
+    Inicia el hilo de sincronización en segundo plano si NOTION_SYNC_INTERVAL_SECONDS > 0.
+    Con varios workers de gunicorn cada proceso tendría su propio hilo; en ese caso es preferible
+    dejarlo desactivado y ejecutar 'flask notion-sync' desde un cron o un único proceso.
+    """
+    global _worker_thread
+    interval_seconds = app.config.get('NOTION_SYNC_INTERVAL_SECONDS', 0)
+    if not interval_seconds or interval_seconds <= 0:
+        return None
+
+    with _worker_lock:
+        if _worker_thread is not None and _worker_thread.is_alive():
+            return _worker_thread
+        _worker_thread = threading.Thread(
+            target=_worker_loop,
+            args=(app, interval_seconds, app.config.get('NOTION_SYNC_FULL_EVERY', 0)),
+            name="notion-sync",
+            daemon=True,
+        )
+        _worker_thread.start()
+        logger.info(f"Hilo de sincronización de Notion iniciado (cada {interval_seconds}s).")
+        return _worker_thread
+
+
+def prewarm_partida_index(app) -> Optional[threading.Thread]:
+    """Carga el índice en memoria de partidas en segundo plano, para que el primer envío no pague la carga completa."""
+    database_id_partidas = app.config.get('DATABASE_ID_PARTIDAS')
+    if app.notion_client is None or not database_id_partidas:
+        return None
+
+    # Primera carga completa, en el mismo hilo único por base que usan los refrescos de find_partida_by_id
+    return refresh_partida_index_in_background(app, app.notion_client, database_id_partidas)
+
+
+@click.command('notion-sync')
+@click.option('--full', is_flag=True, help='Fuerza una carga completa en lugar de la sincronización incremental.')
+@click.option('--database', 'only_key', type=click.Choice(SYNC_DATABASE_CONFIG_KEYS), default=None, help='Sincroniza solo esta base de datos.')
+@click.option('--loop', 'loop_seconds', type=int, default=0, help='Repite la sincronización cada N segundos (0 = una sola vez).')
+@with_appcontext
+def notion_sync_command(full, only_key, loop_seconds):
+    """Sincroniza las bases de datos de Notion configuradas hacia el espejo local."""
+    app = current_app._get_current_object()
+    while True:
+        started_at = datetime.utcnow()
+        results = sync_configured_databases(app, full=full, only_key=only_key)
+        for stats in results:
+            click.echo(f"{stats.config_key}: {'completa' if stats.full else 'incremental'}, "
+                       f"{stats.rows_fetched} filas obtenidas, {stats.rows_changed} filas cambiadas, "
+                       f"{stats.duration_seconds:.2f}s" + (f" ERROR: {stats.error}" if stats.error else ""))
+        click.echo(f"Ciclo iniciado {started_at.isoformat()}Z: {sum(s.rows_fetched for s in results)} obtenidas, "
+                   f"{sum(s.rows_changed for s in results)} cambiadas.")
+        if loop_seconds <= 0:
+            break
+        full = False # Solo el primer ciclo respeta --full
+        time.sleep(loop_seconds)
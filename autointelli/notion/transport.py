@@ -0,0 +1,128 @@
+# autointelli/notion/transport.py
+# Construcción del cliente de Notion con un transporte HTTP configurable (ver create_app).
+# notion_client.Client crea por defecto un httpx.Client con timeout único de 60 s y conexiones ociosas que
+# caducan a los 5 s, así que tras cualquier pausa corta cada llamada vuelve a pagar DNS + TCP + TLS.
+# Aquí se fijan el tamaño del pool, el keep-alive, timeouts separados de conexión y lectura y, opcionalmente, HTTP/2.
+#
+# Estrategias (NOTION_CLIENT_STRATEGY):
+# - 'shared' (por defecto): un único Client por proceso. httpx.Client es seguro entre hilos, así que los hilos
+#   de un worker gthread de gunicorn comparten el pool de conexiones.
+# - 'per_thread': un Client (y su pool) por hilo, creado la primera vez que el hilo lo usa.
+#
+# El calentamiento lo lanza start_background_workers en cada worker de gunicorn (post_worker_init), no create_app,
+# así que los workers no heredan sockets abiertos por el proceso maestro con 'gunicorn --preload'.
+
+import importlib.util
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Callable, Mapping, Any
+
+import httpx
+from notion_client import Client
+
+from .rate_limit import call_notion
+
+logger = logging.getLogger(__name__)
+
+CLIENT_STRATEGY_SHARED = 'shared'
+CLIENT_STRATEGY_PER_THREAD = 'per_thread'
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec('h2') is not None
+
+
+def _build_http_client(config: Mapping[str, Any]) -> httpx.Client:
+    pool_size = max(1, int(config.get('NOTION_HTTP_POOL_SIZE', 10)))
+    http2 = bool(config.get('NOTION_HTTP2', False))
+    if http2 and not _http2_available():
+        logger.warning("NOTION_HTTP2 está activo pero el paquete 'h2' no está instalado (pip install httpx[http2]); se usará HTTP/1.1.")
+        http2 = False
+
+    return httpx.Client(
+        limits=httpx.Limits(
+            max_connections=pool_size,
+            max_keepalive_connections=pool_size,
+            keepalive_expiry=float(config.get('NOTION_HTTP_KEEPALIVE_SECONDS', 120)),
+        ),
+        http2=http2,
+    )
+
+
+def _build_timeout(config: Mapping[str, Any]) -> httpx.Timeout:
+    read_timeout = float(config.get('NOTION_HTTP_READ_TIMEOUT_SECONDS', 30))
+    return httpx.Timeout(
+        read_timeout,
+        connect=float(config.get('NOTION_HTTP_CONNECT_TIMEOUT_SECONDS', 5)),
+        pool=read_timeout, # Espera por una conexión libre cuando el pool está lleno
+    )
+
+
+def _build_client(auth: str, config: Mapping[str, Any], base_url: Optional[str] = None) -> Client:
+    options = {"auth": auth}
+    if base_url:
+        options["base_url"] = base_url
+    notion_client = Client(client=_build_http_client(config), **options)
+    # Client reemplaza el timeout del httpx.Client por uno único (timeout_ms); se aplican después los timeouts separados.
+    notion_client.client.timeout = _build_timeout(config)
+    return notion_client
+
+
+class ThreadLocalNotionClient:
+    """Expone la misma interfaz que notion_client.Client, pero cada hilo usa su propio Client y pool de conexiones."""
+
+    def __init__(self, factory: Callable[[], Client]):
+        self._factory = factory
+        self._local = threading.local()
+
+    def _get_client(self) -> Client:
+        notion_client = getattr(self._local, 'client', None)
+        if notion_client is None:
+            notion_client = self._local.client = self._factory()
+        return notion_client
+
+    def __getattr__(self, name: str) -> Any:
+        # Solo se llama para atributos que no existen en el proxy (databases, pages, users, client, ...)
+        return getattr(self._get_client(), name)
+
+
+def build_notion_client(auth: str, config: Mapping[str, Any], base_url: Optional[str] = None) -> Any:
+    """
+    Crea el cliente de Notion según la configuración NOTION_HTTP_* / NOTION_CLIENT_STRATEGY.
+    Retorna un notion_client.Client ('shared') o un ThreadLocalNotionClient ('per_thread').
+    """
+    strategy = (config.get('NOTION_CLIENT_STRATEGY') or CLIENT_STRATEGY_SHARED).strip().lower()
+    if strategy == CLIENT_STRATEGY_PER_THREAD:
+        return ThreadLocalNotionClient(lambda: _build_client(auth, config, base_url))
+    if strategy != CLIENT_STRATEGY_SHARED:
+        logger.warning(f"NOTION_CLIENT_STRATEGY '{strategy}' no reconocida; se usará '{CLIENT_STRATEGY_SHARED}'.")
+    return _build_client(auth, config, base_url)
+
+
+def warm_up_notion_client(app) -> Optional[threading.Thread]:
+    """
+    Abre en segundo plano NOTION_HTTP_WARMUP_CONNECTIONS conexiones del pool compartido (una llamada users.me por conexión),
+    para que las primeras solicitudes no paguen DNS + TLS. Con 'per_thread' no aplica: cada hilo abre las suyas.
+    """
+    notion_client = app.notion_client
+    if not isinstance(notion_client, Client):
+        return None
+    connections = max(1, min(app.config.get('NOTION_HTTP_WARMUP_CONNECTIONS', 2), app.config.get('NOTION_HTTP_POOL_SIZE', 10)))
+
+    def _warm_one(_):
+        with app.app_context():
+            call_notion(notion_client.users.me)
+
+    def _warm_up():
+        try:
+            # Llamadas concurrentes: cada una toma una conexión distinta del pool y queda abierta (keep-alive)
+            with ThreadPoolExecutor(max_workers=connections, thread_name_prefix="notion-warmup") as executor:
+                list(executor.map(_warm_one, range(connections)))
+            logger.info(f"Conexiones con Notion precalentadas: {connections}.")
+        except Exception as e:
+            logger.warning(f"No se pudieron precalentar las conexiones con Notion: {e}")
+
+    thread = threading.Thread(target=_warm_up, name="notion-http-warmup", daemon=True)
+    thread.start()
+    return thread
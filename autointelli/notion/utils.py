@@ -2,23 +2,35 @@ import logging
 import requests # Aunque get_pages_with_filter_util no usa requests directamente, notion_client lo hace. Mantenerlo por si acaso.
 from datetime import datetime, timedelta # Aunque estas utils no los usan directamente, podrían ser útiles aquí.
 from notion_client import Client
-from notion_client.errors import APIResponseError
-from typing import Optional, Dict, List, Tuple, Any, Union
-from autointelli.notion.constants import NOTION_PROP_MATERIALES_PROYECTO_RELATION, NOTION_PROP_PARTIDA_BUSQUEDA_ID # Importar constantes
+from notion_client.errors import APIResponseError, APIErrorCode
+from typing import Optional, Dict, List, Tuple, Any, Union, Iterator, Sequence
+from autointelli.notion.constants import NOTION_PROP_MATERIALES_PROYECTO_RELATION, NOTION_PROP_PARTIDA_BUSQUEDA_ID, PROJECTION_PARTIDA_LOOKUP # Importar constantes
+from flask import current_app, has_app_context, g
+from autointelli.notion.mirror import (
+    normalize_notion_id, get_mirror_mode, read_mirror, read_through_mirror, store_database_snapshot, record_page_write,
+    MIRROR_MODE_MIRROR_FIRST, MIRROR_MODE_NOTION_FIRST,
+)
+from autointelli.notion.schema_cache import get_database_schema, invalidate_database_schema, property_projection
+from autointelli.notion.rate_limit import call_notion, call_notion_write
+from autointelli.notion.circuit_breaker import NotionUnavailableError
+from autointelli.notion.partida_index import (
+    lookup_partida, claim_refresh, release_refresh, get_partida_watermark, load_partida_pages, remember_partida, PARTIDA_NOT_FOUND,
+)
 import json
+import threading
 import traceback # Aunque estas utils no usan traceback, se mantuvo en el original. Puede que no sea estrictamente necesario aquí, pero no hace daño.
 
 logger = logging.getLogger(__name__)
 
 # --- Funciones Auxiliares Generales ---
 
-def get_database_properties_util(notion_client: Client, database_id: str) -> Dict[str, Dict]:
-    """Obtiene el diccionario de propiedades de una base de datos de Notion."""
+def get_database_properties_util(notion_client: Client, database_id: str, force_refresh: bool = False) -> Dict[str, Dict]:
+    """Obtiene el diccionario de propiedades de una base de datos de Notion (desde el caché de esquemas si está vigente)."""
     if not notion_client or not database_id:
         logger.error("Cliente de Notion o Database ID faltante para obtener propiedades.")
         return {}
     try:
-        database_info = notion_client.databases.retrieve(database_id)
+        database_info = get_database_schema(notion_client, database_id, force_refresh=force_refresh)
         properties = database_info.get("properties", {})
         # logger.debug(f"Propiedades obtenidas de la base de datos {database_id}: {', '.join(properties.keys())}") # Demasiado verbose, descomentar solo para depuración intensa.
         return properties
@@ -60,64 +72,355 @@ def create_filter_condition_util(property_name: str, property_type: str, value:
          return {}
 
 
-def get_pages_with_filter_util(notion_client: Client, database_id: str, filters: List[Dict] = None, page_size: int = 100) -> List[Dict]:
-    """Ejecuta una consulta filtrada a una base de datos de Notion."""
+def _combine_filters(filters: Optional[List[Dict]]) -> Optional[Dict]:
+    """Combina una lista de condiciones en el objeto 'filter' de la API (un 'and' si hay más de una)."""
+    if not filters:
+        return None
+    if len(filters) == 1:
+        return filters[0]
+    # Usar filtro 'and' para combinar múltiples condiciones si hay más de una
+    return { "and": filters }
+
+
+# --- Coalescencia de consultas idénticas concurrentes (singleflight) ---
+# Al inicio de turno varios usuarios abren el mismo dashboard a la vez y cada hilo pediría el mismo databases.query.
+# Cada llamada a databases.query en vivo se identifica por (base de datos, filtro canónico, sorts, cursor, page_size,
+# filter_properties): si ya hay una idéntica en curso, las demás esperan y reciben su mismo resultado.
+# El resultado se comparte entre hilos: los consumidores no deben modificar las páginas devueltas.
+
+class _InFlightQuery:
+    __slots__ = ("done", "result", "error", "followers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+        self.followers = 0
+
+
+_inflight_queries: Dict[tuple, _InFlightQuery] = {}
+_inflight_lock = threading.Lock()
+coalescing_stats = {"leaders": 0, "followers": 0} # Consultas enviadas a Notion / consultas servidas por una en curso
+
+
+def _canonical_filter(value: Any) -> Any:
+    """Forma canónica de un filtro: claves ordenadas y condiciones de 'and'/'or' sin importar el orden."""
+    if isinstance(value, dict):
+        canonical = {}
+        for key, item in value.items():
+            if key in ("and", "or") and isinstance(item, list):
+                canonical[key] = sorted((_canonical_filter(condition) for condition in item), key=lambda c: json.dumps(c, sort_keys=True))
+            else:
+                canonical[key] = _canonical_filter(item)
+        return canonical
+    if isinstance(value, list):
+        return [_canonical_filter(item) for item in value]
+    return value
+
+
+def _query_coalescing_key(query_args: Dict) -> tuple:
+    return (
+        normalize_notion_id(query_args["database_id"]),
+        json.dumps(_canonical_filter(query_args.get("filter")), sort_keys=True, ensure_ascii=False),
+        json.dumps(query_args.get("sorts"), sort_keys=True, ensure_ascii=False),
+        query_args.get("start_cursor"),
+        query_args.get("page_size"),
+        tuple(query_args.get("filter_properties") or ()),
+    )
+
+
+def _coalesced_database_query(notion_client: Client, query_args: Dict) -> Dict:
+    """databases.query compartido entre llamadas idénticas concurrentes (NOTION_QUERY_COALESCING)."""
+    if not (current_app.config.get('NOTION_QUERY_COALESCING', True) if has_app_context() else True):
+        return call_notion(notion_client.databases.query, **query_args)
+
+    key = _query_coalescing_key(query_args)
+    with _inflight_lock:
+        call = _inflight_queries.get(key)
+        leader = call is None
+        if leader:
+            call = _inflight_queries[key] = _InFlightQuery()
+            coalescing_stats["leaders"] += 1
+        else:
+            call.followers += 1
+            coalescing_stats["followers"] += 1
+
+    if not leader:
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = call_notion(notion_client.databases.query, **query_args) # Los seguidores esperan también los reintentos
+        return call.result
+    except BaseException as e:
+        call.error = e
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight_queries.pop(key, None)
+        call.done.set()
+        if call.followers:
+            logger.debug(f"Consulta a DB {query_args['database_id']} compartida con {call.followers} solicitudes concurrentes.")
+
+
+def _iter_pages_live(notion_client: Client, database_id: str, filter_arg: Optional[Dict] = None, page_size: int = 100, filter_properties: Optional[List[str]] = None, max_pages: Optional[int] = None, sorts: Optional[List[Dict]] = None) -> Iterator[Dict]:
+    """
+    Pagina databases.query en vivo y entrega las páginas a medida que llega cada cursor. Propaga las excepciones de la API.
+    filter_properties (IDs de propiedad) limita las propiedades devueltas en cada página.
+    Cada cursor pasa por la coalescencia de consultas: varios hilos con la misma consulta comparten la llamada.
+    Con max_pages se deja de pedir cursores al alcanzar el límite; si el consumidor deja de iterar, no se piden más.
+    """
+    has_more = True
+    start_cursor = None
+    yielded = 0
+
+    query_args = {
+        "database_id": database_id,
+        "page_size": page_size,
+    }
+    if filter_arg is not None:
+         query_args["filter"] = filter_arg
+         # logger.debug(f"Filtros aplicados a consulta Notion para {database_id}: {json.dumps(filter_arg, ensure_ascii=False)}") # Demasiado verbose
+    if filter_properties:
+         query_args["filter_properties"] = filter_properties
+    if sorts:
+         query_args["sorts"] = sorts
+
+    while has_more:
+        if max_pages is not None:
+            remaining = max_pages - yielded
+            if remaining <= 0:
+                break
+            query_args["page_size"] = min(page_size, remaining) # No descargar más páginas de las que se van a entregar
+        if start_cursor:
+            query_args["start_cursor"] = start_cursor
+
+        # El cliente Python de Notion ya devuelve el diccionario, no necesitas response.json()
+        data = _coalesced_database_query(notion_client, query_args)
+
+        has_more = data.get("has_more", False)
+        start_cursor = data.get("next_cursor")
+
+        for page in data.get("results", []):
+            yield page
+            yielded += 1
+
+        # logger.debug(f"Obtenidas {len(results)} páginas con filtros de {database_id}. Total acumulado: {yielded}") # Demasiado verbose
+
+
+def _query_all_pages_live(notion_client: Client, database_id: str, filter_arg: Optional[Dict] = None, page_size: int = 100, filter_properties: Optional[List[str]] = None, sorts: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Pagina databases.query en vivo hasta agotar los cursores. Propaga las excepciones de la API.
+    filter_properties (IDs de propiedad) limita las propiedades devueltas en cada página.
+    """
+    return list(_iter_pages_live(notion_client, database_id, filter_arg, page_size, filter_properties, sorts=sorts))
+
+
+def notion_query_failed() -> bool:
+    """True si en el contexto actual (la solicitud en curso) falló alguna consulta en vivo a una base de datos."""
+    return has_app_context() and g.get('notion_query_failed', False)
+
+
+def _log_query_error(database_id: str, filter_arg: Optional[Dict], e: Exception) -> None:
+    """Registra un error de consulta a una base de datos e invalida el esquema en caché si Notion rechazó el filtro."""
+    if has_app_context():
+        g.notion_query_failed = True # Las vistas lo usan para no guardar ni mostrar como vigente un resultado vacío
+    if isinstance(e, NotionUnavailableError):
+        logger.warning(f"Consulta a DB {database_id} omitida: {e}")
+        return
+    if not isinstance(e, APIResponseError):
+        logger.error(f"Error inesperado al obtener páginas de Notion con filtros de {database_id}: {str(e)}", exc_info=True)
+        return
+
+    logger.error(f"Error API al consultar base de datos {database_id}: Código={e.code if hasattr(e, 'code') else 'N/A'} Mensaje={e.message if hasattr(e, 'message') else str(e)}", exc_info=True)
+    if filter_arg is not None and getattr(e, 'code', None) == APIErrorCode.ValidationError:
+        # Un filtro rechazado suele indicar una propiedad renombrada o eliminada: el esquema en caché ya no es válido.
+        invalidate_database_schema(database_id, reason="filtro rechazado por validation_error")
+    notion_response_body = getattr(e, 'response', None)
+    # Intenta obtener el cuerpo JSON del error si está disponible en el objeto de respuesta
+    if notion_response_body is not None and hasattr(notion_response_body, 'json'):
+         try: logger.error(f"Detalles adicionales del error de Notion (Consulta DB {database_id}): {json.dumps(notion_response_body.json(), ensure_ascii=False)}")
+         except Exception: pass # No fallar si no se puede parsear el JSON del error
+
+
+def get_pages_with_filter_util(notion_client: Client, database_id: str, filters: List[Dict] = None, page_size: int = 100, properties: Optional[Sequence[str]] = None) -> List[Dict]:
+    """
+    Ejecuta una consulta filtrada a una base de datos de Notion.
+    Según NOTION_MIRROR_MODE, la consulta puede resolverse desde el espejo local (ver notion/mirror.py).
+    Para recorrer bases grandes sin acumular todas las páginas en memoria, usar iter_pages.
+    properties (nombres, p. ej. PROJECTION_* de notion/constants.py) limita las propiedades que devuelve Notion;
+    las páginas del espejo vienen completas.
+    """
     if not notion_client or not database_id:
         logger.error("Cliente de Notion o Database ID faltante para obtener páginas con filtro.")
         return []
+
+    filter_arg = _combine_filters(filters)
+    mirror_mode = get_mirror_mode()
+
+    if mirror_mode == MIRROR_MODE_MIRROR_FIRST:
+        mirrored_pages = read_through_mirror(
+            database_id,
+            filter_arg,
+            lambda: _query_all_pages_live(notion_client, database_id) # Recarga completa sin filtro para el espejo
+        )
+        if mirrored_pages is not None:
+            logger.info(f"Consulta a DB {database_id} resuelta desde el espejo local. Total de páginas encontradas: {len(mirrored_pages)}")
+            return mirrored_pages
+
+    filter_properties = property_projection(notion_client, database_id, properties) if properties else None
     all_pages = []
-    has_more = True
-    start_cursor = None
+    live_query_failed = False
+    try:
+        all_pages = _query_all_pages_live(notion_client, database_id, filter_arg, page_size, filter_properties)
+    except Exception as e:
+        live_query_failed = True
+        _log_query_error(database_id, filter_arg, e)
+
+    if mirror_mode == MIRROR_MODE_NOTION_FIRST:
+        if live_query_failed:
+            # Notion no respondió: usar el espejo aunque esté vencido, si puede evaluar el filtro.
+            mirrored_pages = read_mirror(database_id, filter_arg, allow_stale=True)
+            if mirrored_pages is not None:
+                logger.warning(f"Consulta a DB {database_id} falló en Notion; se responde desde el espejo local ({len(mirrored_pages)} páginas).")
+                return mirrored_pages
+        elif filter_arg is None and not filter_properties:
+            # Una consulta sin filtro ni proyección es una copia completa: se aprovecha para refrescar el espejo.
+            store_database_snapshot(database_id, all_pages)
 
+    logger.info(f"Consulta a DB {database_id} completada. Total de páginas encontradas: {len(all_pages)}")
+    return all_pages
+
+
+def iter_pages(notion_client: Client, database_id: str, filters: List[Dict] = None, page_size: int = 100, max_pages: Optional[int] = None, properties: Optional[Sequence[str]] = None, sorts: Optional[List[Dict]] = None) -> Iterator[Dict]:
+    """
+    Variante en streaming de get_pages_with_filter_util: entrega las páginas a medida que llega cada cursor,
+    sin acumularlas. Se puede cortar en cualquier momento (break) y max_pages limita el total entregado.
+
+    Mismos modos del espejo que get_pages_with_filter_util, con dos diferencias:
+    - Un fallo antes de la primera página se registra y termina la iteración (o usa el espejo en 'notion_first');
+      un fallo a mitad de la consulta se propaga, porque el consumidor ya procesó resultados parciales.
+    - Una consulta sin filtro no refresca el espejo (eso exigiría acumular todas las páginas).
+    properties limita las propiedades devueltas, como en get_pages_with_filter_util.
+    sorts (formato de databases.query) fija el orden en vivo; con un orden estable (p. ej. created_time) los cursores
+    no dependen de las propiedades filtradas. El espejo entrega una instantánea completa, sin cursores.
+    """
+    if not notion_client or not database_id:
+        logger.error("Cliente de Notion o Database ID faltante para obtener páginas con filtro.")
+        return
+
+    filter_arg = _combine_filters(filters)
+    mirror_mode = get_mirror_mode()
+
+    if mirror_mode == MIRROR_MODE_MIRROR_FIRST:
+        mirrored_pages = read_through_mirror(
+            database_id,
+            filter_arg,
+            lambda: _query_all_pages_live(notion_client, database_id) # Recarga completa sin filtro para el espejo
+        )
+        if mirrored_pages is not None:
+            logger.info(f"Consulta a DB {database_id} resuelta desde el espejo local. Total de páginas encontradas: {len(mirrored_pages)}")
+            yield from (mirrored_pages if max_pages is None else mirrored_pages[:max_pages])
+            return
+
+    filter_properties = property_projection(notion_client, database_id, properties) if properties else None
+    yielded = 0
     try:
-        query_args = {
-            "database_id": database_id,
-            "page_size": page_size,
-        }
+        for page in _iter_pages_live(notion_client, database_id, filter_arg, page_size, filter_properties, max_pages=max_pages, sorts=sorts):
+            yield page
+            yielded += 1
+    except Exception as e:
+        _log_query_error(database_id, filter_arg, e)
+        if yielded:
+            raise
+        if mirror_mode == MIRROR_MODE_NOTION_FIRST:
+            # Notion no respondió: usar el espejo aunque esté vencido, si puede evaluar el filtro.
+            mirrored_pages = read_mirror(database_id, filter_arg, allow_stale=True)
+            if mirrored_pages is not None:
+                logger.warning(f"Consulta a DB {database_id} falló en Notion; se responde desde el espejo local ({len(mirrored_pages)} páginas).")
+                yield from (mirrored_pages if max_pages is None else mirrored_pages[:max_pages])
+        return
+
+    logger.info(f"Consulta a DB {database_id} completada (streaming). Total de páginas entregadas: {yielded}")
 
-        filter_arg = None
-        if filters and len(filters) > 0:
-            if len(filters) == 1:
-                filter_arg = filters[0]
-            else:
-                # Usar filtro 'and' para combinar múltiples condiciones si hay más de una
-                filter_arg = { "and": filters }
 
-        if filter_arg is not None:
-             query_args["filter"] = filter_arg
-             # logger.debug(f"Filtros aplicados a consulta Notion para {database_id}: {json.dumps(filter_arg, ensure_ascii=False)}") # Demasiado verbose
+# Prefijo de los cursores de paginación servidos desde el espejo (los de Notion son UUID, sin prefijo).
+MIRROR_CURSOR_PREFIX = "m:"
 
 
-        while has_more:
-            if start_cursor:
-                query_args["start_cursor"] = start_cursor
+def _mirror_keyset(page: Dict) -> str:
+    return f"{page.get('created_time') or ''}|{page.get('id') or ''}"
 
-            response = notion_client.databases.query(**query_args)
 
-            # El cliente Python de Notion ya devuelve el diccionario, no necesitas response.json()
-            data = response
+def _slice_mirrored_pages(pages: List[Dict], page_size: int, cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+    """Ventana de páginas del espejo con cursor keyset (created_time, id), de la más reciente a la más antigua."""
+    ordered = sorted(pages, key=_mirror_keyset, reverse=True)
+    if cursor:
+        last_key = cursor[len(MIRROR_CURSOR_PREFIX):]
+        ordered = [page for page in ordered if _mirror_keyset(page) < last_key]
+    window = ordered[:page_size]
+    next_cursor = MIRROR_CURSOR_PREFIX + _mirror_keyset(window[-1]) if len(ordered) > page_size else None
+    return window, next_cursor
 
-            results = data.get("results", [])
-            all_pages.extend(results)
 
-            has_more = data.get("has_more", False)
-            start_cursor = data.get("next_cursor")
+def get_pages_slice_util(notion_client: Client, database_id: str, filters: List[Dict] = None, page_size: int = 50, cursor: Optional[str] = None, properties: Optional[Sequence[str]] = None) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Obtiene una sola ventana de resultados de una consulta filtrada, para paginar en el servidor.
+    Retorna (páginas, next_cursor); next_cursor es None en la última ventana.
+    En vivo es un solo databases.query con start_cursor (cursor de Notion). Si la consulta se resuelve desde
+    el espejo (NOTION_MIRROR_MODE), el cursor es un keyset con prefijo MIRROR_CURSOR_PREFIX.
+    Un cursor que no corresponde a la fuente actual (p. ej. el espejo dejó de estar disponible) reinicia en la primera ventana.
+    properties limita las propiedades devueltas, como en get_pages_with_filter_util.
+    """
+    if not notion_client or not database_id:
+        logger.error("Cliente de Notion o Database ID faltante para obtener páginas con filtro.")
+        return [], None
 
-            # logger.debug(f"Obtenidas {len(results)} páginas con filtros de {database_id}. Total acumulado: {len(all_pages)}") # Demasiado verbose
+    filter_arg = _combine_filters(filters)
+    mirror_mode = get_mirror_mode()
+    mirror_cursor = bool(cursor) and cursor.startswith(MIRROR_CURSOR_PREFIX)
 
-    except APIResponseError as e:
-        logger.error(f"Error API al consultar base de datos {database_id}: Código={e.code if hasattr(e, 'code') else 'N/A'} Mensaje={e.message if hasattr(e, 'message') else str(e)}", exc_info=True)
-        notion_response_body = getattr(e, 'response', None)
-        # Intenta obtener el cuerpo JSON del error si está disponible en el objeto de respuesta
-        if notion_response_body is not None and hasattr(notion_response_body, 'json'):
-             try: logger.error(f"Detalles adicionales del error de Notion (Consulta DB {database_id}): {json.dumps(notion_response_body.json(), ensure_ascii=False)}")
-             except Exception: pass # No fallar si no se puede parsear el JSON del error
+    if mirror_mode == MIRROR_MODE_MIRROR_FIRST and (cursor is None or mirror_cursor):
+        mirrored_pages = read_through_mirror(
+            database_id,
+            filter_arg,
+            lambda: _query_all_pages_live(notion_client, database_id) # Recarga completa sin filtro para el espejo
+        )
+        if mirrored_pages is not None:
+            return _slice_mirrored_pages(mirrored_pages, page_size, cursor)
+
+    if mirror_cursor:
+        mirrored_pages = read_mirror(database_id, filter_arg, allow_stale=True)
+        if mirrored_pages is not None:
+            return _slice_mirrored_pages(mirrored_pages, page_size, cursor)
+        logger.warning(f"Cursor del espejo para DB {database_id} ya no es utilizable; se reinicia la paginación.")
+        cursor = None
+
+    query_args = {"database_id": database_id, "page_size": page_size}
+    if filter_arg is not None:
+        query_args["filter"] = filter_arg
+    if cursor:
+        query_args["start_cursor"] = cursor
+    filter_properties = property_projection(notion_client, database_id, properties) if properties else None
+    if filter_properties:
+        query_args["filter_properties"] = filter_properties
 
+    try:
+        data = _coalesced_database_query(notion_client, query_args)
     except Exception as e:
-        logger.error(f"Error inesperado al obtener páginas de Notion con filtros de {database_id}: {str(e)}", exc_info=True)
+        _log_query_error(database_id, filter_arg, e)
+        if mirror_mode == MIRROR_MODE_NOTION_FIRST and cursor is None:
+            # Notion no respondió: usar el espejo aunque esté vencido, si puede evaluar el filtro.
+            mirrored_pages = read_mirror(database_id, filter_arg, allow_stale=True)
+            if mirrored_pages is not None:
+                logger.warning(f"Consulta a DB {database_id} falló en Notion; se responde desde el espejo local ({len(mirrored_pages)} páginas).")
+                return _slice_mirrored_pages(mirrored_pages, page_size, None)
+        return [], None
+
+    return data.get("results", []), data.get("next_cursor") if data.get("has_more") else None
 
-    logger.info(f"Consulta a DB {database_id} completada. Total de páginas encontradas: {len(all_pages)}")
-    return all_pages
 
 def update_notion_page_properties(notion_client: Client, page_id: str, properties_to_update: Dict) -> Tuple[int, Dict]:
     if not notion_client or not page_id or not properties_to_update:
@@ -126,8 +429,10 @@ def update_notion_page_properties(notion_client: Client, page_id: str, propertie
 
     try:
         # logger.debug(f"Intentando actualizar propiedades para página {page_id}: {properties_to_update}") # Muy verbose, descomentar con cuidado.
-        response = notion_client.pages.update(page_id=page_id, properties=properties_to_update)
+        # Limitador de tasa compartido + reintentos de 429/5xx/timeouts (ver notion/rate_limit.py)
+        response = call_notion(notion_client.pages.update, page_id=page_id, properties=properties_to_update)
         logger.info(f"Página {page_id} actualizada correctamente.")
+        record_page_write(response) # Mantener el espejo local al día con la escritura
         # En caso de éxito, el cliente Notion no devuelve un status_code directo en el objeto response,
         # pero la actualización fue exitosa, que corresponde a un 2xx. Asumimos 200.
         return 200, response
@@ -151,6 +456,54 @@ def update_notion_page_properties(notion_client: Client, page_id: str, propertie
         logger.error(f"Error inesperado al actualizar página {page_id}: {str(e)}", exc_info=True)
         return 500, {"error": f"Error interno del servidor: {str(e)}"}
     
+def find_page_by_dedupe_key(notion_client: Client, database_id: str, dedupe_property: str, dedupe_value: str) -> Optional[Dict]:
+    """
+    Página de la base cuya propiedad de texto (title o rich_text) 'dedupe_property' es exactamente 'dedupe_value'.
+    None si no existe o si la propiedad no es de texto en el esquema. Propaga las excepciones de la API.
+    """
+    property_type = get_database_properties_util(notion_client, database_id).get(dedupe_property, {}).get('type')
+    if property_type not in ('title', 'rich_text'):
+        return None
+    lookup_filter = {"property": dedupe_property, property_type: {"equals": dedupe_value}}
+    results = call_notion(notion_client.databases.query, database_id=database_id, filter=lookup_filter, page_size=1).get("results")
+    return results[0] if results else None
+
+
+def create_page_util(notion_client: Client, database_id: str, properties: Dict, dedupe_property: Optional[str] = None,
+                     dedupe_value: Optional[str] = None, lookup_first: bool = False) -> Dict:
+    """
+    Crea una página en la base de datos con call_notion_write y la refleja en el espejo. Propaga las excepciones de la API.
+    Si 'dedupe_property' es una propiedad de texto (title o rich_text) del esquema, 'dedupe_value' es la clave de
+    deduplicación: se escribe en esa propiedad (si 'properties' no la trae ya) y, ante un 5xx o timeout ambiguo, se
+    busca la página por esa clave antes de reintentar. Con lookup_first se busca también antes del primer intento
+    (reintentos de una creación cuyo resultado se desconoce). Sin clave utilizable, esos errores no se reintentan.
+    """
+    dedupe_lookup = None
+    if dedupe_property and dedupe_value:
+        property_type = get_database_properties_util(notion_client, database_id).get(dedupe_property, {}).get('type')
+        if property_type in ('title', 'rich_text'):
+            if dedupe_property not in properties:
+                properties = {**properties, dedupe_property: {property_type: [{"text": {"content": dedupe_value}}]}}
+            lookup_filter = {"property": dedupe_property, property_type: {"equals": dedupe_value}}
+
+            def _lookup_existing() -> Optional[Dict]:
+                results = call_notion(notion_client.databases.query, database_id=database_id, filter=lookup_filter, page_size=1).get("results")
+                return results[0] if results else None
+            dedupe_lookup = _lookup_existing
+        else:
+            logger.debug(f"Propiedad de deduplicación '{dedupe_property}' no disponible en {database_id}; la creación no se reintenta ante errores ambiguos.")
+
+    if lookup_first and dedupe_lookup is not None:
+        existing = dedupe_lookup()
+        if existing is not None:
+            logger.warning(f"La página con clave '{dedupe_value}' ya existe en {database_id} ({existing.get('id')}); no se vuelve a crear.")
+            return existing
+
+    response = call_notion_write(notion_client.pages.create, parent={"database_id": database_id}, properties=properties, dedupe_lookup=dedupe_lookup)
+    record_page_write(response) # Mantener el espejo local al día con la escritura
+    return response
+
+
 def list_available_properties(notion_client: Client, database_id: str) -> List[Dict[str, str]]:
     """
     Lista las propiedades disponibles (nombre, tipo, id) de una base de datos dada.
@@ -213,46 +566,72 @@ def build_filter_from_properties_util(notion_client: Client, database_id: str, p
     return filters
 
 
-def find_partida_by_id(notion_client: Client, database_id_partidas: str, partida_id: str) -> Optional[Dict]:
+def refresh_partida_index_util(notion_client: Client, database_id_partidas: str, full: bool = False) -> None:
     """
-    Busca una página en la base de datos de Partidas por su 'ID de partida'.
-    Retorna la primera página encontrada o None.
+    Carga (full=True o primera vez) o actualiza de forma incremental el índice en memoria de partidas
+    (ver notion/partida_index.py). Propaga las excepciones de la API.
     """
-    if not notion_client or not database_id_partidas or not partida_id:
-        logger.error("Cliente de Notion, Database ID de Partidas o ID de partida faltante para la búsqueda.")
-        return None
+    watermark = None if full else get_partida_watermark(database_id_partidas)
+    # El índice solo usa el código de partida (más id, archived y last_edited_time, que siempre vienen)
+    filter_properties = property_projection(notion_client, database_id_partidas, PROJECTION_PARTIDA_LOOKUP)
+    if watermark is None:
+        pages = _query_all_pages_live(notion_client, database_id_partidas, filter_properties=filter_properties)
+        load_partida_pages(database_id_partidas, pages, full=True)
+    else:
+        delta_filter = {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": watermark}}
+        pages = _query_all_pages_live(notion_client, database_id_partidas, delta_filter, filter_properties=filter_properties)
+        load_partida_pages(database_id_partidas, pages, full=False)
 
-    logger.debug(f"find_partida_by_id: Buscando partida con ID: '{partida_id}'")
-    logger.info(f"Buscando Partida con ID '{partida_id}' en la base de datos '{database_id_partidas}'.")
 
-    # Definir el nombre de la propiedad en Notion que contiene el ID de partida
-    # Asumimos que la propiedad se llama exactamente 'ID de partida' y es de tipo texto o similar.
-    partida_id_property_name = 'ID de partida'
+def refresh_partida_index_in_background(app, notion_client: Client, database_id_partidas: str) -> Optional[threading.Thread]:
+    """
+    Si el índice de partidas está vencido y nadie lo está refrescando, lanza el refresco (completo o incremental) en un
+    hilo y retorna el hilo; si no, None. Las búsquedas siguen usando el índice actual mientras tanto.
+    """
+    refresh_kind = claim_refresh(database_id_partidas)
+    if not refresh_kind:
+        return None
 
-    # Crear el filtro para buscar la propiedad 'ID de partida' igual al valor proporcionado
-    # Necesitamos obtener el tipo de propiedad real de Notion para usar create_filter_condition_util
-    # O crear el filtro directamente si asumimos que es texto (rich_text/title)
-    # Opción simple: asumir que es rich_text/title y usar 'equals'
-    # Consideramos 'rich_text' o 'title' ya que 'ID de partida' suele ser un identificador único.
-    # Usaremos 'rich_text' con 'equals' para coincidencia exacta.
-    filters = [{ "property": partida_id_property_name, "rich_text": { "equals": partida_id.strip() } }]
+    def _refresh():
+        ok = False
+        try:
+            with app.app_context():
+                refresh_partida_index_util(notion_client, database_id_partidas, full=(refresh_kind == 'full'))
+            ok = True
+        except Exception as e:
+            logger.warning(f"No se pudo refrescar el índice de partidas ({refresh_kind}): {e}. Se usará la búsqueda en Notion.")
+        finally:
+            release_refresh(database_id_partidas, ok)
 
-    # Ejecutar la consulta con el filtro
-    found_pages = get_pages_with_filter_util(notion_client, database_id_partidas, filters=filters, page_size=1) # Solo necesitamos 1 resultado
+    thread = threading.Thread(target=_refresh, name="notion-partida-index", daemon=True)
+    thread.start()
+    return thread
 
-    # Retornar la primera página encontrada o None
-    return found_pages[0] if found_pages else None
 
 # Función actualizada para retornar solo el ID de la página
 def find_partida_by_id(notion_client: Client, database_id_partidas: str, partida_id: str) -> Optional[str]:
     """
     Busca una página en la base de datos de Partidas por su 'ID de partida'.
     Retorna el ID de la primera página encontrada (como string) o None.
+    Primero consulta el índice en memoria de partidas; solo va a Notion si el código no está indexado.
     """
     if not notion_client or not database_id_partidas or not partida_id:
         logger.error("Cliente de Notion, Database ID de Partidas o ID de partida faltante para la búsqueda.")
         return None
 
+    # 1. Índice en memoria; si está vencido se refresca en segundo plano y esta búsqueda usa el índice actual
+    if has_app_context():
+        refresh_partida_index_in_background(current_app._get_current_object(), notion_client, database_id_partidas)
+
+    indexed = lookup_partida(database_id_partidas, partida_id)
+    if indexed is PARTIDA_NOT_FOUND:
+        logger.warning(f"Partida con ID '{partida_id}' no encontrada (caché negativo).")
+        return None
+    if indexed:
+        logger.info(f"Partida con ID '{partida_id}' resuelta desde el índice en memoria: {indexed}")
+        return indexed
+
+    # 2. Búsqueda en vivo en Notion
     logger.info(f"Buscando Partida con ID '{partida_id}' en la base de datos '{database_id_partidas}'.")
 
     # Definir el nombre de la propiedad en Notion que contiene el ID de partida
@@ -266,16 +645,18 @@ def find_partida_by_id(notion_client: Client, database_id_partidas: str, partida
 
     # Ejecutar la consulta con el filtro
     logger.debug(f"find_partida_by_id: Filtro construido: {json.dumps(filters, ensure_ascii=False)}")
-    found_pages = get_pages_with_filter_util(notion_client, database_id_partidas, filters=filters, page_size=1) # Solo necesitamos 1 resultado
+    found_pages = get_pages_with_filter_util(notion_client, database_id_partidas, filters=filters, page_size=1, properties=PROJECTION_PARTIDA_LOOKUP) # Solo necesitamos 1 resultado y su ID
 
     # Si se encontró una página, extrae su ID y retornalo como string.
     logger.debug(f"find_partida_by_id: Páginas encontradas: {len(found_pages)}")
     # Si no se encontró ninguna página, found_pages estará vacío y retornamos None.
     if found_pages and isinstance(found_pages, list) and len(found_pages) > 0:
         # La respuesta de la API para una página en found_pages[0] es un diccionario con la clave 'id'
+        remember_partida(database_id_partidas, partida_id, found_pages[0].get("id"))
         return found_pages[0].get("id") # Extrae el ID como string
     else:
         logger.warning(f"No se encontró ninguna página en la base de datos de Partidas con ID '{partida_id}'.")
+        remember_partida(database_id_partidas, partida_id, None) # Caché negativo de corta duración
         return None
 
 def submit_request_for_material_logic(
@@ -427,7 +808,7 @@ def submit_request_for_material_logic(
         # Debes ajustar el nombre de la propiedad 'title' ('Name' por defecto en Notion a veces) si es diferente.
         properties_db1["Name"] = {"title": [{"text": {"content": f"{folio_solicitud} - {nombre_material}"}}]} # Asumir 'Name' es el campo title
 
-        response_db1 = notion_client.pages.create(parent={"database_id": database_id_db1}, properties=properties_db1)
+        response_db1 = call_notion_write(notion_client.pages.create, parent={"database_id": database_id_db1}, properties=properties_db1)
         url_db1 = response_db1.get("url")
         logger.info(f"Página creada exitosamente en DB1. Folio: {folio_solicitud}. URL: {url_db1}")
 
@@ -458,7 +839,7 @@ def submit_request_for_material_logic(
         # Asegurarse de que el campo 'title' también se llame 'Name' o ajustar.
         properties_db2["Name"] = {"title": [{"text": {"content": f"{folio_solicitud} - {nombre_material}"}}]} # Asumir 'Name' es el campo title
 
-        response_db2 = notion_client.pages.create(parent={"database_id": database_id_db2}, properties=properties_db2)
+        response_db2 = call_notion_write(notion_client.pages.create, parent={"database_id": database_id_db2}, properties=properties_db2)
         url_db2 = response_db2.get("url")
         logger.info(f"Página creada exitosamente en DB2. Folio: {folio_solicitud}. URL: {url_db2}")
 
@@ -522,11 +903,13 @@ def find_page_id_by_property_value(notion_client, database_id, property_name, pr
         return None
 
     try:
-        # Realizar la consulta a la base de datos
-        response = notion_client.databases.query(
-            database_id=database_id,
-            filter=filter_condition
-        )
+        # Realizar la consulta a la base de datos: solo interesa el ID de la primera página,
+        # así que se pide un resultado y únicamente la propiedad buscada (filter_properties)
+        query_args = {"database_id": database_id, "filter": filter_condition, "page_size": 1}
+        filter_properties = property_projection(notion_client, database_id, [property_name])
+        if filter_properties:
+            query_args["filter_properties"] = filter_properties
+        response = call_notion(notion_client.databases.query, **query_args)
 
         # Si se encontraron resultados, devolver el ID de la primera página
         if response and response.get('results'):
@@ -538,6 +921,8 @@ def find_page_id_by_property_value(notion_client, database_id, property_name, pr
 
     except Exception as e:
         logger.error(f"Error al buscar página por propiedad '{property_name}' con valor '{property_value}' en base de datos '{database_id}': {e}", exc_info=True)
+        if isinstance(e, APIResponseError) and e.code == APIErrorCode.ValidationError:
+            invalidate_database_schema(database_id, reason=f"filtro por '{property_name}' rechazado por validation_error")
         return None
 
 
@@ -4,81 +4,150 @@
 # NO debe tener un bloque __main__.
 
 import logging
+from .notion.partida_index import register_partida_page # Hace disponibles las partidas nuevas en el índice en memoria
+from .notion.catalog import register_project_page # Añade los proyectos nuevos al catálogo en caché
+from .notion.constants import NOTION_TITLE_PROPERTY_ID, NOTION_PROP_PARTIDA_BUSQUEDA_ID, PROJECTION_PARTIDA_LOOKUP
+from .notion.rate_limit import call_notion # Límite de tasa y reintentos compartidos
+from .notion.relations import extract_text_property
+from .notion.utils import create_page_util, find_page_by_dedupe_key, get_pages_with_filter_util, notion_query_failed # Creación con reintentos deduplicados por el título
 # No importar notion_client ni os ni dotenv aquí globalmente.
 # from notion_client import Client # No inicializar aquí
 # import os # No leer variables de entorno aquí
 
 logger = logging.getLogger("nuevos_registros_notion")
 
-def crear_proyecto(notion_client, database_id_proyectos, nombre_proyecto):
+def crear_proyecto_page(notion_client, database_id_proyectos, nombre_proyecto):
     """
-    Crea una nueva página de proyecto en la base de datos de Proyectos
-    usando un cliente de Notion proporcionado.
+    Crea (o reutiliza, si ya existe con ese título) la página del proyecto. Retorna (respuesta completa de Notion,
+    reutilizada), para que quien la llame tome el título de ahí sin volver a leer la página y sepa si el proyecto ya
+    existía. (None, False) si falla.
     """
     if not notion_client or not database_id_proyectos or not nombre_proyecto:
         logger.error("Faltan argumentos para crear_proyecto.")
-        return None
+        return None, False
 
     try:
-        response = notion_client.pages.create(
-            parent={"database_id": database_id_proyectos},
-            properties={
+        # El título del proyecto es único: sirve de clave para no duplicar el proyecto si se reenvía el formulario
+        existing = find_page_by_dedupe_key(notion_client, database_id_proyectos, "ID del proyecto", nombre_proyecto)
+        if existing is not None:
+            register_project_page(existing)
+            logger.info(f"Proyecto '{nombre_proyecto}' ya existía en Notion con ID: {existing['id']}; se reutiliza.")
+            return existing, True
+        response = create_page_util(
+            notion_client,
+            database_id_proyectos,
+            {
                 "ID del proyecto": {"title": [{"text": {"content": nombre_proyecto}}]},
                 # ... (añade más propiedades aquí si tu base de datos de Proyectos tiene más campos)
                 # Asegúrate de que las keys coincidan exactamente con los nombres de las propiedades en Notion
-            }
+            },
+            dedupe_property="ID del proyecto",
+            dedupe_value=nombre_proyecto,
         )
+        register_project_page(response)
         logger.info(f"Proyecto '{nombre_proyecto}' creado en Notion con ID: {response['id']}")
-        return response['id']
+        return response, False
     except Exception as e:
         logger.error(f"Error al crear el proyecto '{nombre_proyecto}': {e}", exc_info=True)
+        return None, False
+
+def crear_proyecto(notion_client, database_id_proyectos, nombre_proyecto):
+    """
+    Crea una nueva página de proyecto en la base de datos de Proyectos
+    usando un cliente de Notion proporcionado. Retorna el ID de la página o None.
+    """
+    response, _ = crear_proyecto_page(notion_client, database_id_proyectos, nombre_proyecto)
+    return response['id'] if response else None
+
+def titulo_proyecto(proyecto_page):
+    """Título ('ID del proyecto') de una página de proyecto, p. ej. la respuesta de pages.create. None si no lo trae."""
+    title_prop = (proyecto_page or {}).get('properties', {}).get('ID del proyecto', {})
+    if title_prop.get('type') == 'title' and title_prop.get('title'):
+        return "".join(part.get('plain_text') or part.get('text', {}).get('content', '') for part in title_prop['title']) or None
+    return None
+
+def nombres_partidas(proyecto_nombre, num_partidas):
+    """
+    Títulos de las partidas de un proyecto ('<proyecto>-00.00', '<proyecto>-01.00', ...).
+    Son deterministas: sirven de clave de deduplicación al crear cada partida.
+    """
+    return [f"{proyecto_nombre}-{i:02d}.00" for i in range(num_partidas)]
+
+def partidas_existentes(notion_client, database_id_partidas, proyecto_id):
+    """
+    Partidas ya relacionadas con el proyecto: {título: page_id}. Una sola consulta (o el espejo local) en lugar de
+    buscar cada partida por separado. None si la consulta falló y no se sabe cuáles existen.
+    """
+    pages = get_pages_with_filter_util(
+        notion_client,
+        database_id_partidas,
+        [{"property": "Proyectos", "relation": {"contains": proyecto_id}}],
+        properties=PROJECTION_PARTIDA_LOOKUP,
+    )
+    if notion_query_failed():
         return None
+    return {extract_text_property(page, NOTION_PROP_PARTIDA_BUSQUEDA_ID): page['id'] for page in pages}
+
+def crear_partida(notion_client, database_id_partidas, proyecto_id, nombre_partida, lookup_first=False):
+    """
+    Crea una partida relacionada con el proyecto. El título es la clave de deduplicación: ante un error ambiguo (o
+    antes del primer intento con lookup_first) se busca la partida por su título y se reutiliza si ya existe.
+    Retorna la respuesta de Notion. Propaga las excepciones de la API.
+    """
+    response = create_page_util(
+        notion_client,
+        database_id_partidas,
+        {
+            "ID de partida": {"title": [{"text": {"content": nombre_partida}}]},
+            "Proyectos": {
+                "relation": [
+                    {"id": proyecto_id}
+                ]
+            },
+            # ... otras propiedades ...
+        },
+        dedupe_property="ID de partida",
+        dedupe_value=nombre_partida,
+        lookup_first=lookup_first,
+    )
+    register_partida_page(response)
+    logger.info(f"Partida '{nombre_partida}' creada con ID: {response['id']}")
+    return response
 
-def crear_partidas(notion_client, database_id_partidas, num_partidas, proyecto_id):
+def crear_partidas(notion_client, database_id_partidas, num_partidas, proyecto_id, proyecto_nombre=None):
     """
     Crea múltiples páginas de partida en la base de datos de Partidas
     usando un cliente de Notion proporcionado y las relaciona con el proyecto.
+    Con proyecto_nombre (el título de la respuesta de crear_proyecto_page) no se vuelve a leer la página del proyecto.
+    Las partidas que ya existen no se crean otra vez. Para proyectos grandes usar project_setup.start_partidas_job.
     """
     if not notion_client or not database_id_partidas or not proyecto_id or not isinstance(num_partidas, int) or num_partidas <= 0:
          logger.error("Faltan argumentos válidos para crear_partidas.")
          return []
 
-    partidas_ids = []
-    proyecto_nombre = "Proyecto Desconocido" # Valor por defecto
-
-    try:
-        proyecto_page = notion_client.pages.retrieve(proyecto_id)
-        title_prop = proyecto_page.get('properties', {}).get('ID del proyecto', {})
-        if title_prop.get('type') == 'title' and title_prop.get('title'):
-             proyecto_nombre = title_prop['title'][0].get('plain_text', 'Proyecto sin Nombre')
-        else:
-             logger.warning(f"No se encontró la propiedad Title 'ID del proyecto' o estaba vacía para el proyecto ID '{proyecto_id}'.")
-
-    except Exception as e:
-        logger.error(f"Error al obtener el nombre del proyecto con ID '{proyecto_id}': {e}", exc_info=True)
-
-
-    for i in range(num_partidas):
-        partida_conteo = f"{i:02d}.00"
-        nombre_partida = f"{proyecto_nombre}-{partida_conteo}"
+    if not proyecto_nombre:
+        proyecto_nombre = "Proyecto Desconocido" # Valor por defecto
+        try:
+            # Solo se necesita el título ('ID del proyecto'): se pide únicamente esa propiedad
+            proyecto_page = call_notion(notion_client.pages.retrieve, proyecto_id, filter_properties=[NOTION_TITLE_PROPERTY_ID])
+            proyecto_nombre = titulo_proyecto(proyecto_page) or proyecto_nombre
+            if proyecto_nombre == "Proyecto Desconocido":
+                 logger.warning(f"No se encontró la propiedad Title 'ID del proyecto' o estaba vacía para el proyecto ID '{proyecto_id}'.")
+        except Exception as e:
+            logger.error(f"Error al obtener el nombre del proyecto con ID '{proyecto_id}': {e}", exc_info=True)
 
+    existentes = partidas_existentes(notion_client, database_id_partidas, proyecto_id)
+    partidas_ids = []
+    for nombre_partida in nombres_partidas(proyecto_nombre, num_partidas):
+        if existentes and nombre_partida in existentes:
+            partidas_ids.append(existentes[nombre_partida])
+            continue
         try:
-            response = notion_client.pages.create(
-                parent={"database_id": database_id_partidas},
-                properties={
-                    "ID de partida": {"title": [{"text": {"content": nombre_partida}}]},
-                    "Proyectos": {
-                        "relation": [
-                            {"id": proyecto_id}
-                        ]
-                    },
-                    # ... otras propiedades ...
-                }
-            )
+            # Si no se pudo consultar qué partidas existen, se busca cada una antes de crearla
+            response = crear_partida(notion_client, database_id_partidas, proyecto_id, nombre_partida, lookup_first=existentes is None)
             partidas_ids.append(response['id'])
-            logger.info(f"Partida '{nombre_partida}' creada con ID: {response['id']}")
         except Exception as e:
             logger.error(f"Error al crear la partida '{nombre_partida}': {e}", exc_info=True)
 
-    logger.info(f"Proceso crear_partidas completado para proyecto ID {proyecto_id}: {len(partidas_ids)} creadas.")
-    return partidas_ids
\ No newline at end of file
+    logger.info(f"Proceso crear_partidas completado para proyecto ID {proyecto_id}: {len(partidas_ids)} partidas (creadas o ya existentes).")
+    return partidas_ids
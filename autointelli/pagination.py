@@ -0,0 +1,56 @@
+# autointelli/pagination.py
+# Paginación por cursor para los dashboards (ver get_pages_slice_util en notion/utils.py).
+# Los cursores de Notion solo avanzan, así que el parámetro 'page' de la URL lleva el recorrido completo:
+# la lista de cursores con que empezó cada ventana visitada después de la primera. 'Siguiente' agrega el
+# next_cursor y 'Anterior' quita el último. El token es JSON en base64 url-safe, opaco para el usuario.
+
+import base64
+import json
+import logging
+from typing import Optional, Dict, List, Any
+
+logger = logging.getLogger(__name__)
+
+# Tokens más largos se descartan (y la paginación vuelve a la primera ventana)
+MAX_PAGE_TOKEN_LENGTH = 8000
+
+
+def decode_page_token(token: Optional[str]) -> List[str]:
+    """Devuelve el recorrido de cursores del token; lista vacía (primera ventana) si falta o es inválido."""
+    if not token:
+        return []
+    if len(token) > MAX_PAGE_TOKEN_LENGTH:
+        logger.warning("Token de paginación demasiado largo; se reinicia en la primera página.")
+        return []
+    try:
+        trail = json.loads(base64.urlsafe_b64decode(token.encode('ascii') + b'=' * (-len(token) % 4)))
+    except (ValueError, UnicodeError):
+        logger.warning("Token de paginación inválido; se reinicia en la primera página.")
+        return []
+    if not isinstance(trail, list) or not all(isinstance(cursor, str) and cursor for cursor in trail):
+        return []
+    return trail
+
+
+def encode_page_token(trail: List[str]) -> Optional[str]:
+    """Token para la URL; None para la primera ventana (sin parámetro 'page')."""
+    if not trail:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(trail, separators=(',', ':')).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def current_cursor(trail: List[str]) -> Optional[str]:
+    return trail[-1] if trail else None
+
+
+def build_pagination(trail: List[str], next_cursor: Optional[str], page_size: int, shown: int) -> Dict[str, Any]:
+    """Datos de navegación para el template."""
+    return {
+        'page_number': len(trail) + 1,
+        'page_size': page_size,
+        'shown': shown,
+        'has_prev': bool(trail),
+        'prev_token': encode_page_token(trail[:-1]),
+        'has_next': next_cursor is not None,
+        'next_token': encode_page_token(trail + [next_cursor]) if next_cursor else None,
+    }
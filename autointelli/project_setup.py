@@ -0,0 +1,194 @@
+# autointelli/project_setup.py
+# Creación de las partidas de un proyecto nuevo como trabajo en segundo plano con progreso consultable.
+#
+# - El título del proyecto sale de la respuesta de crear_proyecto_page (no se vuelve a leer la página).
+# - Los títulos de las partidas son deterministas ('<proyecto>-NN.00', nuevosRegistros.nombres_partidas) y son su clave
+#   de deduplicación: antes de empezar se consulta una sola vez qué partidas ya tiene el proyecto y solo se crean las
+#   que faltan; create_page_util busca por esa clave antes de reintentar un error ambiguo. Si la consulta inicial
+#   falla, cada partida se busca antes de crearla (lookup_first).
+# - Las partidas se crean desde PROJECT_PARTIDAS_MAX_WORKERS hilos; las escrituras pasan por el limitador de tasa
+#   compartido (call_notion_write), así que la concurrencia no rebasa la tasa a Notion.
+# - Mientras hay un trabajo en curso para un proyecto (en cualquier worker), reenviar el formulario devuelve ese mismo
+#   trabajo en lugar de lanzar otro que compita por las mismas partidas.
+# - El estado se guarda en la base de datos (background_jobs.py); el navegador lo consulta desde cualquier worker por
+#   /proyectos/create/<job_id>?since=<versión>.
+
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
+
+from flask import current_app, has_app_context
+
+from .background_jobs import create_job, save_job_rows, save_job_state, find_active_job, prune_jobs, get_job_status
+from .models import db, AuditLog
+from .nuevosRegistros import crear_partida, nombres_partidas, partidas_existentes
+
+logger = logging.getLogger(__name__)
+
+PARTIDA_PENDING = 'pending'
+PARTIDA_CREATING = 'creating'
+PARTIDA_CREATED = 'created'
+PARTIDA_EXISTING = 'existing'
+PARTIDA_FAILED = 'failed'
+
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+JOB_KIND = 'project_partidas'
+PARTIDA_STATUSES = (PARTIDA_PENDING, PARTIDA_CREATING, PARTIDA_CREATED, PARTIDA_EXISTING, PARTIDA_FAILED)
+
+
+def _config(key: str, default: Any) -> Any:
+    return current_app.config.get(key, default) if has_app_context() else default
+
+
+class PartidaProgress:
+    __slots__ = ('position', 'nombre', 'status', 'page_id', 'message')
+
+    def __init__(self, position: int, nombre: str):
+        self.position = position
+        self.nombre = nombre
+        self.status = PARTIDA_PENDING
+        self.page_id: Optional[str] = None
+        self.message = ''
+
+
+class PartidasJob:
+    """
+    Creación de partidas en curso en este proceso; la versión avanza con cada cambio. Cada cambio se guarda en la base
+    de datos (background_jobs.py), de donde se leen las consultas de estado. Requiere contexto de aplicación.
+    """
+
+    def __init__(self, user_id: Optional[int], proyecto_id: str, proyecto_nombre: str, num_partidas: int,
+                 proyecto_existente: bool = False):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.user_id = user_id
+        self.proyecto_id = proyecto_id
+        self.proyecto_nombre = proyecto_nombre
+        self.proyecto_existente = proyecto_existente # El proyecto se reutilizó en vez de crearse
+        self.partidas = [PartidaProgress(position, nombre) for position, nombre in enumerate(nombres_partidas(proyecto_nombre, num_partidas))]
+        self.state = JOB_RUNNING
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def save(self) -> None:
+        summary = {"proyecto_id": self.proyecto_id, "proyecto_nombre": self.proyecto_nombre, "proyecto_existente": self.proyecto_existente,
+                   "total": len(self.partidas)}
+        create_job(JOB_KIND, self.job_id, self.state, [(partida.position, partida.status, partida.message, {"nombre": partida.nombre})
+                                                        for partida in self.partidas],
+                   summary, user_id=self.user_id, key=self.proyecto_id)
+
+    def update_partida(self, partida: PartidaProgress, status: str, page_id: Optional[str] = None, message: str = '') -> None:
+        with self._lock:
+            self.version += 1
+            partida.status = status
+            partida.page_id = page_id or partida.page_id
+            partida.message = message
+            save_job_rows(self.job_id, self.version, [partida.position], status, message, page_id)
+
+    def set_state(self, state: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.version += 1
+            self.state = state
+            save_job_state(self.job_id, self.version, state, error)
+
+    def counts(self) -> Dict[str, int]:
+        counts = {status: 0 for status in PARTIDA_STATUSES}
+        for partida in self.partidas:
+            counts[partida.status] += 1
+        return counts
+
+
+_start_lock = threading.Lock() # Evita que dos envíos simultáneos en este proceso lancen dos trabajos del mismo proyecto
+
+
+def get_partidas_status(job_id: str, since: int = 0, user_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Progreso de la creación de partidas desde la base de datos; con since solo incluye las partidas que cambiaron
+    desde esa versión. None si no existe o, con user_id, si es de otro usuario.
+    """
+    status = get_job_status(JOB_KIND, job_id, PARTIDA_STATUSES, 'page_id', since=since, user_id=user_id)
+    if status is not None:
+        status["partidas"] = status.pop("rows")
+    return status
+
+
+def _create_one(app, job: PartidasJob, partida: PartidaProgress, database_id_partidas: str, lookup_first: bool) -> None:
+    with app.app_context():
+        job.update_partida(partida, PARTIDA_CREATING)
+        try:
+            response = crear_partida(app.notion_client, database_id_partidas, job.proyecto_id, partida.nombre, lookup_first=lookup_first)
+        except Exception as e:
+            logger.error(f"Partidas {job.job_id}: error al crear la partida '{partida.nombre}': {e}", exc_info=True)
+            job.update_partida(partida, PARTIDA_FAILED, message=f"Error al crear la partida: {e}")
+            return
+        job.update_partida(partida, PARTIDA_CREATED, page_id=response['id'])
+
+
+def _audit(job: PartidasJob) -> None:
+    counts = job.counts()
+    ok = counts[PARTIDA_CREATED] + counts[PARTIDA_EXISTING]
+    estado = 'ya existía' if job.proyecto_existente else 'creado'
+    if counts[PARTIDA_FAILED]:
+        action = 'Creación de Proyecto Parcial'
+        details = f'Proyecto "{job.proyecto_nombre}" (ID Notion: {job.proyecto_id}) {estado}, pero fallaron {counts[PARTIDA_FAILED]} de {len(job.partidas)} partidas.'
+    else:
+        action = 'Proyecto Existente Completado' if job.proyecto_existente else 'Proyecto Creado'
+        completado = 'ya existía; completado' if job.proyecto_existente else 'creado'
+        details = f'Proyecto "{job.proyecto_nombre}" (ID Notion: {job.proyecto_id}) {completado} con {ok} partidas ({counts[PARTIDA_EXISTING]} ya existían).'
+    try:
+        db.session.add(AuditLog(user_id=job.user_id, action=action, details=details))
+        db.session.commit()
+    except Exception as audit_e:
+        db.session.rollback()
+        logger.error(f"Partidas {job.job_id}: ERROR al crear registro de auditoría: {audit_e}")
+
+
+def _run_partidas_job(app, job: PartidasJob) -> None:
+    with app.app_context():
+        database_id_partidas = app.config.get('DATABASE_ID_PARTIDAS')
+        try:
+            existentes = partidas_existentes(app.notion_client, database_id_partidas, job.proyecto_id)
+            for partida in job.partidas:
+                if existentes and partida.nombre in existentes:
+                    job.update_partida(partida, PARTIDA_EXISTING, page_id=existentes[partida.nombre], message="Ya existía")
+            pending = [partida for partida in job.partidas if partida.status == PARTIDA_PENDING]
+            logger.info(f"Partidas {job.job_id} ({job.proyecto_nombre}): {len(pending)} por crear, {len(job.partidas) - len(pending)} ya existían.")
+            with ThreadPoolExecutor(max_workers=max(1, app.config.get('PROJECT_PARTIDAS_MAX_WORKERS', 4)), thread_name_prefix="partidas") as executor:
+                for partida in pending:
+                    # Si no se pudo consultar qué partidas existen, cada una se busca antes de crearla
+                    executor.submit(_create_one, app, job, partida, database_id_partidas, existentes is None)
+            job.set_state(JOB_DONE)
+        except Exception as e:
+            logger.error(f"Partidas {job.job_id} interrumpido: {e}", exc_info=True)
+            for partida in job.partidas:
+                if partida.status in (PARTIDA_PENDING, PARTIDA_CREATING):
+                    job.update_partida(partida, PARTIDA_FAILED, message="Creación interrumpida")
+            job.set_state(JOB_FAILED, str(e))
+        _audit(job)
+        counts = job.counts()
+        logger.info(f"Partidas {job.job_id} terminado: {counts[PARTIDA_CREATED]} creadas, {counts[PARTIDA_EXISTING]} existentes, {counts[PARTIDA_FAILED]} fallidas.")
+
+
+def start_partidas_job(proyecto_id: str, proyecto_nombre: str, num_partidas: int, user_id: Optional[int] = None,
+                       proyecto_existente: bool = False) -> str:
+    """
+    Lanza la creación de las partidas del proyecto en segundo plano y retorna el job_id. Si ya hay un trabajo en curso
+    para el mismo proyecto, retorna el de ese. Con proyecto_existente la auditoría indica que el proyecto ya existía.
+    """
+    with _start_lock:
+        existing_id = find_active_job(JOB_KIND, proyecto_id)
+        if existing_id is not None:
+            logger.info(f"[User ID: {user_id or 'N/A'}] Partidas de '{proyecto_nombre}' ya en curso ({existing_id}); no se lanza otro trabajo.")
+            return existing_id
+        job = PartidasJob(user_id, proyecto_id, proyecto_nombre, num_partidas, proyecto_existente=proyecto_existente)
+        job.save()
+    prune_jobs(JOB_KIND, _config('PROJECT_PARTIDAS_JOBS', 20)) # Conserva solo los trabajos terminados más recientes
+
+    logger.info(f"[User ID: {user_id or 'N/A'}] Partidas {job.job_id}: {num_partidas} partidas para el proyecto '{proyecto_nombre}' ({proyecto_id}).")
+    app = current_app._get_current_object()
+    threading.Thread(target=_run_partidas_job, args=(app, job), name=f"partidas-{job.job_id}", daemon=True).start()
+    return job.job_id
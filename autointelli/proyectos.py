@@ -1,9 +1,10 @@
 # autointelli/proyectos.py # <<< Corregir el nombre del archivo en el comentario
 
-from flask import Blueprint, request, jsonify, render_template, current_app # Importar current_app
+from flask import Blueprint, request, jsonify, render_template, current_app, flash, url_for # Importar current_app
 from flask_login import login_required, current_user
 # Importar las funciones de creación de proyecto/partidas desde nuevosRegistros
-from .nuevosRegistros import crear_proyecto, crear_partidas # <<< Importar las funciones correctas
+from .nuevosRegistros import crear_proyecto_page, titulo_proyecto # <<< Importar las funciones correctas
+from .project_setup import start_partidas_job, get_partidas_status # Creación de partidas en segundo plano
 # Importar db y AuditLog para registro de auditoría
 from .models import db, AuditLog
 
@@ -70,46 +71,22 @@ def create_project_page():
 
             logger.info(f"[{current_user.username}] Solicitud para crear proyecto '{nombre_proyecto}' con {num_partidas} partidas.")
 
-            # Llama a las funciones auxiliares, pasando el cliente Notion y los IDs
-            proyecto_page_id = crear_proyecto(notion_client, database_id_proyectos, nombre_proyecto)
-
-            if proyecto_page_id:
-                logger.info(f"[{current_user.username}] Proyecto '{nombre_proyecto}' creado en Notion con ID: {proyecto_page_id}")
-                partidas_ids = crear_partidas(notion_client, database_id_partidas, num_partidas, proyecto_page_id)
-
-                if partidas_ids:
-                    logger.info(f"[{current_user.username}] Creadas {len(partidas_ids)} partidas para el proyecto ID: {proyecto_page_id}")
-                    # Registro de auditoría (Éxito)
-                    try:
-                        audit_log = AuditLog(
-                            user_id=current_user.id,
-                            action='Proyecto Creado',
-                            details=f'Proyecto "{nombre_proyecto}" (ID Notion: {proyecto_page_id}) creado con {len(partidas_ids)} partidas.'
-                        )
-                        db.session.add(audit_log)
-                        db.session.commit()
-                        logger.info(f"[{current_user.username}] Registro de auditoría creado para creación de proyecto '{nombre_proyecto}'.")
-                    except Exception as audit_e:
-                         db.session.rollback()
-                         logger.error(f"[{current_user.username}] ERROR al crear registro de auditoría para creación de proyecto: {audit_e}")
-
-                    return jsonify({'message': f'Proyecto "{nombre_proyecto}" creado con éxito con {len(partidas_ids)} partidas.'}), 200
-                else:
-                    logger.error(f"[{current_user.username}] Error al crear las partidas para proyecto '{nombre_proyecto}' (ID: {proyecto_page_id}).")
-                    # Registro de auditoría (Fallo en Partidas)
-                    try:
-                        audit_log = AuditLog(
-                            user_id=current_user.id,
-                            action='Creación de Proyecto Parcial',
-                            details=f'Proyecto "{nombre_proyecto}" (ID Notion: {proyecto_page_id}) creado, pero fallaron las partidas.'
-                        )
-                        db.session.add(audit_log)
-                        db.session.commit()
-                        logger.info(f"[{current_user.username}] Registro de auditoría creado para fallo parcial (partidas) de proyecto '{nombre_proyecto}'.")
-                    except Exception as audit_e:
-                         db.session.rollback()
-                         logger.error(f"[{current_user.username}] ERROR al crear registro de auditoría para fallo parcial: {audit_e}")
-                    return jsonify({'error': 'Error al crear las partidas.'}), 500
+            # Llama a las funciones auxiliares, pasando el cliente Notion y los IDs.
+            # El proyecto se crea aquí; las partidas, en segundo plano con progreso (ver project_setup.py)
+            proyecto_page, proyecto_existente = crear_proyecto_page(notion_client, database_id_proyectos, nombre_proyecto)
+
+            if proyecto_page:
+                proyecto_page_id = proyecto_page['id']
+                estado_proyecto = 'ya existía' if proyecto_existente else 'creado'
+                logger.info(f"[{current_user.username}] Proyecto '{nombre_proyecto}' {estado_proyecto} en Notion con ID: {proyecto_page_id}")
+                # El título se toma de la respuesta de la creación, sin volver a leer la página
+                job_id = start_partidas_job(proyecto_page_id, titulo_proyecto(proyecto_page) or nombre_proyecto, num_partidas,
+                                            user_id=current_user.id, proyecto_existente=proyecto_existente)
+                response_data = get_partidas_status(job_id)
+                response_data['proyecto_existente'] = proyecto_existente
+                response_data['message'] = f'Proyecto "{nombre_proyecto}" {estado_proyecto}. Creando {response_data["total"]} partidas...'
+                response_data['status_url'] = url_for('proyectos.partidas_job_status', job_id=job_id)
+                return jsonify(response_data), 202
             else:
                 logger.error(f"[{current_user.username}] Error al crear el proyecto '{nombre_proyecto}' en Notion.")
                 # Registro de auditoría (Fallo en Proyecto)
@@ -149,4 +126,15 @@ def create_project_page():
     # --- Lógica de GET (Mostrar Formulario) ---
     logger.info(f"[{current_user.username}] Solicitud GET recibida en /proyectos/create")
     # Renderiza la plantilla específica, usando un subdirectorio
-    return render_template('proyectos/create_project.html') # Asume templates/proyectos/create_project.html
\ No newline at end of file
+    return render_template('proyectos/create_project.html') # Asume templates/proyectos/create_project.html
+
+
+@proyectos_bp.route('/create/<string:job_id>')
+@login_required
+def partidas_job_status(job_id):
+    """Progreso de la creación de partidas; con ?since=<versión> solo incluye las partidas que cambiaron desde esa versión."""
+    status = get_partidas_status(job_id, since=request.args.get('since', 0, type=int),
+                                 user_id=None if current_user.role == 'admin' else current_user.id)
+    if status is None:
+        return jsonify({"error": f"No se encontró la creación de partidas '{job_id}'."}), 404
+    return jsonify(status), 200
@@ -1,12 +1,20 @@
 # autointelli/solicitudes.py
 
-from flask import Blueprint, request, jsonify, render_template, current_app
+from flask import Blueprint, request, jsonify, render_template, current_app, url_for
 from flask_login import login_required, current_user # Necesitas current_user
 from .notion.solicitudes import submit_request_for_material_logic
+from .notion.outbox import outbox_enabled, enqueue_material_request, get_request_status # Envío asíncrono vía bandeja de salida
 from .notion.utils import list_available_properties
+from .notion.schema_cache import invalidate_database_schema, schema_cache_stats
+from .notion.rate_limit import get_retry_stats
+from .notion.circuit_breaker import get_circuit_breaker
+from .notion.utils import coalescing_stats
 from .decorators import role_required
+from .material_import import SpreadsheetError, start_material_import, get_import_status
+from .dashboard_snapshot import invalidate_dashboard # Las copias de los dashboards quedan viejas tras un envío
 
 import logging
+from datetime import date
 
 # Configurar logger para este módulo
 logger = logging.getLogger(__name__)
@@ -145,6 +153,19 @@ def submit_standard_request():
     # --- Fin Debugging ---
 
 
+    # Con la bandeja de salida activa, la solicitud se valida y se encola: se responde 202 con el folio y una
+    # URL de estado que el frontend consulta mientras el hilo en segundo plano crea las páginas en Notion.
+    if outbox_enabled():
+        response_data, status_code = enqueue_material_request(
+            database_id_db1,
+            database_id_db2,
+            data,
+            user_id=current_user.id if current_user.is_authenticated else None
+        )
+        if status_code == 202:
+            response_data['status_url'] = url_for('solicitudes.request_status', request_key=response_data['request_key'])
+        return jsonify(response_data), status_code
+
     # Llamar a la lógica principal de procesamiento en notion_utils, pasándole todos los IDs necesarios
     # submit_request_for_material_logic maneja la creación de páginas en Notion,
     # la validación de dimensiones/proyecto en Notion, y la construcción de la respuesta final.
@@ -160,10 +181,81 @@ def submit_standard_request():
 
     # La respuesta y el código de estado HTTP devueltos por esta ruta son los que genera
     # la función submit_request_for_material_logic en notion_utils.py.
+    if 200 <= status_code < 300:
+        # Compras y Almacén leen las mismas bases de Materiales: se invalidan todas las vistas
+        invalidate_dashboard(reason="solicitud de material creada")
 
     return jsonify(response_data), status_code
 
 
+@solicitudes_bp.route('/estado/<string:request_key>')
+@login_required
+@role_required(['logistica', 'diseno', 'compras', 'admin'])
+def request_status(request_key):
+    """Estado de un envío encolado en la bandeja de salida de Notion (solicitud de material o actualización)."""
+    # Cada usuario solo consulta sus propios envíos; el admin consulta todos
+    status = get_request_status(request_key, user_id=None if current_user.role == 'admin' else current_user.id)
+    if status is None:
+        return jsonify({"error": f"No se encontró el envío '{request_key}'."}), 404
+    return jsonify(status), 200
+
+
+# Importación masiva desde una hoja de cálculo (ver material_import.py): la subida se lee y valida en la solicitud
+# y responde 202 con el job_id; el envío a Notion sigue en segundo plano y la página consulta el estado por fila.
+@solicitudes_bp.route('/importar', methods=['GET'])
+@login_required
+@role_required(['logistica', 'diseno', 'admin'])
+def material_import_page():
+    """Renderiza la página de importación de solicitudes desde CSV/XLSX."""
+    current_user_full_name = current_user.full_name if hasattr(current_user, 'full_name') else ""
+    return render_template('solicitudes/import_requests.html',
+                           current_user_full_name=current_user_full_name,
+                           max_rows=current_app.config.get('MATERIAL_IMPORT_MAX_ROWS', 500))
+
+
+@solicitudes_bp.route('/importar', methods=['POST'])
+@login_required
+@role_required(['logistica', 'diseno', 'admin'])
+def upload_material_import():
+    """Recibe el archivo (campo 'archivo'), valida sus filas y lanza el envío a Notion en segundo plano."""
+    max_bytes = current_app.config.get('MATERIAL_IMPORT_MAX_BYTES', 5 * 1024 * 1024)
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({"error": f"El archivo excede el tamaño máximo de {max_bytes // (1024 * 1024)} MB."}), 413
+
+    uploaded = request.files.get('archivo')
+    if uploaded is None or not uploaded.filename:
+        return jsonify({"error": "Selecciona un archivo .csv o .xlsx."}), 400
+    if current_app.notion_client is None or not current_app.config.get('DATABASE_ID_MATERIALES_DB1') or not current_app.config.get('DATABASE_ID_MATERIALES_DB2') or not current_app.config.get('DATABASE_ID_PARTIDAS'):
+        return jsonify({"error": "La integración con Notion para Solicitudes o Partidas no está configurada correctamente (IDs de bases de datos o cliente Notion faltantes)."}), 503
+
+    common_data = {
+        "nombre_solicitante": request.form.get('nombre_solicitante') or getattr(current_user, 'full_name', ''),
+        "departamento_area": request.form.get('departamento_area') or "Logística",
+        "fecha_solicitud": request.form.get('fecha_solicitud') or date.today().isoformat(),
+    }
+    try:
+        job = start_material_import(uploaded.stream, uploaded.filename, common_data, user_id=current_user.id)
+    except SpreadsheetError as e:
+        logger.warning(f"[{current_user.username}] Importación de '{uploaded.filename}' rechazada: {e}")
+        return jsonify({"error": str(e)}), 400
+
+    response_data = get_import_status(job.job_id)
+    response_data['status_url'] = url_for('solicitudes.material_import_status', job_id=job.job_id)
+    return jsonify(response_data), 202
+
+
+@solicitudes_bp.route('/importar/<string:job_id>')
+@login_required
+@role_required(['logistica', 'diseno', 'admin'])
+def material_import_status(job_id):
+    """Estado de una importación; con ?since=<versión> solo incluye las filas que cambiaron desde esa versión."""
+    status = get_import_status(job_id, since=request.args.get('since', 0, type=int),
+                               user_id=None if current_user.role == 'admin' else current_user.id)
+    if status is None:
+        return jsonify({"error": f"No se encontró la importación '{job_id}'."}), 404
+    return jsonify(status), 200
+
+
 # Puedes añadir aquí otras rutas relacionadas con las solicitudes si las tienes
 # Ejemplo:
 # @solicitudes_bp.route('/view_request/<folio>')
@@ -195,4 +287,43 @@ def list_notion_properties(db_id_key):
          return jsonify(properties_list), 200
     except Exception as e:
          logger.error(f"[{current_user.username}] Error al listar propiedades para DB '{db_id_key}': {e}", exc_info=True)
-         return jsonify({"error": "Error al obtener propiedades de Notion."}), 500 # Internal Server Error
\ No newline at end of file
+         return jsonify({"error": "Error al obtener propiedades de Notion."}), 500 # Internal Server Error
+
+
+# Refresca el esquema en caché (notion/schema_cache.py) tras renombrar o añadir propiedades en Notion.
+# db_id_key='all' invalida todas las bases de datos.
+@solicitudes_bp.route('/refresh_schema/<string:db_id_key>', methods=['POST'])
+@login_required
+@role_required(['admin'])
+def refresh_notion_schema(db_id_key):
+    """Endpoint para invalidar el esquema en caché de una base de datos de Notion por su clave de configuración."""
+    logger.info(f"[{current_user.username}] Solicitud POST para refrescar el esquema de DB: {db_id_key}")
+
+    if db_id_key.lower() == 'all':
+        invalidate_database_schema(None, reason=f"refresco manual por {current_user.username}")
+        return jsonify({"message": "Esquemas de Notion invalidados.", "stats": schema_cache_stats}), 200
+
+    db_id = current_app.config.get(f'DATABASE_ID_{db_id_key.upper()}')
+    if not db_id:
+        error_msg = f"Base de datos con clave '{db_id_key}' no encontrada."
+        logger.error(f"[{current_user.username}] {error_msg}")
+        return jsonify({"error": error_msg}), 404
+
+    invalidate_database_schema(db_id, reason=f"refresco manual por {current_user.username}")
+    return jsonify({"message": f"Esquema de '{db_id_key}' invalidado.", "stats": schema_cache_stats}), 200
+
+
+# Métricas de la capa de acceso a Notion en este proceso: circuit breaker, reintentos por operación (notion/rate_limit.py),
+# caché de esquemas y consultas compartidas.
+@solicitudes_bp.route('/notion_stats')
+@login_required
+@role_required(['admin'])
+def notion_stats():
+    """Endpoint con el estado del circuit breaker y las métricas de reintentos, caché de esquemas y coalescencia de consultas a Notion."""
+    breaker = get_circuit_breaker()
+    return jsonify({
+        "circuit_breaker": breaker.snapshot() if breaker is not None else {"state": "disabled"},
+        "retries": get_retry_stats(),
+        "schema_cache": schema_cache_stats,
+        "query_coalescing": coalescing_stats,
+    }), 200
@@ -0,0 +1,357 @@
+# autointelli/torni_catalog.py
+# Catálogo de accesorios Torni compilado a un solo archivo binario, leído con mmap, y su búsqueda en el servidor
+# (/accesorios/catalog/search, autocompletado del formulario Torni).
+#
+# static/data tenía tres copias del mismo catálogo (torni_items_masterlist.json, accesorios.json y
+# accesorios.csv) que se leían por separado y podían diferir. 'flask torni-catalog-build' las une en
+# TORNI_CATALOG_PATH: gana la primera fuente de TORNI_CATALOG_SOURCES que trae cada ID, y se informan los IDs con
+# descripciones distintas entre fuentes. La aplicación abre el archivo con mmap al iniciar (sin leer ni parsear
+# JSON): los workers de gunicorn comparten las páginas del archivo. Si falta o no corresponde a las fuentes
+# actuales (huella de las fuentes en el encabezado), se compila en memoria al iniciar y se registra un aviso.
+# El binario es un artefacto generado (no se versiona, ver .gitignore): el despliegue ejecuta 'flask torni-catalog-build'
+# después de actualizar el código, antes de arrancar gunicorn.
+#
+# Formato (little-endian): encabezado, registros (IDs y descripciones originales y normalizadas), IDs normalizados
+# ordenados (prefijo de ID con búsqueda binaria), tabla hash de IDs (búsqueda exacta), palabras de las
+# descripciones ordenadas con la lista de registros de cada una (cada palabra de la consulta se trata como
+# prefijo y se intersectan los registros) y al final las cadenas UTF-8.
+# Comparaciones sin mayúsculas ni acentos. Orden: coincidencias de ID (por ID); después, descripción que empieza
+# con la consulta o la contiene literalmente, y descripción más corta (el mismo criterio que usaba Awesomplete).
+
+import csv
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import unicodedata
+from typing import Optional, Dict, List, Set, Tuple, Callable
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TORNICAT'
+FORMAT_VERSION = 1
+# magic, versión, reservado, registros, huella de las fuentes y 8 offsets/tamaños
+_HEADER = struct.Struct('<8sHHI16s8I')
+# id, descripción, id normalizado, descripción normalizada: (offset, largo) en la zona de cadenas
+_RECORD = struct.Struct('<IHIHIHIH')
+# palabra (offset, largo) y su rango en la lista de registros
+_TOKEN = struct.Struct('<IHII')
+_U32 = struct.Struct('<I')
+
+_TOKEN_RE = re.compile(r'[0-9a-zñ]+')
+
+
+def normalize_text(text: str) -> str:
+    """Minúsculas, sin acentos (conserva la ñ) y con los espacios/saltos de línea colapsados."""
+    text = ' '.join(str(text).lower().split())
+    decomposed = unicodedata.normalize('NFD', text.replace('ñ', '\0'))
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).replace('\0', 'ñ')
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text)
+
+
+def _fnv1a(data: bytes) -> int:
+    value = 0x811C9DC5
+    for byte in data:
+        value = ((value ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return value
+
+
+def _lower_bound(count: int, key_at: Callable[[int], str], target: str) -> int:
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        if key_at(middle) < target:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+# --- Compilación ---
+
+def _read_source(path: str) -> List[Tuple[str, str]]:
+    """(id, descripción) de una fuente JSON ([{id, description}]) o CSV (columnas ID y DESCRIPCIÓN)."""
+    if path.lower().endswith('.csv'):
+        with open(path, encoding='utf-8-sig', newline='') as source:
+            return [(row.get('ID') or '', row.get('DESCRIPCIÓN') or '') for row in csv.DictReader(source)]
+    with open(path, encoding='utf-8') as source:
+        return [(item.get('id') or '', item.get('description') or '') for item in json.load(source)]
+
+
+def sources_digest(paths: List[str]) -> bytes:
+    """Huella de las fuentes (nombre y contenido) que se guarda en el encabezado del catálogo compilado."""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8') + b'\0')
+        with open(path, 'rb') as source:
+            digest.update(source.read())
+    return digest.digest()[:16]
+
+
+def merge_catalog_sources(paths: List[str]) -> Tuple[List[Dict[str, str]], List[str]]:
+    """Une las fuentes por ID (gana la primera que lo trae). Retorna (ítems, avisos de IDs con descripciones distintas)."""
+    merged: Dict[str, Dict[str, str]] = {}
+    variants: Dict[str, Dict[str, Tuple[str, List[str]]]] = {} # ID -> descripción normalizada -> (descripción, fuentes)
+    for path in paths:
+        source_name = os.path.basename(path)
+        for raw_id, raw_description in _read_source(path):
+            item_id = str(raw_id).strip()
+            description = ' '.join(str(raw_description).split())
+            if not item_id or not description:
+                continue
+            merged.setdefault(item_id, {"id": item_id, "description": description})
+            _, sources = variants.setdefault(item_id, {}).setdefault(normalize_text(description), (description, []))
+            if source_name not in sources:
+                sources.append(source_name)
+    conflicts = [
+        f"{item_id}: " + " | ".join(f"'{description}' ({', '.join(sources)})" for description, sources in descriptions.values())
+        for item_id, descriptions in variants.items() if len(descriptions) > 1
+    ]
+    return list(merged.values()), conflicts
+
+
+def compile_torni_catalog(items: List[Dict[str, str]], digest: bytes = b'\0' * 16) -> bytes:
+    """Compila los ítems {id, description} al formato binario del catálogo."""
+    strings = bytearray()
+    string_offsets: Dict[str, Tuple[int, int]] = {}
+
+    def _string(text: str) -> Tuple[int, int]:
+        if text not in string_offsets:
+            encoded = text.encode('utf-8')[:0xFFFF]
+            string_offsets[text] = (len(strings), len(encoded))
+            strings.extend(encoded)
+        return string_offsets[text]
+
+    records = bytearray()
+    norm_ids = []
+    postings: Dict[str, Set[int]] = {}
+    for idx, item in enumerate(items):
+        norm_id = normalize_text(item['id'])
+        norm_description = normalize_text(item['description'])
+        norm_ids.append(norm_id)
+        records += _RECORD.pack(*_string(item['id']), *_string(item['description']), *_string(norm_id), *_string(norm_description))
+        for token in _tokens(norm_description):
+            postings.setdefault(token, set()).add(idx)
+
+    id_order = b''.join(_U32.pack(idx) for idx in sorted(range(len(items)), key=lambda idx: norm_ids[idx]))
+
+    hash_slots = 1
+    while hash_slots < len(items) * 2:
+        hash_slots *= 2
+    table = [0] * hash_slots
+    for idx, norm_id in enumerate(norm_ids):
+        slot = _fnv1a(norm_id.encode('utf-8')) & (hash_slots - 1)
+        while table[slot]:
+            slot = (slot + 1) & (hash_slots - 1)
+        table[slot] = idx + 1 # 0 = vacío
+    hash_table = b''.join(_U32.pack(value) for value in table)
+
+    tokens = bytearray()
+    posting_list = bytearray()
+    posting_count = 0
+    for token in sorted(postings):
+        record_ids = sorted(postings[token])
+        tokens += _TOKEN.pack(*_string(token), posting_count, len(record_ids))
+        posting_list += b''.join(_U32.pack(idx) for idx in record_ids)
+        posting_count += len(record_ids)
+
+    records_off = _HEADER.size
+    id_order_off = records_off + len(records)
+    hash_off = id_order_off + len(id_order)
+    tokens_off = hash_off + len(hash_table)
+    postings_off = tokens_off + len(tokens)
+    strings_off = postings_off + len(posting_list)
+    header = _HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(items), digest, records_off, id_order_off, hash_off, hash_slots,
+                          tokens_off, len(postings), postings_off, strings_off)
+    return b''.join((header, bytes(records), id_order, hash_table, bytes(tokens), bytes(posting_list), bytes(strings)))
+
+
+# --- Lectura ---
+
+class TorniCatalog:
+    """Lector del catálogo compilado sobre un buffer (mmap del archivo o bytes compilados en memoria)."""
+
+    def __init__(self, buffer, source: str = 'memoria'):
+        self._buffer = buffer # Se conserva para que el mmap siga abierto
+        self._view = memoryview(buffer)
+        (magic, version, _, self._count, self.source_digest, self._records_off, self._id_order_off, self._hash_off,
+         self._hash_slots, self._tokens_off, self._token_count, self._postings_off, self._strings_off) = _HEADER.unpack_from(self._view, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{source} no es un catálogo Torni compilado (versión {FORMAT_VERSION}).")
+        self.source = source
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_off + offset
+        return str(self._view[start:start + length], 'utf-8')
+
+    def _record(self, idx: int) -> Tuple[int, ...]:
+        return _RECORD.unpack_from(self._view, self._records_off + idx * _RECORD.size)
+
+    def item(self, idx: int) -> Dict[str, str]:
+        record = self._record(idx)
+        return {"id": self._string(record[0], record[1]), "description": self._string(record[2], record[3])}
+
+    def _norm_id(self, idx: int) -> str:
+        record = self._record(idx)
+        return self._string(record[4], record[5])
+
+    def _norm_description(self, idx: int) -> str:
+        record = self._record(idx)
+        return self._string(record[6], record[7])
+
+    def _u32(self, offset: int) -> int:
+        return _U32.unpack_from(self._view, offset)[0]
+
+    def get(self, item_id: str) -> Optional[Dict[str, str]]:
+        """Ítem con ese ID exacto (sin distinguir mayúsculas), con la tabla hash; None si no existe."""
+        norm_id = normalize_text(item_id)
+        if not norm_id or not self._hash_slots:
+            return None
+        slot = _fnv1a(norm_id.encode('utf-8')) & (self._hash_slots - 1)
+        while True:
+            value = self._u32(self._hash_off + slot * 4)
+            if not value:
+                return None
+            if self._norm_id(value - 1) == norm_id:
+                return self.item(value - 1)
+            slot = (slot + 1) & (self._hash_slots - 1)
+
+    def _id_matches(self, query: str) -> Set[int]:
+        record_at = lambda position: self._u32(self._id_order_off + position * 4)
+        key_at = lambda position: self._norm_id(record_at(position))
+        start = _lower_bound(self._count, key_at, query)
+        end = _lower_bound(self._count, key_at, query + '\uffff')
+        return {record_at(position) for position in range(start, end)}
+
+    def _token(self, position: int) -> Tuple[int, ...]:
+        return _TOKEN.unpack_from(self._view, self._tokens_off + position * _TOKEN.size)
+
+    def _term_matches(self, term: str) -> Set[int]:
+        key_at = lambda position: self._string(*self._token(position)[:2])
+        start = _lower_bound(self._token_count, key_at, term)
+        end = _lower_bound(self._token_count, key_at, term + '\uffff')
+        matches = set()
+        for position in range(start, end):
+            _, _, first, count = self._token(position)
+            offset = self._postings_off + first * 4
+            matches.update(struct.unpack_from(f'<{count}I', self._view, offset))
+        return matches
+
+    def _description_matches(self, query: str) -> Set[int]:
+        terms = sorted(set(_tokens(query)), key=len, reverse=True) # Los términos largos son los más selectivos
+        if not terms:
+            return set()
+        matches: Optional[Set[int]] = None
+        for term in terms:
+            term_matches = self._term_matches(term)
+            matches = term_matches if matches is None else matches & term_matches
+            if not matches:
+                return set()
+        return matches
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, str]]:
+        """Primeros 'limit' ítems {id, description} que coinciden con la consulta por prefijo de ID o por palabras."""
+        query = normalize_text(query)
+        if not query or limit <= 0:
+            return []
+        id_matches = self._id_matches(query)
+        candidates = id_matches | self._description_matches(query)
+
+        def rank(idx: int):
+            if idx in id_matches:
+                return (False, self._norm_id(idx))
+            description = self._norm_description(idx)
+            return (
+                True,
+                not description.startswith(query),
+                query not in description,
+                len(description),
+                description,
+            )
+
+        return [self.item(idx) for idx in sorted(candidates, key=rank)[:limit]]
+
+
+def open_torni_catalog(path: str) -> TorniCatalog:
+    """Abre el catálogo compilado con mmap de solo lectura (páginas compartidas entre procesos)."""
+    with open(path, 'rb') as catalog_file:
+        mapped = mmap.mmap(catalog_file.fileno(), 0, access=mmap.ACCESS_READ)
+    return TorniCatalog(mapped, source=path)
+
+
+def load_torni_catalog(path: str, source_paths: List[str]) -> Optional[TorniCatalog]:
+    """
+    Catálogo para la aplicación: el archivo compilado si existe y corresponde a las fuentes actuales; si no,
+    se compila en memoria desde las fuentes. None si no hay ni archivo ni fuentes válidas.
+    """
+    source_paths = [source_path for source_path in source_paths if os.path.exists(source_path)]
+    digest = None
+    try:
+        digest = sources_digest(source_paths) if source_paths else None
+    except OSError as e:
+        logger.warning(f"No se pudieron leer las fuentes del catálogo Torni: {e}")
+
+    if os.path.exists(path):
+        try:
+            catalog = open_torni_catalog(path)
+            if digest is None or catalog.source_digest == digest:
+                logger.info(f"Catálogo Torni abierto con mmap: {len(catalog)} ítems ({path}).")
+                return catalog
+            logger.warning(f"El catálogo Torni compilado ({path}) no corresponde a las fuentes actuales; ejecuta 'flask torni-catalog-build'. Se compila en memoria.")
+        except (OSError, ValueError, struct.error) as e:
+            logger.error(f"No se pudo abrir el catálogo Torni compilado {path}: {e}")
+    elif source_paths:
+        logger.warning(f"No existe el catálogo Torni compilado ({path}); ejecuta 'flask torni-catalog-build'. Se compila en memoria.")
+
+    if not source_paths:
+        return None
+    try:
+        items, _ = merge_catalog_sources(source_paths)
+        return TorniCatalog(compile_torni_catalog(items, digest or b'\0' * 16))
+    except (OSError, ValueError, TypeError, AttributeError) as e:
+        logger.error(f"No se pudo compilar el catálogo Torni desde {source_paths}: {e}")
+        return None
+
+
+def get_torni_catalog() -> Optional[TorniCatalog]:
+    """Catálogo cargado en create_app (app.torni_catalog)."""
+    return getattr(current_app, 'torni_catalog', None)
+
+
+@click.command('torni-catalog-build')
+@click.option('--output', default=None, help='Archivo de salida (por defecto TORNI_CATALOG_PATH).')
+@click.option('--show-conflicts', is_flag=True, help='Lista los IDs con descripciones distintas entre fuentes.')
+@with_appcontext
+def torni_catalog_build_command(output, show_conflicts):
+    """Compila las fuentes del catálogo Torni (TORNI_CATALOG_SOURCES) al archivo binario que la aplicación abre con mmap."""
+    source_paths = current_app.config['TORNI_CATALOG_SOURCES']
+    output = output or current_app.config['TORNI_CATALOG_PATH']
+    missing = [source_path for source_path in source_paths if not os.path.exists(source_path)]
+    if missing:
+        raise click.ClickException(f"No se encontraron las fuentes: {', '.join(missing)}")
+
+    items, conflicts = merge_catalog_sources(source_paths)
+    data = compile_torni_catalog(items, sources_digest(source_paths))
+    temp_path = f"{output}.tmp"
+    with open(temp_path, 'wb') as catalog_file:
+        catalog_file.write(data)
+    os.replace(temp_path, output) # Los procesos con el archivo anterior abierto conservan su mmap
+
+    click.echo(f"Catálogo Torni compilado: {len(items)} ítems, {len(data) / 1024:.1f} KB en {output}.")
+    if conflicts:
+        click.echo(f"{len(conflicts)} IDs con descripciones distintas entre fuentes (se usó la primera fuente).")
+        for conflict in conflicts if show_conflicts else []:
+            click.echo(f"  {conflict}")
@@ -0,0 +1,151 @@
+# autointelli/xlsx_stream.py
+# Escritor XLSX en streaming (solo biblioteca estándar) y el proceso que lo ejecuta para las exportaciones.
+# La hoja se escribe fila por fila dentro del zip (zipfile sobre un flujo no posicionable, con descriptores de datos)
+# y los textos van como inlineStr, sin tabla de textos compartidos: la memoria no depende del número de filas.
+# run_xlsx_worker corre en un proceso aparte (ver dashboard_export.py): recibe lotes de filas por una conexión de
+# multiprocessing y devuelve los bytes del archivo por otra, así la compresión no ocupa los hilos de las solicitudes.
+# El escritor solo usa la biblioteca estándar; el proceso hijo no crea la app ni abre conexiones a Notion o a la base.
+
+import re
+import zipfile
+from typing import Iterable, Sequence, Any
+from xml.sax.saxutils import escape
+
+# Caracteres de control que XML 1.0 no admite (Notion los deja pasar en textos pegados)
+_ILLEGAL_XML_CHARS = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+_CHUNK_SIZE = 64 * 1024
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+# Estilo 1: encabezado en negritas
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '</styleSheet>'
+)
+_SHEET_HEADER = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/></sheetView></sheetViews>'
+    '<sheetData>'
+)
+_SHEET_FOOTER = '</sheetData></worksheet>'
+
+
+def _workbook_xml(sheet_name: str) -> str:
+    name = escape(_ILLEGAL_XML_CHARS.sub('', sheet_name)[:31] or 'Hoja1', {'"': '&quot;'})
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    )
+
+
+def _cell_xml(value: Any, style: int) -> str:
+    style_attr = f' s="{style}"' if style else ''
+    if value is None or value == '':
+        return f'<c{style_attr}/>'
+    if isinstance(value, bool):
+        return f'<c t="b"{style_attr}><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c{style_attr}><v>{value!r}</v></c>'
+    text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+    return f'<c t="inlineStr"{style_attr}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def row_xml(values: Sequence[Any], style: int = 0) -> str:
+    return '<row>' + ''.join(_cell_xml(value, style) for value in values) + '</row>'
+
+
+def write_xlsx(output, header: Sequence[str], rows: Iterable[Sequence[Any]], sheet_name: str = 'Hoja1') -> None:
+    """Escribe el libro en 'output' (cualquier objeto con write, no necesita seek) consumiendo 'rows' una vez."""
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _workbook_xml(sheet_name))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        archive.writestr('xl/styles.xml', _STYLES)
+        with archive.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            buffer = [_SHEET_HEADER, row_xml(header, style=1)]
+            size = 0
+            for values in rows:
+                xml = row_xml(values)
+                buffer.append(xml)
+                size += len(xml)
+                if size >= _CHUNK_SIZE:
+                    sheet.write(''.join(buffer).encode('utf-8'))
+                    buffer, size = [], 0
+            buffer.append(_SHEET_FOOTER)
+            sheet.write(''.join(buffer).encode('utf-8'))
+
+
+class _ConnectionWriter:
+    """Archivo de solo escritura sobre una conexión de multiprocessing; envía bloques de _CHUNK_SIZE."""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._buffer = bytearray()
+
+    def write(self, data: bytes) -> int:
+        self._buffer += data
+        if len(self._buffer) >= _CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self) -> None:
+        if self._buffer:
+            self._connection.send_bytes(bytes(self._buffer))
+            self._buffer.clear()
+
+
+def _received_rows(rows_connection) -> Iterable[Sequence[Any]]:
+    while True:
+        try:
+            batch = rows_connection.recv()
+        except EOFError:
+            return # El proceso padre cerró la conexión: se cierra el archivo con lo recibido
+        if batch is None:
+            return
+        yield from batch
+
+
+def run_xlsx_worker(rows_connection, output_connection, header: Sequence[str], sheet_name: str) -> None:
+    """Punto de entrada del proceso hijo: lotes de filas (None al terminar) -> bytes del XLSX (b'' al terminar)."""
+    writer = _ConnectionWriter(output_connection)
+    try:
+        write_xlsx(writer, header, _received_rows(rows_connection), sheet_name)
+        writer.flush()
+        output_connection.send_bytes(b'')
+    except (BrokenPipeError, ConnectionResetError):
+        pass # El cliente canceló la descarga
+    finally:
+        rows_connection.close()
+        output_connection.close()
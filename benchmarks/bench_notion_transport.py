@@ -0,0 +1,139 @@
+# benchmarks/bench_notion_transport.py
+# Compara el cliente de Notion original (Client(auth=...), transporte httpx por defecto) con el transporte
+# configurado de autointelli/notion/transport.py, contra un servidor local que imita a la API de Notion.
+# No consulta Notion ni necesita base de datos.
+#
+# El servidor simula el costo de abrir una conexión (DNS + TCP + TLS hacia api.notion.com) con una espera
+# por conexión nueva, y una latencia por solicitud. La carga son ráfagas de consultas desde varios hilos
+# (como un worker gthread) separadas por pausas más largas que el keep-alive por defecto de httpx (5 s).
+#
+# Uso (desde la raíz del repositorio):
+#   python -m benchmarks.bench_notion_transport [--threads 8] [--requests 10] [--bursts 3] [--idle-gap 6]
+#                                               [--handshake-ms 80] [--latency-ms 20] [--pool-size 10] [--keepalive 120]
+
+import argparse
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from notion_client import Client
+
+from autointelli.notion.transport import build_notion_client
+
+
+class _StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handshake_seconds: float, latency_seconds: float):
+        super().__init__(("127.0.0.1", 0), _StandInHandler)
+        self.handshake_seconds = handshake_seconds
+        self.latency_seconds = latency_seconds
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def count_connection(self):
+        with self._lock:
+            self.connections += 1
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+        time.sleep(self.server.handshake_seconds) # Costo de la conexión nueva
+
+    def _respond(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(self.server.latency_seconds)
+        body = json.dumps({"object": "list", "results": [], "has_more": False, "next_cursor": None}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = _respond
+    do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _run_workload(notion_client, server, args) -> dict:
+    server.connections = 0
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def _query(_):
+        started = time.perf_counter()
+        notion_client.databases.query(database_id="bench-db", page_size=100)
+        with latencies_lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as executor:
+        for burst in range(args.bursts):
+            if burst:
+                time.sleep(args.idle_gap)
+            list(executor.map(_query, range(args.threads * args.requests)))
+    elapsed = time.perf_counter() - started - args.idle_gap * (args.bursts - 1)
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "connections": server.connections,
+        "busy_seconds": elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del transporte HTTP del cliente de Notion contra un servidor local.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=10, help="Consultas por hilo en cada ráfaga")
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--idle-gap", type=float, default=6.0, help="Segundos de pausa entre ráfagas")
+    parser.add_argument("--handshake-ms", type=float, default=80.0)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--keepalive", type=float, default=120.0)
+    parser.add_argument("--strategy", choices=("shared", "per_thread"), default="shared")
+    args = parser.parse_args()
+
+    server = _StandInServer(args.handshake_ms / 1000, args.latency_ms / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    config = {
+        "NOTION_HTTP_POOL_SIZE": args.pool_size,
+        "NOTION_HTTP_KEEPALIVE_SECONDS": args.keepalive,
+        "NOTION_HTTP_CONNECT_TIMEOUT_SECONDS": 5.0,
+        "NOTION_HTTP_READ_TIMEOUT_SECONDS": 30.0,
+        "NOTION_HTTP2": False,
+        "NOTION_CLIENT_STRATEGY": args.strategy,
+    }
+    variants = (
+        ("original (Client por defecto)", Client(auth="bench", base_url=base_url)),
+        (f"configurado ({args.strategy})", build_notion_client("bench", config, base_url=base_url)),
+    )
+
+    print(f"Carga: {args.threads} hilos x {args.requests} consultas x {args.bursts} ráfagas, pausa {args.idle_gap}s, "
+          f"conexión {args.handshake_ms}ms, latencia {args.latency_ms}ms")
+    for name, notion_client in variants:
+        result = _run_workload(notion_client, server, args)
+        print(f"{name:32} {result['requests']} consultas, {result['connections']:3} conexiones abiertas, "
+              f"{result['busy_seconds']:.2f}s en ráfagas, p50 {result['p50_ms']:.1f}ms, p95 {result['p95_ms']:.1f}ms")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
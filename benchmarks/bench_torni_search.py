@@ -0,0 +1,104 @@
+# benchmarks/bench_torni_search.py
+# Compara el autocompletado Torni original (descargar static/data/torni_items_masterlist.json completo y filtrarlo
+# en el navegador con Awesomplete) con la búsqueda indexada del servidor (/accesorios/catalog/search, ver
+# autointelli/torni_catalog.py). No necesita base de datos ni servidor. También compara el arranque: parsear el
+# JSON y compilar el índice en memoria contra abrir el catálogo compilado con mmap (static/data/torni_catalog.bin).
+#
+# Para cada consulta simula que el usuario la escribe letra por letra: el original descarga la lista una vez y
+# filtra en cada tecla (el filtro de Awesomplete, reproducido en Python: subcadena sin mayúsculas, orden por
+# largo, primeros 10); el servidor responde cada tecla con los primeros resultados del índice. Los bytes de red
+# se estiman con el JSON de la respuesta (con y sin gzip) y el tiempo de red con --bandwidth-kbps y --rtt-ms.
+#
+# Uso (desde la raíz del repositorio):
+#   python -m benchmarks.bench_torni_search [--queries "abrazadera omega" "ABRA-00" ...] [--limit 10]
+#                                           [--bandwidth-kbps 500] [--rtt-ms 80] [--repeat 200]
+
+import argparse
+import gzip
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from autointelli.torni_catalog import compile_torni_catalog, open_torni_catalog
+
+MASTERLIST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'data', 'torni_items_masterlist.json')
+DEFAULT_QUERIES = ("abrazadera omega", "ABRA-00", "broca 1/2", "tornillo allen", "rondana plana")
+
+
+def _client_filter(items, query, limit):
+    # Lo que hacía Awesomplete en cada tecla: recorrer la lista completa, filtrar por subcadena y ordenar por largo
+    needle = query.strip().lower()
+    suggestions = [item for item in items if needle in item['description'].strip().lower()]
+    suggestions.sort(key=lambda item: (len(item['description']), item['description']))
+    return suggestions[:limit]
+
+
+def _timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return statistics.median(samples) * 1000, samples[max(0, int(len(samples) * 0.95) - 1)] * 1000
+
+
+def _transfer_ms(size_bytes, args):
+    return args.rtt_ms + size_bytes * 8 / (args.bandwidth_kbps * 1000) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del autocompletado Torni: lista maestra en el navegador vs búsqueda indexada en el servidor.")
+    parser.add_argument("--queries", nargs="+", default=list(DEFAULT_QUERIES))
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--bandwidth-kbps", type=float, default=500.0, help="Ancho de banda simulado de la tableta")
+    parser.add_argument("--rtt-ms", type=float, default=80.0, help="Latencia de ida y vuelta simulada por solicitud")
+    parser.add_argument("--repeat", type=int, default=200, help="Repeticiones por tecla para medir la latencia")
+    args = parser.parse_args()
+
+    with open(MASTERLIST_PATH, 'rb') as masterlist:
+        raw = masterlist.read()
+    items = json.loads(raw)
+
+    started = time.perf_counter()
+    compiled = compile_torni_catalog(json.loads(raw))
+    build_ms = (time.perf_counter() - started) * 1000
+    with tempfile.NamedTemporaryFile(suffix='.bin', delete=False) as catalog_file:
+        catalog_file.write(compiled)
+    started = time.perf_counter()
+    catalog = open_torni_catalog(catalog_file.name)
+    open_ms = (time.perf_counter() - started) * 1000
+
+    masterlist_gzip = len(gzip.compress(raw))
+    print(f"Lista maestra: {len(items)} ítems, {len(raw) / 1024:.1f} KB ({masterlist_gzip / 1024:.1f} KB gzip)")
+    print(f"Arranque: parsear JSON y compilar el índice {build_ms:.1f} ms; abrir el catálogo compilado "
+          f"({len(compiled) / 1024:.1f} KB) con mmap {open_ms:.3f} ms")
+    print(f"Red simulada: {args.bandwidth_kbps:.0f} kbps, RTT {args.rtt_ms:.0f} ms\n")
+
+    for query in args.queries:
+        keystrokes = [query[:n] for n in range(1, len(query) + 1)]
+        client_p50, client_p95, server_p50, server_p95 = [], [], [], []
+        server_bytes = server_gzip = 0
+        for typed in keystrokes:
+            p50, p95 = _timed(lambda: _client_filter(items, typed, args.limit), args.repeat)
+            client_p50.append(p50); client_p95.append(p95)
+            p50, p95 = _timed(lambda: catalog.search(typed, limit=args.limit), args.repeat)
+            server_p50.append(p50); server_p95.append(p95)
+            body = json.dumps({"query": typed, "results": catalog.search(typed, limit=args.limit)}).encode('utf-8')
+            server_bytes += len(body)
+            server_gzip += len(gzip.compress(body))
+
+        first = catalog.search(query, limit=args.limit)
+        print(f"'{query}' ({len(keystrokes)} teclas) -> {first[0]['id'] + ' ' + first[0]['description'] if first else 'sin resultados'}")
+        print(f"  original : {len(raw) / 1024:7.1f} KB descargados ({masterlist_gzip / 1024:.1f} KB gzip, "
+              f"~{_transfer_ms(masterlist_gzip, args):.0f} ms), filtro por tecla p50 {statistics.median(client_p50):.3f} ms, p95 {max(client_p95):.3f} ms")
+        print(f"  servidor : {server_bytes / 1024:7.1f} KB en {len(keystrokes)} respuestas ({server_gzip / 1024:.1f} KB gzip, "
+              f"~{_transfer_ms(server_gzip / len(keystrokes), args):.0f} ms por tecla), búsqueda p50 {statistics.median(server_p50):.3f} ms, p95 {max(server_p95):.3f} ms")
+
+    os.unlink(catalog_file.name)
+
+
+if __name__ == "__main__":
+    main()
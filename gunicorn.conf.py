@@ -0,0 +1,8 @@
+# gunicorn.conf.py
+# gunicorn lee este archivo por defecto al arrancar desde la raíz del proyecto (gunicorn wsgi:app).
+
+def post_worker_init(worker):
+    # Los hilos en segundo plano se inician en cada worker ya creado (también con --preload, donde create_app
+    # corre en el proceso maestro antes del fork y los hilos no sobrevivirían)
+    from autointelli import start_background_workers
+    start_background_workers(worker.wsgi)
@@ -1,10 +1,15 @@
 # run.py
 # Este archivo es opcional si usas FLASK_APP=autointelli:create_app() y flask run
 
-from autointelli import create_app
+import os
+
+from autointelli import create_app, start_background_workers
 
 app = create_app()
 
 if __name__ == '__main__':
+    # Con debug=True el recargador relanza el script: los hilos solo se inician en el proceso que atiende solicitudes
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers(app)
     # Usa el servidor de desarrollo de Flask
     app.run(debug=True) # debug=True es solo para desarrollo
\ No newline at end of file
@@ -80,28 +80,22 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.log('Actualización exitosa:', data);
                 // Mostrar mensaje de éxito al usuario (opcional, en un div dedicado o como flash message)
                 // alert('Estatus actualizado correctamente!'); // Usa algo mejor que alert en producción
-                const feedbackDiv = document.getElementById('compras-update-feedback');
-                 if (feedbackDiv) {
-                     feedbackDiv.textContent = data.message || 'Actualización exitosa.';
-                     feedbackDiv.style.color = 'green';
-                     // Limpiar mensaje después de unos segundos
-                     setTimeout(() => { feedbackDiv.textContent = ''; }, 5000);
-                 }
-
-                // Actualizar la visualización del estatus actual en la tabla
-                 if (currentStatusCell) {
-                    // Restaurar el contenido original si lo guardaste o crear el nuevo badge
-                    // Una forma más robusta es actualizar el contenido basado en el nuevo estatus seleccionado:
-                    const newStatusText = newStatus; // El texto a mostrar es el nuevo estatus seleccionado
-                    const newStatusClass = newStatusText.toLowerCase().replace(' ', '-').replace('/', '-');
-                    currentStatusCell.innerHTML = `<span class="current-estatus-text status-badge status-${newStatusClass}">${newStatusText}</span>`;
-                 }
+                showUpdateFeedback(data.message || 'Actualización exitosa.', 'green', 5000);
 
                 // Opcional: Deshabilitar el select o restablecerlo a la opción por defecto "Cambiar Estatus"
                 select.disabled = false; // Habilitar select
                 select.style.cursor = 'pointer'; // Restaurar cursor
                 select.value = ""; // Restablecer a la opción "Cambiar Estatus"
 
+                if (data.status_url) {
+                    // 202: la actualización quedó en la bandeja de salida; el badge queda "aplicando" hasta que se confirme
+                    if (currentStatusCell) {
+                        currentStatusCell.innerHTML = `<span class="current-estatus-text status-badge processing-text">${newStatus} (aplicando...)</span>`;
+                    }
+                    pollStatusUpdate(data.status_url, currentStatusCell, newStatus);
+                } else {
+                    setStatusBadge(currentStatusCell, newStatus);
+                }
             })
             .catch(error => {
                 // Manejar errores de la solicitud o del backend
@@ -137,6 +131,69 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
 
+    // --- Confirmación de actualizaciones encoladas ---
+
+    function showUpdateFeedback(message, color, clearAfterMs) {
+        const feedbackDiv = document.getElementById('compras-update-feedback');
+        if (feedbackDiv) {
+            feedbackDiv.textContent = message;
+            feedbackDiv.style.color = color;
+            // Limpiar mensaje después de unos segundos
+            setTimeout(() => { feedbackDiv.textContent = ''; }, clearAfterMs);
+        }
+    }
+
+    // Muestra el badge del nuevo estatus en la celda y descarta el contenido original guardado
+    function setStatusBadge(statusCell, statusText) {
+        if (!statusCell) return;
+        const statusClass = statusText.toLowerCase().replace(' ', '-').replace('/', '-');
+        statusCell.innerHTML = `<span class="current-estatus-text status-badge status-${statusClass}">${statusText}</span>`;
+        delete statusCell.dataset.originalContent;
+    }
+
+    // Si Notion rechazó la actualización (o no se confirmó a tiempo), la celda vuelve a mostrar el estatus anterior
+    function revertStatusBadge(statusCell, message) {
+        showUpdateFeedback(message, 'red', 10000);
+        if (statusCell && statusCell.dataset.originalContent) {
+            statusCell.innerHTML = statusCell.dataset.originalContent;
+            delete statusCell.dataset.originalContent;
+        }
+    }
+
+    // Consulta el estado de la actualización encolada (status_url) hasta que la bandeja de salida la aplique o falle
+    function pollStatusUpdate(statusUrl, statusCell, newStatus, attempt = 0) {
+        const maxAttempts = 60; // ~2 minutos
+        const delayMs = attempt < 5 ? 1000 : 3000;
+        setTimeout(() => {
+            fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+                .then(response => response.ok ? response.json() : Promise.reject(new Error(`Error ${response.status}`)))
+                .then(status => {
+                    if (status.state === 'done') {
+                        setStatusBadge(statusCell, newStatus);
+                    } else if (status.state === 'pending') {
+                        if (attempt + 1 < maxAttempts) {
+                            pollStatusUpdate(statusUrl, statusCell, newStatus, attempt + 1);
+                        } else {
+                            revertStatusBadge(statusCell, `La actualización a "${newStatus}" sigue pendiente en Notion; recarga la página más tarde.`);
+                        }
+                    } else {
+                        const write = status.items && status.items[0] && status.items[0].writes[0];
+                        const detail = write && write.error ? ` ${write.error}` : '';
+                        revertStatusBadge(statusCell, `Notion no aplicó la actualización a "${newStatus}".${detail}`);
+                    }
+                })
+                .catch(error => {
+                    console.error('Error al consultar el estado de la actualización:', error);
+                    if (attempt + 1 < maxAttempts) {
+                        pollStatusUpdate(statusUrl, statusCell, newStatus, attempt + 1);
+                    } else {
+                        revertStatusBadge(statusCell, `No se pudo confirmar la actualización a "${newStatus}".`);
+                    }
+                });
+        }, delayMs);
+    }
+
+
     // --- Funcionalidad de Filtrado ---
     // Seleccionar el botón y los selectores de filtro por sus IDs
     const applyFiltersButton = document.getElementById('apply-filters-button'); // Asegúrate de que el botón tenga este ID
@@ -144,6 +201,25 @@ document.addEventListener('DOMContentLoaded', function() {
     const estatusSelect = document.getElementById('estatus-filter');
     const proyectoSelect = document.getElementById('proyecto-filter');
 
+    // Opciones del selector de proyectos desde el catálogo en caché; el navegador revalida con ETag (304 si no cambió)
+    if (proyectoSelect && proyectoSelect.dataset.catalogUrl) {
+        fetch(proyectoSelect.dataset.catalogUrl, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.ok ? response.json() : Promise.reject(new Error(`Error ${response.status}`)))
+            .then(projects => {
+                const selectedCode = proyectoSelect.value;
+                const options = [new Option('Todos', '')];
+                projects.forEach(project => {
+                    // Usamos el código del proyecto como valor (el backend filtra por código) y como texto visible
+                    options.push(new Option(project.code, project.code, false, project.code === selectedCode));
+                });
+                if (selectedCode && !projects.some(project => project.code === selectedCode)) {
+                    options.push(new Option(selectedCode, selectedCode, false, true)); // Conserva el filtro aplicado
+                }
+                proyectoSelect.replaceChildren(...options);
+            })
+            .catch(error => console.error('Error al cargar el catálogo de proyectos:', error));
+    }
+
     if (applyFiltersButton && estatusSelect && proyectoSelect) {
         applyFiltersButton.addEventListener('click', function() {
             const baseUrl = '/compras/';
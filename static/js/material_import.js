@@ -0,0 +1,112 @@
+// static/js/material_import.js
+// Sube la hoja de cálculo a /solicitudes/importar y muestra el avance por fila: consulta el estado de la importación
+// con ?since=<versión> para recibir solo las filas que cambiaron desde la última consulta.
+
+const IMPORT_STATUS_LABELS = {
+    invalid: 'Inválida',
+    pending: 'En espera',
+    sending: 'Enviando',
+    done: 'Registrada',
+    failed: 'Fallida',
+};
+
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.getElementById('material-import-form');
+    const fechaInput = document.getElementById('fecha_solicitud');
+    if (fechaInput && !fechaInput.value) {
+        fechaInput.value = new Date().toISOString().slice(0, 10);
+    }
+    if (form) {
+        form.addEventListener('submit', submitImport);
+    }
+});
+
+function showImportMessage(text, category) {
+    const container = document.getElementById('import-message-container');
+    if (!container) return;
+    container.innerHTML = '';
+    const messageDiv = document.createElement('div');
+    messageDiv.className = `flash-message ${category}`;
+    messageDiv.setAttribute('role', 'alert');
+    messageDiv.textContent = text;
+    container.appendChild(messageDiv);
+}
+
+function submitImport(event) {
+    event.preventDefault();
+    const form = event.target;
+    const submitButton = document.getElementById('import-submit');
+    submitButton.disabled = true;
+    showImportMessage('Leyendo el archivo...', 'success');
+
+    fetch(form.action, { method: 'POST', body: new FormData(form) })
+        .then(response => response.json().then(body => ({ ok: response.ok, body })))
+        .then(({ ok, body }) => {
+            if (!ok) {
+                throw new Error(body.error || 'No se pudo importar el archivo.');
+            }
+            document.getElementById('import-rows-body').innerHTML = '';
+            document.getElementById('import-progress').hidden = false;
+            renderImportStatus(body);
+            pollImportStatus(body.status_url, body.version);
+        })
+        .catch(error => {
+            showImportMessage(error.message, 'error');
+            submitButton.disabled = false;
+        });
+}
+
+function renderImportStatus(status) {
+    const body = document.getElementById('import-rows-body');
+    status.rows.forEach(row => {
+        let tr = document.getElementById(`import-row-${row.row}`);
+        if (!tr) {
+            tr = document.createElement('tr');
+            tr.id = `import-row-${row.row}`;
+            for (let i = 0; i < 5; i++) tr.appendChild(document.createElement('td'));
+            body.appendChild(tr);
+        }
+        const cells = tr.children;
+        cells[0].textContent = row.row;
+        cells[1].textContent = row.label;
+        cells[2].textContent = row.partida;
+        cells[3].textContent = IMPORT_STATUS_LABELS[row.status] || row.status;
+        cells[4].textContent = row.message;
+        tr.className = `import-row-${row.status}`;
+    });
+
+    const counts = status.counts;
+    const valid = status.total_rows - counts.invalid;
+    const finished = counts.done + counts.failed;
+    document.getElementById('import-progress-fill').style.width = `${valid ? Math.round(finished * 100 / valid) : 100}%`;
+    document.getElementById('import-progress-summary').textContent =
+        `${status.filename}: ${counts.done} registradas, ${counts.failed} fallidas, ${counts.invalid} inválidas, ` +
+        `${counts.pending + counts.sending} por enviar (${status.total_rows} filas, ${status.requests} folios).`;
+
+    if (status.state === 'done') {
+        showImportMessage('Importación terminada.', counts.failed || counts.invalid ? 'warning' : 'success');
+        document.getElementById('import-submit').disabled = false;
+    } else if (status.state === 'failed') {
+        showImportMessage(`Importación interrumpida: ${status.error}`, 'error');
+        document.getElementById('import-submit').disabled = false;
+    } else {
+        showImportMessage(status.state === 'validating' ? 'Validando partidas...' : 'Enviando a Notion...', 'success');
+    }
+}
+
+function pollImportStatus(statusUrl, since) {
+    setTimeout(() => {
+        fetch(`${statusUrl}?since=${since}`, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.ok ? response.json() : Promise.reject(new Error(`Error ${response.status}`)))
+            .then(status => {
+                renderImportStatus(status);
+                if (status.state !== 'done' && status.state !== 'failed') {
+                    pollImportStatus(statusUrl, status.version);
+                }
+            })
+            .catch(error => {
+                console.error('Error al consultar el estado de la importación:', error);
+                pollImportStatus(statusUrl, since);
+            });
+    }, 1000);
+}
@@ -0,0 +1,45 @@
+// static/js/request_status.js
+// Seguimiento de solicitudes encoladas en la bandeja de salida de Notion (respuesta 202 con status_url).
+// Lo cargan los formularios de solicitud estándar y Torni antes de su script principal.
+
+// Muestra el mensaje del estado y, si ya hay una página creada, el enlace al registro.
+// El mensaje se escribe como texto: incluye datos capturados por el usuario (p. ej. el folio).
+function showRequestStatus(messageDiv, status) {
+    messageDiv.textContent = status.message || '';
+    const firstUrl = status.notion_url_db1 || status.notion_url_db2;
+    if (firstUrl) {
+        const link = document.createElement('a');
+        link.href = firstUrl;
+        link.target = '_blank';
+        link.rel = 'noopener noreferrer';
+        link.textContent = 'Ver Registro';
+        messageDiv.append(' ', link);
+    }
+}
+
+// Consulta el estado de una solicitud encolada hasta que termine de registrarse en Notion.
+function pollRequestStatus(statusUrl, messageDiv, attempt = 0) {
+    const maxAttempts = 60; // ~2 minutos
+    const delayMs = attempt < 5 ? 1000 : 3000;
+    setTimeout(() => {
+        fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+            .then(response => response.ok ? response.json() : Promise.reject(new Error(`Error ${response.status}`)))
+            .then(status => {
+                if (!messageDiv) return;
+                showRequestStatus(messageDiv, status);
+                messageDiv.classList.remove('success', 'warning', 'error');
+                if (status.state === 'done') {
+                    messageDiv.classList.add('success');
+                } else if (status.state === 'pending') {
+                    messageDiv.classList.add('success');
+                    if (attempt + 1 < maxAttempts) pollRequestStatus(statusUrl, messageDiv, attempt + 1);
+                } else {
+                    messageDiv.classList.add(status.state === 'partial' ? 'warning' : 'error');
+                }
+            })
+            .catch(error => {
+                console.error('Error al consultar el estado de la solicitud:', error);
+                if (attempt + 1 < maxAttempts) pollRequestStatus(statusUrl, messageDiv, attempt + 1);
+            });
+    }, delayMs);
+}
@@ -646,6 +646,8 @@ document.addEventListener('DOMContentLoaded', function() {
                        responseMessageDiv.classList.add('error');
                    }
                }
+               // Solicitud encolada: seguir su registro en Notion
+               if (isSuccess && data.status_url) pollRequestStatus(data.status_url, responseMessageDiv);
 
                // Reset form and UI only if successful (based on isSuccess flag)
                if (isSuccess) {
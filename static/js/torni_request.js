@@ -2,7 +2,7 @@
 
 // Este script asume que las siguientes variables globales se definen en la plantilla HTML
 // antes de que este script se cargue, usando url_for:
-// const TORNI_MASTERLIST_URL = "{{ url_for('static', filename='data/torni_items_masterlist.json') }}";
+// const TORNI_SEARCH_URL = "{{ url_for('accesorios.torni_catalog_search') }}";
 
 
 document.addEventListener('DOMContentLoaded', function() {
@@ -31,7 +31,9 @@ document.addEventListener('DOMContentLoaded', function() {
 
 
     // --- Variables Globales del Script ---
-    let torniMasterList = []; // Para lista maestra de items Torni (cargado de JSON)
+    const torniSearchAvailable = typeof TORNI_SEARCH_URL !== 'undefined'; // Búsqueda del catálogo Torni en el servidor
+    const torniSearchCache = new Map(); // Resultados por consulta, para no repetir búsquedas al borrar y reescribir
+    const TORNI_SEARCH_DEBOUNCE_MS = 150;
     let currentFolio = null;
 
 
@@ -49,6 +51,23 @@ document.addEventListener('DOMContentLoaded', function() {
         if (folioInputHidden) folioInputHidden.value = folio;
     }
 
+    // --- Búsqueda en el catálogo Torni (servidor) ---
+    // Devuelve los primeros resultados {id, description} para la consulta; guarda cada respuesta en torniSearchCache
+    function searchTorniCatalog(query) {
+        const key = query.toLowerCase();
+        if (torniSearchCache.has(key)) return Promise.resolve(torniSearchCache.get(key));
+        return fetch(`${TORNI_SEARCH_URL}?q=${encodeURIComponent(query)}`, { headers: { 'Accept': 'application/json' } })
+            .then(res => {
+                if (!res.ok) throw new Error(`Catálogo Torni: ${res.status} ${res.statusText}`);
+                return res.json();
+            })
+            .then(data => {
+                const results = data.results || [];
+                torniSearchCache.set(key, results);
+                return results;
+            });
+    }
+
     // --- Lógica Tabla Torni (con Awesomplete) ---
     // Esta función maneja la adición de filas Torni y la inicialización de Awesomplete para cada fila
     function addTorniRow() {
@@ -76,13 +95,15 @@ document.addEventListener('DOMContentLoaded', function() {
 
 
         // --- Inicializar Awesomplete para la nueva fila ---
-        if (descInput && typeof Awesomplete !== 'undefined' && torniMasterList.length > 0) {
+        if (descInput && typeof Awesomplete !== 'undefined' && torniSearchAvailable) {
              console.log("Inicializando Awesomplete para nueva fila...");
 
+             let rowResults = []; // Últimos resultados mostrados en esta fila {id, description}
+             let searchTimer = null;
+
              const awesompleteInstance = new Awesomplete(descInput, {
-                 list: torniMasterList, // Pasar el ARRAY COMPLETO de objetos {id, description}
-                 data: function (item, input) { // `item` es un objeto de torniMasterList {id, description}
-                     //console.log("Awesomplete 'data' function - input item:", item);
+                 list: [], // Se llena con los resultados de la búsqueda en el servidor mientras el usuario escribe
+                 data: function (item, input) { // `item` es un resultado de la búsqueda {id, description}
                      let html = item.description.replace(new RegExp(Awesomplete.$.regExpEscape(input.trim()), "gi"), "<mark>$&</mark>");
                      // Retornamos un nuevo objeto para Awesomplete, incluyendo el ID y el objeto original
                      return { label: html, value: item.description, original: item, id: item.id };
@@ -92,16 +113,26 @@ document.addEventListener('DOMContentLoaded', function() {
                       return Awesomplete.ITEM(data.label, input);
                  },
                  replace: function(suggestion) { // Recibe el objeto {label, value, original, id}
-                     //console.log("Awesomplete 'replace' function - suggestion:", suggestion);
                      // Cuando el usuario selecciona, poner el valor (descripción) en el input
                      this.input.value = suggestion.value;
                  },
                  minChars: 1, maxItems: 10, autoFirst: true,
-                 filter: function(item, input) { // Filtra la lista. `item` es el objeto retornado por la función 'data'
-                    // item aquí es {label, value, original, id}
-                    // Queremos filtrar basándonos en la descripción (la propiedad 'value')
-                    return item.value.trim().toLowerCase().includes(input.trim().toLowerCase());
-                 }
+                 filter: function() { return true; }, // El servidor ya filtró (por ID y por palabras de la descripción)
+                 sort: false // Se respeta el orden del servidor
+             });
+
+             // --- Búsqueda en el servidor mientras se escribe (con espera corta entre teclas) ---
+             descInput.addEventListener('input', function() {
+                 const query = this.value.trim();
+                 clearTimeout(searchTimer);
+                 if (!query) { awesompleteInstance.list = []; rowResults = []; return; }
+                 searchTimer = setTimeout(() => {
+                     searchTorniCatalog(query).then(results => {
+                         if (descInput.value.trim() !== query) return; // El usuario siguió escribiendo
+                         rowResults = results;
+                         awesompleteInstance.list = results; // Awesomplete vuelve a evaluar al asignar la lista
+                     }).catch(error => console.error("Error en la búsqueda del catálogo Torni:", error));
+                 }, TORNI_SEARCH_DEBOUNCE_MS);
              });
 
              // --- Listener para cuando se SELECCIONA un item ---
@@ -118,41 +149,21 @@ document.addEventListener('DOMContentLoaded', function() {
                 console.log("ID obtenido inicialmente de event.text.id:", selectedItemId); // Log de verificación
 
 
-                // --- SI event.text.id NO TIENE EL ID, BUSCAR EN LA LISTA MAESTRA ---
-                // Verifica si selectedItemId es falsy (undefined, null, '')
-                // ESTA LÓGICA ES EL FALLBACK. Si event.text.id no viene, busca en la lista maestra.
+                // --- SI event.text.id NO TIENE EL ID, BUSCAR EN LOS RESULTADOS MOSTRADOS EN LA FILA ---
                 if (!selectedItemId) {
-                    console.log("ID no encontrado directamente en event.text. Buscando en lista maestra...");
-                    // El valor seleccionado por Awesomplete (la descripción)
-                    const selectedValueFromAwesomplete = event.text.value;
-                    // Limpiar y normalizar el valor seleccionado (quitar espacios, mayúsculas, posibles saltos de línea)
-                    // >>> CORRECCIÓN FINAL DEL TIPOGRÁFICO <<<
-                    const normalizedSelectedValue = selectedValueFromAwesomplete.trim().toLowerCase().replace(/[\r\n]/g, '');
-
-
-                    // Buscar el objeto original en la lista maestra (torniMasterList)
-                    // Asegúrate de que la comparación en find() también normaliza la descripción del item maestro
-                    const selectedItemData = torniMasterList.find(item => {
-                        if (item && typeof item.description === 'string') {
-                            const normalizedItemDescription = item.description.trim().toLowerCase().replace(/[\r\n]/g, '');
-                            //console.log(`Comparando búsqueda: "${normalizedSelectedValue}" con item "${item.id}": "${normalizedItemDescription}" -> ${normalizedSelectedValue === normalizedItemDescription}`); // Log detallado si es necesario
-                            return normalizedItemDescription === normalizedSelectedValue;
-                        }
-                        return false;
-                    });
-
-                    console.log("Objeto original encontrado en lista maestra:", selectedItemData); // LOGUEA ESTO
-
-                    // Si se encontró el objeto en la lista maestra, usar su ID
+                    console.log("ID no encontrado directamente en event.text. Buscando en los resultados de la búsqueda...");
+                    const normalizedSelectedValue = event.text.value.trim().toLowerCase().replace(/[\r\n]/g, '');
+                    const selectedItemData = rowResults.find(item => item && typeof item.description === 'string' &&
+                        item.description.trim().toLowerCase().replace(/[\r\n]/g, '') === normalizedSelectedValue);
+
                     if (selectedItemData && selectedItemData.id) {
                         selectedItemId = selectedItemData.id; // Asignar el ID encontrado
-                        console.log("ID encontrado en lista maestra.");
                     } else {
-                         console.warn("No se encontró objeto en lista maestra o no tiene ID para:", selectedValueFromAwesomplete);
+                         console.warn("No se encontró el ítem en los resultados de la búsqueda para:", event.text.value);
                          selectedItemId = undefined; // Asegurarse de que es undefined si no se encuentra
                     }
                 }
-                // --- FIN BÚSQUEDA EN LISTA MAESTRA ---
+                // --- FIN BÚSQUEDA EN RESULTADOS ---
 
 
                 console.log("ID final determinado para llenar campo:", selectedItemId); // Log final del ID a usar
@@ -198,7 +209,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         } else {
              if (typeof Awesomplete === 'undefined') console.error("¡Awesomplete NO está definido! Revisa la carga del script.");
-             if (!torniMasterList || torniMasterList.length === 0) console.warn("torniMasterList está vacía o no cargada. No se puede inicializar Awesomplete para sugerencias.");
+             if (!torniSearchAvailable) console.warn("TORNI_SEARCH_URL no está definida. No se puede inicializar Awesomplete para sugerencias.");
              if (!descInput) console.error("Input de descripción (.torni-desc) no encontrado en la nueva fila.");
              if (!idInput) console.error("Input de ID (.torni-id) no encontrado en la nueva fila.");
         }
@@ -230,14 +241,14 @@ document.addEventListener('DOMContentLoaded', function() {
         // Asegurar que la tabla tiene al menos una fila si hay datos maestros
         // Esto ya lo hace la lógica de carga inicial si el proveedor por defecto es Torni
         // Si necesitas añadir una fila después de un reset, hazlo en la lógica de reset del submit listener
-        if (torniTableBody && torniTableBody.rows.length === 0 && torniMasterList.length > 0) {
+        if (torniTableBody && torniTableBody.rows.length === 0 && torniSearchAvailable) {
             addTorniRow();
-        } else if (torniTableBody && torniMasterList.length === 0) {
-             // Si no hay datos maestros, loguear y quizás mostrar mensaje
-             console.warn("Lista maestra de items Torni está vacía. No se pueden añadir items.");
+        } else if (torniTableBody && !torniSearchAvailable) {
+             // Si no hay búsqueda del catálogo, loguear y quizás mostrar mensaje
+             console.warn("Búsqueda del catálogo Torni no configurada. No se pueden añadir items.");
              // Mostrar mensaje en el div de respuesta AJAX si no hay ya un mensaje de error/loading
               if(responseMessageDiv && responseMessageDiv.textContent === "") {
-                 responseMessageDiv.textContent = "Lista de productos Torni no cargada. La creación de ítems no es posible.";
+                 responseMessageDiv.textContent = "Catálogo de productos Torni no disponible. La creación de ítems no es posible.";
                  responseMessageDiv.classList.add('warning');
               }
          }
@@ -474,6 +485,8 @@ document.addEventListener('DOMContentLoaded', function() {
                        responseMessageDiv.classList.add('error');
                    }
                }
+               // Solicitud encolada: seguir su registro en Notion
+               if (isSuccess && data.status_url) pollRequestStatus(data.status_url, responseMessageDiv);
 
                // Resetear formulario y UI solo si fue éxito total o parcial (isSuccess es true)
                if (isSuccess) {
@@ -484,7 +497,7 @@ document.addEventListener('DOMContentLoaded', function() {
                    // Resetear la tabla Torni
                    if (torniTableBody) torniTableBody.innerHTML = '';
                    // Asegurar una fila Torni inicial si la tabla está vacía y hay datos maestros
-                    if (torniTableBody && torniTableBody.rows.length === 0 && torniMasterList.length > 0) {
+                    if (torniTableBody && torniTableBody.rows.length === 0 && torniSearchAvailable) {
                          addTorniRow();
                     }
 
@@ -538,69 +551,20 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
 
-    // Carga de Datos (LLAMA A fetch, que en su .then llama a funciones para inicializar UI)
-    // En este script, solo necesitas cargar TORNI_MASTERLIST_URL
-    if (typeof TORNI_MASTERLIST_URL !== 'undefined') {
-        fetch(TORNI_MASTERLIST_URL)
-        .then(res => {
-             if (!res.ok) throw new Error(`Items Torni: ${res.status} ${res.statusText}`);
-             return res.json();
-         }).catch(error => { console.error("Error en fetch de Items Torni:", error); throw error; })
-        .then(torniData => {
-            console.log("Datos iniciales cargados con éxito (Items Torni).");
-            torniMasterList = torniData || [];
-            console.log("Contenido de torniMasterList:", torniMasterList);
-
-            // --- Llamadas a funciones para inicializar la UI *después* de cargar los datos ---
-            // handleProveedorChange(); // No necesaria en este formulario Torni (proveedor fijo)
-
-             // Asegurar que la tabla tiene al menos una fila si hay datos maestros
-             if (torniTableBody && torniTableBody.rows.length === 0 && torniMasterList.length > 0) {
-                 addTorniRow(); // Añadir una fila si la tabla está vacía y hay datos maestros
-             } else if (torniTableBody && torniMasterList.length === 0) {
-                 // Si no hay datos maestros, loguear y quizás mostrar mensaje
-                 console.warn("Lista maestra de items Torni está vacía. No se pueden añadir items.");
-                 // Mostrar mensaje en el div de respuesta AJAX si no hay ya un mensaje de error/loading
-                  if(responseMessageDiv && responseMessageDiv.textContent === "") {
-                     responseMessageDiv.textContent = "Lista de productos Torni no cargada. La creación de ítems no es posible.";
-                     responseMessageDiv.classList.add('warning');
-                 }
-             }
-
-
-             // Asegurar que el botón de submit esté habilitado solo si hay datos maestros
-             if(materialForm) {
-                 const submitBtn = materialForm.querySelector('button[type="submit"]');
-                 if (submitBtn) {
-                     submitBtn.disabled = torniMasterList.length === 0; // Deshabilitar si la lista está vacía
-                     if (torniMasterList.length === 0 && responseMessageDiv && responseMessageDiv.textContent === "") {
-                          responseMessageDiv.textContent = "Lista de productos Torni no cargada. La creación de ítems no es posible.";
-                          responseMessageDiv.classList.add('warning');
-                     }
-                 }
-             }
-
-
-        })
-        .catch(error => {
-            console.error("Error general al cargar datos JSON iniciales:", error);
-            if(responseMessageDiv){
-                 responseMessageDiv.textContent = `Error al cargar datos iniciales: ${error.message || 'Ver logs de consola.'}`;
-                 responseMessageDiv.classList.add('error');
-            }
-             // Deshabilitar el formulario si faltan URLs o datos iniciales son críticos
-            if(materialForm) materialForm.querySelector('button[type="submit"]').disabled = true;
-        });
+    // Catálogo Torni: ya no se descarga la lista maestra; cada fila consulta TORNI_SEARCH_URL mientras se escribe
+    if (torniSearchAvailable) {
+        if (torniTableBody && torniTableBody.rows.length === 0) {
+            addTorniRow(); // Añadir una fila si la tabla está vacía
+        }
     } else {
-         console.error("URLs para datos iniciales (JSON estáticos) no definidas (Items Torni).");
+         console.error("URL de búsqueda del catálogo Torni no definida (TORNI_SEARCH_URL).");
          if(responseMessageDiv){
-              responseMessageDiv.textContent = `Error: URLs de datos iniciales no configuradas en la plantilla HTML.`;
+              responseMessageDiv.textContent = `Error: URL de búsqueda del catálogo no configurada en la plantilla HTML.`;
               responseMessageDiv.classList.add('error');
          }
          if(materialForm) materialForm.querySelector('button[type="submit"]').disabled = true;
     }
 
-
     // --- Event Listeners ---
     // Los event listeners se añaden aquí
     // No necesitas listeners de dimensiones o dropdowns dependientes en este formulario.
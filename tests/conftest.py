@@ -0,0 +1,148 @@
+# tests/conftest.py
+# Fixtures comunes: la aplicación con una base SQLite temporal y sin cliente de Notion (NOTION_API_KEY vacía), así que
+# ninguna prueba consulta Notion ni arranca hilos en segundo plano. Las llamadas a Notion se prueban con clientes falsos.
+
+import threading
+
+import pytest
+
+from autointelli import create_app
+from autointelli.models import db, User
+from autointelli.notion import rate_limit
+from autointelli.notion.mirror import filter_pages, normalize_notion_id
+from autointelli.notion.rate_limit import TokenBucket
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # load_dotenv no reemplaza variables ya definidas: estas ganan sobre el .env local
+    monkeypatch.setenv('DATABASE_URL', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('NOTION_API_KEY', '')
+    monkeypatch.setenv('NOTION_HTTP_WARMUP', 'false')
+    app = create_app()
+    app.config.update(
+        TESTING=True,
+        NOTION_RETRY_BASE_SECONDS=0.001, # Reintentos sin esperas reales
+        NOTION_CIRCUIT_ENABLED=False,
+    )
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def fast_limiter(monkeypatch):
+    """Limitador de tasa del proceso sin esperas, para probar reintentos sin dormir."""
+    limiter = TokenBucket(1000, 1000)
+    monkeypatch.setattr(rate_limit, '_rate_limiter', limiter)
+    return limiter
+
+
+@pytest.fixture
+def users(app):
+    """Dos usuarios: el dueño de los envíos y otro usuario."""
+    owner = User(username='owner', email='owner@example.com', password='x', role='compras')
+    other = User(username='other', email='other@example.com', password='x', role='compras')
+    db.session.add_all([owner, other])
+    db.session.commit()
+    return owner, other
+
+
+@pytest.fixture
+def notion(fast_limiter):
+    """Cliente de Notion en memoria (ver FakeNotion)."""
+    return FakeNotion()
+
+
+class DatabasesEndpoint:
+    def __init__(self, notion):
+        self._notion = notion
+
+    def query(self, database_id, filter=None, sorts=None, start_cursor=None, page_size=100, filter_properties=None):
+        self._notion.record('databases.query', database_id=database_id, filter=filter, sorts=sorts, start_cursor=start_cursor)
+        pages = filter_pages(self._notion.database_pages(database_id), filter)
+        for sort in reversed(sorts or []):
+            pages.sort(key=lambda page: page.get(sort.get("timestamp")) or "", reverse=sort.get("direction") == "descending")
+        offset = int(start_cursor or 0)
+        next_offset = offset + page_size
+        has_more = next_offset < len(pages)
+        return {"results": pages[offset:next_offset], "has_more": has_more, "next_cursor": str(next_offset) if has_more else None}
+
+    def retrieve(self, database_id):
+        self._notion.record('databases.retrieve', database_id=database_id)
+        return {"id": database_id, "properties": self._notion.schemas.get(normalize_notion_id(database_id), {})}
+
+
+class PagesEndpoint:
+    def __init__(self, notion):
+        self._notion = notion
+
+    def create(self, parent, properties):
+        self._notion.record('pages.create', properties=properties)
+        return self._notion.add_page(parent["database_id"], properties)
+
+    def update(self, page_id, properties):
+        self._notion.record('pages.update', page_id=page_id, properties=properties)
+        page = self._notion.stored_pages[page_id]
+        page["properties"].update(_read_format(properties))
+        return page
+
+    def retrieve(self, page_id, filter_properties=None):
+        self._notion.record('pages.retrieve', page_id=page_id)
+        return self._notion.stored_pages[page_id]
+
+
+def _read_format(properties):
+    """Propiedades en formato de escritura ({"select": {...}}) al formato de lectura ({"type": "select", "select": {...}})."""
+    return {name: value if "type" in value else {"type": next(iter(value)), **value} for name, value in properties.items()}
+
+
+class FakeNotion:
+    """
+    Cliente de Notion en memoria: databases.query evalúa los filtros con el evaluador del espejo y pagina con cursores.
+    fail(operación, error) hace que esa operación ('pages.update', 'databases.query', ...) lance el error;
+    con page_id solo falla para esa página.
+    """
+
+    def __init__(self):
+        self.stored_pages = {}
+        self.schemas = {}
+        self.calls = []
+        self.failures = {}
+        self._lock = threading.Lock()
+        self.databases = DatabasesEndpoint(self)
+        self.pages = PagesEndpoint(self)
+
+    def record(self, operation, **kwargs):
+        with self._lock:
+            self.calls.append((operation, kwargs))
+        error = self.failures.get((operation, kwargs.get("page_id"))) or self.failures.get((operation, None))
+        if error is not None:
+            raise error
+
+    def fail(self, operation, error, page_id=None):
+        self.failures[(operation, page_id)] = error
+
+    def count(self, operation):
+        return sum(1 for name, _ in self.calls if name == operation)
+
+    def add_page(self, database_id, properties, page_id=None, created_time=None, last_edited_time=None):
+        with self._lock:
+            page_id = page_id or f"page{len(self.stored_pages) + 1}"
+            page = self.stored_pages[page_id] = {
+                "object": "page",
+                "id": page_id,
+                "url": f"https://notion.so/{page_id}",
+                "parent": {"type": "database_id", "database_id": database_id},
+                "created_time": created_time or f"2024-05-01T10:{len(self.stored_pages):02d}:00.000Z",
+                "last_edited_time": last_edited_time or created_time or "2024-05-01T10:00:00.000Z",
+                "properties": _read_format(properties),
+            }
+        return page
+
+    def database_pages(self, database_id):
+        database_id = normalize_notion_id(database_id)
+        return [page for page in self.stored_pages.values()
+                if normalize_notion_id(page["parent"]["database_id"]) == database_id and not page.get("archived")]
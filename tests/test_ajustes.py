@@ -0,0 +1,95 @@
+from datetime import datetime
+
+import httpx
+import pytest
+from notion_client.errors import HTTPResponseError
+
+from autointelli.notion import schema_cache
+from autointelli.notion.ajustes import PLAN_QUERY_SORTS, adjust_dates_api, adjust_dates_with_filters_util, build_date_cutoff_filters
+from autointelli.notion.constants import DATE_PROPERTY_NAME
+
+DB = "db-ajustes"
+START = datetime(2024, 5, 10)
+
+
+@pytest.fixture
+def notion(notion, monkeypatch):
+    monkeypatch.setattr(schema_cache, '_schema_cache', {})
+    monkeypatch.setattr(schema_cache, '_known_versions', {})
+    notion.schemas["dbajustes"] = {DATE_PROPERTY_NAME: {"id": "d", "type": "date"}, "Nombre": {"id": "title", "type": "title"}}
+    return notion
+
+
+def _add(notion, page_id, start, end=None):
+    return notion.add_page(DB, {DATE_PROPERTY_NAME: {"date": {"start": start, "end": end} if start else None}}, page_id=page_id)
+
+
+def _date(notion, page_id):
+    return notion.stored_pages[page_id]["properties"][DATE_PROPERTY_NAME]["date"]
+
+
+def test_cutoff_filters_go_to_notion_only_for_date_properties(app, notion):
+    assert build_date_cutoff_filters(notion, DB, START) == [
+        {"property": DATE_PROPERTY_NAME, "date": {"is_not_empty": True}},
+        {"property": DATE_PROPERTY_NAME, "date": {"on_or_after": "2024-05-09"}}, # Un día antes del corte
+    ]
+    notion.schemas["dbajustes"][DATE_PROPERTY_NAME]["type"] = "rich_text"
+    assert build_date_cutoff_filters(notion, "dbajustes", START) == []
+
+
+def test_only_dates_on_or_after_the_cutoff_are_shifted(app, notion):
+    _add(notion, "page1", "2024-05-01T08:00:00")
+    _add(notion, "page2", "2024-05-09T20:00:00")
+    _add(notion, "page3", "2024-05-10T08:00:00", "2024-05-10T10:00:00")
+    _add(notion, "page4", "2024-05-12T09:30:00")
+    _add(notion, "page5", None)
+
+    resumen, pending = adjust_dates_with_filters_util(notion, DB, 2, START)
+    assert pending == []
+    assert "Total de registros encontrados para revisión: 3" in resumen # page1 y page5 no llegan de Notion
+    assert "Registros actualizados con éxito: 2" in resumen
+    assert "omitidos: 1" in resumen
+    assert _date(notion, "page2") == {"start": "2024-05-09T20:00:00", "end": None}
+    assert _date(notion, "page3") == {"start": "2024-05-10T10:00:00", "end": "2024-05-10T12:00:00"}
+    assert _date(notion, "page4") == {"start": "2024-05-12T11:30:00", "end": None}
+
+    (_, query), = [call for call in notion.calls if call[0] == 'databases.query']
+    assert query["sorts"] == PLAN_QUERY_SORTS
+    assert query["filter"] == {"and": build_date_cutoff_filters(notion, DB, START)}
+
+
+def test_failed_updates_can_be_retried_alone(app, notion):
+    _add(notion, "page1", "2024-05-10T08:00:00")
+    _add(notion, "page2", "2024-05-11T08:00:00")
+    notion.fail('pages.update', RuntimeError("sin conexión"), page_id="page2")
+
+    response, status_code = adjust_dates_api(notion, DB, 1, "2024-05-10")
+    assert status_code == 207
+    assert response["pending_page_ids"] == ["page2"]
+    assert _date(notion, "page1")["start"] == "2024-05-10T09:00:00"
+
+    notion.failures.clear()
+    response, _ = adjust_dates_api(notion, DB, 1, "2024-05-10", page_ids=response["pending_page_ids"])
+    assert response["success"] and response["pending_page_ids"] == []
+    assert _date(notion, "page1")["start"] == "2024-05-10T09:00:00" # No se desplaza dos veces
+    assert _date(notion, "page2")["start"] == "2024-05-11T09:00:00"
+
+
+def test_query_failure_before_the_first_page_is_not_an_empty_result(app, notion):
+    _add(notion, "page1", "2024-05-10T08:00:00")
+    error = HTTPResponseError(httpx.Response(400, request=httpx.Request('POST', 'https://api.notion.com/v1/databases/x/query')))
+    notion.fail('databases.query', error)
+
+    resumen, pending = adjust_dates_with_filters_util(notion, DB, 1, START, page_ids=["page1"])
+    assert resumen.startswith("¡ADVERTENCIA! La consulta a Notion se interrumpió")
+    assert "No se modificó ningún registro" in resumen
+    assert "No se encontraron registros" not in resumen
+    assert pending == ["page1"]
+    assert notion.count('pages.update') == 0
+
+
+def test_no_matching_records(app, notion):
+    _add(notion, "page1", "2024-05-01T08:00:00")
+    resumen, pending = adjust_dates_with_filters_util(notion, DB, 1, START)
+    assert resumen.startswith("Operación completada: No se encontraron registros")
+    assert pending == []
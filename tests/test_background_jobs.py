@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+from autointelli.background_jobs import (
+    JOB_DONE, JOB_FAILED, create_job, find_active_job, get_job_status, prune_jobs, save_job_rows, save_job_state,
+)
+from autointelli.material_import import ROW_DONE, ROW_INVALID, ImportJob, ImportRow, get_import_status
+from autointelli.models import db, BackgroundJob, BackgroundJobRow
+
+STATUSES = ('pending', 'done', 'failed')
+
+
+def _create(job_id, kind='test', key=None, user_id=None, rows=3):
+    create_job(kind, job_id, 'running', [(position, 'pending', '', {"name": f"fila {position}"}) for position in range(rows)],
+               {"total": rows}, user_id=user_id, key=key)
+
+
+def test_status_reports_rows_and_counts(app):
+    _create('job1')
+    status = get_job_status('test', 'job1', STATUSES, 'page_id')
+    assert status["state"] == 'running'
+    assert status["total"] == 3
+    assert status["version"] == 0
+    assert status["counts"] == {"pending": 3, "done": 0, "failed": 0}
+    assert status["rows"][0] == {"name": "fila 0", "status": "pending", "message": "", "page_id": None}
+
+
+def test_since_returns_only_changed_rows(app):
+    _create('job1')
+    save_job_rows('job1', 1, [0, 2], 'done', result='page-x')
+    save_job_rows('job1', 2, [1], 'failed', 'Error de Notion')
+
+    status = get_job_status('test', 'job1', STATUSES, 'page_id', since=1)
+    assert status["version"] == 2
+    assert [row["name"] for row in status["rows"]] == ["fila 1"]
+    assert status["rows"][0]["message"] == 'Error de Notion'
+    assert status["counts"] == {"pending": 0, "done": 2, "failed": 1} # Los conteos son de todas las filas
+    assert get_job_status('test', 'job1', STATUSES, 'page_id', since=2)["rows"] == []
+
+    full = get_job_status('test', 'job1', STATUSES, 'page_id')
+    assert [row["page_id"] for row in full["rows"]] == ['page-x', None, 'page-x']
+
+
+def test_status_is_only_visible_to_its_owner(app, users):
+    owner, other = users
+    _create('job1', user_id=owner.id)
+    assert get_job_status('test', 'job1', STATUSES, 'page_id', user_id=owner.id) is not None
+    assert get_job_status('test', 'job1', STATUSES, 'page_id', user_id=other.id) is None
+    assert get_job_status('otro', 'job1', STATUSES, 'page_id') is None # Otro tipo de trabajo
+    assert get_job_status('test', 'no-existe', STATUSES, 'page_id') is None
+
+
+def test_stale_jobs_are_reported_failed_and_stop_blocking(app):
+    _create('job1', key='proyecto-1')
+    assert find_active_job('test', 'proyecto-1') == 'job1'
+
+    db.session.get(BackgroundJob, 'job1').updated_at = datetime.utcnow() - timedelta(hours=1)
+    db.session.commit()
+    status = get_job_status('test', 'job1', STATUSES, 'page_id')
+    assert status["state"] == JOB_FAILED
+    assert "interrumpió" in status["error"]
+    assert find_active_job('test', 'proyecto-1') is None
+
+
+def test_finished_jobs_are_not_active(app):
+    _create('job1', key='proyecto-1')
+    save_job_state('job1', 1, JOB_DONE, summary={"total": 3, "extra": True})
+    assert find_active_job('test', 'proyecto-1') is None
+    status = get_job_status('test', 'job1', STATUSES, 'page_id')
+    assert status["state"] == JOB_DONE
+    assert status["extra"] is True
+
+
+def test_prune_keeps_the_most_recent_finished_jobs(app):
+    for index in range(4):
+        _create(f'job{index}')
+        db.session.get(BackgroundJob, f'job{index}').created_at = datetime(2024, 1, 1 + index)
+        db.session.commit()
+    for index in range(3):
+        save_job_state(f'job{index}', 1, JOB_DONE)
+
+    prune_jobs('test', keep=1)
+    assert sorted(job.id for job in BackgroundJob.query) == ['job2', 'job3'] # job3 sigue en curso
+    assert {row.job_id for row in BackgroundJobRow.query} == {'job2', 'job3'}
+
+
+def test_import_job_persists_every_change(app, users):
+    owner, _ = users
+    rows = [ImportRow(2, True, 'P-01', 'TR-100'), ImportRow(3, True, 'P-01', 'NO-EXISTE')]
+    rows[1].status, rows[1].message = ROW_INVALID, 'El ID no existe'
+    job = ImportJob(owner.id, 'materiales.csv', rows, {})
+    job.save()
+
+    job.update_rows(rows[:1], ROW_DONE, folio='IMP-1')
+    job.set_state('done')
+
+    status = get_import_status(job.job_id, user_id=owner.id)
+    assert status["state"] == 'done'
+    assert status["filename"] == 'materiales.csv'
+    assert status["counts"]["done"] == 1
+    assert status["counts"]["invalid"] == 1
+    assert status["rows"] == [
+        {"row": 2, "label": 'TR-100', "partida": 'P-01', "status": 'done', "message": '', "folio": 'IMP-1'},
+        {"row": 3, "label": 'NO-EXISTE', "partida": 'P-01', "status": 'invalid', "message": 'El ID no existe', "folio": None},
+    ]
+    assert get_import_status(job.job_id, since=status["version"])["rows"] == []
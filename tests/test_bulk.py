@@ -0,0 +1,40 @@
+from autointelli.notion.bulk import bulk_update_pages
+
+DB = "db-bulk"
+
+
+def _estatus(name):
+    return {"Estatus": {"select": {"name": name}}}
+
+
+def test_results_follow_the_input_order(app, notion):
+    for index in range(6):
+        notion.add_page(DB, _estatus("Pendiente"), page_id=f"page{index}")
+    updates = [(f"page{index}", _estatus(f"Estado {index}")) for index in reversed(range(6))]
+
+    results = bulk_update_pages(notion, updates, max_workers=3)
+    assert [page_id for page_id, _, _ in results] == [page_id for page_id, _ in updates]
+    assert all(status_code == 200 for _, status_code, _ in results)
+    assert results[0][2]["properties"]["Estatus"]["select"]["name"] == "Estado 5"
+    assert notion.stored_pages["page2"]["properties"]["Estatus"]["select"]["name"] == "Estado 2"
+
+
+def test_failures_are_reported_per_page(app, notion):
+    notion.add_page(DB, _estatus("Pendiente"), page_id="page1")
+    notion.add_page(DB, _estatus("Pendiente"), page_id="page2")
+    notion.fail('pages.update', RuntimeError("sin conexión"), page_id="page1")
+
+    results = bulk_update_pages(notion, [("page1", _estatus("Listo")), ("page2", _estatus("Listo")), ("page3", {})])
+    assert [(page_id, status_code) for page_id, status_code, _ in results] == [("page1", 500), ("page2", 200), ("page3", 400)]
+    assert "sin conexión" in results[0][2]["error"]
+    assert notion.stored_pages["page2"]["properties"]["Estatus"]["select"]["name"] == "Listo"
+
+
+def test_updates_can_come_from_a_generator(app, notion):
+    notion.add_page(DB, _estatus("Pendiente"), page_id="page1")
+    notion.add_page(DB, _estatus("Pendiente"), page_id="page2")
+    updates = ((page_id, _estatus("Listo")) for page_id in ("page2", "page1"))
+
+    assert [(page_id, status_code) for page_id, status_code, _ in bulk_update_pages(notion, updates)] == [("page2", 200), ("page1", 200)]
+    assert notion.count('pages.update') == 2
+    assert bulk_update_pages(notion, []) == []
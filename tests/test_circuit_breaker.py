@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import pytest
+
+from autointelli.notion import circuit_breaker
+from autointelli.notion.circuit_breaker import (
+    STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker, NotionUnavailableError,
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(circuit_breaker, 'time', SimpleNamespace(monotonic=clock))
+    return clock
+
+
+def _breaker(**overrides):
+    options = {"window": 10, "min_calls": 4, "failure_ratio": 0.5, "slow_call_seconds": 5, "open_seconds": 30}
+    options.update(overrides)
+    return CircuitBreaker(**options)
+
+
+def _call(breaker, failed=False, elapsed=0.1):
+    breaker.before_call()
+    breaker.record(failed, elapsed)
+
+
+def test_stays_closed_below_min_calls(clock):
+    breaker = _breaker()
+    for _ in range(3):
+        _call(breaker, failed=True)
+    assert breaker.state == STATE_CLOSED
+    assert not breaker.is_open()
+
+
+def test_opens_when_failure_ratio_is_reached(clock):
+    breaker = _breaker()
+    _call(breaker)
+    _call(breaker)
+    _call(breaker, failed=True)
+    assert breaker.state == STATE_CLOSED
+    _call(breaker, failed=True) # 2 de 4 fallaron
+    assert breaker.state == STATE_OPEN
+    assert breaker.is_open()
+    with pytest.raises(NotionUnavailableError) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.retry_in_seconds == pytest.approx(30)
+    assert breaker.snapshot()["rejected"] == 1
+
+
+def test_slow_calls_count_as_failures(clock):
+    breaker = _breaker(min_calls=2)
+    _call(breaker, elapsed=6)
+    _call(breaker, elapsed=7)
+    assert breaker.state == STATE_OPEN
+
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = _breaker(min_calls=1)
+    _call(breaker, failed=True)
+    assert breaker.state == STATE_OPEN
+
+    clock.now += 30
+    assert breaker.state == STATE_HALF_OPEN
+    assert not breaker.is_open()
+    breaker.before_call() # La llamada de prueba
+    assert breaker.is_open()
+    with pytest.raises(NotionUnavailableError):
+        breaker.before_call()
+
+    breaker.record(False, 0.1)
+    assert breaker.state == STATE_CLOSED
+    assert breaker.snapshot()["window_calls"] == 0
+
+
+def test_failed_probe_reopens(clock):
+    breaker = _breaker(min_calls=1)
+    _call(breaker, failed=True)
+    clock.now += 31
+    breaker.before_call()
+    breaker.record(True, 0.1)
+    assert breaker.state == STATE_OPEN
+    assert breaker.snapshot()["opened"] == 2
+    clock.now += 29
+    assert breaker.state == STATE_OPEN
+
+
+def test_results_recorded_while_open_do_not_change_state(clock):
+    breaker = _breaker(min_calls=1)
+    breaker.before_call() # Autorizada antes de abrirse
+    _call(breaker, failed=True)
+    breaker.record(False, 0.1)
+    assert breaker.state == STATE_OPEN
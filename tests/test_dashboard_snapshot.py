@@ -0,0 +1,119 @@
+import time
+from collections import OrderedDict
+
+import pytest
+
+from autointelli import dashboard_snapshot
+from autointelli.dashboard_snapshot import DashboardLoad, get_dashboard_snapshot, invalidate_dashboard, load_dashboard
+from autointelli.models import db, DashboardVersion
+
+KEY = ('compras', ())
+
+
+@pytest.fixture
+def snapshots(app, monkeypatch):
+    _fresh_worker(monkeypatch)
+    app.config.update(NOTION_DASHBOARD_TTL_SECONDS=60, NOTION_DASHBOARD_MAX_STALE_SECONDS=600, NOTION_DASHBOARD_EARLY_REFRESH_BETA=0)
+    return dashboard_snapshot
+
+
+def _fresh_worker(monkeypatch, copies=None):
+    """Estado en memoria de un proceso nuevo (o de otro worker): la tabla de versiones es la misma."""
+    monkeypatch.setattr(dashboard_snapshot, '_snapshots', copies if copies is not None else OrderedDict())
+    monkeypatch.setattr(dashboard_snapshot, '_refreshing', set())
+    monkeypatch.setattr(dashboard_snapshot, '_known_versions', {})
+    monkeypatch.setattr(dashboard_snapshot, '_versions_checked_at', None)
+
+
+class Loader:
+    """Función de carga que cuenta sus llamadas; cada carga devuelve un contexto distinto."""
+
+    def __init__(self):
+        self.calls = 0
+        self.ok = True
+        self.error = None
+
+    def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return DashboardLoad({"carga": self.calls}, ok=self.ok)
+
+
+def _age(key, seconds):
+    get_dashboard_snapshot(key).saved_monotonic -= seconds
+
+
+def _wait_for_refresh(key):
+    deadline = time.monotonic() + 5
+    while key in dashboard_snapshot._refreshing and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+
+def test_fresh_copy_is_served_without_loading(snapshots):
+    loader = Loader()
+    assert load_dashboard('compras', KEY, loader) == ({"carga": 1}, [], None)
+    assert load_dashboard('compras', KEY, loader) == ({"carga": 1}, [], None)
+    assert loader.calls == 1
+
+
+def test_stale_copy_is_served_while_it_reloads(snapshots):
+    loader = Loader()
+    load_dashboard('compras', KEY, loader)
+    _age(KEY, 120)
+
+    assert load_dashboard('compras', KEY, loader)[0] == {"carga": 1} # Sin esperar la recarga
+    _wait_for_refresh(KEY)
+    assert loader.calls == 2
+    assert load_dashboard('compras', KEY, loader)[0] == {"carga": 2}
+
+
+def test_too_old_copy_waits_for_the_load(snapshots):
+    loader = Loader()
+    load_dashboard('compras', KEY, loader)
+    _age(KEY, 700)
+    assert load_dashboard('compras', KEY, loader)[0] == {"carga": 2}
+
+
+def test_failed_loads_fall_back_to_the_last_copy(snapshots):
+    loader = Loader()
+    load_dashboard('compras', KEY, loader)
+    _age(KEY, 700)
+
+    loader.ok = False
+    context, _, cached_at = load_dashboard('compras', KEY, loader)
+    assert context == {"carga": 1}
+    assert cached_at == get_dashboard_snapshot(KEY).saved_at_label
+
+    loader.error = RuntimeError("Notion no responde")
+    assert load_dashboard('compras', KEY, loader)[0] == {"carga": 1}
+    with pytest.raises(RuntimeError):
+        load_dashboard('almacen', ('almacen', ()), loader)
+
+
+def test_invalidation_reaches_every_view_and_other_workers(snapshots, monkeypatch):
+    loader = Loader()
+    almacen = ('almacen', ())
+    load_dashboard('compras', KEY, loader)
+    load_dashboard('almacen', almacen, loader)
+    copies = OrderedDict(dashboard_snapshot._snapshots)
+
+    _fresh_worker(monkeypatch) # La escritura ocurre en otro worker
+    invalidate_dashboard(reason="solicitud de material creada")
+    assert {row.view: row.version for row in db.session.query(DashboardVersion)} == {'compras': 1, 'almacen': 1}
+
+    # El primer worker aún tiene sus copias frescas, pero ya no las sirve al ver la nueva versión
+    _fresh_worker(monkeypatch, copies)
+    assert load_dashboard('compras', KEY, loader)[0] == {"carga": 3}
+    assert load_dashboard('almacen', almacen, loader)[0] == {"carga": 4}
+    assert load_dashboard('compras', KEY, loader)[0] == {"carga": 3}
+
+
+def test_local_invalidation_of_one_view(snapshots):
+    loader = Loader()
+    load_dashboard('compras', KEY, loader)
+    load_dashboard('almacen', ('almacen', ()), loader)
+
+    invalidate_dashboard('compras')
+    assert get_dashboard_snapshot(KEY) is None
+    assert get_dashboard_snapshot(('almacen', ())) is not None
@@ -0,0 +1,133 @@
+import io
+
+import pytest
+
+from autointelli import material_import
+from autointelli.material_import import (
+    ROW_DONE, ROW_FAILED, ROW_INVALID, ROW_PENDING, ImportJob, SpreadsheetError, _build_requests, _submit_batch,
+    iter_spreadsheet_rows, parse_material_rows,
+)
+from autointelli.torni_catalog import TorniCatalog, compile_torni_catalog
+from autointelli.xlsx_stream import write_xlsx
+
+CATALOG = TorniCatalog(compile_torni_catalog([
+    {"id": "TR-100", "description": "Tornillo hexagonal"},
+    {"id": "TU-300", "description": "Tuerca hexagonal"},
+]))
+
+
+def _csv(text):
+    return iter_spreadsheet_rows(io.BytesIO(text.encode('utf-8')), 'materiales.csv')
+
+
+def _parse(text, max_rows=100, catalog=CATALOG):
+    return parse_material_rows(_csv(text), catalog, max_rows)
+
+
+def test_csv_with_semicolons_and_accented_headers():
+    rows = _parse("\ufeffPartida;Cantidad;ID Torni;Descripción\nP-01;3;tr-100;\nP-01;1,5;TU-300;Tuerca M6\n")
+    assert [row.status for row in rows] == [ROW_PENDING, ROW_PENDING]
+    assert [row.number for row in rows] == [2, 3]
+    assert rows[0].is_torni
+    assert rows[0].item == {"id": "TR-100", "description": "Tornillo hexagonal", "quantity": 3.0}
+    assert rows[0].label == "TR-100 Tornillo hexagonal"
+    assert rows[1].item["quantity"] == 1.5
+    assert rows[1].item["description"] == "Tuerca M6"
+
+
+def test_standard_material_rows():
+    rows = _parse("partida,cantidad,material,unidad,tipo,largo,urgente\nP-02,10,Placa,pieza,Acero,200,sí\n")
+    row = rows[0]
+    assert not row.is_torni
+    assert row.status == ROW_PENDING
+    assert row.item["nombre_material"] == "Placa"
+    assert row.item["cantidad_solicitada"] == 10.0
+    assert row.item["largo"] == "200"
+    assert row.flags == (True, False, '')
+
+
+def test_invalid_rows_are_reported_not_raised():
+    rows = _parse("Partida,Cantidad,ID Torni,Material,Unidad\n"
+                  ",0,TR-100,,\n"
+                  "P-01,2,NO-EXISTE,,\n"
+                  "P-01,abc,,Placa,\n"
+                  "\n"
+                  "P-01,1,TR-100,,\n")
+    assert [row.status for row in rows] == [ROW_INVALID, ROW_INVALID, ROW_INVALID, ROW_PENDING]
+    assert rows[0].message.startswith("Falta la partida")
+    assert "cantidad '0' inválida" in rows[0].message
+    assert "'NO-EXISTE' no existe" in rows[1].message
+    assert "falta unidad de medida" in rows[2].message
+    assert rows[3].number == 6 # Las filas vacías se saltan pero cuentan
+
+
+def test_torni_rows_need_the_catalog():
+    rows = _parse("Partida,Cantidad,ID Torni\nP-01,1,TR-100\n", catalog=None)
+    assert rows[0].status == ROW_INVALID
+    assert "catálogo Torni no está disponible" in rows[0].message
+
+
+def test_file_level_errors():
+    with pytest.raises(SpreadsheetError, match="Faltan columnas.*cantidad.*ID Torni o Material"):
+        _parse("Partida,Descripción\nP-01,algo\n")
+    with pytest.raises(SpreadsheetError, match="vacío"):
+        _parse("\n\n")
+    with pytest.raises(SpreadsheetError, match="no tiene filas"):
+        _parse("Partida,Cantidad,ID Torni\n")
+    with pytest.raises(SpreadsheetError, match="más de 2 filas"):
+        _parse("Partida,Cantidad,ID Torni\n" + "P-01,1,TR-100\n" * 3, max_rows=2)
+    with pytest.raises(SpreadsheetError, match="UTF-8"):
+        list(iter_spreadsheet_rows(io.BytesIO("Partida,Cantidad\nPresión,1\n".encode('latin-1')), 'a.csv'))
+    with pytest.raises(SpreadsheetError, match="Formato no soportado"):
+        iter_spreadsheet_rows(io.BytesIO(b''), 'a.xls')
+    with pytest.raises(SpreadsheetError, match="XLSX válido"):
+        list(iter_spreadsheet_rows(io.BytesIO(b'no es un zip'), 'a.xlsx'))
+
+
+def test_xlsx_upload():
+    output = io.BytesIO()
+    write_xlsx(output, ['Partida', 'Cantidad', 'ID Torni'], [['P-01', 4, 'TU-300'], ['P-01', None, 'TR-100']])
+    output.seek(0)
+    rows = parse_material_rows(iter_spreadsheet_rows(output, 'materiales.xlsx'), CATALOG, 100)
+    assert [row.status for row in rows] == [ROW_PENDING, ROW_INVALID]
+    assert rows[0].item["quantity"] == 4.0
+
+
+def test_valid_rows_are_grouped_into_requests():
+    rows = _parse("Partida,Cantidad,ID Torni,Material,Unidad,Urgente\n"
+                  "P-01,1,TR-100,,,\n"
+                  "P-01,2,TU-300,,,\n"
+                  "P-01,3,TR-100,,,x\n"
+                  "P-02,4,TR-100,,,\n"
+                  "P-01,5,,Placa,pieza,\n"
+                  "P-01,6,TU-300,,,\n")
+    job = ImportJob(None, 'materiales.csv', rows, {"nombre_solicitante": "Ana"})
+    requests = _build_requests(job, rows, batch_size=2)
+
+    assert [[row.number for row in batch] for batch, _ in requests] == [[2, 3], [7], [4], [5], [6]]
+    first = requests[0][1]
+    assert first["proveedor"] == "Torni"
+    assert first["nombre_solicitante"] == "Ana"
+    assert [item["quantity"] for item in first["torni_items"]] == [1.0, 2.0]
+    assert requests[2][1]["urgente"] is True
+    standard = requests[4][1]
+    assert standard["proveedor"] == "Por definir"
+    assert standard["nombre_material"] == "Placa"
+    assert len({data["folio_solicitud"] for _, data in requests}) == len(requests)
+
+
+def test_submitted_batches_invalidate_every_dashboard(app, monkeypatch):
+    rows = _parse("Partida,Cantidad,ID Torni\nP-01,1,TR-100\nP-01,2,TU-300\n")
+    job = ImportJob(None, 'materiales.csv', rows, {})
+    job.save()
+    responses = iter([({"failed_items": [2]}, 207), ({"error": "Notion no responde"}, 503)])
+    invalidated = []
+    monkeypatch.setattr(material_import, 'submit_request_for_material_logic', lambda *args, **kwargs: next(responses))
+    monkeypatch.setattr(material_import, 'invalidate_dashboard', lambda view=None, reason="": invalidated.append(view))
+
+    _submit_batch(app, job, rows, {"folio_solicitud": "IMP-1"}, ('db1', 'db2', 'partidas', 'proyectos'))
+    assert [row.status for row in rows] == [ROW_DONE, ROW_FAILED]
+    assert invalidated == [None] # Compras y Almacén
+
+    _submit_batch(app, job, rows, {"folio_solicitud": "IMP-2"}, ('db1', 'db2', 'partidas', 'proyectos'))
+    assert invalidated == [None] # Sin escrituras no se invalida
@@ -0,0 +1,62 @@
+import pytest
+
+from autointelli.notion import schema_cache
+from autointelli.notion.solicitudes import _create_material_pages, material_dedupe_key
+
+DB1, DB2 = "db-materiales-1", "db-materiales-2"
+
+
+@pytest.fixture
+def notion(notion, monkeypatch):
+    monkeypatch.setattr(schema_cache, '_schema_cache', {})
+    monkeypatch.setattr(schema_cache, '_known_versions', {})
+    for database_id in ("dbmateriales1", "dbmateriales2"):
+        notion.schemas[database_id] = {"Clave de envío": {"id": "k", "type": "rich_text"}, "Nombre": {"id": "title", "type": "title"}}
+    return notion
+
+
+def _item(name):
+    return f"Item {name}", {"Nombre": {"title": [{"text": {"content": name}}]}}
+
+
+def _created(notion, database_id):
+    return {page["properties"]["Clave de envío"]["rich_text"][0]["text"]["content"]: page
+            for page in notion.database_pages(database_id)}
+
+
+def test_results_follow_the_item_order(app, notion):
+    app.config['NOTION_SUBMIT_MAX_WORKERS'] = 3
+    results = _create_material_pages(notion, DB1, DB2, [_item(name) for name in "ABCDE"], folio="SOL-1")
+
+    assert len(results) == 5
+    db1_pages, db2_pages = _created(notion, DB1), _created(notion, DB2)
+    for index, ((created1, url1, error1), (created2, url2, error2)) in enumerate(results):
+        assert created1 and created2 and error1 == error2 == {}
+        page1 = db1_pages[material_dedupe_key("SOL-1", index, "DB 1")]
+        assert url1 == page1["url"]
+        assert page1["properties"]["Nombre"]["title"][0]["text"]["content"] == "ABCDE"[index]
+        assert url2 == db2_pages[material_dedupe_key("SOL-1", index, "DB 2")]["url"]
+
+
+def test_each_failure_stays_with_its_item(app, notion, monkeypatch):
+    create = notion.pages.create
+
+    def failing_create(parent, properties):
+        if parent["database_id"] == DB2 and properties["Nombre"]["title"][0]["text"]["content"] == "B":
+            raise RuntimeError("sin conexión")
+        return create(parent=parent, properties=properties)
+
+    monkeypatch.setattr(notion.pages, 'create', failing_create)
+    results = _create_material_pages(notion, DB1, DB2, [_item(name) for name in "ABC"], folio="SOL-2")
+
+    assert [(result1[0], result2[0]) for result1, result2 in results] == [(True, True), (True, False), (True, True)]
+    assert results[1][1] == (False, None, {"message": "sin conexión"})
+    assert len(notion.database_pages(DB2)) == 2
+
+
+def test_without_folio_pages_have_no_dedupe_key(app, notion):
+    assert _create_material_pages(notion, DB1, DB2, []) == []
+    ((created1, _, _), (created2, _, _)), = _create_material_pages(notion, DB1, DB2, [_item("A")])
+    assert created1 and created2
+    assert all("Clave de envío" not in page["properties"] for page in notion.stored_pages.values())
+    assert material_dedupe_key("SOL-3", 0, "DB 1") == "SOL-3/1/DB 1"
@@ -0,0 +1,106 @@
+import pytest
+
+from autointelli.notion.mirror import (
+    UnsupportedFilterError, evaluate_filter, filter_pages, is_filter_supported, normalize_notion_id,
+)
+
+
+def _page(page_id, estatus=None, folio='', cantidad=None, urgente=False, partidas=(), fecha=None, tags=(), created='2024-05-01T10:00:00.000Z'):
+    return {
+        "id": page_id,
+        "created_time": created,
+        "last_edited_time": created,
+        "properties": {
+            "Estatus": {"type": "select", "select": {"name": estatus} if estatus else None},
+            "Folio de solicitud": {"type": "rich_text", "rich_text": [{"plain_text": folio}] if folio else []},
+            "Cantidad solicitada": {"type": "number", "number": cantidad},
+            "Urgente": {"type": "checkbox", "checkbox": urgente},
+            "Partida": {"type": "relation", "relation": [{"id": partida} for partida in partidas], "has_more": False},
+            "Fecha de solicitud": {"type": "date", "date": {"start": fecha} if fecha else None},
+            "Etiquetas": {"type": "multi_select", "multi_select": [{"name": tag} for tag in tags]},
+        },
+    }
+
+
+PAGES = [
+    _page("p1", estatus="Pendiente", folio="SOL-001", cantidad=5, urgente=True, partidas=("aaaa-bbbb",), fecha="2024-05-02", tags=("acero",)),
+    _page("p2", estatus="Recibido", folio="SOL-002", cantidad=0.5, partidas=("cccc-dddd",), fecha="2024-06-10T08:30:00.000+00:00"),
+    _page("p3", folio="imp-003", created='2024-07-01T00:00:00.000Z'),
+]
+
+
+def _ids(filter_arg):
+    return [page["id"] for page in filter_pages(PAGES, filter_arg)]
+
+
+def test_no_filter_returns_every_page():
+    assert _ids(None) == ["p1", "p2", "p3"]
+
+
+def test_select_filters():
+    assert _ids({"property": "Estatus", "select": {"equals": "Pendiente"}}) == ["p1"]
+    assert _ids({"property": "Estatus", "select": {"does_not_equal": "Pendiente"}}) == ["p2", "p3"]
+    assert _ids({"property": "Estatus", "select": {"is_empty": True}}) == ["p3"]
+
+
+def test_text_filters_ignore_case_like_notion():
+    assert _ids({"property": "Folio de solicitud", "rich_text": {"equals": "SOL-002"}}) == ["p2"]
+    assert _ids({"property": "Folio de solicitud", "rich_text": {"contains": "sol"}}) == ["p1", "p2"]
+    assert _ids({"property": "Folio de solicitud", "rich_text": {"starts_with": "IMP"}}) == ["p3"]
+    assert _ids({"property": "Folio de solicitud", "rich_text": {"ends_with": "1"}}) == ["p1"]
+
+
+def test_number_checkbox_and_multi_select_filters():
+    assert _ids({"property": "Cantidad solicitada", "number": {"greater_than": 1}}) == ["p1"]
+    assert _ids({"property": "Cantidad solicitada", "number": {"is_empty": True}}) == ["p3"]
+    assert _ids({"property": "Cantidad solicitada", "number": {"does_not_equal": 5}}) == ["p2", "p3"]
+    assert _ids({"property": "Urgente", "checkbox": {"equals": True}}) == ["p1"]
+    assert _ids({"property": "Etiquetas", "multi_select": {"contains": "acero"}}) == ["p1"]
+    assert _ids({"property": "Etiquetas", "multi_select": {"is_empty": True}}) == ["p2", "p3"]
+
+
+def test_relation_filter_compares_ids_without_dashes():
+    assert _ids({"property": "Partida", "relation": {"contains": "aaaabbbb"}}) == ["p1"]
+    assert _ids({"property": "Partida", "relation": {"does_not_contain": "cccc-dddd"}}) == ["p1", "p3"]
+    assert normalize_notion_id(" aaaa-bbbb ") == "aaaabbbb"
+
+
+def test_date_and_timestamp_filters():
+    assert _ids({"property": "Fecha de solicitud", "date": {"on_or_after": "2024-06-01"}}) == ["p2"]
+    assert _ids({"property": "Fecha de solicitud", "date": {"before": "2024-06-01"}}) == ["p1"]
+    assert _ids({"property": "Fecha de solicitud", "date": {"is_empty": True}}) == ["p3"]
+    assert _ids({"timestamp": "created_time", "created_time": {"after": "2024-06-01"}}) == ["p3"]
+
+
+def test_compound_filters():
+    assert _ids({"and": [
+        {"property": "Folio de solicitud", "rich_text": {"starts_with": "SOL"}},
+        {"or": [
+            {"property": "Urgente", "checkbox": {"equals": True}},
+            {"property": "Estatus", "select": {"equals": "Recibido"}},
+        ]},
+    ]}) == ["p1", "p2"]
+
+
+def test_is_filter_supported():
+    assert is_filter_supported(None)
+    assert is_filter_supported({"and": [{"property": "Estatus", "select": {"equals": "Pendiente"}}]})
+    assert is_filter_supported({"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": "2024-01-01"}})
+    assert not is_filter_supported({"property": "Estatus", "select": {"contains": "Pend"}}) # Operador inválido para select
+    assert not is_filter_supported({"property": "Fórmula", "formula": {"string": {"equals": "x"}}})
+    assert not is_filter_supported({"and": [], "or": []})
+    assert not is_filter_supported({"timestamp": "fecha", "fecha": {"equals": "2024-01-01"}})
+
+
+def test_unevaluable_filters_raise():
+    with pytest.raises(UnsupportedFilterError):
+        evaluate_filter({"property": "No existe", "select": {"equals": "x"}}, PAGES[0])
+    with pytest.raises(UnsupportedFilterError):
+        evaluate_filter({"property": "Estatus", "number": {"equals": 1}}, PAGES[0]) # Tipo distinto al de la propiedad
+    truncated = _page("p4", partidas=("aaaa",))
+    truncated["properties"]["Partida"]["has_more"] = True
+    with pytest.raises(UnsupportedFilterError):
+        evaluate_filter({"property": "Partida", "relation": {"contains": "aaaa"}}, truncated)
+    with pytest.raises(UnsupportedFilterError):
+        # Fecha con zona horaria contra una sin zona
+        evaluate_filter({"property": "Fecha de solicitud", "date": {"after": "2024-06-01T00:00:00"}}, PAGES[1])
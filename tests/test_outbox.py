@@ -0,0 +1,207 @@
+import json
+from datetime import datetime
+
+import httpx
+from notion_client.errors import HTTPResponseError
+
+from autointelli.models import db, NotionOutboxItem
+from autointelli.notion import outbox
+from autointelli.notion.circuit_breaker import NotionUnavailableError
+from autointelli.notion.outbox import (
+    OPERATION_CREATE, STATUS_DONE, STATUS_FAILED, STATUS_PENDING, STATUS_PROCESSING,
+    _claim_batch, _finish, enqueue_material_request, enqueue_page_update, get_request_status, outbox_enabled,
+)
+
+
+def _http_error(status):
+    return HTTPResponseError(httpx.Response(status, request=httpx.Request('POST', 'https://api.notion.com/v1/pages')))
+
+
+def _enqueue_update(page_id, estatus, user_id=None):
+    response, status = enqueue_page_update(page_id, {"Estatus": {"select": {"name": estatus}}}, user_id=user_id)
+    assert status == 202
+    return response["request_key"]
+
+
+def _enqueue_create(request_key, item_index, db_label, user_id=None, label='ITEM'):
+    row = NotionOutboxItem(request_key=request_key, operation=OPERATION_CREATE, item_index=item_index, target_id=f"db-{db_label}",
+                           label=label, payload=json.dumps({"properties": {}, "db_label": db_label}), user_id=user_id)
+    db.session.add(row)
+    db.session.commit()
+    return row.id
+
+
+def _torni_request(folio, quantity=2):
+    return {"folio_solicitud": folio, "proveedor": "Torni", "partida": "P-01", "nombre_solicitante": "Ana",
+            "torni_items": [{"id": "TR-100", "description": "Tornillo", "quantity": quantity}]}
+
+
+def _row(request_key):
+    return NotionOutboxItem.query.filter_by(request_key=request_key).one()
+
+
+def test_claim_takes_only_the_oldest_update_of_each_page(app):
+    first = _enqueue_update('page-a', 'Pedido')
+    second = _enqueue_update('page-a', 'Recibido')
+    other = _enqueue_update('page-b', 'Pedido')
+
+    claimed = _claim_batch(10)
+    assert [item["request_key"] for item in claimed] == [first, other]
+    assert claimed[0]["attempts"] == 1
+    assert claimed[0]["payload"] == {"properties": {"Estatus": {"select": {"name": "Pedido"}}}}
+    assert _row(first).status == STATUS_PROCESSING
+    assert _row(second).status == STATUS_PENDING
+
+    assert _claim_batch(10) == [] # La segunda actualización espera a que termine la primera
+
+    assert _finish(claimed[0], response={"id": "page-a", "url": "https://notion.so/page-a"}) == STATUS_DONE
+    claimed = _claim_batch(10)
+    assert [item["request_key"] for item in claimed] == [second]
+
+
+def test_claim_respects_the_limit(app):
+    keys = [_enqueue_update(f'page-{index}', 'Pedido') for index in range(5)]
+    claimed = _claim_batch(2)
+    assert [item["request_key"] for item in claimed] == keys[:2]
+    assert [item["request_key"] for item in _claim_batch(10)] == keys[2:]
+
+
+def test_expired_leases_are_claimed_again(app):
+    key = _enqueue_update('page-a', 'Pedido')
+    _claim_batch(10)
+    row = _row(key)
+    row.locked_until = datetime(2000, 1, 1)
+    db.session.commit()
+
+    claimed = _claim_batch(10)
+    assert [item["request_key"] for item in claimed] == [key]
+    assert claimed[0]["attempts"] == 2
+
+
+def test_finish_records_success(app):
+    key = _enqueue_update('page-a', 'Pedido')
+    item = _claim_batch(10)[0]
+    assert _finish(item, response={"id": "page-a", "url": "https://notion.so/page-a"}) == STATUS_DONE
+    row = _row(key)
+    assert row.status == STATUS_DONE
+    assert row.result_url == "https://notion.so/page-a"
+    assert row.locked_until is None
+
+
+def test_finish_schedules_a_retry_for_transient_errors(app):
+    key = _enqueue_update('page-a', 'Pedido')
+    item = _claim_batch(10)[0]
+    assert _finish(item, error=_http_error(503)) == STATUS_PENDING
+    row = _row(key)
+    assert row.next_attempt_at > datetime.utcnow() # Backoff: no se vuelve a reclamar de inmediato
+    assert "503" in row.last_error
+    assert _claim_batch(10) == []
+
+    item["attempts"] = 1
+    assert _finish(item, error=NotionUnavailableError(30)) == STATUS_PENDING
+
+
+def test_finish_fails_permanent_and_exhausted_errors(app):
+    app.config['NOTION_OUTBOX_MAX_ATTEMPTS'] = 2
+    bad_request = _enqueue_update('page-a', 'Pedido')
+    exhausted = _enqueue_update('page-b', 'Pedido')
+    first, second = _claim_batch(10)
+
+    assert _finish(first, error=_http_error(400)) == STATUS_FAILED
+    second["attempts"] = 2
+    assert _finish(second, error=_http_error(503)) == STATUS_FAILED
+    assert _row(bad_request).status == STATUS_FAILED
+    assert _row(exhausted).status == STATUS_FAILED
+
+
+def test_finish_does_not_retry_ambiguous_creates(app):
+    _enqueue_create('SOL-1', 0, 'DB 1')
+    item = _claim_batch(10)[0]
+    assert _finish(item, error=_http_error(500)) == STATUS_FAILED # La página pudo haberse creado
+    _enqueue_create('SOL-2', 0, 'DB 1')
+    item = _claim_batch(10)[0]
+    assert _finish(item, error=_http_error(502)) == STATUS_PENDING
+
+
+def test_request_status_summarizes_items(app, users):
+    owner, _ = users
+    _enqueue_create('SOL-1', 0, 'DB 1', owner.id, label='T-100')
+    _enqueue_create('SOL-1', 0, 'DB 2', owner.id, label='T-100')
+    _enqueue_create('SOL-1', 1, 'DB 1', owner.id, label='T-200')
+    _enqueue_create('SOL-1', 1, 'DB 2', owner.id, label='T-200')
+
+    status = get_request_status('SOL-1')
+    assert status["state"] == 'pending'
+    assert status["total_items"] == 2
+    assert status["pending_count"] == 2
+
+    *written, rejected = _claim_batch(10) # En orden: item 0 (DB 1, DB 2), item 1 (DB 1, DB 2)
+    for item in written:
+        _finish(item, response={"id": f"page-{item['id']}", "url": f"https://notion.so/{item['payload']['db_label']}/{item['id']}"})
+    _finish(rejected, error=_http_error(400))
+
+    status = get_request_status('SOL-1')
+    assert status["state"] == 'partial'
+    assert status["processed_count"] == 1
+    assert status["failed_count"] == 1
+    assert [item["status"] for item in status["items"]] == [STATUS_DONE, STATUS_FAILED]
+    assert [write["destination"] for write in status["items"][0]["writes"]] == ["DB 1", "DB 2"]
+    assert status["items"][1]["writes"][1]["error"].startswith("HTTP 400")
+    assert status["notion_url_db1"].startswith("https://notion.so/DB 1/")
+    assert status["notion_url_db2"].startswith("https://notion.so/DB 2/")
+
+
+def test_request_status_is_only_visible_to_its_owner(app, users):
+    owner, other = users
+    key = _enqueue_update('page-a', 'Pedido', user_id=owner.id)
+    assert get_request_status(key, user_id=owner.id)["request_key"] == key
+    assert get_request_status(key, user_id=other.id) is None
+    assert get_request_status(key)["state"] == 'pending' # Sin user_id (administradores)
+    assert get_request_status('no-existe') is None
+
+
+def test_repeated_folio_from_the_same_user_is_not_enqueued_again(app, users):
+    owner, _ = users
+    response, status = enqueue_material_request('db-1', 'db-2', _torni_request('SOL-1'), user_id=owner.id)
+    assert status == 202
+    assert response["queued_items"] == 1
+
+    response, status = enqueue_material_request('db-1', 'db-2', _torni_request('SOL-1'), user_id=owner.id)
+    assert status == 202
+    assert response["message"].startswith("La solicitud Folio 'SOL-1' ya había sido recibida. 0/1 item(s)")
+    assert NotionOutboxItem.query.filter_by(request_key='SOL-1').count() == 2 # DB 1 y DB 2, una sola vez
+
+
+def test_folio_of_another_user_or_with_other_data_is_rejected(app, users):
+    owner, other = users
+    enqueue_material_request('db-1', 'db-2', _torni_request('SOL-1'), user_id=owner.id)
+
+    response, status = enqueue_material_request('db-1', 'db-2', _torni_request('SOL-1'), user_id=other.id)
+    assert status == 409
+    assert "message" not in response and "queued_items" not in response # Nada del envío del otro usuario
+
+    response, status = enqueue_material_request('db-1', 'db-2', _torni_request('SOL-1', quantity=5), user_id=owner.id)
+    assert status == 409
+    assert NotionOutboxItem.query.filter_by(request_key='SOL-1').count() == 2
+
+
+def test_outbox_needs_a_worker_to_drain_it(app, monkeypatch):
+    class _Thread:
+        def is_alive(self):
+            return True
+
+    app.config.update(NOTION_OUTBOX_ENABLED=True, NOTION_OUTBOX_POLL_SECONDS=2, NOTION_BACKGROUND_WORKERS=True)
+    monkeypatch.setattr(outbox, '_worker_thread', None)
+    assert not outbox_enabled() # p. ej. 'flask run': se escribe en la solicitud
+
+    monkeypatch.setattr(outbox, '_worker_thread', _Thread())
+    assert outbox_enabled()
+
+    monkeypatch.setattr(outbox, '_worker_thread', None)
+    app.config['NOTION_OUTBOX_POLL_SECONDS'] = 0 # 'flask notion-outbox' en otro proceso
+    assert outbox_enabled()
+    app.config.update(NOTION_OUTBOX_POLL_SECONDS=2, NOTION_BACKGROUND_WORKERS=False)
+    assert outbox_enabled()
+
+    app.config['NOTION_OUTBOX_ENABLED'] = False
+    assert not outbox_enabled()
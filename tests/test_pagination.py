@@ -0,0 +1,49 @@
+from autointelli.pagination import (
+    MAX_PAGE_TOKEN_LENGTH, build_pagination, current_cursor, decode_page_token, encode_page_token,
+)
+
+
+def test_token_round_trip():
+    trail = ['cursor-a', 'cursor-b']
+    token = encode_page_token(trail)
+    assert '=' not in token
+    assert decode_page_token(token) == trail
+    assert current_cursor(trail) == 'cursor-b'
+
+
+def test_first_page_has_no_token():
+    assert encode_page_token([]) is None
+    assert decode_page_token(None) == []
+    assert decode_page_token('') == []
+    assert current_cursor([]) is None
+
+
+def test_invalid_tokens_restart_at_first_page():
+    assert decode_page_token('no es base64!') == []
+    assert decode_page_token(encode_page_token(['cursor-a'])[:-3]) == [] # JSON truncado
+    assert decode_page_token(encode_page_token([''])) == [] # Cursor vacío
+    assert decode_page_token('eyJhIjoxfQ') == [] # {"a":1}: no es una lista
+    assert decode_page_token('A' * (MAX_PAGE_TOKEN_LENGTH + 1)) == []
+
+
+def test_build_pagination_first_page():
+    pagination = build_pagination([], 'next-1', page_size=50, shown=50)
+    assert pagination['page_number'] == 1
+    assert not pagination['has_prev']
+    assert pagination['prev_token'] is None
+    assert pagination['has_next']
+    assert decode_page_token(pagination['next_token']) == ['next-1']
+
+
+def test_build_pagination_middle_and_last_page():
+    middle = build_pagination(['c1', 'c2'], 'c3', page_size=50, shown=50)
+    assert middle['page_number'] == 3
+    assert decode_page_token(middle['prev_token']) == ['c1']
+    assert decode_page_token(middle['next_token']) == ['c1', 'c2', 'c3']
+
+    last = build_pagination(['c1'], None, page_size=50, shown=7)
+    assert last['has_prev']
+    assert last['prev_token'] is None # 'Anterior' vuelve a la primera ventana
+    assert not last['has_next']
+    assert last['next_token'] is None
+    assert last['shown'] == 7
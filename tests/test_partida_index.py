@@ -0,0 +1,72 @@
+import pytest
+
+from autointelli.notion import partida_index
+from autointelli.notion.partida_index import (
+    PARTIDA_NOT_FOUND, claim_refresh, load_partida_pages, lookup_partida, register_partida_page, release_refresh,
+    remember_partida,
+)
+
+
+def _partida(page_id, code, last_edited_time="2024-05-01T10:00:00.000Z", **extra):
+    return {
+        "id": page_id,
+        "last_edited_time": last_edited_time,
+        "parent": {"type": "database_id", "database_id": "db-partidas"},
+        "properties": {"ID de partida": {"type": "title", "title": [{"text": {"content": code}}]}},
+        **extra,
+    }
+
+
+@pytest.fixture
+def index(monkeypatch):
+    monkeypatch.setattr(partida_index, '_indexes', {})
+    return 'db-partidas'
+
+
+def test_index_lookup_and_renames(index):
+    load_partida_pages(index, [_partida("page-a", "P-01"), _partida("page-b", " P-02 ")], full=True)
+    assert lookup_partida(index, "P-01") == "page-a"
+    assert lookup_partida("db-partidas".replace("-", ""), " P-02") == "page-b" # IDs sin guiones y códigos sin espacios
+    assert lookup_partida(index, "P-99") is None
+
+    load_partida_pages(index, [_partida("page-a", "P-01-R", "2024-05-02T10:00:00.000Z")], full=False)
+    assert lookup_partida(index, "P-01") is None
+    assert lookup_partida(index, "P-01-R") == "page-a"
+    assert partida_index.get_partida_watermark(index) == "2024-05-02T10:00:00.000Z"
+
+    load_partida_pages(index, [_partida("page-b", "P-02", archived=True)], full=False)
+    assert lookup_partida(index, "P-02") is None
+
+
+def test_full_load_drops_deleted_partidas(index):
+    load_partida_pages(index, [_partida("page-a", "P-01"), _partida("page-b", "P-02")], full=True)
+    load_partida_pages(index, [_partida("page-b", "P-02")], full=True)
+    assert lookup_partida(index, "P-01") is None
+    assert lookup_partida(index, "P-02") == "page-b"
+
+
+def test_negative_cache_and_new_partidas(app, index):
+    app.config['NOTION_PARTIDA_NEGATIVE_TTL_SECONDS'] = 60
+    remember_partida(index, "P-03", None)
+    assert lookup_partida(index, "P-03") is PARTIDA_NOT_FOUND
+
+    register_partida_page(_partida("page-c", "P-03")) # Recién creada con pages.create
+    assert lookup_partida(index, "P-03") == "page-c"
+
+    app.config['NOTION_PARTIDA_NEGATIVE_TTL_SECONDS'] = -1
+    remember_partida(index, "P-04", None)
+    assert lookup_partida(index, "P-04") is None # Entrada vencida
+
+
+def test_only_one_refresh_at_a_time(app, index):
+    app.config['NOTION_PARTIDA_INDEX_REFRESH_SECONDS'] = 0
+    assert claim_refresh(index) == 'full'
+    assert claim_refresh(index) is None # Ya hay uno en curso
+    load_partida_pages(index, [_partida("page-a", "P-01")], full=True)
+    release_refresh(index, ok=True)
+
+    assert claim_refresh(index) == 'incremental'
+    app.config['NOTION_PARTIDA_INDEX_REFRESH_SECONDS'] = 60
+    release_refresh(index, ok=False)
+    app.config['NOTION_PARTIDA_INDEX_REFRESH_SECONDS'] = 0
+    assert claim_refresh(index) is None # Tras un fallo se espera antes de reintentar
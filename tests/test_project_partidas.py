@@ -0,0 +1,92 @@
+import pytest
+
+from autointelli import project_setup
+from autointelli.models import AuditLog
+from autointelli.notion import schema_cache
+from autointelli.nuevosRegistros import crear_proyecto_page, nombres_partidas
+from autointelli.project_setup import PartidasJob, _run_partidas_job, get_partidas_status, start_partidas_job
+
+
+def test_partida_names_are_deterministic():
+    assert nombres_partidas("PRJ-7", 3) == ["PRJ-7-00.00", "PRJ-7-01.00", "PRJ-7-02.00"]
+    assert nombres_partidas("PRJ-7", 3) == nombres_partidas("PRJ-7", 3)
+
+
+@pytest.fixture
+def fake_notion(app, monkeypatch):
+    """Partidas que ya existen en el proyecto y registro de las que se crean."""
+    app.config['DATABASE_ID_PARTIDAS'] = 'db-partidas'
+    state = {"existentes": {}, "created": []}
+
+    def partidas_existentes(notion_client, database_id_partidas, proyecto_id):
+        return state["existentes"]
+
+    def crear_partida(notion_client, database_id_partidas, proyecto_id, nombre_partida, lookup_first=False):
+        state["created"].append((nombre_partida, lookup_first))
+        return {"id": f"page-{nombre_partida}"}
+
+    monkeypatch.setattr(project_setup, 'partidas_existentes', partidas_existentes)
+    monkeypatch.setattr(project_setup, 'crear_partida', crear_partida)
+    return state
+
+
+def test_rerun_creates_only_missing_partidas(app, users, fake_notion):
+    owner, _ = users
+    fake_notion["existentes"] = {"PRJ-7-00.00": "page-a", "PRJ-7-02.00": "page-c"}
+    job = PartidasJob(owner.id, "proyecto-1", "PRJ-7", 4)
+    job.save()
+    _run_partidas_job(app, job)
+
+    assert sorted(fake_notion["created"]) == [("PRJ-7-01.00", False), ("PRJ-7-03.00", False)]
+    status = get_partidas_status(job.job_id, user_id=owner.id)
+    assert status["state"] == project_setup.JOB_DONE
+    assert status["counts"]["existing"] == 2
+    assert status["counts"]["created"] == 2
+    assert [partida["page_id"] for partida in status["partidas"]] == ["page-a", "page-PRJ-7-01.00", "page-c", "page-PRJ-7-03.00"]
+    assert "2 ya existían" in AuditLog.query.one().details
+
+
+def test_reused_project_is_audited_as_already_existing(app, users, fake_notion):
+    owner, _ = users
+    job = PartidasJob(owner.id, "proyecto-1", "PRJ-7", 2, proyecto_existente=True)
+    job.save()
+    _run_partidas_job(app, job)
+
+    audit = AuditLog.query.one()
+    assert audit.action == 'Proyecto Existente Completado'
+    assert 'ya existía' in audit.details
+    assert get_partidas_status(job.job_id, user_id=owner.id)["proyecto_existente"] is True
+
+
+def test_crear_proyecto_page_reports_whether_the_title_was_reused(app, notion, monkeypatch):
+    monkeypatch.setattr(schema_cache, '_schema_cache', {})
+    monkeypatch.setattr(schema_cache, '_known_versions', {})
+    notion.schemas["dbproyectos"] = {"ID del proyecto": {"id": "title", "type": "title"}}
+    existing = notion.add_page("db-proyectos", {"ID del proyecto": {"title": [{"text": {"content": "PRJ-7"}}]}})
+
+    page, reused = crear_proyecto_page(notion, "db-proyectos", "PRJ-7")
+    assert reused is True
+    assert page["id"] == existing["id"]
+    assert notion.count('pages.create') == 0
+
+    page, reused = crear_proyecto_page(notion, "db-proyectos", "PRJ-8")
+    assert reused is False
+    assert notion.count('pages.create') == 1
+    assert len(notion.database_pages("db-proyectos")) == 2
+
+
+def test_each_partida_is_looked_up_when_existing_ones_are_unknown(app, users, fake_notion):
+    owner, _ = users
+    fake_notion["existentes"] = None # La consulta inicial falló
+    job = PartidasJob(owner.id, "proyecto-1", "PRJ-7", 2)
+    job.save()
+    _run_partidas_job(app, job)
+    assert sorted(fake_notion["created"]) == [("PRJ-7-00.00", True), ("PRJ-7-01.00", True)]
+
+
+def test_resubmitting_returns_the_running_job(app, users, fake_notion):
+    owner, _ = users
+    job = PartidasJob(owner.id, "proyecto-1", "PRJ-7", 3)
+    job.save()
+    assert start_partidas_job("proyecto-1", "PRJ-7", 3, user_id=owner.id) == job.job_id
+    assert fake_notion["created"] == []
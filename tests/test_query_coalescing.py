@@ -0,0 +1,120 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from autointelli.notion import utils
+from autointelli.notion.utils import _coalesced_database_query, _query_coalescing_key
+
+
+class _BlockingDatabases:
+    """databases.query falso que no responde hasta que la prueba lo libera."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = []
+
+    def query(self, **kwargs):
+        self.calls.append(kwargs)
+        self.release.wait(5)
+        return {"results": [{"id": "page-1"}], "next_cursor": None, "call": len(self.calls)}
+
+
+def _wait_for_followers(key, followers):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        with utils._inflight_lock:
+            call = utils._inflight_queries.get(key)
+            if call is not None and call.followers >= followers:
+                return
+        time.sleep(0.001)
+    pytest.fail("Las consultas concurrentes no se unieron a la consulta en curso.")
+
+
+def _run_concurrently(app, client, query_args_list):
+    results = [None] * len(query_args_list)
+
+    def run(index, query_args):
+        with app.app_context():
+            results[index] = _coalesced_database_query(client, query_args)
+
+    threads = [threading.Thread(target=run, args=(index, query_args)) for index, query_args in enumerate(query_args_list)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+
+def test_identical_concurrent_queries_share_one_call(app, fast_limiter):
+    databases = _BlockingDatabases()
+    client = SimpleNamespace(databases=databases)
+    filter_a = {"and": [{"property": "Estatus", "select": {"equals": "Pendiente"}},
+                        {"property": "Urgente", "checkbox": {"equals": True}}]}
+    filter_b = {"and": list(reversed(filter_a["and"]))} # Mismo filtro con las condiciones en otro orden
+    query_args = [{"database_id": "aaaa-bbbb", "filter": filter_a, "page_size": 100}] * 3
+    query_args.append({"database_id": "aaaabbbb", "filter": filter_b, "page_size": 100})
+    leaders_before = utils.coalescing_stats["leaders"]
+
+    threads, results = _run_concurrently(app, client, query_args)
+    _wait_for_followers(_query_coalescing_key(query_args[0]), 3)
+    databases.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(databases.calls) == 1
+    assert all(result is results[0] for result in results)
+    assert utils.coalescing_stats["leaders"] == leaders_before + 1
+    assert utils._inflight_queries == {}
+
+
+def test_different_queries_are_not_shared(app, fast_limiter):
+    databases = _BlockingDatabases()
+    databases.release.set()
+    client = SimpleNamespace(databases=databases)
+    first = _coalesced_database_query(client, {"database_id": "db", "start_cursor": None})
+    second = _coalesced_database_query(client, {"database_id": "db", "start_cursor": "cursor-2"})
+    assert first["call"] == 1
+    assert second["call"] == 2
+    assert _query_coalescing_key({"database_id": "db", "filter": {"property": "A", "select": {"equals": "x"}}}) != \
+        _query_coalescing_key({"database_id": "db", "filter": {"property": "A", "select": {"equals": "y"}}})
+
+
+def test_followers_receive_the_leader_error(app, fast_limiter):
+    class _FailingDatabases(_BlockingDatabases):
+        def query(self, **kwargs):
+            super().query(**kwargs)
+            raise ValueError("consulta inválida")
+
+    databases = _FailingDatabases()
+    client = SimpleNamespace(databases=databases)
+    query_args = {"database_id": "db-error", "page_size": 10}
+    errors = []
+
+    def run():
+        with app.app_context():
+            try:
+                _coalesced_database_query(client, query_args)
+            except ValueError as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    _wait_for_followers(_query_coalescing_key(query_args), 2)
+    databases.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(databases.calls) == 1
+    assert len(errors) == 3
+    assert utils._inflight_queries == {}
+
+
+def test_coalescing_can_be_disabled(app, fast_limiter):
+    app.config['NOTION_QUERY_COALESCING'] = False
+    databases = _BlockingDatabases()
+    databases.release.set()
+    client = SimpleNamespace(databases=databases)
+    _coalesced_database_query(client, {"database_id": "db"})
+    _coalesced_database_query(client, {"database_id": "db"})
+    assert len(databases.calls) == 2
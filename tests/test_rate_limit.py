@@ -0,0 +1,139 @@
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from notion_client.errors import HTTPResponseError
+
+from autointelli.notion import rate_limit
+from autointelli.notion.rate_limit import TokenBucket, call_notion, call_notion_write, get_retry_stats
+
+
+def _http_error(status, headers=None):
+    request = httpx.Request('POST', 'https://api.notion.com/v1/pages')
+    return HTTPResponseError(httpx.Response(status, headers=headers, request=request))
+
+
+class _Script:
+    """Función falsa de la API: cada llamada lanza o retorna el siguiente resultado del guion."""
+
+    def __init__(self, name, *outcomes):
+        self.__name__ = name
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+class _FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+# --- Token bucket ---
+
+def test_token_bucket_allows_burst_then_waits(monkeypatch):
+    fake_time = _FakeTime()
+    monkeypatch.setattr(rate_limit, 'time', SimpleNamespace(monotonic=fake_time.monotonic, sleep=fake_time.sleep))
+    bucket = TokenBucket(rate_per_second=2, capacity=3)
+    for _ in range(3):
+        bucket.acquire()
+    assert fake_time.slept == []
+
+    bucket.acquire()
+    assert fake_time.slept == [pytest.approx(0.5)]
+
+
+def test_token_bucket_pause_blocks_for_retry_after(monkeypatch):
+    fake_time = _FakeTime()
+    monkeypatch.setattr(rate_limit, 'time', SimpleNamespace(monotonic=fake_time.monotonic, sleep=fake_time.sleep))
+    bucket = TokenBucket(rate_per_second=3, capacity=3)
+    bucket.pause(2)
+    bucket.acquire()
+    assert fake_time.now == pytest.approx(2 + 1 / 3)
+
+
+# --- Políticas de reintento ---
+
+def test_read_retries_transient_errors(app, fast_limiter):
+    fn = _Script('test_read_transient', _http_error(503), httpx.ReadTimeout('lento'), {"object": "list"})
+    assert call_notion(fn, database_id='db') == {"object": "list"}
+    assert fn.calls == 3
+    stats = get_retry_stats()['test_read_transient']
+    assert stats['calls'] == 1
+    assert stats['attempts'] == 3
+    assert stats['retries'] == 2
+    assert stats['failures'] == 0
+
+
+def test_read_does_not_retry_client_errors(app, fast_limiter):
+    fn = _Script('test_read_400', _http_error(400), {"object": "list"})
+    with pytest.raises(HTTPResponseError):
+        call_notion(fn)
+    assert fn.calls == 1
+    assert get_retry_stats()['test_read_400']['failures'] == 1
+
+
+def test_read_gives_up_after_max_retries(app, fast_limiter):
+    app.config['NOTION_MAX_RETRIES'] = 2
+    fn = _Script('test_read_exhausted', *[_http_error(502)] * 3)
+    with pytest.raises(HTTPResponseError) as excinfo:
+        call_notion(fn)
+    assert excinfo.value.status == 502
+    assert fn.calls == 3
+
+
+def test_rate_limited_call_respects_retry_after(app, fast_limiter):
+    fn = _Script('test_read_429', _http_error(429, headers={'Retry-After': '0.01'}), {"ok": True})
+    assert call_notion(fn) == {"ok": True}
+    assert get_retry_stats()['test_read_429']['sleep_seconds'] == pytest.approx(0.01)
+
+
+def test_create_retries_errors_where_notion_did_not_write(app, fast_limiter):
+    fn = _Script('test_create_not_sent', _http_error(429), httpx.ConnectError('sin red'), {"id": "page-1"})
+    assert call_notion_write(fn, parent={}) == {"id": "page-1"}
+    assert fn.calls == 3
+
+
+def test_create_does_not_retry_ambiguous_errors_without_dedupe(app, fast_limiter):
+    fn = _Script('test_create_ambiguous', _http_error(500), {"id": "duplicada"})
+    with pytest.raises(HTTPResponseError):
+        call_notion_write(fn)
+    assert fn.calls == 1
+
+    timeout = _Script('test_create_timeout', httpx.ReadTimeout('lento'), {"id": "duplicada"})
+    with pytest.raises(httpx.ReadTimeout):
+        call_notion_write(timeout)
+    assert timeout.calls == 1
+
+
+def test_create_with_dedupe_returns_the_page_already_written(app, fast_limiter):
+    fn = _Script('test_create_dedupe', _http_error(504), {"id": "duplicada"})
+    lookups = []
+
+    def dedupe_lookup():
+        lookups.append(1)
+        return {"id": "page-1"}
+
+    assert call_notion_write(fn, dedupe_lookup=dedupe_lookup) == {"id": "page-1"}
+    assert fn.calls == 1
+    assert len(lookups) == 1
+    assert get_retry_stats()['test_create_dedupe']['deduplicated'] == 1
+
+
+def test_create_with_dedupe_retries_when_the_page_is_missing(app, fast_limiter):
+    fn = _Script('test_create_dedupe_miss', _http_error(500), {"id": "page-2"})
+    assert call_notion_write(fn, dedupe_lookup=lambda: None) == {"id": "page-2"}
+    assert fn.calls == 2
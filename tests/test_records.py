@@ -0,0 +1,84 @@
+from autointelli.notion.constants import (
+    NOTION_PROP_CANTIDAD, NOTION_PROP_ESTATUS, NOTION_PROP_FECHA_SOLICITUD, NOTION_PROP_FOLIO,
+    NOTION_PROP_MATERIALES_PROYECTO, NOTION_PROP_MATERIALES_PROYECTO_RELATION, NOTION_PROP_SOLICITANTE, NOTION_PROP_URGENTE,
+)
+from autointelli.notion.records import SolicitudRecord, _compile_extractor
+
+SCHEMA = {
+    NOTION_PROP_FOLIO: {"type": "rich_text"},
+    NOTION_PROP_SOLICITANTE: {"type": "select"},
+    NOTION_PROP_FECHA_SOLICITUD: {"type": "date"},
+    NOTION_PROP_ESTATUS: {"type": "status"},
+    NOTION_PROP_CANTIDAD: {"type": "number"},
+    NOTION_PROP_URGENTE: {"type": "checkbox"},
+    NOTION_PROP_MATERIALES_PROYECTO_RELATION: {"type": "relation"},
+    NOTION_PROP_MATERIALES_PROYECTO: {"type": "relation"},
+}
+
+
+def _page(**properties):
+    return {
+        "id": "page-1",
+        "url": "https://notion.so/page-1",
+        "created_time": "2024-05-01T10:00:00.000Z",
+        "last_edited_time": "2024-05-02T10:00:00.000Z",
+        "properties": properties,
+    }
+
+
+PAGE = _page(**{
+    NOTION_PROP_FOLIO: {"type": "rich_text", "rich_text": [{"plain_text": "SOL-"}, {"text": {"content": "001"}}]},
+    NOTION_PROP_SOLICITANTE: {"type": "select", "select": {"name": "Ana"}},
+    NOTION_PROP_FECHA_SOLICITUD: {"type": "date", "date": {"start": "2024-05-01T09:30:00.000-06:00"}},
+    NOTION_PROP_ESTATUS: {"type": "status", "status": {"name": "Pendiente"}},
+    NOTION_PROP_CANTIDAD: {"type": "number", "number": 0},
+    NOTION_PROP_URGENTE: {"type": "checkbox", "checkbox": False},
+    NOTION_PROP_MATERIALES_PROYECTO_RELATION: {"type": "relation", "relation": [{"id": "partida-1"}, {"id": "partida-2"}]},
+    NOTION_PROP_MATERIALES_PROYECTO: {"type": "relation", "relation": [{"id": "proyecto-1"}]},
+    "Otra propiedad": {"type": "rich_text", "rich_text": [{"plain_text": "no se copia"}]},
+})
+
+
+def test_extracts_the_dashboard_fields():
+    record = _compile_extractor(SCHEMA)(PAGE)
+    assert isinstance(record, SolicitudRecord)
+    assert record.id == "page-1"
+    assert record.url == "https://notion.so/page-1"
+    assert record.created_time == "2024-05-01T10:00:00.000Z"
+    assert record.folio == "SOL-001"
+    assert record.solicitante == "Ana"
+    assert record.estatus == "Pendiente"
+    assert record.fecha_solicitud_dia == "2024-05-01"
+    assert record.cantidad == 0 # Los valores falsos se conservan
+    assert record.urgente is False
+    assert record.partida_ids == ("partida-1", "partida-2")
+    assert record.proyecto_ids == ("proyecto-1",)
+    assert record.project_code is None
+    assert not hasattr(record, '__dict__')
+
+
+def test_missing_and_empty_properties_stay_none():
+    record = _compile_extractor(SCHEMA)(_page(**{
+        NOTION_PROP_FOLIO: {"type": "rich_text", "rich_text": []},
+        NOTION_PROP_ESTATUS: {"type": "status", "status": None},
+    }))
+    assert record.folio is None
+    assert record.estatus is None
+    assert record.fecha_solicitud_dia is None
+    assert record.partida_ids == ()
+
+
+def test_project_captured_as_text_goes_to_project_code():
+    schema = {**SCHEMA, NOTION_PROP_MATERIALES_PROYECTO: {"type": "rich_text"}}
+    record = _compile_extractor(schema)(_page(**{
+        NOTION_PROP_MATERIALES_PROYECTO: {"type": "rich_text", "rich_text": [{"plain_text": "PRJ-7"}]},
+    }))
+    assert record.project_code == "PRJ-7"
+    assert record.proyecto_ids == ()
+
+
+def test_without_schema_each_page_is_read_by_its_own_types():
+    record = _compile_extractor({})(PAGE)
+    assert record.folio == "SOL-001"
+    assert record.estatus == "Pendiente"
+    assert record.partida_ids == ("partida-1", "partida-2")
@@ -0,0 +1,71 @@
+import pytest
+
+from autointelli.notion import relations, schema_cache
+from autointelli.notion.relations import relation_ids, resolve_relation_titles
+
+PARTIDAS = "db-partidas"
+
+
+@pytest.fixture
+def notion(notion, monkeypatch):
+    monkeypatch.setattr(relations, '_title_cache', {})
+    monkeypatch.setattr(schema_cache, '_schema_cache', {})
+    monkeypatch.setattr(schema_cache, '_known_versions', {})
+    notion.schemas["dbpartidas"] = {"ID de partida": {"id": "pid", "type": "rich_text"}}
+    for index in (1, 2, 3):
+        notion.add_page(PARTIDAS, {"ID de partida": {"rich_text": [{"text": {"content": f"P-0{index}"}}]}}, page_id=f"partida-{index}")
+    return notion
+
+
+def test_ids_are_deduplicated_and_cached(app, notion):
+    titles = resolve_relation_titles(notion, ["partida-1", "partida-2", "partida-1", None], "ID de partida")
+    assert titles == {"partida-1": "P-01", "partida-2": "P-02"}
+    assert notion.count('pages.retrieve') == 2
+
+    titles = resolve_relation_titles(notion, ["partida-2", "partida-3"], "ID de partida")
+    assert titles == {"partida-2": "P-02", "partida-3": "P-03"}
+    assert notion.count('pages.retrieve') == 3 # partida-2 sale del caché
+
+
+def test_cache_expires_with_the_ttl(app, notion):
+    app.config['NOTION_RELATION_CACHE_TTL_SECONDS'] = 0
+    resolve_relation_titles(notion, ["partida-1"], "ID de partida")
+    resolve_relation_titles(notion, ["partida-1"], "ID de partida")
+    assert notion.count('pages.retrieve') == 2
+
+
+def test_failures_are_not_cached(app, notion):
+    notion.fail('pages.retrieve', RuntimeError("sin conexión"), page_id="partida-2")
+    assert resolve_relation_titles(notion, ["partida-1", "partida-2"], "ID de partida") == {"partida-1": "P-01"}
+
+    notion.failures.clear()
+    assert resolve_relation_titles(notion, ["partida-1", "partida-2"], "ID de partida") == {"partida-1": "P-01", "partida-2": "P-02"}
+    assert notion.count('pages.retrieve') == 3
+
+
+def test_pages_without_the_property_resolve_to_none(app, notion):
+    notion.add_page(PARTIDAS, {"Otra": {"rich_text": []}}, page_id="partida-4")
+    assert resolve_relation_titles(notion, ["partida-4"], "ID de partida") == {"partida-4": None}
+    resolve_relation_titles(notion, ["partida-4"], "ID de partida")
+    assert notion.count('pages.retrieve') == 1 # También se cachea
+
+
+def test_database_id_projects_the_retrieved_property(app, notion, monkeypatch):
+    projections = []
+    fetch_pages_by_ids = relations.fetch_pages_by_ids
+
+    def recording_fetch(client, page_ids, filter_properties=None):
+        projections.append(filter_properties)
+        return fetch_pages_by_ids(client, page_ids, filter_properties=filter_properties)
+
+    monkeypatch.setattr(relations, 'fetch_pages_by_ids', recording_fetch)
+    resolve_relation_titles(notion, ["partida-1"], "ID de partida", database_id=PARTIDAS)
+    assert projections == [["pid"]]
+
+
+def test_relation_ids():
+    page = {"properties": {"Partida": {"type": "relation", "relation": [{"id": "a"}, {"id": ""}, {"id": "b"}]},
+                           "Folio": {"type": "rich_text", "rich_text": []}}}
+    assert relation_ids(page, "Partida") == ["a", "b"]
+    assert relation_ids(page, "Folio") == []
+    assert relation_ids(page, "No existe") == []
@@ -0,0 +1,86 @@
+import pytest
+
+from autointelli.models import db, NotionSchemaVersion
+from autointelli.notion import schema_cache
+from autointelli.notion.schema_cache import get_database_schema, invalidate_database_schema, property_projection
+
+DB = "aaaa-bbbb"
+
+
+def _fresh_worker(monkeypatch, cached=None):
+    """Estado en memoria de un proceso nuevo (o de otro worker): la tabla de versiones es la misma."""
+    monkeypatch.setattr(schema_cache, '_schema_cache', cached if cached is not None else {})
+    monkeypatch.setattr(schema_cache, '_known_versions', {})
+    monkeypatch.setattr(schema_cache, '_versions_checked_at', None)
+
+
+@pytest.fixture
+def notion(notion, monkeypatch):
+    _fresh_worker(monkeypatch)
+    notion.schemas["aaaabbbb"] = {"Estatus": {"id": "st%3A", "type": "status"}, "Folio": {"id": "title", "type": "title"}}
+    return notion
+
+
+def test_schema_is_cached_until_the_ttl_expires(app, notion):
+    first = get_database_schema(notion, DB)
+    assert get_database_schema(notion, "aaaabbbb") is first # Mismo ID con o sin guiones
+    assert notion.count('databases.retrieve') == 1
+
+    app.config['NOTION_SCHEMA_TTL_SECONDS'] = 0
+    get_database_schema(notion, DB)
+    assert notion.count('databases.retrieve') == 2
+
+
+def test_force_refresh_skips_the_cache(app, notion):
+    get_database_schema(notion, DB)
+    get_database_schema(notion, DB, force_refresh=True)
+    assert notion.count('databases.retrieve') == 2
+
+
+def test_invalidation_is_local_and_versioned(app, notion):
+    get_database_schema(notion, DB)
+    invalidations = schema_cache.schema_cache_stats["invalidations"]
+
+    invalidate_database_schema(DB, reason="prueba")
+    assert schema_cache.schema_cache_stats["invalidations"] == invalidations + 1
+    assert db.session.get(NotionSchemaVersion, "aaaabbbb").version == 1
+    get_database_schema(notion, DB)
+    assert notion.count('databases.retrieve') == 2
+
+
+def test_other_workers_see_the_new_version(app, notion, monkeypatch):
+    get_database_schema(notion, DB)
+    cached = dict(schema_cache._schema_cache)
+
+    _fresh_worker(monkeypatch)
+    invalidate_database_schema(DB, reason="propiedad renombrada")
+
+    # De vuelta en el primer worker: su copia es de la versión 0 y el TTL no ha vencido
+    _fresh_worker(monkeypatch, cached)
+    get_database_schema(notion, DB)
+    assert notion.count('databases.retrieve') == 2
+    assert schema_cache._schema_cache["aaaabbbb"][1] == 1
+
+    get_database_schema(notion, DB)
+    assert notion.count('databases.retrieve') == 2
+
+
+def test_version_check_is_throttled(app, notion, monkeypatch):
+    get_database_schema(notion, DB)
+    version = NotionSchemaVersion(database_id="aaaabbbb", version=5) # Publicada por otro worker
+    db.session.add(version)
+    db.session.commit()
+
+    get_database_schema(notion, DB)
+    assert notion.count('databases.retrieve') == 1 # Aún dentro de NOTION_SCHEMA_VERSION_CHECK_SECONDS
+
+    monkeypatch.setattr(schema_cache, '_versions_checked_at', None)
+    get_database_schema(notion, DB)
+    assert notion.count('databases.retrieve') == 2
+
+
+def test_property_projection(app, notion):
+    assert property_projection(notion, DB, ["Folio", "Estatus", "Folio", "No existe"]) == ["title", "st%3A"]
+    assert property_projection(notion, DB, ["No existe"]) is None
+    notion.fail('databases.retrieve', RuntimeError("sin acceso"))
+    assert property_projection(notion, "otra-db", ["Folio"]) is None
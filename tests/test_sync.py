@@ -0,0 +1,77 @@
+from autointelli.notion.mirror import get_sync_watermark, read_mirror
+from autointelli.notion.sync import sync_database
+
+DB = "db-sync"
+
+
+def _add(notion, page_id, edited, folio):
+    return notion.add_page(DB, {"Folio": {"rich_text": [{"text": {"content": folio}}]}}, page_id=page_id,
+                           created_time="2024-05-01T09:00:00.000Z", last_edited_time=edited)
+
+
+def _mirrored(database_id=DB):
+    return {page["id"]: page["properties"]["Folio"]["rich_text"][0]["text"]["content"]
+            for page in read_mirror(database_id, allow_stale=True)}
+
+
+def test_first_sync_is_full_and_sets_the_watermark(app, notion):
+    _add(notion, "page1", "2024-05-01T10:00:00.000Z", "SOL-1")
+    _add(notion, "page2", "2024-05-02T10:00:00.000Z", "SOL-2")
+
+    stats = sync_database(notion, 'DATABASE_ID_PARTIDAS', DB)
+    assert stats.full and stats.error is None
+    assert (stats.rows_fetched, stats.rows_changed) == (2, 2)
+    assert get_sync_watermark(DB) == "2024-05-02T10:00:00.000Z"
+    assert _mirrored() == {"page1": "SOL-1", "page2": "SOL-2"}
+
+
+def test_delta_sync_only_upserts_changed_pages(app, notion):
+    _add(notion, "page1", "2024-05-01T10:00:00.000Z", "SOL-1")
+    _add(notion, "page2", "2024-05-02T10:00:00.000Z", "SOL-2")
+    sync_database(notion, 'DATABASE_ID_PARTIDAS', DB)
+
+    _add(notion, "page1", "2024-05-03T08:00:00.000Z", "SOL-1 editado")
+    _add(notion, "page3", "2024-05-03T09:00:00.000Z", "SOL-3")
+    notion.calls.clear()
+    stats = sync_database(notion, 'DATABASE_ID_PARTIDAS', DB)
+
+    assert not stats.full and stats.error is None
+    _, query = notion.calls[0]
+    assert query["filter"] == {"timestamp": "last_edited_time", "last_edited_time": {"on_or_after": "2024-05-02T10:00:00.000Z"}}
+    assert stats.rows_fetched == 3 # 'on_or_after' vuelve a traer page2, que no cambió
+    assert stats.rows_changed == 2
+    assert get_sync_watermark(DB) == "2024-05-03T09:00:00.000Z"
+    assert _mirrored() == {"page1": "SOL-1 editado", "page2": "SOL-2", "page3": "SOL-3"}
+
+
+def test_empty_delta_keeps_the_watermark(app, notion):
+    _add(notion, "page1", "2024-05-01T10:00:00.000Z", "SOL-1")
+    sync_database(notion, 'DATABASE_ID_PARTIDAS', DB)
+    notion.stored_pages.clear()
+
+    stats = sync_database(notion, 'DATABASE_ID_PARTIDAS', DB)
+    assert (stats.rows_fetched, stats.rows_changed) == (0, 0)
+    assert get_sync_watermark(DB) == "2024-05-01T10:00:00.000Z"
+    assert _mirrored() == {"page1": "SOL-1"} # El delta no ve páginas eliminadas
+
+
+def test_full_sync_drops_deleted_pages(app, notion):
+    _add(notion, "page1", "2024-05-01T10:00:00.000Z", "SOL-1")
+    _add(notion, "page2", "2024-05-02T10:00:00.000Z", "SOL-2")
+    sync_database(notion, 'DATABASE_ID_PARTIDAS', DB)
+    notion.stored_pages["page2"]["archived"] = True
+
+    stats = sync_database(notion, 'DATABASE_ID_PARTIDAS', DB, full=True)
+    assert stats.full
+    assert _mirrored() == {"page1": "SOL-1"}
+    assert get_sync_watermark(DB) == "2024-05-01T10:00:00.000Z"
+
+
+def test_errors_are_reported_without_moving_the_watermark(app, notion):
+    _add(notion, "page1", "2024-05-01T10:00:00.000Z", "SOL-1")
+    sync_database(notion, 'DATABASE_ID_PARTIDAS', DB)
+    notion.fail('databases.query', RuntimeError("Notion no responde"))
+
+    stats = sync_database(notion, 'DATABASE_ID_PARTIDAS', DB)
+    assert stats.error == "Notion no responde"
+    assert get_sync_watermark(DB) == "2024-05-01T10:00:00.000Z"
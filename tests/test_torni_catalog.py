@@ -0,0 +1,89 @@
+import json
+
+import pytest
+
+from autointelli.torni_catalog import (
+    TorniCatalog, compile_torni_catalog, merge_catalog_sources, normalize_text, open_torni_catalog, sources_digest,
+)
+
+ITEMS = [
+    {"id": "TR-100", "description": "Tornillo hexagonal acero 1/4"},
+    {"id": "TR-101", "description": "Tornillo cabeza plana acero inoxidable"},
+    {"id": "RD-200", "description": "Rondana plana de presión"},
+    {"id": "TU-300", "description": "Tuerca hexagonal"},
+    {"id": "ÑA-1", "description": "Ñandú de latón"},
+]
+
+
+@pytest.fixture
+def catalog():
+    return TorniCatalog(compile_torni_catalog(ITEMS))
+
+
+def _ids(results):
+    return [item["id"] for item in results]
+
+
+def test_normalize_text_drops_accents_but_keeps_enie():
+    assert normalize_text("  Presión   AÑO\n") == "presion año"
+
+
+def test_get_by_exact_id(catalog):
+    assert len(catalog) == len(ITEMS)
+    assert catalog.get("TR-100") == ITEMS[0]
+    assert catalog.get("tr-101") == ITEMS[1]
+    assert catalog.get("ña-1") == ITEMS[4]
+    assert catalog.get("TR-10") is None
+    assert catalog.get("") is None
+
+
+def test_search_by_id_prefix_comes_first(catalog):
+    assert _ids(catalog.search("tr-1")) == ["TR-100", "TR-101"]
+    assert _ids(catalog.search("TU")) == ["TU-300"]
+
+
+def test_search_by_description_words(catalog):
+    assert _ids(catalog.search("hexagonal")) == ["TU-300", "TR-100"] # Descripción más corta primero
+    assert _ids(catalog.search("torn acero")) == ["TR-100", "TR-101"] # Cada palabra es un prefijo
+    assert _ids(catalog.search("presion")) == ["RD-200"]
+    assert catalog.search("hexagonal inoxidable") == []
+
+
+def test_search_limits_and_empty_queries(catalog):
+    assert len(catalog.search("a", limit=2)) <= 2
+    assert catalog.search("tornillo", limit=0) == []
+    assert catalog.search("   ") == []
+
+
+def test_empty_catalog():
+    catalog = TorniCatalog(compile_torni_catalog([]))
+    assert len(catalog) == 0
+    assert catalog.get("TR-100") is None
+    assert catalog.search("tornillo") == []
+
+
+def test_rejects_other_files():
+    with pytest.raises(ValueError):
+        TorniCatalog(b'\0' * 128)
+
+
+def test_compiled_file_round_trip(tmp_path):
+    json_source = tmp_path / "torni_items_masterlist.json"
+    json_source.write_text(json.dumps([{"id": "TR-100", "description": "Tornillo hexagonal"},
+                                       {"id": "RD-200", "description": "Rondana plana"}]), encoding="utf-8")
+    csv_source = tmp_path / "accesorios.csv"
+    csv_source.write_text("ID,DESCRIPCIÓN\nTR-100,Tornillo   distinto\nTU-300,Tuerca\n", encoding="utf-8")
+    sources = [str(json_source), str(csv_source)]
+
+    items, conflicts = merge_catalog_sources(sources)
+    assert [item["id"] for item in items] == ["TR-100", "RD-200", "TU-300"]
+    assert items[0]["description"] == "Tornillo hexagonal" # Gana la primera fuente
+    assert len(conflicts) == 1 and conflicts[0].startswith("TR-100:")
+
+    digest = sources_digest(sources)
+    path = tmp_path / "torni_catalog.bin"
+    path.write_bytes(compile_torni_catalog(items, digest))
+    catalog = open_torni_catalog(str(path))
+    assert catalog.source_digest == digest
+    assert catalog.get("TU-300") == {"id": "TU-300", "description": "Tuerca"}
+    assert _ids(catalog.search("rondana")) == ["RD-200"]
@@ -0,0 +1,44 @@
+import io
+import zipfile
+
+from autointelli.material_import import iter_spreadsheet_rows
+from autointelli.xlsx_stream import row_xml, write_xlsx
+
+
+def _write(header, rows, sheet_name='Hoja1'):
+    output = io.BytesIO()
+    write_xlsx(output, header, rows, sheet_name=sheet_name)
+    output.seek(0)
+    return output
+
+
+def test_cells_by_type():
+    assert row_xml([None, '', True, 3, 2.5]) == '<row><c/><c/><c t="b"><v>1</v></c><c><v>3</v></c><c><v>2.5</v></c></row>'
+    assert row_xml(['a<b & "c"']) == '<row><c t="inlineStr"><is><t xml:space="preserve">a&lt;b &amp; "c"</t></is></c></row>'
+    assert row_xml(['x'], style=1).startswith('<row><c t="inlineStr" s="1">')
+    assert '\x07' not in row_xml(['campana\x07']) # Caracteres de control que XML no admite
+
+
+def test_workbook_parts():
+    with zipfile.ZipFile(_write(['A'], [['1']], sheet_name='Solicitudes <compras>')) as archive:
+        names = set(archive.namelist())
+        assert {'[Content_Types].xml', '_rels/.rels', 'xl/workbook.xml', 'xl/_rels/workbook.xml.rels',
+                'xl/styles.xml', 'xl/worksheets/sheet1.xml'} <= names
+        assert 'name="Solicitudes &lt;compras&gt;"' in archive.read('xl/workbook.xml').decode('utf-8')
+
+
+def test_round_trip_through_the_importer():
+    rows = [['SOL-001', 'Tornillo', 5, True], ['SOL-002', 'Tuerca "M6"', 2.5, None]]
+    output = _write(['Folio', 'Material', 'Cantidad', 'Urgente'], iter(rows))
+    assert list(iter_spreadsheet_rows(output, 'export.xlsx')) == [
+        ['Folio', 'Material', 'Cantidad', 'Urgente'],
+        ['SOL-001', 'Tornillo', '5', 'si'],
+        ['SOL-002', 'Tuerca "M6"', '2.5', ''],
+    ]
+
+
+def test_many_rows_are_written_in_chunks():
+    rows = ([f'ID-{index}', 'x' * 100, index] for index in range(3000)) # Más de un bloque de 64 KB
+    read = list(iter_spreadsheet_rows(_write(['ID', 'Texto', 'N'], rows), 'grande.xlsx'))
+    assert len(read) == 3001
+    assert read[-1] == ['ID-2999', 'x' * 100, '2999']